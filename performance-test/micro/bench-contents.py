@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+#
+# Compares the content computers that ScanJob.do_content_computations
+# runs on every file with the per byte implementations they replaced,
+# on text and on binary files of different sizes. The results of the old
+# and the new computers are compared as well.
+#
+# Usage: bench-contents.py [<size> ...]
+#
+# Sizes can have a suffix K, M or G, the default is 1K 1M 64M.
+
+import collections
+import os
+import pathlib
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+import FileContentsComputer as contentscomputer
+from FileContentsComputer import FileContentsComputer, IsTextComputer, ByteCounter
+
+# the size of the reads in ScanJob.do_content_computations
+readsize = 10240
+
+class OldIsTextComputer(IsTextComputer):
+    def compute(self, data):
+        self.is_text = self.is_text and \
+            all(chr(x) in string.printable for x in data)
+
+class OldByteCounter(ByteCounter):
+    def initialize(self):
+        self.bytecounter = collections.Counter(
+            dict([(i, 0) for i in range(0, 256)]))
+
+    def compute(self, data):
+        self.bytecounter.update(data)
+
+    def finalize(self):
+        pass
+
+def parse_size(size):
+    for suffix, factor in [('K', 1024), ('M', 1024**2), ('G', 1024**3)]:
+        if size.upper().endswith(suffix):
+            return int(size[:-1]) * factor
+    return int(size)
+
+def create_file(directory, kind, size):
+    '''Write a file of size bytes of text, or of random data'''
+    path = pathlib.Path(directory) / ('%s-%d' % (kind, size))
+    if kind == 'text':
+        block = (string.printable.encode() * 10486)[:1024*1024]
+    else:
+        block = os.urandom(1024*1024)
+    with path.open('wb') as f:
+        for i in range(size // len(block)):
+            f.write(block)
+        f.write(block[:size % len(block)])
+    return path
+
+def run(path, computer):
+    fc = FileContentsComputer(readsize)
+    fc.subscribe(computer)
+    start = time.perf_counter()
+    fc.read(path)
+    return computer.get(), time.perf_counter() - start
+
+def main(argv):
+    sizes = [ parse_size(x) for x in argv[1:] ]
+    if sizes == []:
+        sizes = [ parse_size(x) for x in ['1K', '1M', '64M'] ]
+
+    computers = [
+        ('is text', OldIsTextComputer, IsTextComputer),
+        ('byte counter', OldByteCounter, ByteCounter),
+    ]
+
+    print("computer,kind,size,old seconds,new seconds,speedup,numpy,same result")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for kind in ['text', 'binary']:
+                path = create_file(directory, kind, size)
+                for name, oldcomputer, newcomputer in computers:
+                    oldresult, oldduration = run(path, oldcomputer())
+                    newresult, newduration = run(path, newcomputer())
+                    print("%s,%s,%d,%f,%f,%f,%s,%s" % (name, kind, size,
+                        oldduration, newduration,
+                        oldduration / max(newduration, 1e-9),
+                        contentscomputer.numpy is not None,
+                        oldresult == newresult))
+                path.unlink()
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Unpacks compressed files with the unpackers of compressed streams in
+# bangunpack (gzip, bzip2, LZMA, XZ, lzip, LZ4, LZ4 legacy, zstd, snappy
+# and lzop), with the decompression limits of the scan environment (see
+# decompressionmaximum and decompressionratio in bang.config), and
+# reports the time, the amount of bytes that were written and the reason
+# of failures. Every file in the directory that starts with the
+# signature of one of the unpackers is unpacked at offset 0. Without a
+# directory, a gzip, bzip2 and XZ "bomb" of 1 GiB of zero bytes are
+# generated.
+#
+# Usage: bench-decompress.py [<maximum> [<ratio> [<directory>]]]
+
+import bz2
+import lzma
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import zlib
+
+srcdirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        '..', '..', 'src')
+sys.path.insert(0, srcdirectory)
+
+import bangunpack
+from FileResult import FileResult
+from ScanEnvironment import ScanEnvironment
+
+unpackers = [bangunpack.unpack_gzip, bangunpack.unpack_bzip2,
+        bangunpack.unpack_lzma, bangunpack.unpack_xz, bangunpack.unpack_lzip,
+        bangunpack.unpack_lz4, bangunpack.unpack_lz4legacy,
+        bangunpack.unpack_zstd, bangunpack.unpack_snappy,
+        bangunpack.unpack_lzop]
+
+def find_unpacker(filename):
+    '''Return the unpacker with a signature at the start of the file,
+    or None'''
+    with open(filename, 'rb') as f:
+        checkbytes = f.read(16)
+    for unpacker in unpackers:
+        for signature in unpacker.signatures.values():
+            if checkbytes.startswith(signature):
+                return unpacker
+    return None
+
+def create_bombs(directory, size=1024*1024*1024):
+    '''Write gzip, bzip2 and XZ files of size zero bytes'''
+    block = b'\x00' * (1024 * 1024)
+    compressors = {'zeros.gz': zlib.compressobj(9, zlib.DEFLATED, 31),
+                   'zeros.bz2': bz2.BZ2Compressor(9),
+                   'zeros.xz': lzma.LZMACompressor()}
+    for name, compressor in compressors.items():
+        with open(directory / name, 'wb') as f:
+            for i in range(size // len(block)):
+                f.write(compressor.compress(block))
+            f.write(compressor.flush())
+
+def main(argv):
+    maximum = 0
+    ratio = 0
+    if len(argv) > 1:
+        maximum = int(argv[1])
+    if len(argv) > 2:
+        ratio = int(argv[2])
+
+    with tempfile.TemporaryDirectory() as tmpdirectory:
+        tmpdirectory = pathlib.Path(tmpdirectory)
+        if len(argv) > 3:
+            directory = pathlib.Path(argv[3]).absolute()
+        else:
+            directory = tmpdirectory / 'bombs'
+            directory.mkdir()
+            create_bombs(directory)
+        unpackdirectory = tmpdirectory / 'unpack'
+        unpackdirectory.mkdir()
+        scanenvironment = ScanEnvironment(maxbytes=200000, readsize=10240,
+                createbytecounter=False, createjson=False,
+                runfilescans=False, tlshmaximum=sys.maxsize,
+                synthesizedminimum=10, logging=False, paddingname='PADDING',
+                unpackdirectory=unpackdirectory,
+                temporarydirectory=tmpdirectory,
+                resultsdirectory=tmpdirectory, scanfilequeue=None,
+                resultqueue=None, processlock=None, checksumdict={},
+                decompressionmaximum=maximum, decompressionratio=ratio)
+
+        print("file,unpacker,size,status,written,seconds,reason")
+        for counter, filename in enumerate(sorted(directory.iterdir())):
+            if not filename.is_file():
+                continue
+            unpacker = find_unpacker(filename)
+            if unpacker is None:
+                continue
+            fileresult = FileResult(None, filename, set())
+            fileresult.set_filesize(filename.stat().st_size)
+            unpackdir = pathlib.Path('unpacked-%d' % counter)
+            start = time.perf_counter()
+            res = unpacker(fileresult, scanenvironment, 0, unpackdir)
+            duration = time.perf_counter() - start
+            written = sum(p.stat().st_size for p in
+                    (unpackdirectory / unpackdir).rglob('*') if p.is_file())
+            print("%s,%s,%d,%s,%d,%f,%s" % (filename.name, unpacker.__name__,
+                fileresult.filesize, res['status'], written, duration,
+                res.get('error', {}).get('reason', '')))
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Times the image unpackers in bangmedia on a directory of images, once
+# for every image validation level: "structural" only checks headers,
+# markers and chunks, "full" also decodes the images with PIL. Every file
+# that starts with the signature of one of the unpackers is unpacked at
+# offset 0 with that unpacker. Carved images are written to a temporary
+# directory. The amount of verified images is reported as well, as the
+# levels do not have to agree on damaged images.
+#
+# Usage: bench-images.py [<runs> [<image directory>]]
+
+import collections
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+srcdirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        '..', '..', 'src')
+sys.path.insert(0, srcdirectory)
+
+import bangmedia
+from FileResult import FileResult
+from ScanEnvironment import ScanEnvironment, imagevalidationlevels
+
+imageunpackers = [bangmedia.unpack_bmp, bangmedia.unpack_gif,
+        bangmedia.unpack_jpeg, bangmedia.unpack_ico, bangmedia.unpack_sgi,
+        bangmedia.unpack_apple_icon, bangmedia.unpack_psd,
+        bangmedia.unpack_pnm]
+
+def find_unpacker(filename):
+    '''Return the image unpacker with a signature at the start of
+    the file, or None'''
+    with open(filename, 'rb') as f:
+        checkbytes = f.read(8)
+    for unpacker in imageunpackers:
+        for signature in unpacker.signatures.values():
+            if checkbytes.startswith(signature):
+                return unpacker
+    return None
+
+def create_scan_environment(unpackdirectory, imagevalidation):
+    return ScanEnvironment(maxbytes=200000, readsize=10240,
+            createbytecounter=False, createjson=False, runfilescans=False,
+            tlshmaximum=sys.maxsize, synthesizedminimum=10, logging=False,
+            paddingname='PADDING', unpackdirectory=unpackdirectory,
+            temporarydirectory=unpackdirectory,
+            resultsdirectory=unpackdirectory, scanfilequeue=None,
+            resultqueue=None, processlock=None, checksumdict={},
+            imagevalidation=imagevalidation)
+
+def unpack_images(scanenvironment, images):
+    '''Unpack all images and return the amount of verified images'''
+    verified = 0
+    for counter, (filename, unpacker) in enumerate(images):
+        fileresult = FileResult(None, filename, set())
+        fileresult.set_filesize(filename.stat().st_size)
+        unpackdir = pathlib.Path('%s-%d' % (unpacker.__name__, counter))
+        res = unpacker(fileresult, scanenvironment, 0, unpackdir)
+        if res['status']:
+            verified += 1
+    return verified
+
+def main(argv):
+    runs = 5
+    imagedirectory = pathlib.Path(srcdirectory) / 'test' / 'testdata' / 'unpackers'
+    if len(argv) > 1:
+        runs = int(argv[1])
+    if len(argv) > 2:
+        imagedirectory = pathlib.Path(argv[2])
+
+    images = collections.defaultdict(list)
+    for filename in sorted(imagedirectory.rglob('*')):
+        if not filename.is_file():
+            continue
+        unpacker = find_unpacker(filename)
+        if unpacker is not None:
+            images[unpacker.__name__].append((filename.absolute(), unpacker))
+
+    print("unpacker,validation,images,verified,seconds")
+    for name in images:
+        for imagevalidation in imagevalidationlevels:
+            with tempfile.TemporaryDirectory() as unpackdirectory:
+                scanenvironment = create_scan_environment(
+                        pathlib.Path(unpackdirectory), imagevalidation)
+                start = time.perf_counter()
+                for i in range(runs):
+                    verified = unpack_images(scanenvironment, images[name])
+                duration = (time.perf_counter() - start) / runs
+            print("%s,%s,%d,%d,%f" % (name, imagevalidation,
+                len(images[name]), verified, duration))
+
+if __name__ == "__main__":
+    main(sys.argv)
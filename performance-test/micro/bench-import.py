@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Measures how long it takes to import the modules that every worker
+# and every tool imports, with "python3 -X importtime", and checks that
+# these imports do not pull in modules that should only be imported
+# when they are used: the legacy unpack modules and the large third
+# party modules. The exit status is 1 if any of these is imported.
+#
+# Usage: bench-import.py [<runs> [<module> ...]]
+
+import os
+import statistics
+import subprocess
+import sys
+
+srcdirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        '..', '..', 'src')
+
+# modules that are imported by the scanner, the workers and the tools
+defaultmodules = ['bangsignatures', 'ScanEnvironment', 'ScanJob',
+        'bangprocesslog']
+
+# modules that should only be imported when they are used
+lazymodules = ['bangunpack', 'bangfilesystems', 'bangmedia', 'bangandroid',
+        'bangtext', 'PIL', 'defusedxml', 'psycopg2', 'elasticsearch']
+
+def import_times(module):
+    '''Import module in a new interpreter and return a dictionary with
+    the cumulative import time in microseconds of every module that
+    was imported'''
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+        'import %s' % module], cwd=srcdirectory, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, check=True, text=True)
+    times = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        selftime, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+def main(argv):
+    runs = 5
+    modules = defaultmodules
+    if len(argv) > 1:
+        runs = int(argv[1])
+    if len(argv) > 2:
+        modules = argv[2:]
+
+    failed = False
+    print("module,runs,median seconds,modules imported,lazy modules imported")
+    for module in modules:
+        durations = []
+        for i in range(runs):
+            times = import_times(module)
+            durations.append(times[module] / 1000000)
+        imported = [ m for m in lazymodules if m in times ]
+        failed = failed or imported != []
+        print("%s,%d,%f,%d,%s" % (module, runs, statistics.median(durations),
+            len(times), ' '.join(imported)))
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Times the Kaitai Struct based unpack parsers on the test data of the
+# test suite, reading through OffsetInputFile with its default block
+# size and without a block (a read for every field, as before). Every
+# parser is tried on every test file that it would be tried on by the
+# scanner: files with one of its extensions or with one of its signatures
+# at offset 0. Only parsing is timed, nothing is unpacked.
+#
+# Usage: bench-parsers.py [<runs> [<testdata directory>]]
+
+import inspect
+import os
+import pathlib
+import sys
+import time
+
+srcdirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        '..', '..', 'src')
+sys.path.insert(0, srcdirectory)
+
+import bangsignatures
+from UnpackParser import OffsetInputFile
+
+def kaitai_unpackers():
+    '''Return the unpack parsers that have a Kaitai Struct specification
+    next to them'''
+    unpackers = []
+    for unpacker in bangsignatures.get_unpackers():
+        try:
+            directory = pathlib.Path(inspect.getfile(unpacker.get_class())).parent
+        except ImportError:
+            continue
+        if list(directory.glob('*.ksy')) != []:
+            unpackers.append(unpacker)
+    return unpackers
+
+def is_candidate(unpacker, filename):
+    if any(filename.name.endswith(e) for e in unpacker.extensions):
+        return True
+    with open(filename, 'rb') as f:
+        for offset, signature in unpacker.signatures:
+            f.seek(offset)
+            if f.read(len(signature)) == signature:
+                return True
+    return False
+
+def parse_file(unpacker, filename):
+    '''Parse the file, and return whether or not it could be parsed'''
+    p = unpacker(None, None, pathlib.Path('.'), 0)
+    p.infile = OffsetInputFile(open(filename, 'rb'), 0)
+    try:
+        p.parse_from_offset()
+        return True
+    except Exception:
+        return False
+    finally:
+        p.infile.close()
+
+def main(argv):
+    runs = 5
+    testdatadirectory = pathlib.Path(srcdirectory) / 'test' / 'testdata'
+    if len(argv) > 1:
+        runs = int(argv[1])
+    if len(argv) > 2:
+        testdatadirectory = pathlib.Path(argv[2])
+
+    files = [ f for f in sorted(testdatadirectory.rglob('*')) if f.is_file() ]
+    buffersizes = [OffsetInputFile.buffersize, 0]
+
+    print("parser,block size,files,parsed,seconds")
+    for unpacker in kaitai_unpackers():
+        candidates = [ f for f in files if is_candidate(unpacker, f) ]
+        if candidates == []:
+            continue
+        for buffersize in buffersizes:
+            OffsetInputFile.buffersize = buffersize
+            start = time.perf_counter()
+            for i in range(runs):
+                parsed = sum(parse_file(unpacker, f) for f in candidates)
+            duration = (time.perf_counter() - start) / runs
+            print("%s,%d,%d,%d,%f" % (unpacker.pretty_name, buffersize,
+                len(candidates), parsed, duration))
+        OffsetInputFile.buffersize = buffersizes[0]
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Compares the overhead of the scheduler backends: scan jobs for files
+# that do not exist are passed around like processfile() does, without
+# scanning anything, so only the cost of handing out jobs, checking for
+# duplicates and collecting results is measured.
+#
+# Usage: bench-scheduler.py [<jobs> [<processes> [<scans>]]]
+
+import hashlib
+import multiprocessing
+import os
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from FileResult import FileResult
+from ScanJob import ScanJob
+from ScanScheduler import ScanContext, create_scheduler, schedulers
+
+# every scan job "unpacks" this many files, until there are enough jobs
+fanout = 64
+
+def fake_processfile(scanfilequeue, resultqueue, processlock, checksumdict, jobs):
+    '''Take scan jobs from the queue like processfile() does, add
+    new jobs for "unpacked" files and report a result for each job.'''
+    while True:
+        scanjob = scanfilequeue.get(timeout=86400)
+        fileresult = scanjob.fileresult
+        index = int(fileresult.filename.name)
+        queuedjobs = 0
+        for child in range(index * fanout + 1, min(index * fanout + fanout + 1, jobs)):
+            childresult = FileResult(fileresult,
+                    fileresult.filename.parent / str(child), set())
+            scanfilequeue.put(ScanJob(childresult, scanjob.scan, scanjob.jobid))
+            queuedjobs += 1
+
+        # a quarter of the files are duplicates
+        data = b'%d' % (index % max(1, jobs * 3 // 4))
+        fileresult.set_hashresult('sha256', hashlib.sha256(data).hexdigest())
+        checksumkey = scanjob.scan.checksum_key(fileresult.get_hash())
+        processlock.acquire()
+        if checksumkey in checksumdict:
+            fileresult.set_duplicate(True)
+            fileresult.set_duplicate_of(checksumdict[checksumkey])
+        else:
+            checksumdict[checksumkey] = fileresult.filename
+        processlock.release()
+
+        resultqueue.put((scanjob.scan.scanid, scanjob.jobid, scanjob.parentid,
+            fileresult, queuedjobs, None))
+        scanfilequeue.task_done()
+
+def run(name, jobs, processcount, scancount):
+    '''Run scancount scans of jobs files each, all at the same time'''
+    scheduler = create_scheduler(name)
+    processes = [ multiprocessing.Process(target=fake_processfile,
+        args=(scheduler.scanfilequeue, scheduler.resultqueue,
+            scheduler.processlock, scheduler.checksumdict, jobs))
+        for i in range(processcount) ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for i in range(scancount):
+        scan = ScanContext(str(i), pathlib.Path('/unpack'), pathlib.Path('/results'))
+        scheduler.submit(ScanJob(FileResult(None, pathlib.Path('/unpack/0'),
+            set(['root'])), scan))
+    results = 0
+    while scheduler.get_active_scans() > 0:
+        scan, fileresults, statistics = scheduler.wait_for_scan()
+        results += len(fileresults)
+    duration = time.perf_counter() - start
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+    scheduler.shutdown()
+    return results, duration
+
+def main(argv):
+    jobs = 100000
+    processcount = multiprocessing.cpu_count()
+    scancount = 1
+    if len(argv) > 1:
+        jobs = int(argv[1])
+    if len(argv) > 2:
+        processcount = int(argv[2])
+    if len(argv) > 3:
+        scancount = int(argv[3])
+
+    print("scheduler,processes,scans,jobs,results,seconds,jobs per second")
+    for name in schedulers:
+        results, duration = run(name, jobs, processcount, scancount)
+        print("%s,%d,%d,%d,%d,%f,%f" % (name, processcount, scancount,
+            jobs * scancount, results, duration, results / duration))
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Compares the time needed to find all signature candidates in a file
+# with one regular expression per signature (the old code path) and
+# with the SignatureMatcher.
+#
+# Usage: bench-signatures.py <file> [<file> ...]
+
+import os
+import sys
+import time
+import pathlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+import bangsignatures
+from bangsignatures import maxsignaturesoffset
+from SignatureMatcher import SignatureMatcher
+from UnpackManager import UnpackManager
+
+def scan_file(filename, find_candidates, usemmap):
+    '''Slide a window over the file like ScanJob.check_for_signatures does,
+    without unpacking anything, and return the number of candidates.'''
+    maxbytes = max(200000, maxsignaturesoffset+1)
+    filesize = filename.stat().st_size
+    unpacker = UnpackManager(pathlib.Path('.'))
+    if not (usemmap and unpacker.open_scanfile_with_mmap(filename)):
+        unpacker.open_scanfile_with_memoryview(filename, maxbytes)
+    unpacker.seek_to_last_unpacked_offset()
+    unpacker.read_chunk_from_scanfile()
+    candidates = 0
+    while True:
+        candidates += len(find_candidates(unpacker, filesize))
+        if unpacker.get_current_offset_in_file() >= filesize:
+            break
+        unpacker.seek_to_find_next_signature()
+        unpacker.read_chunk_from_scanfile()
+    unpacker.close_scanfile()
+    return candidates
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: %s <file> [<file> ...]" % argv[0], file=sys.stderr)
+        sys.exit(1)
+
+    signatures = bangsignatures.signature_to_unpackparser
+    paths = {
+        'per signature': (None, False),
+        'regex matcher': (SignatureMatcher(signatures, use_automaton=False), False),
+        'automaton': (SignatureMatcher(signatures), False),
+        'automaton mmap': (SignatureMatcher(signatures), True),
+    }
+
+    def find_per_signature(unpacker, filesize):
+        candidates = set()
+        for s, unpackparsers in signatures.items():
+            candidates.update(unpacker.find_offsets_for_signature(s,
+                unpackparsers, filesize))
+        return candidates
+
+    print("file,size,path,candidates,seconds")
+    for f in argv[1:]:
+        filename = pathlib.Path(f)
+        for name, (matcher, usemmap) in paths.items():
+            if name.startswith('automaton') and not matcher.uses_automaton():
+                continue
+            if matcher is None:
+                find_candidates = find_per_signature
+            else:
+                find_candidates = lambda u, s, m=matcher: u.find_offsets_for_signatures(m, s)
+            start = time.perf_counter()
+            candidates = scan_file(filename, find_candidates, usemmap)
+            duration = time.perf_counter() - start
+            print("%s,%d,%s,%d,%f" % (f, filename.stat().st_size, name,
+                candidates, duration))
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Searches a file for signatures and tries to unpack the data at every
+# candidate offset, like ScanJob.check_for_signatures does, and counts
+# the file system operations that are done while doing so with an audit
+# hook (see sys.addaudithook()). The default file is random data with
+# many JPEG and LZMA signatures, almost all of which are false positives.
+# Calls that are not audited, such as stat(), are not counted.
+#
+# Usage: bench-unpackdirs.py [<file> [<amount of signatures>]]
+
+import collections
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+srcdirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        '..', '..', 'src')
+sys.path.insert(0, srcdirectory)
+
+import bangsignatures
+from FileResult import FileResult
+from ScanEnvironment import ScanEnvironment
+from ScanJob import ScanJob
+from UnpackManager import UnpackManager
+
+# the audit events of operations on the file system
+fsevents = set(['open', 'os.mkdir', 'os.rmdir', 'os.remove', 'os.rename',
+        'os.chmod', 'os.chdir', 'os.scandir', 'os.listdir', 'os.walk',
+        'shutil.rmtree', 'shutil.move', 'shutil.copyfile'])
+
+counts = collections.Counter()
+counting = False
+
+def count_event(event, args):
+    if counting and event in fsevents:
+        counts[event] += 1
+
+def create_false_positives(filename, amount):
+    '''Write random data with amount JPEG and LZMA signatures'''
+    rng = random.Random(1)
+    with open(filename, 'wb') as f:
+        for i in range(amount):
+            f.write(rng.randbytes(200))
+            f.write(rng.choice([b'\xff\xd8\xff\xe0', b'\x5d\x00\x00\x80']))
+
+def main(argv):
+    global counting
+    amount = 2000
+    if len(argv) > 2:
+        amount = int(argv[2])
+
+    with tempfile.TemporaryDirectory() as tmpdirectory:
+        tmpdirectory = pathlib.Path(tmpdirectory)
+        unpackdirectory = tmpdirectory / 'unpack'
+        unpackdirectory.mkdir()
+        if len(argv) > 1:
+            filename = pathlib.Path(argv[1]).absolute()
+        else:
+            filename = tmpdirectory / 'false-positives.bin'
+            create_false_positives(filename, amount)
+
+        scanenvironment = ScanEnvironment(maxbytes=max(200000,
+                    bangsignatures.maxsignaturesoffset+1),
+                readsize=10240, createbytecounter=False, createjson=False,
+                runfilescans=False, tlshmaximum=sys.maxsize,
+                synthesizedminimum=10, logging=False, paddingname='PADDING',
+                unpackdirectory=unpackdirectory,
+                temporarydirectory=tmpdirectory,
+                resultsdirectory=tmpdirectory, scanfilequeue=None,
+                resultqueue=None, processlock=None, checksumdict={})
+        scanenvironment.set_unpackparsers(bangsignatures.get_unpackers())
+        scanenvironment.get_signature_matcher()
+
+        fileresult = FileResult(None, filename, set())
+        fileresult.set_filesize(filename.stat().st_size)
+        scanjob = ScanJob(fileresult)
+        scanjob.set_scanenvironment(scanenvironment)
+        scanjob.initialize()
+        scanjob.prepare_for_unpacking()
+        unpacker = UnpackManager(unpackdirectory)
+
+        sys.addaudithook(count_event)
+        counting = True
+        start = time.perf_counter()
+        scanjob.check_for_signatures(unpacker)
+        duration = time.perf_counter() - start
+        counting = False
+
+    print("event,count")
+    for event, count in sorted(counts.items()):
+        print("%s,%d" % (event, count))
+    print("total,%d" % sum(counts.values()))
+    print("seconds,%f" % duration)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+#
+# Times bangunpack.unpack_xml on every file in a directory (recursively)
+# with one of the extensions it is used for (.xml, .svg, etc.), next to
+# running 'xmllint --noout --nonet' for every file (which unpack_xml
+# used to do), if xmllint is installed. The amount of well-formed files
+# is reported for both, and files for which they do not agree are
+# printed to standard error.
+#
+# Usage: bench-xml.py [<runs> [<directory>]]
+
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+srcdirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        '..', '..', 'src')
+sys.path.insert(0, srcdirectory)
+
+import bangunpack
+from FileResult import FileResult
+from ScanEnvironment import ScanEnvironment
+
+def check_unpack_xml(scanenvironment, filenames):
+    '''Return the set of files that unpack_xml accepts'''
+    wellformed = set()
+    for filename in filenames:
+        fileresult = FileResult(None, filename, set())
+        fileresult.set_filesize(filename.stat().st_size)
+        res = bangunpack.unpack_xml(fileresult, scanenvironment, 0,
+                pathlib.Path('unpacked'))
+        if res['status']:
+            wellformed.add(filename)
+    return wellformed
+
+def check_xmllint(scanenvironment, filenames):
+    '''Return the set of files that xmllint accepts'''
+    wellformed = set()
+    for filename in filenames:
+        p = subprocess.run(['xmllint', '--noout', '--nonet', filename],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if p.returncode == 0:
+            wellformed.add(filename)
+    return wellformed
+
+def main(argv):
+    runs = 5
+    xmldirectory = pathlib.Path(srcdirectory) / 'test' / 'testdata'
+    if len(argv) > 1:
+        runs = int(argv[1])
+    if len(argv) > 2:
+        xmldirectory = pathlib.Path(argv[2])
+
+    filenames = [filename.absolute() for filename in sorted(xmldirectory.rglob('*'))
+            if filename.is_file() and
+            filename.suffix.lower() in bangunpack.unpack_xml.extensions]
+
+    checkers = {'unpack_xml': check_unpack_xml}
+    if shutil.which('xmllint') is not None:
+        checkers['xmllint'] = check_xmllint
+
+    results = {}
+    print("checker,files,bytes,wellformed,seconds")
+    totalsize = sum(filename.stat().st_size for filename in filenames)
+    for name, checker in checkers.items():
+        with tempfile.TemporaryDirectory() as unpackdirectory:
+            scanenvironment = ScanEnvironment(maxbytes=200000,
+                    readsize=10240, createbytecounter=False,
+                    createjson=False, runfilescans=False,
+                    tlshmaximum=sys.maxsize, synthesizedminimum=10,
+                    logging=False, paddingname='PADDING',
+                    unpackdirectory=pathlib.Path(unpackdirectory),
+                    temporarydirectory=pathlib.Path(unpackdirectory),
+                    resultsdirectory=pathlib.Path(unpackdirectory),
+                    scanfilequeue=None, resultqueue=None, processlock=None,
+                    checksumdict={})
+            start = time.perf_counter()
+            for i in range(runs):
+                results[name] = checker(scanenvironment, filenames)
+            duration = (time.perf_counter() - start) / runs
+        print("%s,%d,%d,%d,%f" % (name, len(filenames), totalsize,
+            len(results[name]), duration))
+
+    if 'xmllint' in results:
+        for filename in sorted(results['unpack_xml'] ^ results['xmllint']):
+            print("%s: unpack_xml %s, xmllint %s" % (filename,
+                filename in results['unpack_xml'], filename in results['xmllint']),
+                file=sys.stderr)
+
+if __name__ == "__main__":
+    main(sys.argv)
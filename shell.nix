@@ -13,32 +13,30 @@ let
     icalendar
     kaitaistruct
     lz4
+    numpy
     parameterized
     pdfminer
     pefile
     pillow
     psycopg2
+    pyahocorasick
     pytest
+    python-lzo
     python-snappy
     pyyaml
     tinycss2
     tlsh
+    zstandard
   ]);
     
 in
 pkgs.mkShell {
   buildInputs = with pkgs; [
-    binutils
     cabextract
     e2tools
     innoextract
-    libxml2
-    lz4
-    lzop
     mailcap
-    ncompress
     openjdk8
-    openssl
     my-python
     qemu
     rzip
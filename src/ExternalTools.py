@@ -0,0 +1,217 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# Running the external programs that some unpack functions use to unpack
+# data (unsquashfs, 7z, qemu-img, etc.). All scanning processes share a
+# limit on the amount of copies of a program that run at the same time,
+# so the scanning processes do not start more copies of a heavy (and often
+# multithreaded) program than there are CPUs. The semaphores for these
+# limits are created before the scanning processes are started.
+#
+# Programs that cannot read data at an offset in a file are given a
+# temporary copy of the data (a "slice"). A slice is shared by all
+# programs that are run on the same data in a scan job, such as
+# sasquatch after unsquashfs failed, and is removed at the end of the
+# scan job.
+#
+# A program that runs longer than its timeout is killed, as is a program
+# that is still running when the attempt of the unpack function that ran
+# it is aborted. The amount of runs, the time spent waiting for a
+# program to be allowed to run and the time spent running it are stored
+# per program in the statistics of the scan job.
+
+import contextlib
+import multiprocessing
+import os
+import signal
+import subprocess
+import tempfile
+import time
+
+from UnpackBudget import budgetcheckinterval
+
+# the programs that are run by unpack functions, and that have a
+# limit on the amount of copies running at the same time
+externaltools = ['7z', 'cabextract', 'e2cp', 'e2ls', 'fsck.cramfs',
+                 'qemu-img', 'rzip', 'sasquatch', 'unpack200',
+                 'unsquashfs', 'zstd']
+
+@contextlib.contextmanager
+def budget_signal_blocked():
+    '''Delay the signal that checks the budget of an unpack attempt until
+    the end of the with block'''
+    blocked = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    try:
+        yield
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+
+class ExternalTools:
+    """Runs external programs for the unpack functions. concurrency is
+    the maximum amount of copies of a program that run at the same time
+    and timeout is the maximum time in seconds that a program runs, for
+    every program in externaltools. toolconcurrency and tooltimeouts are
+    dictionaries with the limits of programs that have limits of their
+    own, by name. A limit of 0 means that there is no limit.
+    """
+    def __init__(self, temporarydirectory=None, concurrency=0, timeout=0,
+                 toolconcurrency=None, tooltimeouts=None):
+        self.temporarydirectory = temporarydirectory
+        if toolconcurrency is None:
+            toolconcurrency = {}
+        if tooltimeouts is None:
+            tooltimeouts = {}
+        self.timeout = timeout
+        self.tooltimeouts = tooltimeouts
+        # tool -> semaphore, shared by all processes
+        self.semaphores = {}
+        for tool in set(externaltools) | set(toolconcurrency):
+            limit = toolconcurrency.get(tool, concurrency)
+            if limit > 0:
+                self.semaphores[tool] = multiprocessing.BoundedSemaphore(limit)
+        # (filename, offset, size) -> [slice filename, users]
+        self.slices = {}
+        # the ScanStatistics of the current scan job
+        self.statistics = None
+
+    def set_statistics(self, statistics):
+        '''Record the runs of programs in the ScanStatistics statistics,
+        or nowhere if statistics is None'''
+        self.statistics = statistics
+
+    def get_timeout(self, tool):
+        '''Return the timeout of the program tool, 0 for no timeout'''
+        return self.tooltimeouts.get(tool, self.timeout)
+
+    @contextlib.contextmanager
+    def slot(self, tool):
+        '''Wait until the program tool may run, and run it in the with
+        block, for programs that are not run with run(), such as programs
+        that data is streamed to or from. The time spent waiting and
+        running is recorded, but there is no timeout.'''
+        semaphore = self.semaphores.get(tool)
+        start = time.perf_counter()
+        started = None
+        acquired = False
+        try:
+            if semaphore is not None:
+                # the budget of the attempt is checked between short waits,
+                # but not while the semaphore is acquired or released, so
+                # it cannot be acquired without being released
+                while not acquired:
+                    with budget_signal_blocked():
+                        acquired = semaphore.acquire(
+                                timeout=budgetcheckinterval)
+            started = time.perf_counter()
+            yield
+        finally:
+            ended = time.perf_counter()
+            if acquired:
+                with budget_signal_blocked():
+                    semaphore.release()
+            if started is not None and self.statistics is not None:
+                self.statistics.add_tool_run(tool, started - start,
+                        ended - started)
+
+    def run(self, args, cwd=None):
+        '''Run the program args[0] with the arguments args[1:] and wait
+        for it to exit. Standard input is empty, standard output and
+        standard error are collected. Returns a CompletedProcess. A
+        program that is killed after its timeout has a negative
+        returncode, like any other program that is killed.'''
+        tool = os.path.basename(args[0])
+        timeout = self.get_timeout(tool)
+        timedout = False
+        with self.slot(tool):
+            p = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    cwd=cwd)
+            try:
+                (outputmsg, errormsg) = p.communicate(timeout=timeout or None)
+            except subprocess.TimeoutExpired:
+                timedout = True
+                p.kill()
+                (outputmsg, errormsg) = p.communicate()
+            except BaseException:
+                # the attempt was aborted, for example because it went
+                # over its budget, so do not leave the program running
+                p.kill()
+                p.wait()
+                raise
+        if timedout and self.statistics is not None:
+            self.statistics.add_tool_timeout(tool)
+        return subprocess.CompletedProcess(args, p.returncode,
+                outputmsg, errormsg)
+
+    @contextlib.contextmanager
+    def file_slice(self, filename, offset, size, trailingdata=False):
+        '''Yield the name of a file with the size bytes of the file
+        filename at offset: filename itself if that is all of the file,
+        or if offset is 0 and trailingdata is True (for programs that
+        ignore data that follows the data that they unpack), otherwise a
+        temporary copy of the data. The copy is reused for the same data
+        until remove_file_slices() is called, or until a copy of other
+        data is made.'''
+        filename = os.fspath(filename)
+        if offset == 0 and (trailingdata or os.stat(filename).st_size == size):
+            yield filename
+            return
+        key = (filename, offset, size)
+        if key not in self.slices:
+            # keep at most one copy that is not used, so not too much
+            # disk space is used for copies of large files
+            self.remove_file_slices()
+            self.slices[key] = [self._copy_slice(filename, offset, size), 0]
+        fileslice = self.slices[key]
+        fileslice[1] += 1
+        try:
+            yield fileslice[0]
+        finally:
+            fileslice[1] -= 1
+
+    def _copy_slice(self, filename, offset, size):
+        '''Copy size bytes of filename at offset to a temporary file and
+        return its name'''
+        fd, slicename = tempfile.mkstemp(dir=self.temporarydirectory)
+        try:
+            with open(filename, 'rb') as infile:
+                while size > 0:
+                    sent = os.sendfile(fd, infile.fileno(), offset, size)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    size -= sent
+        except BaseException:
+            os.unlink(slicename)
+            raise
+        finally:
+            os.close(fd)
+        return slicename
+
+    def remove_file_slices(self):
+        '''Remove the copies made by file_slice() that are not in use'''
+        for key, (slicename, users) in list(self.slices.items()):
+            if users == 0:
+                try:
+                    os.unlink(slicename)
+                except FileNotFoundError:
+                    pass
+                del self.slices[key]
@@ -22,10 +22,24 @@
 
 import os
 import hashlib
+import math
 import string
 import collections
 import tlsh
 
+import bangpadding
+from UnpackParser import OffsetInputFile
+
+# numpy is optional: without it bytes are counted with a Counter,
+# which is a lot slower for large files.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the bytes for which chr() is in string.printable
+printablebytes = string.printable.encode()
+
 class FileContentsComputer:
     '''Class to process the contents of a file'''
     def __init__(self, read_size, overlap=0):
@@ -36,16 +50,67 @@ class FileContentsComputer:
     def subscribe(self, input_computer):
         self.computers.append(input_computer)
 
-    def read(self, filename):
+    def read(self, filename, offset=0, size=None, paddingranges=[]):
+        '''Process the contents of the file, or only the size bytes
+        at offset if size is given. paddingranges is a sorted list of
+        (start, end, paddingbyte) tuples of ranges that do not overlap and
+        are known to only contain paddingbyte. These ranges are not read,
+        but processed as padding.'''
+        if paddingranges != [] and self.overlap == 0:
+            return self._read_with_padding(filename, offset, size,
+                    paddingranges)
         if all(c.supports_memoryview for c in self.computers):
-            return self._read_with_memory_view(filename)
-        return self._read_with_file_read(filename)
+            return self._read_with_memory_view(filename, offset, size)
+        return self._read_with_file_read(filename, offset, size)
 
-    def _read_with_file_read(self, filename):
-        filesize = filename.stat().st_size
-        bytes_processed = 0
-        scanfile = open(filename, 'rb')
+    def _open(self, filename, offset, size):
+        if size is None:
+            size = filename.stat().st_size - offset
+        scanfile = OffsetInputFile(open(filename, 'rb'), offset, size)
         scanfile.seek(0)
+        return scanfile, size
+
+    def _read_with_padding(self, filename, offset, size, paddingranges):
+        scanfile, filesize = self._open(filename, offset, size)
+        usememoryview = all(c.supports_memoryview for c in self.computers)
+        for computer in self.computers:
+            computer.initialize()
+        scanbytes = bytearray(self.read_size)
+        position = 0
+        for start, end, paddingbyte in paddingranges + [(filesize, filesize, None)]:
+            start = min(start, filesize)
+            end = min(end, filesize)
+            # read the data up to the padding
+            scanfile.seek(position)
+            while position < start:
+                bytes_read = scanfile.readinto(
+                        memoryview(scanbytes)[:min(self.read_size, start - position)])
+                if bytes_read == 0:
+                    break
+                if usememoryview:
+                    data = memoryview(scanbytes[:bytes_read])
+                else:
+                    data = bytes(scanbytes[:bytes_read])
+                for computer in self.computers:
+                    computer.compute(data)
+                position += bytes_read
+            # then process the padding without reading it
+            if position < end:
+                padding = bangpadding.padding_piece(paddingbyte)
+                if usememoryview:
+                    padding = memoryview(padding)
+                while position < end:
+                    data = padding[:end - position]
+                    for computer in self.computers:
+                        computer.compute(data)
+                    position += len(data)
+        for computer in self.computers:
+            computer.finalize()
+        scanfile.close()
+
+    def _read_with_file_read(self, filename, offset, size):
+        scanfile, filesize = self._open(filename, offset, size)
+        bytes_processed = 0
         for computer in self.computers:
             computer.initialize()
         data = scanfile.read(self.read_size)
@@ -61,11 +126,9 @@ class FileContentsComputer:
             computer.finalize()
         scanfile.close()
 
-    def _read_with_memory_view(self, filename):
-        filesize = filename.stat().st_size
+    def _read_with_memory_view(self, filename, offset, size):
+        scanfile, filesize = self._open(filename, offset, size)
         bytes_processed = 0
-        scanfile = open(filename, 'rb')
-        scanfile.seek(0)
         for computer in self.computers:
             computer.initialize()
         scanbytes = bytearray(self.read_size)
@@ -94,8 +157,10 @@ class IsTextComputer:
         pass
 
     def compute(self, data):
-        self.is_text = self.is_text and \
-            all(chr(x) in string.printable for x in data)
+        # delete all printable bytes: the data is text if
+        # there is nothing left.
+        if self.is_text:
+            self.is_text = not bytes(data).translate(None, printablebytes)
 
     def finalize(self):
         pass
@@ -151,16 +216,82 @@ class ByteCounter:
     def initialize(self):
         self.bytecounter = collections.Counter(
             dict([(i, 0) for i in range(0, 256)]))
+        if numpy is not None:
+            self.counts = numpy.zeros(256, dtype=numpy.int64)
 
     def compute(self, data):
-        self.bytecounter.update(data)
+        if numpy is not None:
+            self.counts += numpy.bincount(
+                numpy.frombuffer(data, dtype=numpy.uint8), minlength=256)
+        else:
+            self.bytecounter.update(data)
 
     def finalize(self):
-        pass
+        if numpy is not None:
+            self.bytecounter.update(dict(enumerate(self.counts.tolist())))
+            del self.counts
 
     def get(self):
         return self.bytecounter
 
+# the default size of the blocks for which the entropy is computed
+entropyblocksize = 65536
+
+class EntropyComputer:
+    '''Computes the entropy, in bits per byte (0 to 8), of every block of
+    blocksize bytes of a file. The last block can be smaller.'''
+    supports_memoryview = True
+
+    def __init__(self, blocksize=entropyblocksize):
+        self.blocksize = blocksize
+
+    def initialize(self):
+        self.profile = []
+        self._start_block()
+
+    def _start_block(self):
+        if numpy is not None:
+            self.counts = numpy.zeros(256, dtype=numpy.int64)
+        else:
+            self.counts = collections.Counter()
+        self.blockbytes = 0
+
+    def _finish_block(self):
+        if numpy is not None:
+            counts = self.counts[self.counts > 0] / self.blockbytes
+            entropy = float(-(counts * numpy.log2(counts)).sum())
+        else:
+            entropy = -sum(count / self.blockbytes * math.log2(count / self.blockbytes)
+                    for count in self.counts.values())
+        # -0.0 for blocks that only contain a single byte value
+        self.profile.append(abs(entropy))
+        self._start_block()
+
+    def compute(self, data):
+        # the data is not aligned to the blocks, so it is split at
+        # the block boundaries.
+        offset = 0
+        while offset < len(data):
+            length = min(len(data) - offset, self.blocksize - self.blockbytes)
+            block = data[offset:offset+length]
+            if numpy is not None:
+                self.counts += numpy.bincount(
+                    numpy.frombuffer(block, dtype=numpy.uint8), minlength=256)
+            else:
+                self.counts.update(block)
+            self.blockbytes += length
+            offset += length
+            if self.blockbytes == self.blocksize:
+                self._finish_block()
+
+    def finalize(self):
+        if self.blockbytes > 0:
+            self._finish_block()
+        del self.counts
+
+    def get(self):
+        return self.profile
+
 hash_algorithms = ['sha256', 'md5', 'sha1']
 
 def _compute_empty_hash_results():
@@ -48,10 +48,38 @@ class FileResult:
         self.filesize = None
         self.mimetype = None
         self.mimetype_encoding = None
+        self.duplicate = False
+        self.duplicateof = None
+        self.slice = None
 
     def set_filesize(self, size):
         self.filesize = size
 
+    def set_slice(self, backing, offset, size):
+        """Makes this a virtual file: the data of the file is the range of
+        size bytes at offset in the file backing (a path relative to the unpack
+        directory root, or an absolute path for the top file) and is only
+        written to filename when it is materialized.
+        """
+        self.slice = (backing, offset, size)
+
+    def get_slice(self):
+        return self.slice
+
+    def clear_slice(self):
+        self.slice = None
+
+    def is_virtual(self):
+        return self.slice is not None
+
+    def get_backing(self):
+        """Returns the file that holds the data of this file and the offset
+        of the data in that file.
+        """
+        if self.slice is not None:
+            return self.slice[0], self.slice[1]
+        return self.filename, 0
+
     def has_parent(self):
         return self.parent_path is not None
 
@@ -91,6 +119,11 @@ class FileResult:
             d['mimetype'] = self.mimetype
             if self.mimetype_encoding is not None:
                 d['mimetype encoding'] = self.mimetype_encoding
+        if self.duplicateof is not None:
+            d['duplicate of'] = str(self.duplicateof)
+        if self.slice is not None:
+            d['backing file'] = str(self.slice[0])
+            d['backing offset'] = self.slice[1]
         return d
 
     def get_hash(self, algorithm='sha256'):
@@ -107,3 +140,7 @@ class FileResult:
     def is_duplicate(self):
         return self.duplicate
 
+    def set_duplicate_of(self, filename):
+        """Sets the name of the first file with the same contents."""
+        self.duplicateof = filename
+
@@ -48,11 +48,10 @@ class LicenseIdentifierScanner(BaseScanner):
         forgeresults = {}
 
         seekbuf = bytearray(1000000)
-        filename_full = self.scanenvironment.get_unpack_path_for_fileresult(fileresult)
         filesize = fileresult.filesize
 
         # open the file in binary mode
-        checkfile = open(filename_full, 'rb')
+        checkfile = self.scanenvironment.open_fileresult(fileresult)
         checkfile.seek(0)
         while True:
             bytesread = checkfile.readinto(seekbuf)
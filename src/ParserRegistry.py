@@ -0,0 +1,229 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# The registry of the unpack parsers in the parsers directory.
+#
+# Finding the unpack parsers means importing all the modules in the parsers
+# directory, which makes starting BANG slow. The registry keeps a manifest
+# with the signatures, extensions and other class attributes of all unpack
+# parsers, so the tables for extensions and signatures can be built
+# without importing anything. A parser module is only imported when the
+# parser is actually used.
+#
+# The manifest is rebuilt when a Python file in the parsers directory was
+# added, removed or changed, or when a module that a parser could not be
+# imported without has become available.
+#
+# The manifest can be rebuilt by hand with:
+#
+#   python3 ParserRegistry.py
+
+import hashlib
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import pathlib
+import pkgutil
+import sys
+
+import parsers
+from UnpackParser import UnpackParser, WrappedUnpackParser
+
+parsersdirectory = pathlib.Path(os.path.dirname(parsers.__file__))
+manifestfile = parsersdirectory / 'manifest.json'
+
+# version of the format of the manifest
+manifestversion = 1
+
+class LazyUnpackParser:
+    '''Stands in for an UnpackParser class that is described in the
+    manifest. The attributes needed to select the parser are known without
+    importing its module, the class itself is imported the first time it
+    is instantiated or any other attribute is needed.'''
+    def __init__(self, module, classname, pretty_name, signatures,
+            extensions, scan_if_featureless):
+        self.module = module
+        self.__name__ = classname
+        self.pretty_name = pretty_name
+        self.signatures = signatures
+        self.extensions = extensions
+        self.scan_if_featureless = scan_if_featureless
+        self.unpackparser = None
+
+    def get_class(self):
+        '''Return the UnpackParser class, and import it if needed'''
+        if self.unpackparser is None:
+            module = importlib.import_module(self.module)
+            self.unpackparser = getattr(module, self.__name__)
+        return self.unpackparser
+
+    def __call__(self, *args, **kwargs):
+        return self.get_class()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # only called for attributes that are not in the manifest.
+        # Special attributes are not forwarded, so copying and pickling
+        # work as for any other object.
+        if name.startswith('__') or 'unpackparser' not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.get_class(), name)
+
+    def __getstate__(self):
+        # the class is imported again after unpickling
+        state = self.__dict__.copy()
+        state['unpackparser'] = None
+        return state
+
+    def __repr__(self):
+        return '<LazyUnpackParser %s.%s>' % (self.module, self.__name__)
+
+def _get_unpackers_recursive(unpackers_root, parent_module_path, missing):
+    unpackers = []
+    abs_module_path = unpackers_root / parent_module_path
+    for m in pkgutil.iter_modules([abs_module_path]):
+        full_module_path = parent_module_path / m.name
+        if (unpackers_root / full_module_path).is_dir():
+            full_module_name = ".".join(full_module_path.parts)
+            module_name = 'parsers.{}.UnpackParser'.format(full_module_name)
+            try:
+                module = importlib.import_module(module_name)
+                for name, member in inspect.getmembers(module):
+                    if inspect.isclass(member) and issubclass(member, UnpackParser) \
+                        and member != UnpackParser \
+                        and member != WrappedUnpackParser:
+                        unpackers.append(member)
+            except ModuleNotFoundError as e:
+                # modules in the parsers directory (for example Kaitai
+                # Struct parsers that were not compiled) are covered by
+                # the fingerprint, other modules have to be remembered.
+                if e.name is not None and e.name.split('.')[0] != 'parsers':
+                    missing[module_name] = e.name
+            unpackers.extend(_get_unpackers_recursive(
+                unpackers_root, full_module_path, missing))
+    return unpackers
+
+def import_unpackers():
+    '''Import all modules in the parsers directory and return a list of
+    UnpackParser classes, and a dictionary with the names of the modules
+    that could not be imported, with the name of the module that was not
+    found.'''
+    missing = {}
+    unpackers = _get_unpackers_recursive(parsersdirectory,
+            pathlib.Path('.'), missing)
+    return unpackers, missing
+
+def compute_fingerprint():
+    '''Return a fingerprint of the names, sizes and modification times of
+    all Python files in the parsers directory'''
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(parsersdirectory):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+            st = os.stat(os.path.join(dirpath, filename))
+            h.update(('%s %d %d\n' % (os.path.join(dirpath, filename),
+                st.st_size, st.st_mtime_ns)).encode())
+    return h.hexdigest()
+
+def _describe_unpacker(unpackparser):
+    return {
+        'module': unpackparser.__module__,
+        'class': unpackparser.__name__,
+        'pretty name': unpackparser.pretty_name,
+        'signatures': [ [offset, signature.hex()]
+            for offset, signature in unpackparser.signatures ],
+        'extensions': list(unpackparser.extensions),
+        'scan if featureless': bool(unpackparser.scan_if_featureless),
+    }
+
+def build_manifest():
+    '''Import all unpack parsers and return the manifest for them'''
+    unpackers, missing = import_unpackers()
+    return {
+        'version': manifestversion,
+        'fingerprint': compute_fingerprint(),
+        'missing': missing,
+        'unpackers': [ _describe_unpacker(u) for u in unpackers ],
+    }
+
+def write_manifest(manifest):
+    '''Write the manifest, if the parsers directory is writable'''
+    tmpfile = manifestfile.with_suffix('.%d' % os.getpid())
+    try:
+        with open(tmpfile, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmpfile, manifestfile)
+    except OSError:
+        pass
+
+def read_manifest():
+    '''Return the manifest if it is still valid, otherwise None'''
+    try:
+        with open(manifestfile, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != manifestversion:
+        return None
+    if manifest.get('fingerprint') != compute_fingerprint():
+        return None
+    # a module that a parser needs could have been installed since
+    for modulename in manifest['missing'].values():
+        try:
+            if importlib.util.find_spec(modulename) is not None:
+                return None
+        except (ImportError, ValueError):
+            pass
+    return manifest
+
+def _lazy_unpacker(description):
+    return LazyUnpackParser(description['module'], description['class'],
+            description['pretty name'],
+            [ (offset, bytes.fromhex(signature))
+                for offset, signature in description['signatures'] ],
+            description['extensions'], description['scan if featureless'])
+
+_unpackers = None
+
+def get_unpackers():
+    '''Return a list of all unpack parsers. The parsers are described by
+    the manifest and are only imported when they are used. If there is no
+    valid manifest, all parsers are imported and the manifest is
+    rebuilt.'''
+    global _unpackers
+    if _unpackers is None:
+        manifest = read_manifest()
+        if manifest is None:
+            manifest = build_manifest()
+            write_manifest(manifest)
+        _unpackers = [ _lazy_unpacker(d) for d in manifest['unpackers'] ]
+    return _unpackers
+
+if __name__ == "__main__":
+    manifest = build_manifest()
+    write_manifest(manifest)
+    print("%d unpack parsers written to %s" % (len(manifest['unpackers']),
+        manifestfile))
+    for module_name, missing in sorted(manifest['missing'].items()):
+        print("%s: missing %s" % (module_name, missing), file=sys.stderr)
@@ -0,0 +1,102 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# A set of byte ranges, used to keep track of the parts of a file that
+# were unpacked. Ranges are kept sorted and merged, so looking up whether
+# an offset was unpacked, or where the next data that was not unpacked
+# starts, is a binary search.
+
+import bisect
+
+class RangeSet:
+    """A set of half open byte ranges [low, high). Ranges that overlap or
+    that are adjacent are merged when they are added, so the ranges in the
+    set are sorted and separated by at least one byte.
+    """
+    def __init__(self, ranges=()):
+        # the starts and ends of the ranges, both sorted
+        self.starts = []
+        self.ends = []
+        for low, high in ranges:
+            self.add(low, high)
+
+    def add(self, low, high):
+        '''Add the range [low, high). Empty ranges are ignored.'''
+        if low >= high:
+            return
+        # the ranges that overlap with or are adjacent to [low, high)
+        # are ranges first to last - 1
+        first = bisect.bisect_left(self.ends, low)
+        last = bisect.bisect_right(self.starts, high)
+        if first < last:
+            low = min(low, self.starts[first])
+            high = max(high, self.ends[last - 1])
+        self.starts[first:last] = [low]
+        self.ends[first:last] = [high]
+
+    def find(self, offset):
+        '''Return the range (low, high) that contains offset, or None'''
+        index = bisect.bisect_right(self.starts, offset) - 1
+        if index >= 0 and offset < self.ends[index]:
+            return (self.starts[index], self.ends[index])
+        return None
+
+    def __contains__(self, offset):
+        return self.find(offset) is not None
+
+    def overlaps(self, low, high):
+        '''Return whether or not any part of [low, high) is in the set'''
+        index = bisect.bisect_right(self.ends, low)
+        return low < high and index < len(self.starts) and \
+                self.starts[index] < high
+
+    def next_gap(self, offset):
+        '''Return the first offset at or after offset that is not in
+        the set'''
+        found = self.find(offset)
+        if found is None:
+            return offset
+        return found[1]
+
+    def gaps(self, low, high):
+        '''Return a sorted list of the ranges in [low, high) that are not
+        in the set'''
+        gaps = []
+        index = bisect.bisect_right(self.ends, low)
+        while low < high and index < len(self.starts) and \
+                self.starts[index] < high:
+            if self.starts[index] > low:
+                gaps.append((low, self.starts[index]))
+            low = max(low, self.ends[index])
+            index += 1
+        if low < high:
+            gaps.append((low, high))
+        return gaps
+
+    def ranges(self):
+        '''Return the ranges as a sorted list of (low, high) tuples'''
+        return list(zip(self.starts, self.ends))
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def __len__(self):
+        return len(self.starts)
@@ -20,12 +20,23 @@
 # version 3
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import copy
 import os
 from NSRLHashScanner import *
 from LicenseIdentifierScanner import *
 from ByteCountReporter import *
 from PickleReporter import *
 from JsonReporter import *
+from SignatureMatcher import SignatureMatcher
+from UnpackParser import OffsetInputFile
+from SharedInputFile import SharedInputFile
+from UnpackBudget import UnpackBudget
+from ExternalTools import ExternalTools
+
+# how thoroughly images are checked by the unpack functions: "structural"
+# only walks the headers, markers and chunks (and checks their CRCs),
+# "full" also decodes all pixels with PIL.
+imagevalidationlevels = ['structural', 'full']
 
 class ScanEnvironment:
     tlshlabelsignore = set([
@@ -37,7 +48,13 @@ class ScanEnvironment:
                  runfilescans, tlshmaximum, synthesizedminimum, logging,
                  paddingname, unpackdirectory, temporarydirectory,
                  resultsdirectory, scanfilequeue, resultqueue,
-                 processlock, checksumdict,
+                 processlock, checksumdict, usemmap=True,
+                 hashfirst=False, virtualcarving=False,
+                 entropyprofile=False, skiphighentropy=False,
+                 skippadding=False, carvepadding=False,
+                 imagevalidation='full', unpackbudget=None,
+                 parserbudgets=None, decompressionmaximum=0,
+                 decompressionratio=0, externaltools=None,
                 ):
         """unpackdirectory: a Path object, absolute
            temporarydirectory: a Path object, absolute
@@ -46,6 +63,36 @@ class ScanEnvironment:
            processlock: a Lock object that guards access to shared objects
            checksumdict: a shared dictionary to store hashes of files to
                          prevent scans of duplicate files.
+           usemmap: map files into memory when scanning for signatures
+           hashfirst: compute hashes before unpacking and skip unpacking
+                      of duplicate files
+           virtualcarving: do not write carved data to disk, but let the
+                      carved files refer to a range of the file they were
+                      carved from
+           entropyprofile: record the entropy of every block of a file in
+                      the metadata of the file
+           skiphighentropy: skip short signatures in blocks of a file with a
+                      high entropy
+           skippadding: do not search holes and long runs of padding bytes
+                      in a file for signatures
+           carvepadding: carve padding between unpacked data into separate
+                      files, instead of only reporting it
+           imagevalidation: "structural" to only check the structure of
+                      images, "full" to also decode them
+           unpackbudget: the UnpackBudget of an attempt of an unpack
+                      parser, None for no limits
+           parserbudgets: a dictionary with the UnpackBudget of unpack
+                      parsers that have a budget of their own, by
+                      pretty name
+           decompressionmaximum: the maximum size of decompressed
+                      streams (gzip, bzip2, XZ, etc.) in bytes, 0 for
+                      no limit
+           decompressionratio: the maximum amount of bytes that a byte
+                      of a compressed stream decompresses to, 0 for no
+                      limit
+           externaltools: the ExternalTools that runs external programs
+                      for the unpack functions, None to run them without
+                      limits
         """
         # TODO: init from options object
         self.maxbytes = maxbytes
@@ -64,11 +111,34 @@ class ScanEnvironment:
         self.processlock = processlock
         self.checksumdict = checksumdict
         self.runfilescans = runfilescans
+        self.usemmap = usemmap
+        self.hashfirst = hashfirst
+        self.virtualcarving = virtualcarving
+        self.entropyprofile = entropyprofile
+        self.skiphighentropy = skiphighentropy
+        self.skippadding = skippadding
+        self.carvepadding = carvepadding
+        self.imagevalidation = imagevalidation
+        if unpackbudget is None:
+            unpackbudget = UnpackBudget()
+        self.unpackbudget = unpackbudget
+        if parserbudgets is None:
+            parserbudgets = {}
+        self.parserbudgets = parserbudgets
+        self.decompressionmaximum = decompressionmaximum
+        self.decompressionratio = decompressionratio
+        if externaltools is None:
+            externaltools = ExternalTools(temporarydirectory)
+        self.externaltools = externaltools
         self.filescanners = [ NSRLHashScanner, LicenseIdentifierScanner ]
         self.unpackparsers = []
         self.unpackparsers_for_extensions = {}
         self.unpackparsers_for_signatures = {}
         self.unpackparsers_for_featureless_files = []
+        self.signature_matcher = None
+        self.scanenvironments = {}
+        self.sharedinputfiles = {}
+        self.materializedfiles = set()
         self.reporters = []
         if self.createbytecounter: self.reporters.append(ByteCountReporter)
         self.reporters.append(PickleReporter)
@@ -102,6 +172,62 @@ class ScanEnvironment:
     def get_maxbytes(self):
         return self.maxbytes
 
+    def get_usemmap(self):
+        return self.usemmap
+
+    def get_hashfirst(self):
+        return self.hashfirst
+
+    def get_virtualcarving(self):
+        return self.virtualcarving
+
+    def get_entropyprofile(self):
+        return self.entropyprofile
+
+    def get_skiphighentropy(self):
+        return self.skiphighentropy
+
+    def get_skippadding(self):
+        return self.skippadding
+
+    def get_carvepadding(self):
+        return self.carvepadding
+
+    def get_imagevalidation(self):
+        return self.imagevalidation
+
+    def get_decompressionmaximum(self):
+        return self.decompressionmaximum
+
+    def get_decompressionratio(self):
+        return self.decompressionratio
+
+    def get_unpack_budget(self, unpackparser):
+        '''Return the UnpackBudget of an attempt of unpackparser'''
+        return self.parserbudgets.get(unpackparser.pretty_name,
+                self.unpackbudget)
+
+    def for_scan(self, scan):
+        '''Return the environment for a file of the top level scan
+        described by the ScanContext scan: a copy of this environment
+        that unpacks to and writes results to the directories of that
+        scan. Queues, unpack parsers and the signature matcher are
+        shared with this environment. If scan is None this environment
+        is returned.'''
+        if scan is None:
+            return self
+        scanenvironment = self.scanenvironments.get(scan.scanid)
+        if scanenvironment is None:
+            # create the signature matcher first, so it is shared
+            self.get_signature_matcher()
+            scanenvironment = copy.copy(self)
+            scanenvironment.unpackdirectory = scan.unpackdirectory
+            scanenvironment.resultsdirectory = scan.resultsdirectory
+            if len(self.scanenvironments) >= 64:
+                self.scanenvironments.clear()
+            self.scanenvironments[scan.scanid] = scanenvironment
+        return scanenvironment
+
     def unpack_path(self, fn):
         """Returns a path object containing the absolute path of the file in
         the unpack directory root.
@@ -116,6 +242,101 @@ class ScanEnvironment:
         else:
             return fr.filename
 
+    def share_input_file(self, filename):
+        """Opens the file filename once, so that open_input_file and
+        open_fileresult borrow the open file instead of opening it again,
+        until it is closed with close_shared_input_file. Returns the
+        SharedInputFile.
+        """
+        key = os.fspath(filename)
+        if key not in self.sharedinputfiles:
+            self.sharedinputfiles[key] = SharedInputFile(filename)
+        return self.sharedinputfiles[key]
+
+    def close_shared_input_file(self, sharedfile):
+        """Closes a file that was opened with share_input_file."""
+        self.sharedinputfiles.pop(os.fspath(sharedfile.filename), None)
+        sharedfile.close()
+
+    def get_shared_input_file(self, filename):
+        """Returns the SharedInputFile for filename, or None if the file
+        is not shared.
+        """
+        return self.sharedinputfiles.get(os.fspath(filename))
+
+    def open_input_file(self, filename):
+        """Opens the file filename for reading in binary mode. If the file
+        is shared, the shared file is borrowed: the returned file object
+        has its own position, and closing it does not close the shared
+        file.
+        """
+        sharedfile = self.sharedinputfiles.get(os.fspath(filename))
+        if sharedfile is not None:
+            return sharedfile.borrow()
+        return open(filename, 'rb')
+
+    def open_fileresult(self, fr):
+        """Opens the data of the file in fileresult fr for reading. Returns an
+        OffsetInputFile, which for virtual files is bounded to the range of
+        the backing file that holds the data.
+        """
+        if fr.is_virtual():
+            backing, offset, size = fr.get_slice()
+            return OffsetInputFile(
+                    self.open_input_file(self.unpack_path(backing)),
+                    offset, size)
+        return OffsetInputFile(
+                self.open_input_file(self.get_unpack_path_for_fileresult(fr)), 0)
+
+    def materialize(self, fr, keep=True):
+        """Writes the data of the virtual file in fileresult fr to its own
+        file, for code that needs a real file, such as unpack functions and
+        external tools. Returns the absolute path of the file. If keep is
+        True fr refers to the file from then on. Otherwise fr stays a
+        virtual file and the file is reused by later calls, until it is
+        kept by a call with keep set to True or removed by unmaterialize,
+        so the data is written only once for all attempts to unpack it.
+        """
+        filename_full = self.get_unpack_path_for_fileresult(fr)
+        if not fr.is_virtual():
+            return filename_full
+        key = os.fspath(filename_full)
+        if key not in self.materializedfiles:
+            backing, offset, size = fr.get_slice()
+            os.makedirs(filename_full.parent, exist_ok=True)
+            try:
+                with self.unpack_path(backing).open('rb') as infile:
+                    with filename_full.open('wb') as outfile:
+                        # sendfile can copy less than asked for large ranges
+                        while size > 0:
+                            written = os.sendfile(outfile.fileno(),
+                                    infile.fileno(), offset, size)
+                            if written == 0:
+                                break
+                            offset += written
+                            size -= written
+            except BaseException:
+                # do not leave a partial file behind
+                filename_full.unlink(missing_ok=True)
+                raise
+            self.materializedfiles.add(key)
+        if keep:
+            self.materializedfiles.discard(key)
+            fr.clear_slice()
+        return filename_full
+
+    def unmaterialize(self, fr):
+        """Removes the file written by materialize for the virtual file in
+        fileresult fr, if it was not kept. Nothing is done if fr is not a
+        virtual file.
+        """
+        if not fr.is_virtual():
+            return
+        filename_full = self.get_unpack_path_for_fileresult(fr)
+        if os.fspath(filename_full) in self.materializedfiles:
+            self.materializedfiles.discard(os.fspath(filename_full))
+            filename_full.unlink(missing_ok=True)
+
     def rel_unpack_path(self, fn):
         # TODO: check if fn starts with unpackdirectory to catch path traversal
         # in that case, return absolute path? but what about:
@@ -134,6 +355,8 @@ class ScanEnvironment:
         self.unpackparsers_for_extensions = {}
         self.unpackparsers_for_signatures = {}
         self.unpackparsers_for_featureless_files = []
+        self.signature_matcher = None
+        self.scanenvironments = {}
 
     def set_unpackparsers(self, iterable):
         self.clear_unpackparsers()
@@ -150,6 +373,10 @@ class ScanEnvironment:
             self.unpackparsers_for_signatures[signature].append(unpackparser)
         if unpackparser.scan_if_featureless:
             self.unpackparsers_for_featureless_files.append(unpackparser)
+        # the signature matcher and the environments for the
+        # scans have to be rebuilt
+        self.signature_matcher = None
+        self.scanenvironments = {}
 
     def get_unpackparsers(self):
         return self.unpackparsers
@@ -163,3 +390,11 @@ class ScanEnvironment:
     def get_unpackparsers_for_featureless_files(self):
         return self.unpackparsers_for_featureless_files
 
+    def get_signature_matcher(self):
+        """Returns a SignatureMatcher for all signatures of the unpackparsers.
+        The matcher is built on first use and then reused."""
+        if self.signature_matcher is None:
+            self.signature_matcher = SignatureMatcher(
+                    self.unpackparsers_for_signatures)
+        return self.signature_matcher
+
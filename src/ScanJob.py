@@ -20,6 +20,7 @@
 # version 3
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import itertools
 import stat
 import os
 import logging
@@ -28,14 +29,17 @@ import pathlib
 import shutil
 import sys
 import traceback
-from operator import itemgetter
 
+import bangpadding
 import bangsignatures
 from banglogging import log
 import banglogging
 from FileResult import FileResult
 from FileContentsComputer import *
+from ScanStatistics import ScanStatistics
 from UnpackManager import *
+from UnpackParser import OffsetInputFile
+from UnpackBudget import UnpackBudgetExceeded
 from UnpackParserException import UnpackParserException
 
 class ScanJobError(Exception):
@@ -60,19 +64,51 @@ labels:
             return "Exception (no scanjob):\n\n" + "".join(exc)
 
 
+# scan jobs are identified by the process that created them and a counter
+jobcounter = itertools.count()
+
+
 class ScanJob:
     """Performs scanning and unpacking related checks and stores the
     results in the given FileResult object."""
-    def __init__(self, fileresult):
+    def __init__(self, fileresult, scan=None, parentid=None):
         self.fileresult = fileresult
+        self.scan = scan
+        self.jobid = (os.getpid(), next(jobcounter))
+        self.parentid = parentid
+        self.queuedjobs = 0
         self.type = None
+        self.entropyprofile = None
+        self.paddingranges = None
+        self.sharedfile = None
+        self.statistics = ScanStatistics()
 
     def set_scanenvironment(self, scanenvironment):
         self.scanenvironment = scanenvironment
+        scanenvironment.externaltools.set_statistics(self.statistics)
 
     def initialize(self):
         self.abs_filename = self.scanenvironment.unpack_path(self.fileresult.filename)
-        self._stat_file()
+        if self.fileresult.is_virtual():
+            # the data is a range of another file, which does not
+            # have to be looked at.
+            self.stat = None
+        else:
+            self._stat_file()
+
+    def _get_data_location(self):
+        '''Return the absolute path of the file that holds the data of the
+        file, the offset of the data in it and the size of the data, or
+        None if the data is the whole file.'''
+        if self.fileresult.is_virtual():
+            backing, offset, size = self.fileresult.get_slice()
+            return self.scanenvironment.unpack_path(backing), offset, size
+        return self.abs_filename, 0, None
+
+    def _get_size(self):
+        if self.fileresult.is_virtual():
+            return self.fileresult.get_slice()[2]
+        return self.stat.st_size
 
     def _stat_file(self):
         try:
@@ -114,11 +150,13 @@ class ScanJob:
         return r
 
     def _is_empty(self):
-        r = self.stat.st_size == 0
+        r = self._get_size() == 0
         if r: self.type = 'empty'
         return r
 
     def not_scannable(self):
+        if self.fileresult.is_virtual():
+            return self._is_empty()
         return self._is_symlink() or \
                 self._is_socket() or \
                 self._is_fifo() or \
@@ -135,12 +173,35 @@ class ScanJob:
                 for hash_algorithm, hash_value in emptyhashresults.items():
                     self.fileresult.set_hashresult(hash_algorithm, hash_value)
             return True
-        self.fileresult.set_filesize(self.stat.st_size)
+        self.fileresult.set_filesize(self._get_size())
         return False
 
     def prepare_for_unpacking(self):
         self.fileresult.init_unpacked_files()
 
+    def share_input_file(self):
+        '''Open the file that holds the data once, so the signature search
+        and every unpack parser and unpack function that is tried on the
+        data borrow the open file (and its memory map) instead of opening
+        it again. If it cannot be opened, everything opens it by itself.'''
+        filename_full, offset, size = self._get_data_location()
+        try:
+            if filename_full.stat().st_mode & stat.S_IRUSR != stat.S_IRUSR:
+                filename_full.chmod(stat.S_IRUSR)
+            self.sharedfile = self.scanenvironment.share_input_file(filename_full)
+        except OSError:
+            self.sharedfile = None
+
+    def close_shared_input_file(self):
+        '''Close the file opened by share_input_file, and remove the
+        copies of its data that were made for unpack functions and external
+        programs'''
+        if self.sharedfile is not None:
+            self.scanenvironment.close_shared_input_file(self.sharedfile)
+            self.sharedfile = None
+        self.scanenvironment.unmaterialize(self.fileresult)
+        self.scanenvironment.externaltools.remove_file_slices()
+
     def check_for_padding_file(self, unpacker):
         # padding files don't need to be scanned
         if 'padding' in self.fileresult.labels:
@@ -187,11 +248,14 @@ class ScanJob:
             for unpackparser in unpackparsers:
                 if bangsignatures.matches_file_pattern(self.fileresult.filename, extension):
                     log(logging.INFO, "TRYING extension match %s %s" % (self.fileresult.filename, extension))
+                    start = self.statistics.start()
                     try:
                         unpackresult = unpacker.try_unpack_file_for_extension(
                             self.fileresult, self.scanenvironment,
                             extension, unpackparser)
                     except UnpackParserException as e:
+                        self.statistics.add_attempt(unpackparser.pretty_name,
+                                start, False, isinstance(e, UnpackBudgetExceeded))
                         # No data could be unpacked for some reason
                         log(logging.DEBUG, "FAIL %s known extension %s: %s" %
                             (self.fileresult.filename, extension,
@@ -202,6 +266,8 @@ class ScanJob:
                         #    pass
                         unpacker.remove_data_unpack_directory_tree()
                         continue
+                    self.statistics.add_attempt(unpackparser.pretty_name,
+                            start, True)
 
                     # the file could be unpacked successfully,
                     # so log it as such.
@@ -228,8 +294,7 @@ class ScanJob:
                         self.fileresult.set_metadata(unpackresult.get_metadata())
 
                     for unpackedfile in unpackresult.get_unpacked_files():
-                        j = ScanJob(unpackedfile)
-                        self.scanenvironment.scanfilequeue.put(j)
+                        self.queue_scanjob(unpackedfile)
                         report['files'].append(unpackedfile.filename)
                     self.fileresult.add_unpackedfile(report)
 
@@ -237,8 +302,24 @@ class ScanJob:
             signaturesfound = []
             counterspersignature = {}
 
-            filename_full = self.scanenvironment.unpack_path(self.fileresult.filename)
-            unpacker.open_scanfile_with_memoryview(filename_full, self.scanenvironment.get_maxbytes())
+            # optionally skip weak signatures in compressed or
+            # encrypted data.
+            if self.scanenvironment.get_skiphighentropy():
+                if self.entropyprofile is None:
+                    self.compute_entropy_profile()
+                unpacker.set_entropy_profile(entropyblocksize,
+                        self.entropyprofile)
+
+            unpacker.set_skip_padding(self.scanenvironment.get_skippadding())
+            filename_full, offset, size = self._get_data_location()
+            # map the file into memory if possible, and fall back to reading
+            # chunks if it cannot be mapped.
+            if not (self.scanenvironment.get_usemmap() and
+                    unpacker.open_scanfile_with_mmap(filename_full,
+                        offset=offset, size=size, sharedfile=self.sharedfile)):
+                unpacker.open_scanfile_with_memoryview(filename_full,
+                        self.scanenvironment.get_maxbytes(), offset, size,
+                        sharedfile=self.sharedfile)
             unpacker.seek_to_last_unpacked_offset()
             unpacker.read_chunk_from_scanfile()
 
@@ -246,19 +327,20 @@ class ScanJob:
             # TODO: check why this is a while true loop
             # instead of:
             # while unpacker.get_current_offset_in_file() != self.fileresult.filesize:
+            # always change to the declared unpacking directory. The
+            # UnpackManager changes back to it after every attempt, also
+            # after attempts that fail or are aborted.
+            os.chdir(self.scanenvironment.unpackdirectory)
+
+            signaturematcher = self.scanenvironment.get_signature_matcher()
             while True:
-                candidateoffsetsfound = set()
-                for s, unpackparsers in \
-                    self.scanenvironment.get_unpackparsers_for_signatures().items():
-                    offsets = unpacker.find_offsets_for_signature(s,
-                            unpackparsers, self.fileresult.filesize)
-                    candidateoffsetsfound.update(offsets)
+                candidateoffsetsfound = unpacker.find_offsets_for_signatures(
+                        signaturematcher, self.fileresult.filesize)
 
                 # For each of the found candidates see if any
                 # data can be unpacked. Process these in the order
                 # in which the signatures were found in the file.
-                for offset_with_unpackparser in sorted(candidateoffsetsfound,
-                        key=itemgetter(0)):
+                for offset_with_unpackparser in candidateoffsetsfound:
                     # skip offsets which are not useful to look at
                     # for example because the data has already been
                     # unpacked.
@@ -268,10 +350,7 @@ class ScanJob:
 
                     signaturesfound.append(offset_with_unpackparser)
 
-                    # TODO: this chdir can probably go away
-                    # always change to the declared unpacking directory
-                    os.chdir(self.scanenvironment.unpackdirectory)
-                    # then create an unpacking directory specifically
+                    # create an unpacking directory specifically
                     # for the signature including the pretty printed signature
                     # name and a counter for the signature.
                     namecounter = counterspersignature.get(unpackparser.pretty_name, 0) + 1
@@ -285,11 +364,15 @@ class ScanJob:
                     log(logging.DEBUG, "TRYING %s %s at offset: %d" %
                         (self.fileresult.filename, unpackparser.pretty_name, offset))
 
+                    start = self.statistics.start()
                     try:
                         unpackresult = unpacker.try_unpack_file_for_signatures(
                             self.fileresult, self.scanenvironment,
                             unpackparser, offset)
                     except UnpackParserException as e:
+                        self.statistics.add_attempt(unpackparser.pretty_name,
+                                start, False, isinstance(e, UnpackBudgetExceeded))
+
                         # No data could be unpacked for some reason,
                         # so log the status and error message
                         log(logging.DEBUG, "FAIL %s %s at offset: %d: %s" %
@@ -312,6 +395,8 @@ class ScanJob:
                         # could lead to some overlap and redundant
                         # scanning. TODO: find an elegant solution for this.
                         continue
+                    self.statistics.add_attempt(unpackparser.pretty_name,
+                            start, True)
 
                     # first rewrite the offset, if needed
                     # (example: coreboot file system)
@@ -364,8 +449,7 @@ class ScanJob:
 
                     for unpackedfile in unpackresult.get_unpacked_files():
                         report['files'].append(unpackedfile.filename)
-                        j = ScanJob(unpackedfile)
-                        self.scanenvironment.scanfilequeue.put(j)
+                        self.queue_scanjob(unpackedfile)
 
                     self.fileresult.add_unpackedfile(report)
 
@@ -391,40 +475,63 @@ class ScanJob:
                 unpacker.read_chunk_from_scanfile()
 
             unpacker.close_scanfile()
+            self.report_padding_ranges(unpacker)
+            if unpacker.skippedsignatures > 0:
+                log(logging.DEBUG, "SKIPPED %d weak signatures in high entropy data in %s" %
+                    (unpacker.skippedsignatures, self.fileresult.filename))
+
+    def report_padding_ranges(self, unpacker):
+        '''Report the runs of padding that were skipped while searching for
+        signatures and that are not part of unpacked data, so they are not
+        carved into separate files.'''
+        if not self.scanenvironment.get_skippadding():
+            return
+        # remember all padding, including the holes that were too short
+        # to skip, so it does not have to be read when computing hashes.
+        self.paddingranges = bangpadding.merge_ranges(unpacker.padding_ranges() +
+                [ (start, end, b'\x00') for start, end in unpacker.holes ])
 
-    def is_padding(self, filename):
-        # try to see if the file contains NUL byte padding
-        # or 0xFF padding and if so tag it as such
-        validpadding = [b'\x00', b'\xff']
-        ispadding = True
-        outfile = open(filename, 'rb')
-        c = outfile.read(1)
-        if c in validpadding:
-            padding_char = c
-            while c == padding_char:
-                c = outfile.read(1)
-            ispadding = c == b''
-        else:
-            ispadding = False
-        outfile.close()
+        for start, end, paddingbyte in unpacker.add_padding_ranges():
+            report = {
+                'offset': start,
+                'type': 'padding',
+                'size': end - start,
+                'files': [],
+            }
+            self.fileresult.add_unpackedfile(report)
+            if start == 0 and end == self.fileresult.filesize:
+                self.fileresult.labels.add('padding')
+
+    def get_padding_ranges(self):
+        '''Return the known padding in the file as a list of (start, end,
+        paddingbyte) tuples. Before the file was searched for signatures
+        only the holes of a sparse file are known.'''
+        if not self.scanenvironment.get_skippadding():
+            return []
+        if self.paddingranges is None:
+            self.paddingranges = [ (start, end, b'\x00') for start, end in
+                    bangpadding.find_holes(*self._get_data_location()) ]
+        return self.paddingranges
+
+    def is_padding(self, filename, offset=0, size=None):
+        '''Return whether or not the file (or the size bytes at offset)
+        only contains NUL bytes or only 0xFF bytes.'''
+        scanfile = OffsetInputFile(
+                self.scanenvironment.open_input_file(filename), offset, size)
+        scanfile.seek(0)
+        scanbytes = scanfile.read(bangpadding.piecesize)
+        paddingbyte = scanbytes[:1]
+        ispadding = paddingbyte in bangpadding.paddingbytes
+        # compare the data with padding in large pieces
+        while ispadding and scanbytes != b'':
+            ispadding = scanbytes == \
+                    bangpadding.padding_piece(paddingbyte)[:len(scanbytes)]
+            scanbytes = scanfile.read(bangpadding.piecesize)
+        scanfile.close()
         return ispadding
 
-        checkbytes = outfile.read(1)
-        if checkbytes in validpadding:
-            paddingchar = checkbytes
-            # now read more bytes
-            while True:
-                scanbytes = outfile.read(self.scanenvironment.get_maxbytes())
-                if scanbytes == b'':
-                    break
-                if scanbytes != len(scanbytes) * paddingchar:
-                    ispadding = False
-                    break
-        else:
-            ispadding = False
-        outfile.close()
-
-    def synthesize_file(self, unpacker, scanfile, index_from, index_to):
+    def synthesize_file(self, unpacker, scanfile, index_from, index_to,
+            ispadding):
         self.synthesizedcounter = \
                 unpacker.make_data_unpack_directory(
                 self.fileresult.get_unpack_directory_parent(),
@@ -434,25 +541,30 @@ class ScanJob:
                 ("unpacked-0x%x-0x%x" % (index_from, index_to-1))
         outfile_full = self.scanenvironment.unpack_path(outfile_rel)
 
-        # create the unpacking directory and write the file
-        os.makedirs(outfile_full.parent, exist_ok=True)
+        # with virtual carving the data is not written, but read
+        # from the file that it was carved from.
+        if not self.scanenvironment.get_virtualcarving():
+            # create the unpacking directory and write the file
+            os.makedirs(outfile_full.parent, exist_ok=True)
 
-        # write the file
-        outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), scanfile.fileno(), index_from, index_to -
-                index_from)
-        outfile.close()
+            # write the file. scanfile.fileno() is the file descriptor
+            # of the backing file, so its offset has to be added.
+            outfile = open(outfile_full, 'wb')
+            os.sendfile(outfile.fileno(), scanfile.fileno(),
+                    scanfile.offset + index_from, index_to - index_from)
+            outfile.close()
 
         unpackedlabel = ['synthesized']
 
-        if self.is_padding(outfile_full):
+        if ispadding:
             unpackedlabel.append('padding')
             if self.scanenvironment.get_paddingname() is not None:
                 newoutfile_rel = unpacker.get_data_unpack_directory() / \
                     ( "%s-%s-%s" % (self.scanenvironment.get_paddingname(),
                             hex(index_from), hex(index_to-1)))
-                newoutfile_full = self.scanenvironment.unpack_path(newoutfile_rel)
-                shutil.move(outfile_full, newoutfile_full)
+                if not self.scanenvironment.get_virtualcarving():
+                    newoutfile_full = self.scanenvironment.unpack_path(newoutfile_rel)
+                    shutil.move(outfile_full, newoutfile_full)
 
                 outfile_rel = newoutfile_rel
         return outfile_rel, unpackedlabel
@@ -461,45 +573,51 @@ class ScanJob:
     def carve_file_data(self, unpacker):
         # Now carve any data that was not unpacked from the file and
         # put it back into the scanning queue to see if something
-        # could be unpacked after all, or to more quickly recognize
-        # padding data.
+        # could be unpacked after all. Padding is only reported, unless
+        # it should be carved as well.
         #
         # This also makes it easier for doing a "post mortem".
         #
-        unpacked_range = unpacker.unpacked_range()
-        if unpacked_range == []:
+        if unpacker.unpacked_range() == []:
             return
 
-
-
-        # Invariant: everything up to carve_index has been inspected
-        # unpack ranges are [u_low:u_high)
+        # carve the ranges in between the unpacked ranges, which
+        # are half open: [low:high)
         self.synthesizedcounter = 1
-        carve_index = 0
-        filename_full = self.scanenvironment.unpack_path(self.fileresult.filename)
-        scanfile = open(filename_full, 'rb')
-        scanfile.seek(carve_index)
-        for u_low, u_high in unpacked_range + [(self.fileresult.filesize, self.fileresult.filesize)]:
-            if carve_index < u_low:
-                outfile_rel, unpackedlabel = self.synthesize_file(unpacker,
-                        scanfile, carve_index, u_low)
-
+        scanfile = self.scanenvironment.open_fileresult(self.fileresult)
+        backing, backing_offset = self.fileresult.get_backing()
+        for low, high in unpacker.unpacked_gaps(0, self.fileresult.filesize):
+            ispadding = self.is_padding(scanfile.name,
+                    scanfile.offset + low, high - low)
+            if ispadding and not self.scanenvironment.get_carvepadding():
                 report = {
-                    'offset': carve_index,
-                    'type': 'carved',
-                    'size': u_low - carve_index,
-                    'files': [ outfile_rel ],
+                    'offset': low,
+                    'type': 'padding',
+                    'size': high - low,
+                    'files': [],
                 }
                 self.fileresult.add_unpackedfile(report)
+                continue
+
+            outfile_rel, unpackedlabel = self.synthesize_file(unpacker,
+                    scanfile, low, high, ispadding)
 
-                # add the data, plus labels, to the queue
-                fr = FileResult(self.fileresult,
-                    outfile_rel,
-                    set(unpackedlabel))
-                j = ScanJob(fr)
-                self.scanenvironment.scanfilequeue.put(j)
-                self.synthesizedcounter += 1
-            carve_index = u_high
+            report = {
+                'offset': low,
+                'type': 'carved',
+                'size': high - low,
+                'files': [ outfile_rel ],
+            }
+            self.fileresult.add_unpackedfile(report)
+
+            # add the data, plus labels, to the queue
+            fr = FileResult(self.fileresult,
+                outfile_rel,
+                set(unpackedlabel))
+            if self.scanenvironment.get_virtualcarving():
+                fr.set_slice(backing, backing_offset + low, high - low)
+            self.queue_scanjob(fr)
+            self.synthesizedcounter += 1
         scanfile.close()
 
     def do_content_computations(self):
@@ -518,8 +636,16 @@ class ScanJob:
             tlshc = TLSHComputerMemoryView()
             fc.subscribe(tlshc)
 
-        filename_full = self.scanenvironment.unpack_path(self.fileresult.filename)
-        fc.read(filename_full)
+        computeentropy = self.needs_entropy_profile()
+        if computeentropy:
+            entropy = EntropyComputer()
+            fc.subscribe(entropy)
+
+        fc.read(*self._get_data_location(),
+                paddingranges=self.get_padding_ranges())
+
+        if computeentropy:
+            self.entropyprofile = entropy.get()
 
         hashresults = dict(hasher.get())
         if self.scanenvironment.use_tlsh(self.fileresult.filesize, self.fileresult.labels):
@@ -542,6 +668,85 @@ class ScanJob:
         else:
             self.fileresult.labels.add('binary')
 
+    def needs_entropy_profile(self):
+        '''Return whether or not the entropy profile of the file still
+        has to be computed'''
+        if self.entropyprofile is not None or 'padding' in self.fileresult.labels:
+            return False
+        return self.scanenvironment.get_entropyprofile() or \
+                self.scanenvironment.get_skiphighentropy()
+
+    def compute_entropy_profile(self):
+        '''Compute only the entropy profile of the file. This is needed
+        if the profile is used for scanning and hashes are not computed
+        before unpacking.'''
+        fc = FileContentsComputer(self.scanenvironment.get_readsize())
+        entropy = EntropyComputer()
+        fc.subscribe(entropy)
+        fc.read(*self._get_data_location())
+        self.entropyprofile = entropy.get()
+
+    def record_entropy_profile(self):
+        '''Store the entropy profile in the metadata of the file'''
+        if not self.scanenvironment.get_entropyprofile() or \
+                self.entropyprofile is None:
+            return
+        metadata = dict(self.fileresult.metadata or {})
+        metadata['entropy'] = {
+            'block size': entropyblocksize,
+            'blocks': self.entropyprofile,
+        }
+        self.fileresult.set_metadata(metadata)
+
+    def check_for_duplicate(self):
+        '''Claims the hash of the file in the shared checksum dictionary.
+        If another file with the same hash was claimed first, the file
+        is marked as a duplicate of that file.'''
+        processlock = self.scanenvironment.processlock
+        checksumdict = self.scanenvironment.checksumdict
+
+        if self.scan is None:
+            checksumkey = self.fileresult.get_hash()
+        else:
+            checksumkey = self.scan.checksum_key(self.fileresult.get_hash())
+
+        processlock.acquire()
+        if checksumkey in checksumdict:
+            self.fileresult.set_duplicate(True)
+            self.fileresult.set_duplicate_of(checksumdict[checksumkey])
+        else:
+            self.fileresult.set_duplicate(False)
+            checksumdict[checksumkey] = self.fileresult.filename
+        processlock.release()
+
+    def queue_scanjob(self, fileresult):
+        '''Queue a new ScanJob for an unpacked file in the same scan'''
+        self.scanenvironment.scanfilequeue.put(ScanJob(fileresult,
+            self.scan, self.jobid))
+        self.queuedjobs += 1
+
+    def report_result(self):
+        '''Put the result on the result queue. Results of files in a top
+        level scan are sent together with the identifiers of the scan, this
+        scan job and its parent and the amount of new scan jobs, so the
+        scheduler knows when the scan is done, and the statistics of the
+        scan job.'''
+        if self.scan is None:
+            self.scanenvironment.resultqueue.put(self.fileresult)
+        else:
+            self.scanenvironment.resultqueue.put((self.scan.scanid,
+                self.jobid, self.parentid, self.fileresult, self.queuedjobs,
+                self.statistics))
+
+    def check_tlsh_after_unpacking(self):
+        '''The TLSH hash is computed before unpacking if hashes are computed
+        first, when not all labels are known yet. Remove the TLSH hash if
+        labels that were found during unpacking show it is not useful.'''
+        if 'tlsh' not in self.fileresult.hash:
+            return
+        if not self.scanenvironment.use_tlsh(self.fileresult.filesize, self.fileresult.labels):
+            del self.fileresult.hash['tlsh']
+
     def check_entire_file(self, unpacker):
         # TODO: this is making an assumption that all featureless files are
         # text based.
@@ -556,15 +761,20 @@ class ScanJob:
 
                 log(logging.DEBUG, "TRYING %s %s at offset: 0" %
                         (self.fileresult.filename, unpack_parser.pretty_name))
+                start = self.statistics.start()
                 try:
                     unpackresult = unpacker.try_unpack_without_features(
                         self.fileresult, self.scanenvironment, unpack_parser, 0)
                 except UnpackParserException as e:
+                    self.statistics.add_attempt(unpack_parser.pretty_name,
+                            start, False, isinstance(e, UnpackBudgetExceeded))
                     log(logging.DEBUG, "FAIL %s %s at offset: %d: %s" %
                         (self.fileresult.filename, unpack_parser.pretty_name, 0,
                             e.args))
                     unpacker.remove_data_unpack_directory_tree()
                     continue
+                self.statistics.add_attempt(unpack_parser.pretty_name,
+                        start, True)
 
                 log(logging.INFO, "SUCCESS %s %s at offset: %d, length: %d" %
                     (self.fileresult.filename, unpack_parser.pretty_name, 0,
@@ -594,8 +804,7 @@ class ScanJob:
 
                 for unpackedfile in unpackresult.get_unpacked_files():
                     report['files'].append(unpackedfile.filename)
-                    j = ScanJob(unpackedfile)
-                    self.scanenvironment.scanfilequeue.put(j)
+                    self.queue_scanjob(unpackedfile)
 
                 self.fileresult.add_unpackedfile(report)
 
@@ -621,9 +830,6 @@ class ScanJob:
 def processfile(dbconn, dbcursor, scanenvironment):
 
     scanfilequeue = scanenvironment.scanfilequeue
-    resultqueue = scanenvironment.resultqueue
-    processlock = scanenvironment.processlock
-    checksumdict = scanenvironment.checksumdict
 
     carveunpacked = True
 
@@ -631,59 +837,87 @@ def processfile(dbconn, dbcursor, scanenvironment):
         try:
             scanjob = scanfilequeue.get(timeout=86400)
             if not scanjob: continue
-            scanjob.set_scanenvironment(scanenvironment)
-            scanjob.initialize()
+            # files of a top level scan are unpacked to and reported
+            # in the directories of that scan.
+            jobenvironment = scanenvironment.for_scan(scanjob.scan)
+            if scanjob.scan is not None and jobenvironment.logging:
+                banglogging.set_logfile(scanjob.scan.logfile)
+            scanjob.set_scanenvironment(jobenvironment)
+            statistics = scanjob.statistics
+            with statistics.phase('stat'):
+                scanjob.initialize()
+                unscannable = scanjob.check_unscannable_file()
             fileresult = scanjob.fileresult
 
-            unscannable = scanjob.check_unscannable_file()
             if unscannable:
-                resultqueue.put(scanjob.fileresult)
+                scanjob.report_result()
                 scanfilequeue.task_done()
                 continue
 
-            unpacker = UnpackManager(scanenvironment.unpackdirectory)
-            scanjob.prepare_for_unpacking()
-            scanjob.check_for_padding_file(unpacker)
-            scanjob.check_for_unpacked_file(unpacker)
-            scanjob.check_mime_types()
+            unpacker = UnpackManager(jobenvironment.unpackdirectory)
+            with statistics.phase('preparation'):
+                scanjob.prepare_for_unpacking()
+                scanjob.share_input_file()
+                scanjob.check_for_padding_file(unpacker)
+                scanjob.check_for_unpacked_file(unpacker)
+                scanjob.check_mime_types()
+
+            # optionally compute the hashes first, so duplicate files
+            # do not have to be unpacked at all.
+            if jobenvironment.get_hashfirst():
+                with statistics.phase('content computations'):
+                    scanjob.do_content_computations()
+                with statistics.phase('duplicates'):
+                    scanjob.check_for_duplicate()
+                if scanjob.fileresult.is_duplicate():
+                    unpacker.set_needs_unpacking(False)
 
             if unpacker.needs_unpacking():
-                scanjob.check_for_valid_extension(unpacker)
+                with statistics.phase('extensions'):
+                    scanjob.check_for_valid_extension(unpacker)
 
             if unpacker.needs_unpacking():
-                scanjob.check_for_signatures(unpacker)
+                with statistics.phase('signatures'):
+                    scanjob.check_for_signatures(unpacker)
 
             if carveunpacked:
-                scanjob.carve_file_data(unpacker)
+                with statistics.phase('carving'):
+                    scanjob.carve_file_data(unpacker)
 
-            scanjob.do_content_computations()
+            if jobenvironment.get_hashfirst():
+                scanjob.check_tlsh_after_unpacking()
+            else:
+                with statistics.phase('content computations'):
+                    scanjob.do_content_computations()
 
             if unpacker.needs_unpacking():
-                scanjob.check_entire_file(unpacker)
+                with statistics.phase('featureless'):
+                    scanjob.check_entire_file(unpacker)
 
-            processlock.acquire()
+            scanjob.close_shared_input_file()
 
-            if scanjob.fileresult.get_hash() in checksumdict:
-                scanjob.fileresult.set_duplicate(True)
-            else:
-                scanjob.fileresult.set_duplicate(False)
-                checksumdict[scanjob.fileresult.get_hash()] = scanjob.fileresult.filename
-            processlock.release()
+            scanjob.record_entropy_profile()
 
-            if not scanjob.fileresult.is_duplicate():
-                if scanenvironment.runfilescans:
-                    for sclass in scanenvironment.filescanners:
-                        s = sclass(dbconn, dbcursor, scanenvironment)
-                        if s.should_scan(scanjob.fileresult):
-                            s.scan(scanjob.fileresult)
+            if not jobenvironment.get_hashfirst():
+                with statistics.phase('duplicates'):
+                    scanjob.check_for_duplicate()
 
-                for rclass in scanenvironment.reporters:
-                    r = rclass(scanenvironment)
-                    r.report(scanjob.fileresult)
+            if not scanjob.fileresult.is_duplicate():
+                if jobenvironment.runfilescans:
+                    with statistics.phase('file scanners'):
+                        for sclass in jobenvironment.filescanners:
+                            s = sclass(dbconn, dbcursor, jobenvironment)
+                            if s.should_scan(scanjob.fileresult):
+                                s.scan(scanjob.fileresult)
+
+                with statistics.phase('reporters'):
+                    for rclass in jobenvironment.reporters:
+                        r = rclass(jobenvironment)
+                        r.report(scanjob.fileresult)
 
             # scanjob.fileresult.set_filesize(scanjob.filesize)
 
-            resultqueue.put(scanjob.fileresult)
+            scanjob.report_result()
             scanfilequeue.task_done()
         except Exception as e:
             tb = sys.exc_info()[2]
@@ -0,0 +1,449 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+'''Schedulers hand out scan jobs to the worker processes, collect the
+results and keep track of the hashes of the files that were scanned.
+The worker processes are started once and scan files of several top
+level scans at the same time.
+
+Two backends are available:
+
+* manager :: queues and the checksum dictionary live in a separate
+  multiprocessing.Manager() process. Every put, get and duplicate check
+  is a round trip to that process.
+* pipes :: scan jobs are handed out in batches over a pipe, results are
+  written to a pipe that is read by the main process and the hashes are
+  stored in a hash table in shared memory.
+'''
+
+import collections
+import hashlib
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+
+from ScanStatistics import ScanStatistics
+
+schedulers = ['pipes', 'manager']
+
+
+class BatchingJoinableQueue:
+    """A joinable queue that sends items in batches.
+
+    Items that are put are buffered and sent over the underlying
+    multiprocessing.JoinableQueue as a single list when the buffer is full
+    or when the process that put them calls task_done(). A process that
+    calls get() receives a whole batch and hands out its items one at a
+    time from a local buffer, so every item is sent over the queue only
+    once. A batch is marked as done when all of its items are done, and
+    the items that were put while processing an item are sent before it is
+    marked as done, so join() does not return before all work is done.
+
+    A process keeps the rest of a batch while it works on an item, so
+    batchsize should be small compared to the amount of work: other
+    processes only get the items of other batches.
+
+    The buffers are local to a process, so every item that is put has to be
+    followed by a task_done() or flush() in the same process, and every item
+    that is received has to be followed by a task_done() in that process.
+    """
+    def __init__(self, batchsize=16, context=None):
+        if context is None:
+            context = multiprocessing.get_context()
+        self.queue = context.JoinableQueue()
+        self.batchsize = batchsize
+        self.pending = []
+        self.received = collections.deque()
+        # the amount of items of every received batch that are not done
+        self.unfinished = collections.deque()
+
+    def __getstate__(self):
+        # do not send the buffers of this process to another process
+        return {'queue': self.queue, 'batchsize': self.batchsize}
+
+    def __setstate__(self, state):
+        self.queue = state['queue']
+        self.batchsize = state['batchsize']
+        self.pending = []
+        self.received = collections.deque()
+        self.unfinished = collections.deque()
+
+    def put(self, item):
+        self.pending.append(item)
+        if len(self.pending) >= self.batchsize:
+            self.flush()
+
+    def flush(self):
+        '''Send all buffered items to the underlying queue'''
+        if self.pending != []:
+            self.queue.put(self.pending)
+            self.pending = []
+
+    def get(self, timeout=None):
+        self.flush()
+        if not self.received:
+            batch = self.queue.get(timeout=timeout)
+            self.received.extend(batch)
+            self.unfinished.append(len(batch))
+        return self.received.popleft()
+
+    def task_done(self):
+        self.flush()
+        self.unfinished[0] -= 1
+        if self.unfinished[0] == 0:
+            # all items of the batch are done
+            self.unfinished.popleft()
+            self.queue.task_done()
+
+    def join(self):
+        self.flush()
+        self.queue.join()
+
+
+class SharedChecksumTable:
+    """A set of SHA256 hashes in shared memory.
+
+    The table is an open addressing hash table with linear probing that
+    stores the 32 byte digests. Removed digests are replaced by a marker,
+    so lookups of other digests keep working. A small header segment
+    records the name and capacity of the segment with the table, so when
+    the table is rebuilt by one process the other processes can find the
+    new segment.
+
+    Keys that are not SHA256 hashes in hexadecimal notation (such as
+    tuples of a scan identifier and a hash) are hashed first.
+
+    The table only records whether or not a hash was seen: looking up a
+    hash that is in the table returns None instead of the name of the file
+    that was seen first. The table is not locked: callers should hold the
+    lock that guards the shared data structures (the processlock).
+    """
+    headerformat = '<QQQQ64s'
+    headersize = struct.calcsize(headerformat)
+    emptyslot = bytes(32)
+    removedslot = b'\xff' * 32
+
+    def __init__(self, capacity=65536):
+        self.header = shared_memory.SharedMemory(create=True, size=self.headersize)
+        self.data = shared_memory.SharedMemory(create=True, size=capacity*32)
+        self.generation = 0
+        self.capacity = capacity
+        self._write_header(0, 0)
+
+    def __getstate__(self):
+        return {'header': self.header.name}
+
+    def __setstate__(self, state):
+        self.header = shared_memory.SharedMemory(name=state['header'])
+        self.data = None
+        self.generation = None
+        self._attach()
+
+    def _write_header(self, used, count):
+        struct.pack_into(self.headerformat, self.header.buf, 0, self.generation,
+                self.capacity, used, count, self.data.name.encode())
+
+    def _attach(self):
+        '''(Re)attach to the segment with the table if it was replaced
+        by another process, and return the amount of used slots and
+        the amount of digests in the table'''
+        generation, capacity, used, count, name = struct.unpack_from(
+                self.headerformat, self.header.buf, 0)
+        if generation != self.generation:
+            if self.data is not None:
+                self.data.close()
+            self.data = shared_memory.SharedMemory(name=name.rstrip(b'\x00').decode())
+            self.generation = generation
+            self.capacity = capacity
+        return used, count
+
+    @classmethod
+    def _digest(cls, key):
+        try:
+            digest = bytes.fromhex(key)
+        except (TypeError, ValueError):
+            digest = b''
+        if len(digest) != 32 or digest in (cls.emptyslot, cls.removedslot):
+            digest = hashlib.sha256(str(key).encode()).digest()
+        return digest
+
+    def _find_slot(self, buf, capacity, digest):
+        '''Return the slot with the digest, or the slot where it
+        should be stored'''
+        slot = int.from_bytes(digest[:8], 'little') % capacity
+        freeslot = None
+        while True:
+            stored = buf[slot*32:slot*32+32]
+            if stored == digest:
+                return slot
+            if stored == self.emptyslot:
+                if freeslot is None:
+                    return slot
+                return freeslot
+            if freeslot is None and stored == self.removedslot:
+                freeslot = slot
+            slot = (slot + 1) % capacity
+
+    def _rebuild(self, count):
+        '''Copy all digests to a new segment, dropping the markers
+        of removed digests and growing the table if needed'''
+        newcapacity = self.capacity
+        if count * 2 > self.capacity:
+            newcapacity = self.capacity * 2
+        newdata = shared_memory.SharedMemory(create=True, size=newcapacity*32)
+        for slot in range(self.capacity):
+            digest = bytes(self.data.buf[slot*32:slot*32+32])
+            if digest in (self.emptyslot, self.removedslot):
+                continue
+            newslot = self._find_slot(newdata.buf, newcapacity, digest)
+            newdata.buf[newslot*32:newslot*32+32] = digest
+        olddata = self.data
+        self.data = newdata
+        self.capacity = newcapacity
+        self.generation += 1
+        self._write_header(count, count)
+        olddata.close()
+        olddata.unlink()
+
+    def __contains__(self, key):
+        self._attach()
+        digest = self._digest(key)
+        slot = self._find_slot(self.data.buf, self.capacity, digest)
+        return self.data.buf[slot*32:slot*32+32] == digest
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return None
+
+    def __setitem__(self, key, value):
+        used, count = self._attach()
+        digest = self._digest(key)
+        slot = self._find_slot(self.data.buf, self.capacity, digest)
+        stored = bytes(self.data.buf[slot*32:slot*32+32])
+        if stored == digest:
+            return
+        if stored == self.emptyslot:
+            used += 1
+        self.data.buf[slot*32:slot*32+32] = digest
+        count += 1
+        self._write_header(used, count)
+        if used * 4 > self.capacity * 3:
+            self._rebuild(count)
+
+    def __delitem__(self, key):
+        used, count = self._attach()
+        digest = self._digest(key)
+        slot = self._find_slot(self.data.buf, self.capacity, digest)
+        if self.data.buf[slot*32:slot*32+32] != digest:
+            raise KeyError(key)
+        self.data.buf[slot*32:slot*32+32] = self.removedslot
+        self._write_header(used, count - 1)
+
+    def __len__(self):
+        return self._attach()[1]
+
+    def close(self):
+        '''Close the shared memory in this process'''
+        self.data.close()
+        self.header.close()
+
+    def unlink(self):
+        '''Free the shared memory. Should be called once, by the
+        process that created the table, after all other processes
+        are done with it.'''
+        self._attach()
+        self.data.close()
+        self.data.unlink()
+        self.header.close()
+        self.header.unlink()
+
+
+class ScanContext:
+    """Describes a top level scan. Every ScanJob refers to the scan it
+    is part of, so worker processes can scan files of several top level
+    scans at the same time."""
+    def __init__(self, scanid, unpackdirectory, resultsdirectory, logfile=None):
+        self.scanid = scanid
+        self.unpackdirectory = unpackdirectory
+        self.resultsdirectory = resultsdirectory
+        self.logfile = logfile
+
+    def checksum_key(self, filehash):
+        '''Return the key for a hash in the checksum dictionary. Hashes
+        are only compared to hashes of files in the same scan.'''
+        return (self.scanid, filehash)
+
+
+def resolve_duplicates(fileresults):
+    '''Set the name of the first file with the same contents for
+    duplicate files, if the checksum dictionary did not record it.'''
+    firstseen = {}
+    for fileresult in fileresults:
+        if not fileresult.is_duplicate() and 'sha256' in fileresult.hash:
+            firstseen.setdefault(fileresult.hash['sha256'], fileresult.filename)
+    for fileresult in fileresults:
+        if fileresult.is_duplicate() and fileresult.duplicateof is None:
+            fileresult.set_duplicate_of(firstseen.get(fileresult.hash['sha256']))
+
+
+class ScanProgress:
+    """Keeps track of the scan jobs of a top level scan that did not
+    report a result yet.
+
+    Results can arrive in a different order than the scan jobs were
+    queued: a scan job for an unpacked file can be done before the scan
+    job for the file it was unpacked from. The scan is only done when the
+    amount of results matches the amount of queued scan jobs and the
+    results of all parents have arrived.
+
+    The statistics of the scan jobs are merged as their results arrive.
+    """
+    def __init__(self, scan):
+        self.scan = scan
+        self.fileresults = []
+        self.statistics = ScanStatistics()
+        self.outstanding = 1
+        self.received = set()
+        self.missingparents = {}
+
+    def add_result(self, jobid, parentid, fileresult, queuedjobs,
+                   statistics=None):
+        '''Record the result of a scan job and return whether or not
+        the scan is done'''
+        self.fileresults.append(fileresult)
+        if statistics is not None:
+            self.statistics.merge(statistics)
+        self.outstanding += queuedjobs - 1
+        self.received.add(jobid)
+        self.missingparents.pop(jobid, None)
+        if parentid is not None and parentid not in self.received:
+            self.missingparents[parentid] = self.missingparents.get(parentid, 0) + 1
+        return self.outstanding == 0 and self.missingparents == {}
+
+
+class Scheduler:
+    """Hands out scan jobs of one or more top level scans to the worker
+    processes and collects the results per scan.
+
+    Workers put a tuple (scanid, jobid, parentid, fileresult, queuedjobs,
+    statistics) on the result queue for every scan job (see
+    ScanJob.report_result()), after the new scan jobs for the unpacked
+    files were queued. The statistics are a ScanStatistics object, or None.
+    """
+    def __init__(self):
+        self.scans = {}
+
+    def _put(self, scanjob):
+        raise NotImplementedError
+
+    def _get_result(self):
+        raise NotImplementedError
+
+    def submit(self, scanjob):
+        '''Start a top level scan with the scan job for its first file'''
+        self.scans[scanjob.scan.scanid] = ScanProgress(scanjob.scan)
+        self._put(scanjob)
+
+    def get_active_scans(self):
+        '''Return the amount of top level scans that are not done'''
+        return len(self.scans)
+
+    def wait_for_scan(self):
+        '''Wait until one of the top level scans is done and return its
+        ScanContext together with the FileResult objects of all the files
+        in that scan and the merged ScanStatistics of its scan jobs'''
+        while True:
+            scanid, jobid, parentid, fileresult, queuedjobs, statistics = \
+                    self._get_result()
+            progress = self.scans[scanid]
+            if progress.add_result(jobid, parentid, fileresult, queuedjobs,
+                    statistics):
+                del self.scans[scanid]
+                self._forget_hashes(progress.scan, progress.fileresults)
+                resolve_duplicates(progress.fileresults)
+                return progress.scan, progress.fileresults, progress.statistics
+
+    def _forget_hashes(self, scan, fileresults):
+        '''Remove the hashes of a scan that is done from the checksum
+        dictionary'''
+        self.processlock.acquire()
+        for fileresult in fileresults:
+            if fileresult.is_duplicate() or 'sha256' not in fileresult.hash:
+                continue
+            try:
+                del self.checksumdict[scan.checksum_key(fileresult.hash['sha256'])]
+            except KeyError:
+                pass
+        self.processlock.release()
+
+
+class ManagerScheduler(Scheduler):
+    """Scheduler with queues and a dictionary in a Manager process."""
+    def __init__(self):
+        super().__init__()
+        self.processmanager = multiprocessing.Manager()
+        self.scanfilequeue = self.processmanager.JoinableQueue(maxsize=0)
+        self.resultqueue = self.processmanager.JoinableQueue(maxsize=0)
+        self.processlock = multiprocessing.Lock()
+        self.checksumdict = self.processmanager.dict()
+
+    def _put(self, scanjob):
+        self.scanfilequeue.put(scanjob)
+
+    def _get_result(self):
+        result = self.resultqueue.get()
+        self.resultqueue.task_done()
+        return result
+
+    def shutdown(self):
+        self.processmanager.shutdown()
+
+
+class PipeScheduler(Scheduler):
+    """Scheduler that sends scan jobs in batches over pipes and keeps
+    the hashes in shared memory, without a separate Manager process."""
+    def __init__(self, batchsize=4, checksumcapacity=65536):
+        super().__init__()
+        self.scanfilequeue = BatchingJoinableQueue(batchsize)
+        self.resultqueue = multiprocessing.SimpleQueue()
+        self.processlock = multiprocessing.Lock()
+        self.checksumdict = SharedChecksumTable(checksumcapacity)
+
+    def _put(self, scanjob):
+        self.scanfilequeue.put(scanjob)
+        self.scanfilequeue.flush()
+
+    def _get_result(self):
+        return self.resultqueue.get()
+
+    def shutdown(self):
+        self.checksumdict.unlink()
+        self.resultqueue.close()
+
+
+def create_scheduler(name):
+    '''Create a scheduler for the backend with the given name'''
+    if name == 'manager':
+        return ManagerScheduler()
+    if name == 'pipes':
+        return PipeScheduler()
+    raise ValueError("unknown scheduler %s" % name)
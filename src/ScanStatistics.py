@@ -0,0 +1,147 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# Timing and outcome statistics of a scan. Every scan job measures the
+# wall clock and CPU time of the phases of processfile() and of every
+# attempt of an unpack parser, and the time spent on the external programs
+# that the unpack functions run, and sends them with its result. The
+# statistics of all scan jobs of a scan are merged and stored in the
+# "statistics" section of the scan results.
+
+import contextlib
+import time
+
+class ScanStatistics:
+    """Wall clock and CPU time per phase, and the amount of attempts,
+    successes and failures and the time spent per unpack parser. The time
+    spent by the unpack parsers is part of the time of the phase in which
+    they were tried. The time spent on external programs (waiting for
+    them to be allowed to run and running them) is part of the time of
+    the unpack parsers that run them.
+    """
+    def __init__(self):
+        # phase -> [count, wall time, cpu time]
+        self.phases = {}
+        # pretty name -> [attempts, successes, wall time, cpu time,
+        #                 failed wall time, failed cpu time, timeouts]
+        self.parsers = {}
+        # program -> [runs, wait time, wall time, timeouts]
+        self.tools = {}
+
+    @staticmethod
+    def start():
+        '''Return the current wall clock and CPU time, to pass to
+        add_phase() or add_attempt() later'''
+        return (time.perf_counter(), time.process_time())
+
+    def add_phase(self, name, start):
+        '''Add the time since start to the phase name'''
+        wall = time.perf_counter() - start[0]
+        cpu = time.process_time() - start[1]
+        phase = self.phases.setdefault(name, [0, 0.0, 0.0])
+        phase[0] += 1
+        phase[1] += wall
+        phase[2] += cpu
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Time the code in the with block as the phase name'''
+        start = self.start()
+        try:
+            yield
+        finally:
+            self.add_phase(name, start)
+
+    def add_attempt(self, pretty_name, start, success, timeout=False):
+        '''Record an attempt of the unpack parser pretty_name that started
+        at start and that did or did not succeed. timeout is True for
+        failed attempts that were aborted because they went over their
+        budget.'''
+        wall = time.perf_counter() - start[0]
+        cpu = time.process_time() - start[1]
+        parser = self.parsers.setdefault(pretty_name, [0, 0, 0.0, 0.0, 0.0, 0.0, 0])
+        parser[0] += 1
+        parser[2] += wall
+        parser[3] += cpu
+        if success:
+            parser[1] += 1
+        else:
+            parser[4] += wall
+            parser[5] += cpu
+            if timeout:
+                parser[6] += 1
+
+    def add_tool_run(self, tool, wait, wall):
+        '''Record a run of the external program tool that waited wait
+        seconds before it could run and then ran for wall seconds'''
+        run = self.tools.setdefault(tool, [0, 0.0, 0.0, 0])
+        run[0] += 1
+        run[1] += wait
+        run[2] += wall
+
+    def add_tool_timeout(self, tool):
+        '''Record that a run of the external program tool was killed
+        because it went over its timeout'''
+        self.tools.setdefault(tool, [0, 0.0, 0.0, 0])[3] += 1
+
+    def merge(self, other):
+        '''Add the statistics in other to these statistics'''
+        for name, values in other.phases.items():
+            phase = self.phases.setdefault(name, [0, 0.0, 0.0])
+            for i, value in enumerate(values):
+                phase[i] += value
+        for name, values in other.parsers.items():
+            parser = self.parsers.setdefault(name, [0, 0, 0.0, 0.0, 0.0, 0.0, 0])
+            for i, value in enumerate(values):
+                parser[i] += value
+        for name, values in other.tools.items():
+            run = self.tools.setdefault(name, [0, 0.0, 0.0, 0])
+            for i, value in enumerate(values):
+                run[i] += value
+
+    def get(self):
+        '''Return the statistics as a dictionary, to store in the scan
+        results. Parsers are sorted by the time spent on failed attempts,
+        most first, external programs by the time spent running them.'''
+        phases = {}
+        for name, (count, wall, cpu) in self.phases.items():
+            phases[name] = {'count': count, 'wall time': wall,
+                            'cpu time': cpu}
+        parsers = {}
+        for name, values in sorted(self.parsers.items(),
+                key=lambda x: x[1][4], reverse=True):
+            attempts, successes, wall, cpu, failedwall, failedcpu, \
+                    timeouts = values
+            parsers[name] = {'attempts': attempts,
+                             'successes': successes,
+                             'failures': attempts - successes,
+                             'timeouts': timeouts,
+                             'wall time': wall,
+                             'cpu time': cpu,
+                             'failed wall time': failedwall,
+                             'failed cpu time': failedcpu,
+                            }
+        tools = {}
+        for name, (runs, wait, wall, timeouts) in sorted(self.tools.items(),
+                key=lambda x: x[1][2], reverse=True):
+            tools[name] = {'runs': runs, 'timeouts': timeouts,
+                           'wait time': wait, 'wall time': wall}
+        return {'phases': phases, 'parsers': parsers, 'tools': tools}
@@ -0,0 +1,168 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# A file that is opened once for a scan job and shared by everything that
+# reads it during the job: the signature search, every unpack parser that
+# is tried and the unpack functions. Without it, every attempt to unpack
+# data at an offset opens the file again.
+
+import io
+import mmap
+import os
+
+from UnpackParser import OffsetInputFile
+
+class SharedInputFile:
+    """An open file, and optionally a read-only memory map of it, that can
+    be borrowed any number of times. Every borrowed file object has its own
+    position, and closing it does not close the shared file.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.infile = open(filename, 'rb')
+        self.map = None
+        self.mapfailed = False
+        # the borrowed file that the position of infile belongs to
+        self.owner = None
+
+    def borrow(self, offset=0, size=None):
+        '''Return a file object for the shared file, positioned at the
+        start. If offset or size are given, an OffsetInputFile for that
+        range of the file is returned.'''
+        borrowed = BorrowedFile(self)
+        borrowed.position = offset
+        if offset == 0 and size is None:
+            return borrowed
+        return OffsetInputFile(borrowed, offset, size)
+
+    def get_mmap(self):
+        '''Return a read-only memory map of the file, or None if the
+        file cannot be mapped (for example empty files and special files).
+        The map is created the first time it is asked for.'''
+        if self.map is None and not self.mapfailed:
+            try:
+                self.map = mmap.mmap(self.infile.fileno(), 0,
+                        access=mmap.ACCESS_READ)
+            except (ValueError, OSError, OverflowError):
+                self.mapfailed = True
+        return self.map
+
+    def reopen(self):
+        '''Open the file again, so data that was read ahead is not used
+        after the file was changed in place. The map, if any, already
+        shows the changes.'''
+        if self.owner is not None:
+            self.owner.position = self.infile.tell()
+            self.owner = None
+        infile = open(self.filename, 'rb')
+        self.infile.close()
+        self.infile = infile
+
+    def close(self):
+        '''Close the map and the file. Any views on the map have to be
+        released first.'''
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.infile.close()
+        self.owner = None
+
+
+class BorrowedFile:
+    """A file object for a SharedInputFile. It reads from the shared file,
+    but remembers its own position, so borrowed file objects can be used at
+    the same time. The shared file is only seeked when another borrowed
+    file object used it last.
+    """
+    def __init__(self, sharedfile):
+        self.sharedfile = sharedfile
+        self.position = 0
+        self.closed = False
+
+    def __getattr__(self, name):
+        return getattr(self.sharedfile.infile, name)
+
+    def _acquire(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if self.sharedfile.owner is not self:
+            owner = self.sharedfile.owner
+            if owner is not None:
+                owner.position = self.sharedfile.infile.tell()
+            self.sharedfile.infile.seek(self.position)
+            self.sharedfile.owner = self
+        return self.sharedfile.infile
+
+    def _release(self):
+        if self.sharedfile.owner is self:
+            self.position = self.sharedfile.infile.tell()
+            self.sharedfile.owner = None
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._acquire().seek(offset, whence)
+
+    def tell(self):
+        return self._acquire().tell()
+
+    def read(self, size=-1):
+        return self._acquire().read(size)
+
+    def readinto(self, b):
+        return self._acquire().readinto(b)
+
+    def readline(self, size=-1):
+        return self._acquire().readline(size)
+
+    def peek(self, size=0):
+        return self._acquire().peek(size)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if line == b'':
+            raise StopIteration
+        return line
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def write(self, b):
+        raise io.UnsupportedOperation('write')
+
+    def close(self):
+        '''Stop using the shared file. The shared file stays open.'''
+        if not self.closed:
+            self._release()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,127 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import re
+
+import bangsignatures
+
+# pyahocorasick is optional: without it every signature is searched
+# for with its own (precompiled) regular expression.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class SignatureMatcher:
+    """Finds all known signatures in a buffer in a single pass.
+
+    The matcher is built once from a dictionary that maps signatures (tuples
+    of the form (offset, bytestring)) to a list of UnpackParsers, as returned
+    by ScanEnvironment.get_unpackparsers_for_signatures(). The bytestrings
+    are put into an Aho-Corasick automaton, so scanning a buffer costs a
+    single pass, independent of the amount of signatures.
+    """
+    def __init__(self, unpackparsers_for_signatures, use_automaton=True):
+        # group the signatures by their bytestring, as several signatures
+        # can share the same bytes at a different offset (example: RIFF
+        # based formats such as WAV and WebP).
+        self.signatures = {}
+        for (s_offset, s_text), unpackparsers in unpackparsers_for_signatures.items():
+            self.signatures.setdefault(s_text, []).append((s_offset, unpackparsers))
+
+        self.maxsignaturelength = max([0] + [ len(x) for x in self.signatures ])
+
+        self.automaton = None
+        self.patterns = {}
+        if use_automaton and ahocorasick is not None and self.signatures != {}:
+            self.automaton = ahocorasick.Automaton()
+            for s_text in self.signatures:
+                # latin-1 maps every byte to the code point with the same
+                # value, so offsets in the string are offsets in the data.
+                self.automaton.add_word(s_text.decode('latin-1'), s_text)
+            self.automaton.make_automaton()
+        else:
+            for s_text in self.signatures:
+                self.patterns[s_text] = re.compile(re.escape(s_text))
+
+    def uses_automaton(self):
+        '''Return whether or not the Aho-Corasick automaton is used'''
+        return self.automaton is not None
+
+    def _find_signature_offsets(self, scanbytes, searchlength):
+        '''Yield tuples (start, bytestring) for every signature in the
+        first searchlength bytes of scanbytes, in no particular order.'''
+        if self.automaton is not None:
+            data = str(scanbytes[:searchlength], 'latin-1')
+            for end, s_text in self.automaton.iter(data):
+                yield (end - len(s_text) + 1, s_text)
+        else:
+            for s_text, pattern in self.patterns.items():
+                for r in pattern.finditer(scanbytes[:searchlength]):
+                    yield (r.start(), s_text)
+
+    def find_offsets(self, scanbytes, bytesread, offsetinfile, filesize,
+            bytesavailable=None, skip=None):
+        '''Return a list of tuples (offset, unpackparser) for all signatures
+        that start in the first bytesread bytes of scanbytes, sorted by
+        offset. offsetinfile is the offset of scanbytes in the file, and the
+        offsets returned are relative to the start of the file.
+
+        bytesavailable is the amount of valid bytes in scanbytes, which can
+        be more than bytesread if scanbytes is a view on a larger buffer
+        (such as a memory mapped file). Signatures that start in the first
+        bytesread bytes but end beyond them are then found as well, and the
+        prescan functions can look at all available bytes. By default only
+        bytesread bytes are available.
+
+        skip is an optional function that is called with the offset in the
+        file and the bytestring of every signature that is found. Signatures
+        for which it returns True are ignored.'''
+        if bytesavailable is None:
+            bytesavailable = bytesread
+        searchlength = min(bytesavailable,
+                bytesread + max(self.maxsignaturelength - 1, 0))
+        candidates = []
+        for start, s_text in self._find_signature_offsets(scanbytes, searchlength):
+            if start >= bytesread:
+                continue
+            if skip is not None and skip(start + offsetinfile, s_text):
+                continue
+            for s_offset, unpackparsers in self.signatures[s_text]:
+                # skip files that aren't big enough if the
+                # signature is not at the start of the data
+                # to be carved (example: ISO9660).
+                if start + offsetinfile - s_offset < 0:
+                    continue
+
+                if not bangsignatures.prescan(s_text, scanbytes, bytesavailable,
+                        filesize, start, offsetinfile):
+                    continue
+
+                for u in unpackparsers:
+                    candidates.append((start + offsetinfile - s_offset, u))
+
+        # remove duplicates. The order of the candidates for the same
+        # offset is the order in which the unpackparsers were registered.
+        candidates = list(dict.fromkeys(candidates))
+        candidates.sort(key=lambda x: x[0])
+        return candidates
@@ -0,0 +1,187 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# Budgets for attempts of unpack parsers. A budget limits the wall clock
+# time, the CPU time and the amount of bytes written to the data unpack
+# directory of a single attempt. The limits are checked by a timer signal
+# that fires every few milliseconds while the attempt runs (the amount of
+# bytes written is checked less often, as it means walking the directory
+# tree), and an attempt that is over its budget is aborted with an
+# UnpackBudgetExceeded exception, which is an UnpackParserException, so
+# the attempt fails like any other attempt that fails.
+#
+# Signals are only delivered to the main thread. Attempts in other threads
+# are only checked for the amount of bytes written, after they finish.
+# CPU time is the CPU time of the scanning process, external programs
+# that are run by an unpack parser are only limited by the wall time.
+
+import contextlib
+import os
+import signal
+import threading
+import time
+
+from UnpackParserException import UnpackParserException
+
+# the limits of a budget, as used in the configuration file
+budgetlimits = ['walltime', 'cputime', 'writtenbytes']
+
+# the interval (in seconds) at which budgets are checked
+budgetcheckinterval = 0.05
+
+# the interval (in seconds) at which the amount of bytes written is checked
+writtenbytescheckinterval = 1.0
+
+class UnpackBudgetExceeded(UnpackParserException):
+    """An attempt of an unpack parser went over one of the limits of
+    its budget.
+    """
+    def __init__(self, limit, value):
+        super().__init__("%s budget exceeded: %s" % (limit, value))
+        self.limit = limit
+
+def directory_size(path):
+    '''Return the total size of the regular files in the directory tree
+    path, or 0 if path does not exist'''
+    size = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    size += directory_size(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return size
+
+class UnpackBudget:
+    """The limits of a single attempt of an unpack parser: wall time and
+    CPU time in seconds and the amount of bytes written. A limit of 0
+    means that there is no limit.
+    """
+    def __init__(self, walltime=0, cputime=0, writtenbytes=0):
+        self.walltime = walltime
+        self.cputime = cputime
+        self.writtenbytes = writtenbytes
+
+    def __repr__(self):
+        return "UnpackBudget(walltime=%r, cputime=%r, writtenbytes=%r)" % (
+                self.walltime, self.cputime, self.writtenbytes)
+
+    def __eq__(self, other):
+        return isinstance(other, UnpackBudget) and \
+                (self.walltime, self.cputime, self.writtenbytes) == \
+                (other.walltime, other.cputime, other.writtenbytes)
+
+    def is_limited(self):
+        '''Return whether or not any of the limits is set'''
+        return self.walltime > 0 or self.cputime > 0 or self.writtenbytes > 0
+
+    def updated(self, **limits):
+        '''Return a copy of this budget, with the limits in limits
+        replaced'''
+        budget = UnpackBudget(self.walltime, self.cputime, self.writtenbytes)
+        for limit, value in limits.items():
+            if limit not in budgetlimits:
+                raise ValueError("unknown budget limit %s" % limit)
+            setattr(budget, limit, value)
+        return budget
+
+    def check(self, start, outputdirectory):
+        '''Raise UnpackBudgetExceeded if an attempt that started at start
+        (a tuple of perf_counter() and process_time()) and that writes to
+        outputdirectory is over budget'''
+        self.check_time(start)
+        self.check_written_bytes(outputdirectory)
+
+    def check_time(self, start):
+        '''Raise UnpackBudgetExceeded if an attempt that started at start
+        (a tuple of perf_counter() and process_time()) is over its wall
+        time or CPU time budget'''
+        if self.walltime > 0:
+            wall = time.perf_counter() - start[0]
+            if wall > self.walltime:
+                raise UnpackBudgetExceeded('walltime', "%.2fs" % wall)
+        if self.cputime > 0:
+            cpu = time.process_time() - start[1]
+            if cpu > self.cputime:
+                raise UnpackBudgetExceeded('cputime', "%.2fs" % cpu)
+
+    def check_written_bytes(self, outputdirectory):
+        '''Raise UnpackBudgetExceeded if more bytes were written to
+        outputdirectory than the budget allows'''
+        if self.writtenbytes > 0:
+            size = directory_size(outputdirectory)
+            if size > self.writtenbytes:
+                raise UnpackBudgetExceeded('writtenbytes', "%d bytes" % size)
+
+    @contextlib.contextmanager
+    def enforce(self, outputdirectory):
+        '''Abort the code in the with block with UnpackBudgetExceeded if it
+        goes over budget. outputdirectory is the directory that the
+        attempt writes to. The exception is raised once, when the budget
+        is exceeded, so that cleanup code of the unpack parser is not
+        interrupted, and again when the block ends, so that an unpack
+        parser that catches all exceptions cannot continue or fail in
+        another way.'''
+        if not self.is_limited():
+            yield
+            return
+        start = (time.perf_counter(), time.process_time())
+        # some unpack functions change the working directory while
+        # unpacking, and do not change it back if they are aborted
+        cwd = os.getcwd()
+        exceeded = []
+        writtenbyteschecked = [start[0]]
+
+        def check_budget(signum, frame):
+            if exceeded:
+                return
+            try:
+                self.check_time(start)
+                now = time.perf_counter()
+                if now - writtenbyteschecked[0] >= writtenbytescheckinterval:
+                    writtenbyteschecked[0] = now
+                    self.check_written_bytes(outputdirectory)
+            except UnpackBudgetExceeded as e:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                exceeded.append(e)
+                raise
+
+        usetimer = threading.current_thread() is threading.main_thread()
+        if usetimer:
+            previoushandler = signal.signal(signal.SIGALRM, check_budget)
+            signal.setitimer(signal.ITIMER_REAL, budgetcheckinterval,
+                    budgetcheckinterval)
+        try:
+            yield
+        finally:
+            if usetimer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previoushandler)
+            # also replaces any other exception that the unpack parser
+            # raised after catching UnpackBudgetExceeded
+            if exceeded:
+                os.chdir(cwd)
+                raise exceeded[0]
+        # the last bytes might have been written after the last check
+        self.check_written_bytes(outputdirectory)
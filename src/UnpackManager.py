@@ -22,15 +22,30 @@
 
 import re
 import os
+import mmap
 import shutil
 import stat
 import pathlib
 
+import bangpadding
 import bangsignatures
 from bangsignatures import maxsignaturesoffset
 
+from RangeSet import RangeSet
+from UnpackParser import OffsetInputFile
 from UnpackParserException import UnpackParserException
 
+# the amount of bytes that are searched for signatures at once when
+# the file is memory mapped. The window is a view on the mapping, so
+# it can be much larger than the chunks that are read into memory.
+mmapwindowsize = 16 * 1024 * 1024
+
+# signatures shorter than this are easily found by chance in compressed
+# or encrypted data, and are skipped in blocks with a high entropy (in
+# bits per byte) if the scan policy to do so is used.
+weaksignaturelength = 4
+highentropy = 7.95
+
 class UnpackManager:
     """The UnpackManager manages the unpacking (analysis and extraction) of a
     file."""
@@ -42,12 +57,19 @@ class UnpackManager:
         # last known position in file with successfully unpacked data
         # everything before this offset is unpacked and identified.
         self.lastunpackedoffset = -1
-        self.unpackedrange = []
+        self.unpackedrange = RangeSet()
         self.needsunpacking = True
         # signature based unpacking?
         self.signaturesfound = []
         self.counterspersignature = {}
         self.unpackroot = unpackroot
+        self.scanmap = None
+        self.sharedscanmap = False
+        self.entropyprofile = None
+        self.skippedsignatures = 0
+        self.skippadding = False
+        self.holes = []
+        self.paddingranges = []
 
     def needs_unpacking(self):
         ''' Return whether or not a file needs further unpacking'''
@@ -58,8 +80,14 @@ class UnpackManager:
         return self.lastunpackedoffset
 
     def unpacked_range(self):
-        '''Return a list of byte ranges of unpacked data'''
-        return self.unpackedrange
+        '''Return a sorted list of byte ranges of unpacked data, in which
+        overlapping and adjacent ranges are merged'''
+        return self.unpackedrange.ranges()
+
+    def unpacked_gaps(self, low, high):
+        '''Return a sorted list of the byte ranges in [low, high) that
+        were not unpacked'''
+        return self.unpackedrange.gaps(low, high)
 
     def set_last_unpacked_offset(self, offset):
         '''Set the offset of the last successfully unpacked data'''
@@ -70,43 +98,77 @@ class UnpackManager:
         self.needsunpacking = needsunpacking
 
     def append_unpacked_range(self, low, high):
-        '''Add a byte range of unpacked data to a list'''
-        self.unpackedrange.append((low, high))
+        '''Add a byte range of unpacked data'''
+        self.unpackedrange.add(low, high)
+
+    def set_skip_padding(self, skippadding):
+        '''Set whether or not holes and long runs of padding are skipped
+        when searching for signatures. This has to be set before the file
+        is opened.'''
+        self.skippadding = skippadding
+
+    def padding_ranges(self):
+        '''Return a list of (start, end, paddingbyte) tuples of the runs
+        of padding that were skipped'''
+        return self.paddingranges
+
+    def add_padding_ranges(self):
+        '''Add the parts of the skipped runs of padding that do not
+        overlap with unpacked data to the unpacked ranges and return them
+        as a list of (start, end, paddingbyte) tuples.'''
+        added = []
+        for start, end, paddingbyte in self.paddingranges:
+            for low, high in self.unpackedrange.gaps(start, end):
+                added.append((low, high, paddingbyte))
+        for start, end, paddingbyte in added:
+            self.unpackedrange.add(start, end)
+        return added
 
     def make_data_unpack_directory(self, relpath, filetype, offset, seqnr=1):
-        '''Makes a data unpack directory.
+        '''Sets the name of the data unpack directory. The directory itself
+        is only created when something is unpacked into it (see
+        UnpackParser.make_unpack_directory()), so nothing is created for
+        attempts that fail.
         relpath is the relative path to the file that is unpacked. For files
             that do not have an unpack parent, this path is absolute.
         filetype is the type of the file.
         offset is the offset in the file from which we extract (used in the
         data unpack directory name)
         seqnr is a sequence number that will be increased
-        if the directory with that nr already exists.
+        if something else than a directory with that nr already exists.
         returns the sequence number of the directory
         '''
         while True:
             dirname = "%s-%#010x-%s-%d" % (relpath.name, offset, filetype, seqnr)
             dirpath = relpath.parent / dirname
             try:
-                os.makedirs(self.unpackroot / dirpath, exist_ok=True)
-                self.dataunpackdirectory = dirpath
+                if stat.S_ISDIR(os.lstat(self.unpackroot / dirpath).st_mode):
+                    break
+            except FileNotFoundError:
                 break
-            except FileExistsError:
-                seqnr += 1
+            seqnr += 1
+        self.dataunpackdirectory = dirpath
         return seqnr
 
     def remove_data_unpack_directory(self):
-        '''Remove the unpacking directory'''
-        if not (self.unpackroot / self.dataunpackdirectory).exists():
-            return
-        os.rmdir(os.path.join(self.unpackroot, self.dataunpackdirectory))
+        '''Remove the unpacking directory, if it was created'''
+        try:
+            os.rmdir(self.unpackroot / self.dataunpackdirectory)
+        except FileNotFoundError:
+            pass
 
     def remove_data_unpack_directory_tree(self):
         '''Remove the unpacking directory, including any
         data that might accidentily have been left behind.'''
-        # TODO: use exception
-        if not (self.unpackroot / self.dataunpackdirectory).exists():
+        # most attempts that fail did not create the directory, or
+        # did not write anything in it.
+        try:
+            os.rmdir(self.unpackroot / self.dataunpackdirectory)
             return
+        except FileNotFoundError:
+            return
+        except OSError:
+            pass
         # dirwalk = os.walk(os.path.join(self.unpackroot, self.dataunpackdirectory))
         dirwalk = os.walk(self.unpackroot / self.dataunpackdirectory)
         for direntries in dirwalk:
@@ -132,20 +194,27 @@ class UnpackManager:
     def try_unpack_file_for_extension(self, fileresult, scanenvironment,
             extension, unpackparser):
         """tries to unpack the file in fileresult with unpackparser after
-        it matched by extension.
+        it matched by extension. The attempt is aborted with
+        UnpackBudgetExceeded if it goes over the budget of unpackparser.
         """
         self.make_data_unpack_directory(fileresult.get_unpack_directory_parent(), unpackparser.pretty_name, 0)
         up = unpackparser(fileresult, scanenvironment, self.dataunpackdirectory,
                 0)
+        # an attempt that fails can leave the working directory anywhere,
+        # for example in an unpack directory that is removed afterwards
+        cwd = os.getcwd()
         up.open()
         try:
-            unpackresult = up.parse_and_unpack()
-            if unpackresult.get_length() != fileresult.filesize:
-                up.carve()
+            with scanenvironment.get_unpack_budget(unpackparser).enforce(
+                    self.unpackroot / self.dataunpackdirectory):
+                unpackresult = up.parse_and_unpack()
+                if unpackresult.get_length() != fileresult.filesize:
+                    up.carve()
         except UnpackParserException as e:
             raise e
         finally:
             up.close()
+            os.chdir(cwd)
 
         return unpackresult
 
@@ -154,48 +223,243 @@ class UnpackManager:
         if filename.stat().st_mode &  stat.S_IRUSR != stat.S_IRUSR:
             filename.chmod(stat.S_IRUSR)
         self.scanfile = open(filename, 'rb')
-
-    def open_scanfile_with_memoryview(self, filename, maxbytes):
-        '''Open the file using a memory view to reduce I/O'''
-        if filename.stat().st_mode &  stat.S_IRUSR != stat.S_IRUSR:
-            filename.chmod(stat.S_IRUSR)
-        self.scanfile = open(filename, 'rb')
+        self.scanmap = None
+
+    def open_scanfile_with_memoryview(self, filename, maxbytes, offset=0,
+            size=None, sharedfile=None):
+        '''Open the file using a memory view to reduce I/O. If size is
+        given, only the size bytes at offset are scanned, as if they were
+        a file of their own. If sharedfile is given, that SharedInputFile
+        is borrowed instead of opening the file again.'''
+        if sharedfile is not None:
+            self.scanfile = OffsetInputFile(sharedfile.borrow(), offset, size)
+        else:
+            if filename.stat().st_mode &  stat.S_IRUSR != stat.S_IRUSR:
+                filename.chmod(stat.S_IRUSR)
+            self.scanfile = OffsetInputFile(open(filename, 'rb'), offset, size)
+        self.scanfile.seek(0)
+        self.scanmap = None
         self.scanbytesarray = bytearray(maxbytes)
         self.scanbytes = memoryview(self.scanbytesarray)
+        if size is None:
+            size = filename.stat().st_size - offset
+        self.scansize = size
+        if self.skippadding:
+            self.holes = bangpadding.find_holes(filename, offset, size)
+
+    def open_scanfile_with_mmap(self, filename, windowsize=mmapwindowsize,
+            offset=0, size=None, sharedfile=None):
+        '''Open the file and map it into memory. Chunks are then views on
+        the mapped file instead of copies. If size is given, only the size
+        bytes at offset are scanned. Returns False if the file cannot
+        be mapped (for example special files), in which case the file is
+        not opened. If sharedfile is given, the file and the map of that
+        SharedInputFile are borrowed instead.'''
+        if sharedfile is not None:
+            self.scanmap = sharedfile.get_mmap()
+            if self.scanmap is None:
+                return False
+            self.scanfile = sharedfile.borrow()
+            self.sharedscanmap = True
+        else:
+            if filename.stat().st_mode &  stat.S_IRUSR != stat.S_IRUSR:
+                filename.chmod(stat.S_IRUSR)
+            scanfile = open(filename, 'rb')
+            try:
+                self.scanmap = mmap.mmap(scanfile.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError, OverflowError):
+                scanfile.close()
+                return False
+            self.scanfile = scanfile
+            self.sharedscanmap = False
+        self.scanmapview = memoryview(self.scanmap)
+        if size is None:
+            size = len(self.scanmap) - offset
+        self.scanview = self.scanmapview[offset:offset+size]
+        self.scanbytes = self.scanview
+        self.scanposition = 0
+        self.scanoffset = offset
+        self.scansize = size
+        self.windowsize = windowsize
+        if self.skippadding:
+            self.holes = bangpadding.find_holes(filename, offset, size)
+        return True
 
     def seek_to(self, pos):
         '''Seek to the desired position in the file'''
-        self.scanfile.seek(pos)
+        if self.scanmap is not None:
+            self.scanposition = pos
+        else:
+            self.scanfile.seek(pos)
 
     def seek_to_last_unpacked_offset(self):
         '''Seek to the position of the data that
         was unpacked successfully last'''
-        self.scanfile.seek(max(self.last_unpacked_offset(), 0))
+        self.seek_to(max(self.last_unpacked_offset(), 0))
 
     def get_current_offset_in_file(self):
         '''Return the current position in the file'''
+        if self.scanmap is not None:
+            return self.scanposition
         return self.scanfile.tell()
 
     def read_chunk_from_scanfile(self):
         self.offsetinfile = self.get_current_offset_in_file()
-        self.bytesread = self.scanfile.readinto(self.scanbytesarray)
+        if self.scanmap is not None:
+            # the chunk is a view of everything up to the end of the
+            # file, of which only the window is searched for signatures.
+            self.scanbytes = self.scanview[self.offsetinfile:]
+            self.bytesavailable = len(self.scanbytes)
+            self.bytesread = min(self.windowsize, self.bytesavailable)
+            self.scanposition += self.bytesread
+        else:
+            self.bytesread = self.scanfile.readinto(self.scanbytesarray)
+            self.bytesavailable = self.bytesread
+        if self.skippadding:
+            self.skip_padding_in_chunk()
+
+    def _read_at(self, pos, length):
+        '''Return at most length bytes at pos, without changing the
+        position in the file'''
+        if self.scanmap is not None:
+            return self.scanview[pos:pos+length]
+        return os.pread(self.scanfile.fileno(), min(length, self.scansize - pos),
+                self.scanfile.offset + pos)
+
+    def _find_padding_start(self, start, end):
+        '''Return the position and the padding byte of the first block of
+        padding that starts between start and end, or (None, None)'''
+        found = (None, None)
+        for holestart, holeend in self.holes:
+            if holeend > start and holestart < end:
+                found = (max(holestart, start), b'\x00')
+                end = found[0]
+                break
+        for paddingbyte in bangpadding.paddingbytes:
+            block = bangpadding.padding_block(paddingbyte)
+            if self.scanmap is not None:
+                pos = self.scanmap.find(block, self.scanoffset + start,
+                        self.scanoffset + end)
+                if pos != -1:
+                    pos -= self.scanoffset
+            else:
+                pos = self.scanbytesarray.find(block, start - self.offsetinfile,
+                        end - self.offsetinfile)
+                if pos != -1:
+                    pos += self.offsetinfile
+            if pos != -1:
+                found = (pos, paddingbyte)
+                # the other padding byte only has to be searched for
+                # before this block.
+                end = pos
+        return found
+
+    def _find_padding_end(self, pos, paddingbyte):
+        '''Return the end of the run of padding bytes that starts at pos'''
+        while pos < self.scansize:
+            if paddingbyte == b'\x00':
+                inhole = False
+                for holestart, holeend in self.holes:
+                    if holestart <= pos < holeend:
+                        pos = holeend
+                        inhole = True
+                        break
+                if inhole:
+                    continue
+            data = self._read_at(pos, bangpadding.piecesize)
+            length = bangpadding.padding_length(data, paddingbyte)
+            pos += length
+            if length < len(data) or length == 0:
+                break
+        return min(pos, self.scansize)
+
+    def skip_padding_in_chunk(self):
+        '''Find the first run of padding of at least
+        bangpadding.minimumlength bytes that starts in the current chunk.
+        The chunk is shortened to end where the run starts and the file
+        position is moved to the end of the run, so the run is not searched
+        for signatures. Runs in holes of sparse files are not read at all,
+        other runs are compared with padding in large pieces.'''
+        start = self.offsetinfile
+        end = self.offsetinfile + self.bytesread
+        while start < end:
+            runstart, paddingbyte = self._find_padding_start(start, end)
+            if runstart is None:
+                return
+            runend = self._find_padding_end(runstart, paddingbyte)
+            if runend - runstart >= bangpadding.minimumlength:
+                self.paddingranges.append((runstart, runend, paddingbyte))
+                self.bytesread = runstart - self.offsetinfile
+                self.seek_to(runend)
+                return
+            start = max(runend, runstart + 1)
 
     def close_scanfile(self):
         '''Close the file'''
+        if self.scanmap is not None:
+            # all views have to be released before the mapping can be closed
+            self.scanbytes.release()
+            self.scanview.release()
+            self.scanmapview.release()
+            if not self.sharedscanmap:
+                self.scanmap.close()
+            self.scanmap = None
         self.scanfile.close()
 
     def seek_to_find_next_signature(self):
-        if self.scanfile.tell() < self.lastunpackedoffset:
+        currentoffset = self.get_current_offset_in_file()
+        nextoffset = self.unpackedrange.next_gap(currentoffset)
+        if nextoffset > currentoffset:
             # skip data that has already been unpacked
-            self.scanfile.seek(self.lastunpackedoffset)
-        else:
-            # use an overlap, i.e. go back
+            self.seek_to(nextoffset)
+        elif self.scanmap is None and not (self.paddingranges != [] and
+                self.paddingranges[-1][1] == self.get_current_offset_in_file()):
+            # use an overlap, i.e. go back. This is not needed for mapped
+            # files, where signatures that cross the end of the window are
+            # found as the bytes after the window are available, or after
+            # a run of padding that was skipped.
             self.scanfile.seek(-maxsignaturesoffset, 1)
 
+    def set_entropy_profile(self, blocksize, profile):
+        '''Skip weak signatures in the blocks of blocksize bytes that have a
+        high entropy according to profile (a list with the entropy of every
+        block, as computed by EntropyComputer).'''
+        self.entropyblocksize = blocksize
+        self.entropyprofile = profile
+
+    def skip_weak_signature(self, offset, signature):
+        '''Return whether or not a signature found at offset should be
+        skipped, because it is short and in a block with a high entropy.
+        Blocks that overlap with unpacked data are never skipped, as the
+        entropy could come from that data.'''
+        if len(signature) >= weaksignaturelength:
+            return False
+        block = offset // self.entropyblocksize
+        if block >= len(self.entropyprofile) or \
+                self.entropyprofile[block] < highentropy:
+            return False
+        blockstart = block * self.entropyblocksize
+        blockend = blockstart + self.entropyblocksize
+        if self.unpackedrange.overlaps(blockstart, blockend):
+            return False
+        self.skippedsignatures += 1
+        return True
+
+    def find_offsets_for_signatures(self, signaturematcher, filesize):
+        '''Return a list of (offset, unpackparser) tuples for all signatures
+        in the current chunk, sorted by offset.'''
+        skip = None
+        if self.entropyprofile is not None:
+            skip = self.skip_weak_signature
+        return signaturematcher.find_offsets(self.scanbytes, self.bytesread,
+                self.offsetinfile, filesize, self.bytesavailable, skip)
+
     def find_offsets_for_signature(self, sig, unpackparsers, filesize):
+        '''Return a set of (offset, unpackparser) tuples for a single
+        signature in the current chunk. Searching for many signatures
+        is faster with find_offsets_for_signatures.'''
         offsets = set()
         s_offset, s_text = sig
-        # TODO: precompile regexp patterns in bangsignatures
         res = re.finditer(re.escape(s_text), self.scanbytes[:self.bytesread])
         if res is not None:
             for r in res:
@@ -215,36 +479,48 @@ class UnpackManager:
         return offsets
 
     def offset_overlaps_with_unpacked_data(self, offset):
-        return offset < self.lastunpackedoffset
+        '''Return whether or not offset is in data that was unpacked. Data
+        that was not unpacked before the last unpacked offset is still
+        searched, so formats with a signature far from their start (such
+        as ISO9660 and ext2) are not missed.'''
+        return offset in self.unpackedrange
 
     def try_unpack_file_for_signatures(self, fileresult, scanenvironment,
             unpackparser, offset):
         up = unpackparser(fileresult, scanenvironment, self.dataunpackdirectory,
                 offset)
+        cwd = os.getcwd()
         up.open()
         try:
-            unpackresult = up.parse_and_unpack()
-            if unpackresult.get_length() != fileresult.filesize:
-                up.carve()
+            with scanenvironment.get_unpack_budget(unpackparser).enforce(
+                    self.unpackroot / self.dataunpackdirectory):
+                unpackresult = up.parse_and_unpack()
+                if unpackresult.get_length() != fileresult.filesize:
+                    up.carve()
         except UnpackParserException as e:
             raise e
         finally:
             up.close()
+            os.chdir(cwd)
         return unpackresult
 
     def try_unpack_without_features(self, fileresult, scanenvironment, unpackparser,  offset):
         up = unpackparser(fileresult, scanenvironment, self.dataunpackdirectory,
                 0)
+        cwd = os.getcwd()
         up.open()
         try:
-            unpackresult = up.parse_and_unpack()
-            if unpackresult.get_length() != fileresult.filesize:
-                # TODO: let up generate name
-                up.carve()
+            with scanenvironment.get_unpack_budget(unpackparser).enforce(
+                    self.unpackroot / self.dataunpackdirectory):
+                unpackresult = up.parse_and_unpack()
+                if unpackresult.get_length() != fileresult.filesize:
+                    # TODO: let up generate name
+                    up.carve()
         except UnpackParserException as e:
             raise e
         finally:
             up.close()
+            os.chdir(cwd)
         return unpackresult
 
     def file_unpacked(self, unpackresult, filesize):
@@ -253,7 +529,7 @@ class UnpackManager:
         self.lastunpackedoffset = unpackresult.get_length()
 
         # store the range of the unpacked data
-        self.unpackedrange.append((0, unpackresult.get_length()))
+        self.unpackedrange.add(0, unpackresult.get_length())
 
         # if unpackedfilesandlabels is empty, then no files
         # were unpacked likely because the whole file was the
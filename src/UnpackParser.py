@@ -1,28 +1,213 @@
+import functools
+import io
 import os
+import pathlib
+import struct
 
 from UnpackParserException import UnpackParserException
 from UnpackResults import UnpackResults
 from FileResult import FileResult
 
-import os
-import pathlib
-
 class OffsetInputFile:
-    def __init__(self, infile, offset):
+    """Wraps a file object so that offset in the file appears as the start
+    of the file. If size is given, the file appears to end size bytes after
+    offset, so a range of a larger file can be read as if it were a file of
+    its own. Otherwise it ends where the file ends. Data outside of the
+    range cannot be read.
+
+    Parsers do many small reads, so data is read in blocks of buffersize
+    bytes and small reads are served from the block. Reads use os.pread, so
+    the position of the wrapped file object is neither used nor changed.
+    readinto() reads data that is not in the block directly into the
+    buffer that is passed, and read_view() returns a memoryview on the
+    block instead of a copy. read_struct() and unpack_from() unpack data
+    with the struct module.
+    """
+    buffersize = 65536
+
+    def __init__(self, infile, offset, size=None):
         self.infile = infile
-        self.offset = offset
+        try:
+            infile.fileno()
+            self._usepread = True
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            self._usepread = False
+        if size is None:
+            if self._usepread:
+                size = os.fstat(infile.fileno()).st_size - offset
+            else:
+                size = infile.seek(0, os.SEEK_END) - offset
+        # all positions are absolute positions in infile. The block
+        # is always inside of the range.
+        self._offset = offset
+        self._size = size
+        self._end = offset + size
+        self._position = offset
+        self._discard_block()
 
     def __getattr__(self, name):
-        return self.infile.__getattribute__(name)
+        return getattr(self.infile, name)
+
+    # the range can be changed, for example to start where a parser starts
+    @property
+    def offset(self):
+        return self._offset
+
+    @offset.setter
+    def offset(self, offset):
+        self._offset = offset
+        self._end = offset + self._size
+        self._discard_block()
+
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        self._size = size
+        self._end = self._offset + size
+        self._discard_block()
+
+    def _discard_block(self):
+        self._block = b''
+        self._blockstart = 0
+        self._blockend = 0
+
+    def _remaining(self):
+        return max(self._end - self._position, 0)
+
+    def _pread(self, size, position):
+        if self._usepread:
+            return os.pread(self.infile.fileno(), size, position)
+        self.infile.seek(position)
+        return self.infile.read(size)
+
+    def _preadinto(self, view, position):
+        if not self._usepread:
+            self.infile.seek(position)
+            return self.infile.readinto(view)
+        fd = self.infile.fileno()
+        bytesread = 0
+        while bytesread < len(view):
+            n = os.preadv(fd, [view[bytesread:]], position + bytesread)
+            if n == 0:
+                break
+            bytesread += n
+        return bytesread
+
+    def _fill(self, size):
+        '''Make sure that the block holds size bytes (or what is left of
+        the range) at the position. Returns the index of the position in
+        the block.'''
+        position = self._position
+        if position < self._blockstart or position + size > self._blockend:
+            self._block = self._pread(min(max(size, self.buffersize),
+                self._remaining()), position)
+            self._blockstart = position
+            self._blockend = position + len(self._block)
+        return position - self._blockstart
 
     def seek(self, offset, whence=os.SEEK_SET):
         if whence == os.SEEK_SET:
-            return self.infile.seek(offset + self.offset, whence)
-        return self.infile.seek(offset, whence)
+            position = self._offset + offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self._end + offset
+        else:
+            raise ValueError("invalid whence (%r)" % whence)
+        if position < self._offset:
+            raise ValueError("negative seek position %d" % (position - self._offset))
+        self._position = position
+        return position - self._offset
 
     def tell(self):
-        return self.infile.tell() - self.offset
+        return self._position - self._offset
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        position = self._position
+        end = position + size
+        if size >= 0 and end <= self._blockend and position >= self._blockstart:
+            # the data is in the block
+            self._position = end
+            return self._block[position - self._blockstart:end - self._blockstart]
+        remaining = self._remaining()
+        if size < 0 or size > remaining:
+            size = remaining
+        if size == 0:
+            return b''
+        if size >= self.buffersize:
+            data = self._pread(size, position)
+            # very large reads can return less than asked for
+            while 0 < len(data) < size:
+                more = self._pread(size - len(data), position + len(data))
+                if more == b'':
+                    break
+                data += more
+        else:
+            index = self._fill(size)
+            data = self._block[index:index+size]
+        self._position += len(data)
+        return data
 
+    def read_view(self, size):
+        '''Read at most size bytes and return them as a memoryview. The
+        view refers to the block that was read, and stays valid.'''
+        size = min(size, self._remaining())
+        index = self._fill(size)
+        view = memoryview(self._block)[index:index+size]
+        self._position += len(view)
+        return view
+
+    def readinto(self, b):
+        with memoryview(b) as view:
+            view = view.cast('B')
+            size = min(len(view), self._remaining())
+            position = self._position
+            if position >= self._blockstart and position + size <= self._blockend:
+                index = position - self._blockstart
+                view[:size] = self._block[index:index+size]
+                bytesread = size
+            else:
+                bytesread = self._preadinto(view[:size], position)
+        self._position += bytesread
+        return bytesread
+
+    def read_struct(self, fmt):
+        '''Read and unpack the data for fmt, a struct format string or a
+        struct.Struct. Raises EOFError if the range ends before that.'''
+        s = _get_struct(fmt) if isinstance(fmt, str) else fmt
+        if s.size > self._remaining():
+            raise EOFError("requested %d bytes, but only %d bytes available" %
+                    (s.size, self._remaining()))
+        index = self._fill(s.size)
+        self._position += s.size
+        return s.unpack_from(self._block, index)
+
+    def unpack_from(self, fmt, offset):
+        '''Unpack the data for fmt at offset, without changing the
+        position. Raises EOFError if the range ends before that.'''
+        position = self._position
+        self.seek(offset)
+        try:
+            return self.read_struct(fmt)
+        finally:
+            self._position = position
+
+    def close(self):
+        self._discard_block()
+        self.infile.close()
+
+_get_struct = functools.lru_cache(maxsize=256)(struct.Struct)
 
 
 class UnpackParser:
@@ -81,10 +266,10 @@ class UnpackParser:
         self.calculate_unpacked_size()
         check_condition(self.unpacked_size > 0, 'Parser resulted in zero length file')
     def open(self):
-        filename_full = self.scan_environment.get_unpack_path_for_fileresult(
-                    self.fileresult)
-        f = filename_full.open('rb')
-        self.infile = OffsetInputFile(f, self.offset)
+        self.infile = self.scan_environment.open_fileresult(self.fileresult)
+        self.infile.offset += self.offset
+        if self.infile.size is not None:
+            self.infile.size -= self.offset
     def close(self):
         self.infile.close()
     def calculate_unpacked_size(self):
@@ -108,10 +293,19 @@ class UnpackParser:
         self.parse_from_offset()
         self.unpack_results.set_length(self.unpacked_size)
         self.set_metadata_and_labels()
+        self.make_unpack_directory()
         unpacked_files = self.unpack()
         self.unpack_results.set_unpacked_files(unpacked_files)
         return self.unpack_results
 
+    def make_unpack_directory(self):
+        """Create the directory that files are unpacked to, if it does not
+        exist yet. This is done after the data was parsed, so no directory
+        is created for data that cannot be parsed.
+        """
+        os.makedirs(self.scan_environment.unpack_path(self.rel_unpack_dir),
+                exist_ok=True)
+
     @classmethod
     def get_carved_filename(cls):
         """Override this to change the name of the unpacked file if it is
@@ -123,19 +317,27 @@ class UnpackParser:
         """If the UnpackParser recognizes data but there is still data left in
         the file, this method saves the parsed part of the file, leaving the
         rest to be  analyzed. The part is saved to the unpack data directory,
-        under the name given by get_carved_filename.
+        under the name given by get_carved_filename. With virtual carving,
+        only the range of the part in the backing file is recorded.
         """
         rel_output_path = self.rel_unpack_dir / self.get_carved_filename()
-        abs_output_path = self.scan_environment.unpack_path(rel_output_path)
-        os.makedirs(abs_output_path.parent, exist_ok=True)
-        outfile = open(abs_output_path, 'wb')
-        # Although self.infile is an OffsetInputFile, fileno() will give the file
-        # descriptor of the backing file. Therefore, we need to specify self.offset here
-        os.sendfile(outfile.fileno(), self.infile.fileno(), self.offset, self.unpacked_size)
-        outfile.close()
         self.unpack_results.add_label('unpacked')
         out_labels = self.unpack_results.get_labels() + ['unpacked']
         fr = FileResult(self.fileresult, rel_output_path, set(out_labels))
+        if self.scan_environment.get_virtualcarving():
+            # only remember where the data is, it is written to disk
+            # when a real file is needed.
+            backing, backing_offset = self.fileresult.get_backing()
+            fr.set_slice(backing, backing_offset + self.offset,
+                    self.unpacked_size)
+        else:
+            abs_output_path = self.scan_environment.unpack_path(rel_output_path)
+            os.makedirs(abs_output_path.parent, exist_ok=True)
+            outfile = open(abs_output_path, 'wb')
+            # Although self.infile is an OffsetInputFile, fileno() will give the file
+            # descriptor of the backing file. Therefore, we need to specify its offset here
+            os.sendfile(outfile.fileno(), self.infile.fileno(), self.infile.offset, self.unpacked_size)
+            outfile.close()
         self.unpack_results.add_unpacked_file( fr )
     def set_metadata_and_labels(self):
         """Override this method to set metadata and labels."""
@@ -171,6 +373,11 @@ class WrappedUnpackParser(UnpackParser):
     To wrap an unpack function, derive a class from WrappedUnpackParser and
     override the method unpack_function.
     """
+    # Set this to True if the unpack function creates the unpack directory
+    # before it writes anything in it. Otherwise, the directory is created
+    # before the unpack function is called.
+    creates_unpack_directory = False
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         """Override this method to call the unpack function and return the
         result, e.g.:
@@ -181,10 +388,18 @@ class WrappedUnpackParser(UnpackParser):
         """
         raise UnpackParserException("%s: must call unpack function" % self.__class__.__name__)
     def parse_and_unpack(self):
+        # the unpack functions need the data in a file of its own. It is
+        # written once for all unpack functions that are tried on the
+        # data, and is removed at the end of the scan job if nothing
+        # could be unpacked.
+        if not self.creates_unpack_directory:
+            self.make_unpack_directory()
+        self.scan_environment.materialize(self.fileresult, keep=False)
         r = self.unpack_function(self.fileresult, self.scan_environment,
                 self.offset, self.rel_unpack_dir)
         if r['status'] is False:
             raise UnpackParserException(r.get('error'))
+        self.scan_environment.materialize(self.fileresult)
         return self.get_unpack_results_from_dictionary(r)
     def open(self):
         pass
@@ -207,7 +207,7 @@ def unpack_android_sparse_data(fileresult, scanenvironment, offset, unpackdir):
     targetfile.seek(0)
 
     # open the source file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     checkfile.seek(0)
 
@@ -255,7 +255,7 @@ def unpack_android_backup(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # skip over the offset
     checkfile.seek(offset+15)
@@ -390,7 +390,7 @@ def unpack_dex(
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip over the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -1119,7 +1119,7 @@ def unpack_odex(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip over the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -1273,7 +1273,7 @@ def unpack_android_resource(fileresult, scanenvironment, offset, unpackdir):
     # * XML (Android's "binary XML") (0x0003)
     # In ResourceTypes.h this part is the resChunk_header
     # Only the table type is currently supported.
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(2)
     if len(checkbytes) != 2:
@@ -1816,7 +1816,7 @@ def unpack_android_tzdata(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(8)
     if checkbytes != b'tzdata20':
@@ -2042,7 +2042,7 @@ def unpack_avb(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -2260,7 +2260,7 @@ def unpack_android_boot_msm(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize += 8
 
@@ -2389,7 +2389,7 @@ def unpack_android_boot_img(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize += 8
 
@@ -2660,7 +2660,7 @@ def unpack_nb0(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # first four bytes are the number of headers
@@ -2764,7 +2764,7 @@ def unpack_dhtb(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and jump to the offset of the payload size
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 48)
 
     checkbytes = checkfile.read(4)
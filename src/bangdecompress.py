@@ -0,0 +1,580 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# Helper functions and classes to decompress streams of compressed data
+# (gzip, bzip2, LZMA, XZ, lzip, LZ4, zstd, snappy, LZO) with bounded
+# output. Decompressed data is produced in chunks of at most chunksize
+# bytes (using max_length) and written to a BoundedOutput, which aborts the
+# decompression with DecompressionLimitExceeded as soon as the output is
+# larger than the maximum decompressed size, or expands the compressed
+# data more than the maximum ratio, before anything over the limit is
+# written. This stops decompression bombs and false positives that
+# decompress to endless garbage from filling the disk.
+#
+# The decompressors have the interface of bz2.BZ2Decompressor and
+# lzma.LZMADecompressor (decompress(data, max_length), eof, needs_input
+# and unused_data). ZlibDecompressor and LZ4FrameDecompressor provide
+# this interface for zlib and LZ4 frames.
+#
+# Formats that consist of separately compressed blocks (LZ4 legacy,
+# lzop) are parsed by the unpackers themselves, which only need a
+# function to decompress a single block: lz4.block.decompress() and
+# lzo1x_decompress().
+#
+# Unix compress (LZW) data has no end marker and is decompressed in one
+# go by decompress_lzw(), which reads from a file and writes to a
+# BoundedOutput itself.
+
+import os
+import subprocess
+import threading
+import zlib
+
+import lz4.frame
+
+# zstandard is in the requirements, but on systems that do not package
+# it zstd frames are decompressed by the zstd program.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# python-lzo is optional: without it LZO1X blocks are decompressed by
+# lzo1x_decompress_python(), which is a lot slower.
+try:
+    import lzo
+except ImportError:
+    lzo = None
+
+# the maximum amount of decompressed data that is produced at once
+chunksize = 1024 * 1024
+
+# the amount of compressed data that is given to a decompressor at once.
+# This is kept small, as the decompressors do not tell how much of the
+# data they were given they actually used until the end of the stream,
+# so the expansion ratio is computed with the data that was given.
+readsize = 65536
+
+# the expansion ratio is only checked once this much data has been
+# decompressed, as small amounts of data (for example padding) can be
+# compressed extremely well.
+ratiominimum = 64 * 1024 * 1024
+
+class DecompressionLimitExceeded(Exception):
+    """The decompressed data is larger than the maximum size or the
+    maximum expansion ratio allows. args[0] is the reason, to report
+    in the error of the unpacker.
+    """
+    pass
+
+class BoundedOutput:
+    """A file like object that decompressed data is written to. The file
+    outfile_full is only created when data is written to it or when the
+    output is closed, so nothing is created for data that turns out not
+    to be valid compressed data. If outfile_full is None the data is only
+    counted.
+    maximum is the maximum amount of decompressed bytes and ratio the
+    maximum amount of decompressed bytes per compressed byte. 0 means
+    that there is no limit.
+    If computecrc is True the CRC32 of the data is kept in crc32.
+    """
+    def __init__(self, outfile_full, maximum=0, ratio=0, computecrc=False):
+        self.outfile_full = outfile_full
+        self.outfile = None
+        self.maximum = maximum
+        self.ratio = ratio
+        self.computecrc = computecrc
+        self.crc32 = zlib.crc32(b'')
+        # the amount of bytes that were decompressed and that were
+        # decompressed from
+        self.written = 0
+        self.consumed = 0
+
+    def add_input(self, size):
+        '''Record that size more bytes of compressed data were given to
+        the decompressor'''
+        self.consumed += size
+
+    def check(self, size):
+        '''Raise DecompressionLimitExceeded if size more bytes of
+        decompressed data are over the limits'''
+        written = self.written + size
+        if self.maximum > 0 and written > self.maximum:
+            raise DecompressionLimitExceeded(
+                    'decompressed data larger than %d bytes' % self.maximum)
+        if self.ratio > 0 and written > ratiominimum and \
+                written > self.ratio * max(self.consumed, 1):
+            raise DecompressionLimitExceeded(
+                    'decompressed data expands more than %d times' % self.ratio)
+
+    def write(self, data):
+        self.check(len(data))
+        if data == b'':
+            return 0
+        self.written += len(data)
+        if self.computecrc:
+            self.crc32 = zlib.crc32(data, self.crc32)
+        if self.outfile_full is not None:
+            if self.outfile is None:
+                self._open()
+            self.outfile.write(data)
+        return len(data)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.outfile_full), exist_ok=True)
+        self.outfile = open(self.outfile_full, 'wb')
+
+    def close(self):
+        '''Close the output file, creating it if nothing was written'''
+        if self.outfile_full is None:
+            return
+        if self.outfile is None:
+            self._open()
+        self.outfile.close()
+
+    def discard(self):
+        '''Close and remove the output file, if it was created'''
+        if self.outfile is None:
+            return
+        self.outfile.close()
+        os.unlink(self.outfile_full)
+        self.outfile = None
+
+def bounded_output(scanenvironment, outfile_full, computecrc=False):
+    '''Return a BoundedOutput for outfile_full with the limits of the
+    scan environment'''
+    return BoundedOutput(outfile_full,
+            scanenvironment.get_decompressionmaximum(),
+            scanenvironment.get_decompressionratio(), computecrc)
+
+class ZlibDecompressor:
+    """A zlib decompressor (see zlib.decompressobj()) with the interface
+    of bz2.BZ2Decompressor"""
+    def __init__(self, wbits=zlib.MAX_WBITS):
+        self.decompressor = zlib.decompressobj(wbits)
+        self.needs_input = True
+
+    @property
+    def eof(self):
+        return self.decompressor.eof
+
+    @property
+    def unused_data(self):
+        return self.decompressor.unused_data
+
+    def decompress(self, data, max_length=-1):
+        if data == b'':
+            data = self.decompressor.unconsumed_tail
+        # for zlib a max_length of 0 means that there is no limit
+        unpackeddata = self.decompressor.decompress(data, max(max_length, 0))
+        self.needs_input = self.decompressor.unconsumed_tail == b'' and \
+                (max_length < 0 or len(unpackeddata) < max_length)
+        return unpackeddata
+
+class LZ4FrameDecompressor:
+    """A decompressor for a LZ4 frame (see lz4.frame) with the interface
+    of bz2.BZ2Decompressor"""
+    def __init__(self):
+        self.context = lz4.frame.create_decompression_context()
+        self.eof = False
+        self.needs_input = True
+        self.unused_data = b''
+        self.tail = b''
+
+    def decompress(self, data, max_length=-1):
+        if self.eof:
+            raise EOFError("End of stream already reached")
+        if data == b'':
+            data = self.tail
+        unpackeddata, bytesread, self.eof = lz4.frame.decompress_chunk(
+                self.context, data, max_length=max_length)
+        self.tail = data[bytesread:]
+        if self.eof:
+            self.unused_data = bytes(self.tail)
+        self.needs_input = self.tail == b'' and \
+                (max_length < 0 or len(unpackeddata) < max_length)
+        return unpackeddata
+
+def decompress_stream(decompressor, infile, output):
+    '''Decompress the data in infile from its current position with
+    decompressor and write it to output, until the end of the compressed
+    stream or the end of infile. Returns the amount of bytes of infile
+    that are part of the compressed stream. Errors of the decompressor
+    and DecompressionLimitExceeded are passed on.'''
+    bytesread = 0
+    while not decompressor.eof:
+        if decompressor.needs_input:
+            data = infile.read(readsize)
+            if data == b'':
+                break
+            bytesread += len(data)
+            output.add_input(len(data))
+        else:
+            data = b''
+        output.write(decompressor.decompress(data, chunksize))
+    return bytesread - len(decompressor.unused_data)
+
+def decompress_zstd_frame(infile, size, output):
+    '''Decompress the zstd frame of size bytes in infile at its current
+    position with zstandard and write the data to output. The content
+    checksum of the frame, if any, is verified by zstandard. Errors
+    (zstandard.ZstdError) and DecompressionLimitExceeded are passed
+    on.'''
+    decompressor = zstandard.ZstdDecompressor()
+    # zstandard reads ahead and fails on data after the frame, so it
+    # is only given the frame.
+    reader = decompressor.stream_reader(LimitedReader(infile, size),
+            read_size=readsize, read_across_frames=False, closefd=False)
+    output.add_input(size)
+    while True:
+        data = reader.read(chunksize)
+        if data == b'':
+            break
+        output.write(data)
+
+class LimitedReader:
+    """A file like object that reads at most size bytes from infile,
+    starting at its current position"""
+    def __init__(self, infile, size):
+        self.infile = infile
+        self.remaining = size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.infile.read(size)
+        self.remaining -= len(data)
+        return data
+
+def decompress_with_program(args, output, infile=None, offset=0, size=0):
+    '''Run the decompression program with arguments args, which writes the
+    decompressed data to standard output, and write the data to output.
+    If infile is not None, size bytes of infile at offset are given to
+    the program on standard input, without copying them to a file first.
+    The program is killed if the data goes over the limits of output.
+    Returns the exit code of the program.'''
+    if infile is None:
+        p = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        feeder = None
+    else:
+        p = subprocess.Popen(args, stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        feeder = threading.Thread(target=_feed_program,
+                args=(p.stdin, infile, offset, size), daemon=True)
+        feeder.start()
+    try:
+        while True:
+            data = p.stdout.read(chunksize)
+            if data == b'':
+                break
+            output.write(data)
+    except BaseException:
+        p.kill()
+        raise
+    finally:
+        p.stdout.close()
+        p.wait()
+        if feeder is not None:
+            feeder.join()
+    return p.returncode
+
+def _feed_program(stdin, infile, offset, size):
+    '''Write size bytes of infile at offset to stdin of a program and
+    close it. The program may exit (or be killed) before it has read
+    everything.'''
+    try:
+        while size > 0:
+            sent = os.sendfile(stdin.fileno(), infile.fileno(), offset, size)
+            if sent == 0:
+                break
+            offset += sent
+            size -= sent
+    except OSError:
+        pass
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+class LZOError(Exception):
+    """The data is not valid LZO1X compressed data"""
+    pass
+
+def lzo1x_decompress(data, decompressed_size):
+    '''Decompress a block of LZO1X compressed data (as used by lzop and
+    several firmware formats) that decompresses to exactly
+    decompressed_size bytes. Raises LZOError for invalid data.'''
+    if lzo is not None:
+        try:
+            unpackeddata = lzo.decompress(data, False, decompressed_size)
+        except lzo.error as e:
+            raise LZOError(str(e))
+    else:
+        unpackeddata = lzo1x_decompress_python(data, decompressed_size)
+    if len(unpackeddata) != decompressed_size:
+        raise LZOError('wrong decompressed size')
+    return unpackeddata
+
+def lzo1x_decompress_python(data, maximum_size):
+    '''Decompress a block of LZO1X compressed data that decompresses to
+    at most maximum_size bytes, following lzo1x_decompress_safe() of
+    the LZO library. Raises LZOError for invalid data.'''
+    out = bytearray()
+    ip = 0
+    datalen = len(data)
+    # state is the amount of literals that were copied after the
+    # previous match (0 to 3), or 4 after a run of literals, as the
+    # meaning of instructions 0-15 depends on it.
+    state = 0
+    try:
+        if data[0] > 17:
+            t = data[0] - 17
+            ip = 1
+            if ip + t > datalen:
+                raise LZOError('input overrun')
+            out += data[ip:ip+t]
+            ip += t
+            state = t if t < 4 else 4
+        while True:
+            t = data[ip]
+            ip += 1
+            if t < 16:
+                if state == 0:
+                    # run of literals
+                    if t == 0:
+                        t = 15
+                        while data[ip] == 0:
+                            t += 255
+                            ip += 1
+                        t += data[ip]
+                        ip += 1
+                    t += 3
+                    if ip + t > datalen:
+                        raise LZOError('input overrun')
+                    out += data[ip:ip+t]
+                    ip += t
+                    state = 4
+                    continue
+                if state != 4:
+                    # 2 byte match within 1 KiB
+                    distance = 1 + (t >> 2) + (data[ip] << 2)
+                    length = 2
+                else:
+                    # 3 byte match within 3 KiB
+                    distance = 0x801 + (t >> 2) + (data[ip] << 2)
+                    length = 3
+                ip += 1
+                nextstate = t & 3
+            elif t >= 64:
+                # match of 3 to 8 bytes within 2 KiB
+                distance = 1 + ((t >> 2) & 7) + (data[ip] << 3)
+                ip += 1
+                length = (t >> 5) + 1
+                nextstate = t & 3
+            elif t >= 32:
+                # match within 16 KiB
+                length = t & 31
+                if length == 0:
+                    length = 31
+                    while data[ip] == 0:
+                        length += 255
+                        ip += 1
+                    length += data[ip]
+                    ip += 1
+                length += 2
+                value = data[ip] | (data[ip+1] << 8)
+                ip += 2
+                distance = 1 + (value >> 2)
+                nextstate = value & 3
+            else:
+                # match within 16 to 48 KiB, or the end of the stream
+                length = t & 7
+                if length == 0:
+                    length = 7
+                    while data[ip] == 0:
+                        length += 255
+                        ip += 1
+                    length += data[ip]
+                    ip += 1
+                length += 2
+                value = data[ip] | (data[ip+1] << 8)
+                ip += 2
+                distance = ((t & 8) << 11) + (value >> 2)
+                if distance == 0:
+                    if length != 3:
+                        raise LZOError('invalid end of stream')
+                    break
+                distance += 0x4000
+                nextstate = value & 3
+
+            # copy the match, which can overlap with the data that is
+            # copied, in which case it repeats.
+            start = len(out) - distance
+            if start < 0:
+                raise LZOError('lookbehind overrun')
+            if distance >= length:
+                out += out[start:start+length]
+            else:
+                out += (out[start:] * (length // distance + 1))[:length]
+
+            # followed by 0 to 3 literals
+            if nextstate != 0:
+                if ip + nextstate > datalen:
+                    raise LZOError('input overrun')
+                out += data[ip:ip+nextstate]
+                ip += nextstate
+            state = nextstate
+            if len(out) > maximum_size:
+                raise LZOError('output overrun')
+    except IndexError:
+        raise LZOError('input overrun')
+    if len(out) > maximum_size:
+        raise LZOError('output overrun')
+    if ip != datalen:
+        raise LZOError('input not consumed')
+    return bytes(out)
+
+class LZWError(Exception):
+    """The data is not valid LZW compressed data"""
+    pass
+
+# the maximum length of the bytes that are stored for a string in the
+# LZW string table. Longer strings are stored as a reference to a
+# shorter string plus the remaining bytes, so highly compressed data
+# does not need a string table of gigabytes.
+lzwchunksize = 64
+
+def decompress_lzw(infile, output, maxbits, blockmode):
+    '''Decompress the LZW compressed data of compress (.Z files) in infile
+    from its current position (after the 3 byte header) until the end
+    of infile, and write it to output. maxbits and blockmode are from
+    the header. This follows decompress() of ncompress, including its
+    quirks: codes are read in groups of 8 codes and the rest of a
+    group is skipped when the code size changes. Raises LZWError for
+    invalid data.'''
+    if maxbits < 9 or maxbits > 16:
+        raise LZWError('invalid bits per code')
+    maxmaxcode = 1 << maxbits
+
+    # the string table: the string of a code is the string of its
+    # prefix code (nothing for -1) followed by its chunk.
+    prefixes = [-1] * 256
+    chunks = [bytes([i]) for i in range(256)]
+    if blockmode:
+        # code 256 clears the table
+        prefixes.append(-1)
+        chunks.append(b'')
+    firstfree = len(chunks)
+
+    nbits = 9
+    maxcode = (1 << nbits) - 1
+    first = True
+    previouscode = None
+    previous = b''
+
+    pending = []
+    pendingsize = 0
+    buf = b''
+    pos = 0
+    eof = False
+    while True:
+        # codes are read in groups of nbits bytes (8 codes), only the
+        # last group can be shorter.
+        if len(buf) - pos < nbits and not eof:
+            data = infile.read(readsize)
+            if data == b'':
+                eof = True
+            else:
+                output.add_input(len(data))
+                buf = buf[pos:] + data
+                pos = 0
+            continue
+        groupsize = nbits
+        group = buf[pos:pos+groupsize]
+        if group == b'':
+            break
+        value = int.from_bytes(group, byteorder='little')
+        mask = (1 << nbits) - 1
+        for i in range(len(group) * 8 // groupsize):
+            if len(chunks) > maxcode:
+                # the code size grows, and the rest of the group,
+                # if any, is skipped.
+                nbits += 1
+                if nbits == maxbits:
+                    maxcode = maxmaxcode
+                else:
+                    maxcode = (1 << nbits) - 1
+                if i == 0:
+                    groupsize = 0
+                break
+            code = (value >> (i * groupsize)) & mask
+            if first:
+                if code >= 256:
+                    raise LZWError('invalid first code')
+                first = False
+            elif code == 256 and blockmode:
+                # clear the table and start again with 9 bit codes
+                # after the rest of the group
+                del prefixes[firstfree:]
+                del chunks[firstfree:]
+                nbits = 9
+                maxcode = (1 << nbits) - 1
+                previouscode = None
+                break
+
+            if code < len(chunks):
+                prefix = prefixes[code]
+                if prefix == -1:
+                    string = chunks[code]
+                else:
+                    parts = [chunks[code]]
+                    while prefix != -1:
+                        parts.append(chunks[prefix])
+                        prefix = prefixes[prefix]
+                    parts.reverse()
+                    string = b''.join(parts)
+            elif code == len(chunks) and previouscode is not None:
+                string = previous + previous[:1]
+            else:
+                raise LZWError('invalid code')
+
+            # add the previous string followed by the first byte of
+            # this string to the table
+            if previouscode is not None and len(chunks) < maxmaxcode:
+                if len(chunks[previouscode]) < lzwchunksize:
+                    prefixes.append(prefixes[previouscode])
+                    chunks.append(chunks[previouscode] + string[:1])
+                else:
+                    prefixes.append(previouscode)
+                    chunks.append(string[:1])
+            previouscode = code
+            previous = string
+
+            pending.append(string)
+            pendingsize += len(string)
+            if pendingsize >= chunksize:
+                output.write(b''.join(pending))
+                pending = []
+                pendingsize = 0
+        pos += groupsize
+    output.write(b''.join(pending))
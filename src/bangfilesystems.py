@@ -41,7 +41,6 @@ import lzma
 import zlib
 import gzip
 import stat
-import subprocess
 import json
 import re
 import pathlib
@@ -87,7 +86,7 @@ def unpack_squashfs(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough data'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     littleendians = [b'hsqs', b'shsq', b'hsqt']
@@ -168,14 +167,6 @@ def unpack_squashfs(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'file system cannot extend past file'}
         return {'status': False, 'error': unpackingerror}
 
-    # then create a temporary file and copy the data into the
-    # temporary file but only if offset != 0
-    if offset != 0:
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        # depending on the variant of squashfs a file size can be
-        # determined meaning less data needs to be copied.
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, filesize - offset)
-        os.fdopen(temporaryfile[0]).close()
     checkfile.close()
 
     # unpack in a temporary directory, as unsquashfs expects
@@ -183,56 +174,39 @@ def unpack_squashfs(fileresult, scanenvironment, offset, unpackdir):
     # already exists.
     squashfsunpackdirectory = tempfile.mkdtemp(dir=scanenvironment.temporarydirectory)
 
-    if offset != 0:
-        p = subprocess.Popen(['unsquashfs', temporaryfile[1]],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=squashfsunpackdirectory)
-    else:
-        p = subprocess.Popen(['unsquashfs', filename_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=squashfsunpackdirectory)
-    (outputmsg, errormsg) = p.communicate()
-
-    # check if there was an error and retry with another tool
-    # unless it is a non-fatal error because a character
-    # or block device could not be created. The exit code
-    # for this error was changed in squashfs-tools 4.4.
-    # This ugly hack should work.
-    # See: https://github.com/armijnhemel/binaryanalysis-ng/issues/61
-    if p.returncode != 0 and not b'because you\'re not superuser!' in errormsg:
-        shutil.rmtree(squashfsunpackdirectory)
-        if usesasquatch:
-            # retry with sasquatch, using 1 thread
-            squashfsunpackdirectory = tempfile.mkdtemp(dir=scanenvironment.temporarydirectory)
-            if offset != 0:
-                p = subprocess.Popen(['sasquatch', '-p', '1', temporaryfile[1]],
-                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                     cwd=squashfsunpackdirectory)
+    # the programs get a copy of the data if offset != 0, which is
+    # shared by unsquashfs and sasquatch. Depending on the variant of
+    # squashfs a file size can be determined meaning less data needs
+    # to be copied.
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, filesize - offset) as squashfsfile:
+        p = externaltools.run(['unsquashfs', squashfsfile],
+                              cwd=squashfsunpackdirectory)
+
+        # check if there was an error and retry with another tool
+        # unless it is a non-fatal error because a character
+        # or block device could not be created. The exit code
+        # for this error was changed in squashfs-tools 4.4.
+        # This ugly hack should work.
+        # See: https://github.com/armijnhemel/binaryanalysis-ng/issues/61
+        if p.returncode != 0 and not b'because you\'re not superuser!' in p.stderr:
+            shutil.rmtree(squashfsunpackdirectory)
+            if usesasquatch:
+                # retry with sasquatch, using 1 thread
+                squashfsunpackdirectory = tempfile.mkdtemp(dir=scanenvironment.temporarydirectory)
+                p = externaltools.run(['sasquatch', '-p', '1', squashfsfile],
+                                      cwd=squashfsunpackdirectory)
+
+                if p.returncode != 0:
+                    unpackingerror = {'offset': offset+unpackedsize,
+                                      'fatal': False,
+                                      'reason': 'Not a valid squashfs file'}
+                    return {'status': False, 'error': unpackingerror}
             else:
-                p = subprocess.Popen(['sasquatch', '-p', '1', filename_full],
-                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                     cwd=squashfsunpackdirectory)
-            (outputmsg, errormsg) = p.communicate()
-
-            if p.returncode != 0:
-                # remove old data
-                if offset != 0:
-                    os.unlink(temporaryfile[1])
                 unpackingerror = {'offset': offset+unpackedsize,
                                   'fatal': False,
                                   'reason': 'Not a valid squashfs file'}
                 return {'status': False, 'error': unpackingerror}
-        else:
-            if offset != 0:
-                os.unlink(temporaryfile[1])
-            unpackingerror = {'offset': offset+unpackedsize,
-                              'fatal': False,
-                              'reason': 'Not a valid squashfs file'}
-            return {'status': False, 'error': unpackingerror}
-
-    # remove old data
-    if offset != 0:
-        os.unlink(temporaryfile[1])
 
     unpackedsize = squashfssize
 
@@ -280,7 +254,7 @@ def unpack_squashfs(fileresult, scanenvironment, offset, unpackdir):
     if offset + unpackedsize != filesize:
         # by default mksquashfs pads to 4K blocks with NUL bytes.
         # The padding is not counted in squashfssize
-        checkfile = open(filename_full, 'rb')
+        checkfile = scanenvironment.open_input_file(filename_full)
         checkfile.seek(offset + unpackedsize)
         padoffset = checkfile.tell()
         if unpackedsize % 4096 != 0:
@@ -348,7 +322,7 @@ def unpack_iso9660(fileresult, scanenvironment, offset, unpackdir):
     # each sector is 2048 bytes long (ECMA 119, 6.1.2). The first 16
     # sectors are reserved for the "system area" (in total 32768 bytes:
     # ECMA 119, 6.2.1)
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+32768)
     unpackedsize += 32768
 
@@ -1264,7 +1238,7 @@ def unpack_jffs2(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # read the magic of the first inode to see if it is a little endian
@@ -1801,7 +1775,7 @@ def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip directly to the superblock
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+1024)
     unpackedsize += 1024
 
@@ -2008,28 +1982,6 @@ def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
     except UnicodeDecodeError:
         pass
 
-    # e2tools can work with trailing data, but if there is any data
-    # preceding the file system then some carving has to be done first.
-    havetmpfile = False
-    if not offset == 0:
-        # if files are larger than a certain limit, then os.sendfile()
-        # won't write more data than 2147479552 so write bytes
-        # out in chunks. Reference:
-        # https://bugzilla.redhat.com/show_bug.cgi?id=612839
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        if unpackedsize > 2147479552:
-            bytesleft = unpackedsize
-            bytestowrite = min(bytesleft, 2147479552)
-            readoffset = offset
-            while bytesleft > 0:
-                os.sendfile(temporaryfile[0], checkfile.fileno(), readoffset, bytestowrite)
-                bytesleft -= bytestowrite
-                readoffset += bytestowrite
-                bytestowrite = min(bytesleft, 2147479552)
-        else:
-            os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
     checkfile.close()
 
     # Now read the contents of the file system with e2ls and
@@ -2050,146 +2002,133 @@ def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
     # or at least it was not a useful file system.
     dataunpacked = False
 
-    while True:
-        try:
-            ext2dir = ext2dirstoscan.popleft()
-        except IndexError:
-            # there are no more entries to process
-            break
-        if havetmpfile:
-            p = subprocess.Popen(['e2ls', '-lai', temporaryfile[1] + ":" + ext2dir], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        else:
-            p = subprocess.Popen(['e2ls', '-lai', str(filename_full) + ":" + ext2dir], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        if p.returncode != 0:
-            if havetmpfile:
-                os.unlink(temporaryfile[1])
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'e2ls error'}
-            return {'status': False, 'error': unpackingerror}
-        dirlisting = outputmsg.rstrip().split(b'\n')
-
-        # socket, symbolic link, regular, block device, directory
-        # charactter device, FIFO/pipe
-        octals = [('s', 0o140000), ('l', 0o120000), ('-', 0o100000),
-                  ('b', 0o60000), ('d', 0o40000), ('c', 0o10000),
-                  ('p', 0o20000)]
-
-        # create the unpacking directory
-        os.makedirs(unpackdir_full, exist_ok=True)
-        for d in dirlisting:
-            # ignore deleted files
-            if d.strip().startswith(b'>'):
-                continue
-            dirsplit = re.split(b'\s+', d.strip(), 7)
-            if len(dirsplit) != 8:
+    # e2tools can work with trailing data, but if there is any data
+    # preceding the file system then they get a copy of the data.
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, unpackedsize, trailingdata=True) as ext2file:
+        while True:
+            try:
+                ext2dir = ext2dirstoscan.popleft()
+            except IndexError:
+                # there are no more entries to process
+                break
+            p = externaltools.run(['e2ls', '-lai', ext2file + ":" + ext2dir])
+            outputmsg = p.stdout
+            if p.returncode != 0:
                 unpackingerror = {'offset': offset, 'fatal': False,
-                                  'reason': 'not enough data in directory entry'}
+                                  'reason': 'e2ls error'}
                 return {'status': False, 'error': unpackingerror}
-            (inode, filemode, userid, groupid, size, filedate, filetime, ext2name) = re.split(b'\s+', d.strip(), 7)
-            try:
-                filemode = int(filemode, base=8)
-            except ValueError:
-                # newer versions of e2tools (starting 0.1.0) pretty print
-                # the file mode instead of printing a number so recreate it
-                if len(filemode) != 10:
-                     unpackingerror = {'offset': offset, 'fatal': False,
-                                       'reason': 'e2ls error'}
-                     return {'status': False, 'error': unpackingerror}
-
-                # instantiate the file mode and look at the first character
-                # as that is the only one used during checks.
-                filemode = filemode.decode()
-                new_filemode = 0
-                for fm in octals:
-                    if filemode[0] == fm[0]:
-                        new_filemode = fm[1]
-                        break
+            dirlisting = outputmsg.rstrip().split(b'\n')
+
+            # socket, symbolic link, regular, block device, directory
+            # charactter device, FIFO/pipe
+            octals = [('s', 0o140000), ('l', 0o120000), ('-', 0o100000),
+                      ('b', 0o60000), ('d', 0o40000), ('c', 0o10000),
+                      ('p', 0o20000)]
+
+            # create the unpacking directory
+            os.makedirs(unpackdir_full, exist_ok=True)
+            for d in dirlisting:
+                # ignore deleted files
+                if d.strip().startswith(b'>'):
+                    continue
+                dirsplit = re.split(b'\s+', d.strip(), 7)
+                if len(dirsplit) != 8:
+                    unpackingerror = {'offset': offset, 'fatal': False,
+                                      'reason': 'not enough data in directory entry'}
+                    return {'status': False, 'error': unpackingerror}
+                (inode, filemode, userid, groupid, size, filedate, filetime, ext2name) = re.split(b'\s+', d.strip(), 7)
+                try:
+                    filemode = int(filemode, base=8)
+                except ValueError:
+                    # newer versions of e2tools (starting 0.1.0) pretty print
+                    # the file mode instead of printing a number so recreate it
+                    if len(filemode) != 10:
+                         unpackingerror = {'offset': offset, 'fatal': False,
+                                           'reason': 'e2ls error'}
+                         return {'status': False, 'error': unpackingerror}
+
+                    # instantiate the file mode and look at the first character
+                    # as that is the only one used during checks.
+                    filemode = filemode.decode()
+                    new_filemode = 0
+                    for fm in octals:
+                        if filemode[0] == fm[0]:
+                            new_filemode = fm[1]
+                            break
 
-                filemode = new_filemode
+                    filemode = new_filemode
 
-            dataunpacked = True
+                dataunpacked = True
 
-            # try to make sense of the filename by decoding it first.
-            # This might fail.
-            namedecoded = False
-            for c in encodingstotranslate:
-                try:
-                    ext2name = ext2name.decode(c)
-                    namedecoded = True
-                    break
-                except Exception as e:
-                    pass
-            if not namedecoded:
-                if havetmpfile:
-                    os.unlink(temporaryfile[1])
-                unpackingerror = {'offset': offset, 'fatal': False,
-                                  'reason': 'could not decode file name'}
-                return {'status': False, 'error': unpackingerror}
+                # try to make sense of the filename by decoding it first.
+                # This might fail.
+                namedecoded = False
+                for c in encodingstotranslate:
+                    try:
+                        ext2name = ext2name.decode(c)
+                        namedecoded = True
+                        break
+                    except Exception as e:
+                        pass
+                if not namedecoded:
+                    unpackingerror = {'offset': offset, 'fatal': False,
+                                      'reason': 'could not decode file name'}
+                    return {'status': False, 'error': unpackingerror}
 
-            # Check the different file types
-            if stat.S_ISDIR(filemode):
-                # It is a directory, so create it and then add
-                # it to the scanning queue, unless it is . or ..
-                if ext2name == '.' or ext2name == '..':
+                # Check the different file types
+                if stat.S_ISDIR(filemode):
+                    # It is a directory, so create it and then add
+                    # it to the scanning queue, unless it is . or ..
+                    if ext2name == '.' or ext2name == '..':
+                        continue
+                    newext2dir = os.path.join(ext2dir, ext2name)
+                    ext2dirstoscan.append(newext2dir)
+                    ext2dir_rel = os.path.join(unpackdir, newext2dir)
+                    ext2dir_full = scanenvironment.unpack_path(ext2dir_rel)
+                    os.mkdir(ext2dir_full)
+                    unpackedfilesandlabels.append((ext2dir_rel, []))
+                elif stat.S_ISBLK(filemode):
+                    # ignore block devices
+                    continue
+                elif stat.S_ISCHR(filemode):
+                    # ignore character devices
+                    continue
+                elif stat.S_ISFIFO(filemode):
+                    # ignore FIFO
+                    continue
+                elif stat.S_ISSOCK(filemode):
+                    # ignore sockets
                     continue
-                newext2dir = os.path.join(ext2dir, ext2name)
-                ext2dirstoscan.append(newext2dir)
-                ext2dir_rel = os.path.join(unpackdir, newext2dir)
-                ext2dir_full = scanenvironment.unpack_path(ext2dir_rel)
-                os.mkdir(ext2dir_full)
-                unpackedfilesandlabels.append((ext2dir_rel, []))
-            elif stat.S_ISBLK(filemode):
-                # ignore block devices
-                continue
-            elif stat.S_ISCHR(filemode):
-                # ignore character devices
-                continue
-            elif stat.S_ISFIFO(filemode):
-                # ignore FIFO
-                continue
-            elif stat.S_ISSOCK(filemode):
-                # ignore sockets
-                continue
 
-            fullext2name = os.path.join(ext2dir, ext2name)
-            filetoinode[fullext2name] = inode
-            if stat.S_ISLNK(filemode):
-                # e2cp cannot copy symbolic links
-                # so just record it as a symbolic link
-                # TODO: process symbolic links
-                pass
-            elif stat.S_ISREG(filemode):
-                fileunpacked = False
-                if inode not in inodetofile:
-                    inodetofile[inode] = fullext2name
-                    # use e2cp to copy the file
-                    ext2dir_rel = os.path.join(unpackdir, ext2dir)
-                    ext2dir_full = scanenvironment.unpack_path(ext2dir_rel)
-                    if havetmpfile:
-                        p = subprocess.Popen(['e2cp', temporaryfile[1] + ":" + fullext2name, "-d", ext2dir_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    else:
-                        p = subprocess.Popen(['e2cp', str(filename_full) + ":" + fullext2name, "-d", ext2dir_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    (outputmsg, errormsg) = p.communicate()
-                    if p.returncode != 0:
-                        if havetmpfile:
-                            os.unlink(temporaryfile[1])
-                        unpackingerror = {'offset': offset, 'fatal': False,
-                                          'reason': 'e2cp error'}
-                        return {'status': False, 'error': unpackingerror}
-                    fileunpacked = True
-                else:
-                    # hardlink the file to an existing
-                    # file and record it as such.
-                    if inodetofile[inode] != fullext2name:
-                        os.link(os.path.join(unpackdir_full, inodetofile[inode]), os.path.join(unpackdir_full, fullext2name))
+                fullext2name = os.path.join(ext2dir, ext2name)
+                filetoinode[fullext2name] = inode
+                if stat.S_ISLNK(filemode):
+                    # e2cp cannot copy symbolic links
+                    # so just record it as a symbolic link
+                    # TODO: process symbolic links
+                    pass
+                elif stat.S_ISREG(filemode):
+                    fileunpacked = False
+                    if inode not in inodetofile:
+                        inodetofile[inode] = fullext2name
+                        # use e2cp to copy the file
+                        ext2dir_rel = os.path.join(unpackdir, ext2dir)
+                        ext2dir_full = scanenvironment.unpack_path(ext2dir_rel)
+                        p = externaltools.run(['e2cp', ext2file + ":" + fullext2name, "-d", ext2dir_full])
+                        if p.returncode != 0:
+                            unpackingerror = {'offset': offset, 'fatal': False,
+                                              'reason': 'e2cp error'}
+                            return {'status': False, 'error': unpackingerror}
                         fileunpacked = True
-                if fileunpacked:
-                    unpackedfilesandlabels.append((os.path.join(unpackdir, fullext2name), []))
-
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
+                    else:
+                        # hardlink the file to an existing
+                        # file and record it as such.
+                        if inodetofile[inode] != fullext2name:
+                            os.link(os.path.join(unpackdir_full, inodetofile[inode]), os.path.join(unpackdir_full, fullext2name))
+                            fileunpacked = True
+                    if fileunpacked:
+                        unpackedfilesandlabels.append((os.path.join(unpackdir, fullext2name), []))
 
     # only report if any data was unpacked
     if not dataunpacked:
@@ -2241,14 +2180,11 @@ def unpack_vmdk(fileresult, scanenvironment, offset, unpackdir):
 
     # first run qemu-img in case the whole file is the VMDK file
     if offset == 0:
-        p = subprocess.Popen(['qemu-img', 'info', '--output=json', filename_full],
-                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-        (standardout, standarderror) = p.communicate()
+        p = scanenvironment.externaltools.run(['qemu-img', 'info', '--output=json', filename_full])
         if p.returncode == 0:
             # extra sanity check to see if it is valid JSON
             try:
-                vmdkjson = json.loads(standardout)
+                vmdkjson = json.loads(p.stdout)
             except:
                 unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                                   'reason': 'no valid JSON output from qemu-img'}
@@ -2260,11 +2196,7 @@ def unpack_vmdk(fileresult, scanenvironment, offset, unpackdir):
 
             outputfile_full = scanenvironment.unpack_path(outputfile_rel)
             # now convert it to a raw file
-            p = subprocess.Popen(['qemu-img', 'convert', '-O', 'raw', filename_full, outputfile_full],
-                                 stdin=subprocess.PIPE,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            (standardout, standarderror) = p.communicate()
+            p = scanenvironment.externaltools.run(['qemu-img', 'convert', '-O', 'raw', filename_full, outputfile_full])
             if p.returncode != 0:
                 if os.path.exists(outputfile_full):
                     os.unlink(outputfile_full)
@@ -2310,14 +2242,11 @@ def unpack_qcow2(fileresult, scanenvironment, offset, unpackdir):
 
     # first run qemu-img in case the whole file is the qcow2 file
     if offset == 0:
-        p = subprocess.Popen(['qemu-img', 'info', '--output=json', filename_full],
-                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-        (standardout, standarderror) = p.communicate()
+        p = scanenvironment.externaltools.run(['qemu-img', 'info', '--output=json', filename_full])
         if p.returncode == 0:
             # extra sanity check to see if it is valid JSON
             try:
-                vmdkjson = json.loads(standardout)
+                vmdkjson = json.loads(p.stdout)
             except:
                 unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                                   'reason': 'no valid JSON output from qemu-img'}
@@ -2329,11 +2258,7 @@ def unpack_qcow2(fileresult, scanenvironment, offset, unpackdir):
 
             outputfile_full = scanenvironment.unpack_path(outputfile_rel)
             # now convert it to a raw file
-            p = subprocess.Popen(['qemu-img', 'convert', '-O', 'raw', filename_full, outputfile_full],
-                                 stdin=subprocess.PIPE,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            (standardout, standarderror) = p.communicate()
+            p = scanenvironment.externaltools.run(['qemu-img', 'convert', '-O', 'raw', filename_full, outputfile_full])
             if p.returncode != 0:
                 if os.path.exists(outputfile_full):
                     os.unlink(outputfile_full)
@@ -2379,7 +2304,7 @@ def unpack_vdi(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file skip over the magic header bytes
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # This assumes the Oracle flavour of VDI. There have been
     # others in the past.
@@ -2520,15 +2445,11 @@ def unpack_vdi(fileresult, scanenvironment, offset, unpackdir):
 
     # check to see if the VDI is the entire file. If so unpack it.
     if offset == 0 and (2+blocksallocated) * blocksize == filesize:
-        p = subprocess.Popen(['qemu-img', 'info', '--output=json', filename_full],
-                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-
-        (standardout, standarderror) = p.communicate()
+        p = scanenvironment.externaltools.run(['qemu-img', 'info', '--output=json', filename_full])
         if p.returncode == 0:
             # extra sanity check to see if it is valid JSON
             try:
-                vmdkjson = json.loads(standardout)
+                vmdkjson = json.loads(p.stdout)
             except:
                 unpackingerror = {'offset': offset+unpackedsize,
                                   'fatal': False,
@@ -2541,11 +2462,7 @@ def unpack_vdi(fileresult, scanenvironment, offset, unpackdir):
 
             outputfile_full = scanenvironment.unpack_path(outputfile_rel)
             # now convert it to a raw file
-            p = subprocess.Popen(['qemu-img', 'convert', '-O', 'raw', filename_full, outputfile_full],
-                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-
-            (standardout, standarderror) = p.communicate()
+            p = scanenvironment.externaltools.run(['qemu-img', 'convert', '-O', 'raw', filename_full, outputfile_full])
             if p.returncode != 0:
                 if os.path.exists(outputfile_full):
                     os.unlink(outputfile_full)
@@ -2586,7 +2503,7 @@ def unpack_dlink_romfs(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # check the endianness, don't support anything but little endian
@@ -2818,7 +2735,7 @@ def unpack_fat(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # jump instruction
@@ -3370,7 +3287,7 @@ def unpack_cbfs(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
 
     # open the file, skip the component magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # what follows is a list of components
@@ -3573,7 +3490,7 @@ def unpack_minix1l(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     blocksize = 1024
@@ -3995,7 +3912,7 @@ def unpack_romfs(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file, skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize += 8
 
@@ -4292,7 +4209,7 @@ def unpack_cramfs(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # read the magic to see what the endianness is
@@ -4538,8 +4455,6 @@ def unpack_cramfs(fileresult, scanenvironment, offset, unpackdir):
                                       'reason': 'invalid directory entry'}
                     return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-
     # unpack in a temporary directory, as fsck.cramfs expects
     # to create the directory itself, but the unpacking directory
     # already exists.
@@ -4550,25 +4465,10 @@ def unpack_cramfs(fileresult, scanenvironment, offset, unpackdir):
     # remove the directory. Possible race condition?
     shutil.rmtree(cramfsunpackdirectory)
 
-    if offset == 0 and cramfssize == filesize:
-        checkfile.close()
-        p = subprocess.Popen(['fsck.cramfs', '--extract=%s' % cramfsunpackdirectory, filename_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    else:
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, cramfssize)
-        os.fdopen(temporaryfile[0]).close()
-        checkfile.close()
-        havetmpfile = True
-
-        p = subprocess.Popen(['fsck.cramfs', '--extract=%s' % cramfsunpackdirectory, temporaryfile[1]],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
-
-    # clean up
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
+    checkfile.close()
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, cramfssize) as cramfsfile:
+        p = externaltools.run(['fsck.cramfs', '--extract=%s' % cramfsunpackdirectory, cramfsfile])
 
     if p.returncode != 0:
         # clean up the temporary directory. It could be that
@@ -4648,7 +4548,7 @@ def unpack_plf(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -5022,7 +4922,7 @@ def unpack_ubi(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     curoffset = offset
@@ -5464,7 +5364,7 @@ def unpack_pfs(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize += 8
 
@@ -5660,7 +5560,7 @@ def unpack_yaffs2(fileresult, scanenvironment, offset, unpackdir):
                          (8192, 448), (512, 16), (4096, 16), (4080, 16)]
 
     # open the file and seek to the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # YAFFS2 come in little endian and big endian flavour.
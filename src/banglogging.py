@@ -1,10 +1,25 @@
 import logging
+import os
 
 uselogging = False
 
+# the handler for the log file of the current scan
+loghandler = None
+
 def log(level, message):
     if uselogging:
         logging.log(level, message)
 
-
-
+def set_logfile(filename):
+    '''Write log messages to filename instead of the log file that was
+    set before. If filename is None no log file is used.'''
+    global loghandler
+    if loghandler is not None:
+        if filename is not None and loghandler.baseFilename == os.path.abspath(filename):
+            return
+        logging.getLogger().removeHandler(loghandler)
+        loghandler.close()
+        loghandler = None
+    if filename is not None:
+        loghandler = logging.FileHandler(filename=filename)
+        logging.getLogger().addHandler(loghandler)
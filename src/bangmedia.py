@@ -51,6 +51,59 @@ encodingstotranslate = ['utf-8', 'ascii', 'latin-1', 'euc_jp', 'euc_jis_2004',
                         'shift_jis_2004', 'shift_jisx0213']
 
 
+# The unpack functions for images walk the headers, markers and chunks
+# of an image (and check CRCs where the format has them). With the "full"
+# image validation level the image is also decoded by PIL as an extra
+# sanity check, which is a lot slower than walking the structure.
+def verify_image(scanenvironment, imagefile):
+    '''Load the image in imagefile (a path or a file object) with PIL
+    if the image validation level is "full". Returns False if PIL cannot
+    load the image.'''
+    if scanenvironment.get_imagevalidation() != 'full':
+        return True
+    try:
+        testimg = PIL.Image.open(imagefile)
+        testimg.load()
+        testimg.close()
+    except (OSError, ValueError):
+        return False
+    return True
+
+def image_validation_metadata(scanenvironment):
+    '''Return the metadata that records how an image was checked'''
+    return {'image validation': scanenvironment.get_imagevalidation()}
+
+def verify_png_chunks(checkfile, offset, size):
+    '''Walk the chunks of a PNG image of size bytes at offset in checkfile,
+    right after the PNG signature, and verify the CRC of every chunk up to
+    and including IEND. Returns False if a chunk does not fit, if a CRC
+    is wrong or if there is no IEND chunk.'''
+    endofimage = offset + size
+    checkfile.seek(offset + 8)
+    curoffset = offset + 8
+    while curoffset + 12 <= endofimage:
+        checkbytes = checkfile.read(8)
+        if len(checkbytes) != 8:
+            return False
+        chunklength = int.from_bytes(checkbytes[:4], byteorder='big')
+        if curoffset + 12 + chunklength > endofimage:
+            return False
+        crc = binascii.crc32(checkbytes[4:])
+        remaining = chunklength
+        while remaining > 0:
+            chunkdata = checkfile.read(min(remaining, 65536))
+            if chunkdata == b'':
+                return False
+            crc = binascii.crc32(chunkdata, crc)
+            remaining -= len(chunkdata)
+        if int.from_bytes(checkfile.read(4), byteorder='big') != crc:
+            return False
+        if checkbytes[4:] == b'IEND':
+            return True
+        curoffset += 12 + chunklength
+    return False
+
+
 # A verifier for the WebP file format.
 # Uses the description of the WebP file format as described here:
 #
@@ -124,7 +177,7 @@ def unpack_wav(fileresult, scanenvironment, offset, unpackdir):
                               'reason': 'multiple fmt chunks'}
             return {'status': False, 'error': unpackingerror}
         # open the file for reading
-        checkfile = open(filename_full, 'rb')
+        checkfile = scanenvironment.open_input_file(filename_full)
 
         # seek to just after the fmt chunk id
         checkfile.seek(offset + unpackres['offsets'][b'fmt '][0] + 4)
@@ -265,7 +318,7 @@ def unpack_riff(
 
     # Then open the file and read the first four bytes to see if
     # they are "RIFF".
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(4)
     if checkbytes != b'RIFF':
@@ -433,7 +486,7 @@ def unpack_ani(fileresult, scanenvironment, offset, unpackdir):
 
     # Then read four bytes and check the length (stored
     # in little endian format)
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     checkbytes = checkfile.read(4)
     rifflength = int.from_bytes(checkbytes, byteorder='little')
@@ -476,7 +529,7 @@ def unpack_bmp(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     # skip over the magic
     checkfile.seek(offset+2)
     unpackedsize += 2
@@ -534,13 +587,38 @@ def unpack_bmp(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
     unpackedsize += 2
 
+    # read the dimensions, the bits per pixel and the compression from
+    # the DIB header. Old OS/2 headers use 16 bit dimensions and have no
+    # compression field.
+    # https://en.wikipedia.org/wiki/BMP_file_format#DIB_header_(bitmap_information_header)
+    if dibheadersize == 12:
+        checkbytes = checkfile.read(10)
+        width = int.from_bytes(checkbytes[2:4], byteorder='little')
+        height = int.from_bytes(checkbytes[4:6], byteorder='little')
+        bitsperpixel = int.from_bytes(checkbytes[8:10], byteorder='little')
+        compression = 0
+    else:
+        checkbytes = checkfile.read(18)
+        width = abs(int.from_bytes(checkbytes[2:6], byteorder='little', signed=True))
+        height = abs(int.from_bytes(checkbytes[6:10], byteorder='little', signed=True))
+        bitsperpixel = int.from_bytes(checkbytes[12:14], byteorder='little')
+        compression = 0
+        if dibheadersize > 16:
+            compression = int.from_bytes(checkbytes[14:18], byteorder='little')
+
+    # uncompressed pixel data (possibly with bit masks) is stored in rows
+    # that are padded to a multiple of 4 bytes, and has to fit in the file
+    if compression in [0, 3, 6]:
+        rowsize = (bitsperpixel * width + 31) // 32 * 4
+        if bmpoffset + rowsize * height > bmpsize:
+            checkfile.close()
+            unpackingerror = {'offset': offset, 'fatal': False,
+                              'reason': 'not enough data for pixels'}
+            return {'status': False, 'error': unpackingerror}
+
     if offset == 0 and bmpsize == filesize:
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(checkfile)
-            testimg.load()
-            testimg.close()
-        except OSError:
+        if not verify_image(scanenvironment, checkfile):
             checkfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'invalid BMP according to PIL'}
@@ -550,7 +628,8 @@ def unpack_bmp(fileresult, scanenvironment, offset, unpackdir):
         labels.append('bmp')
         labels.append('graphics')
         return {'status': True, 'length': bmpsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+                'filesandlabels': unpackedfilesandlabels,
+                'metadata': image_validation_metadata(scanenvironment)}
 
     # else carve the file
     outfile_rel = os.path.join(unpackdir, "unpacked.bmp")
@@ -563,17 +642,8 @@ def unpack_bmp(fileresult, scanenvironment, offset, unpackdir):
     outfile.close()
     checkfile.close()
 
-    # open as read only
-    outfile = open(outfile_full, 'rb')
-
     # now load the file into PIL as an extra sanity check
-    try:
-        testimg = PIL.Image.open(outfile)
-        testimg.load()
-        testimg.close()
-        outfile.close()
-    except OSError:
-        outfile.close()
+    if not verify_image(scanenvironment, outfile_full):
         os.unlink(outfile_full)
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid BMP data according to PIL'}
@@ -614,7 +684,7 @@ def unpack_gif(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset (section 17)
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+6)
     unpackedsize += 6
 
@@ -1042,11 +1112,7 @@ def unpack_gif(fileresult, scanenvironment, offset, unpackdir):
 
     if offset == 0 and unpackedsize == filesize:
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(checkfile)
-            testimg.load()
-            testimg.close()
-        except OSError:
+        if not verify_image(scanenvironment, checkfile):
             checkfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'invalid GIF data according to PIL'}
@@ -1056,6 +1122,7 @@ def unpack_gif(fileresult, scanenvironment, offset, unpackdir):
         labels += ['gif', 'graphics']
         if animated:
             labels.append('animated')
+        gifresults.update(image_validation_metadata(scanenvironment))
         return {'status': True, 'length': unpackedsize, 'labels': labels,
                 'filesandlabels': unpackedfilesandlabels, 'metadata': gifresults}
 
@@ -1070,17 +1137,8 @@ def unpack_gif(fileresult, scanenvironment, offset, unpackdir):
     outfile.close()
     checkfile.close()
 
-    # reopen the file read only
-    outfile = open(outfile_full, 'rb')
-
     # now load the file into PIL as an extra sanity check
-    try:
-        testimg = PIL.Image.open(outfile)
-        testimg.load()
-        testimg.close()
-        outfile.close()
-    except OSError:
-        outfile.close()
+    if not verify_image(scanenvironment, outfile_full):
         os.unlink(outfile_full)
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid GIF data according to PIL'}
@@ -1119,7 +1177,7 @@ def unpack_jpeg(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file and skip the SOI magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+2)
     unpackedsize += 2
 
@@ -1642,11 +1700,7 @@ def unpack_jpeg(fileresult, scanenvironment, offset, unpackdir):
 
     if offset == 0 and unpackedsize == filesize:
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(checkfile)
-            testimg.load()
-            testimg.close()
-        except OSError:
+        if not verify_image(scanenvironment, checkfile):
             checkfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'invalid JPEG data according to PIL'}
@@ -1656,7 +1710,8 @@ def unpack_jpeg(fileresult, scanenvironment, offset, unpackdir):
         labels.append('graphics')
         labels.append('jpeg')
         return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+                'filesandlabels': unpackedfilesandlabels,
+                'metadata': image_validation_metadata(scanenvironment)}
 
     # else carve the file
     outfile_rel = os.path.join(unpackdir, "unpacked.jpg")
@@ -1669,17 +1724,8 @@ def unpack_jpeg(fileresult, scanenvironment, offset, unpackdir):
     outfile.close()
     checkfile.close()
 
-    # open as read only
-    outfile = open(outfile_full, 'rb')
-
     # now load the file into PIL as an extra sanity check
-    try:
-        testimg = PIL.Image.open(outfile)
-        testimg.load()
-        testimg.close()
-        outfile.close()
-    except OSError:
-        outfile.close()
+    if not verify_image(scanenvironment, outfile_full):
         os.unlink(outfile_full)
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid JPEG data according to PIL'}
@@ -1710,7 +1756,7 @@ def unpack_ico(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file, skip the magic and read the number of images
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -1799,7 +1845,12 @@ def unpack_ico(fileresult, scanenvironment, offset, unpackdir):
         checkfile.seek(offset + imageoffset)
         checkbytes = checkfile.read(8)
         if checkbytes == b'\x89PNG\x0d\x0a\x1a\x0a':
-            # the file is a PNG
+            # the file is a PNG, so check its chunks
+            if not verify_png_chunks(checkfile, offset + imageoffset, imagesize):
+                checkfile.close()
+                unpackingerror = {'offset': offset, 'fatal': False,
+                                  'reason': 'invalid PNG data'}
+                return {'status': False, 'error': unpackingerror}
             icondir[iconcounter] = {'type': 'png', 'offset': imageoffset,
                                     'size': imagesize, 'width': imagewidth,
                                     'height': imageheight}
@@ -1824,11 +1875,7 @@ def unpack_ico(fileresult, scanenvironment, offset, unpackdir):
 
     if offset == 0 and unpackedsize == filesize:
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(checkfile)
-            testimg.load()
-            testimg.close()
-        except (OSError, ValueError):
+        if not verify_image(scanenvironment, checkfile):
             checkfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'invalid ICO data according to PIL'}
@@ -1838,7 +1885,8 @@ def unpack_ico(fileresult, scanenvironment, offset, unpackdir):
         labels.append('ico')
         labels.append('resource')
         return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+                'filesandlabels': unpackedfilesandlabels,
+                'metadata': image_validation_metadata(scanenvironment)}
 
     # else carve the file
     outfile_rel = os.path.join(unpackdir, "unpacked.ico")
@@ -1850,19 +1898,12 @@ def unpack_ico(fileresult, scanenvironment, offset, unpackdir):
     os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
 
-    # reopen output file in read only mode
-    outfile = open(outfile_full, 'rb')
-    try:
-        testimg = PIL.Image.open(outfile)
-        testimg.load()
-        testimg.close()
-    except (OSError, ValueError):
+    # now load the file into PIL as an extra sanity check
+    if not verify_image(scanenvironment, outfile_full):
         checkfile.close()
-        outfile.close()
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid ICO data according to PIL'}
         return {'status': False, 'error': unpackingerror}
-    outfile.close()
     checkfile.close()
 
     unpackedfilesandlabels.append((outfile_rel, ['ico', 'graphics', 'resource', 'unpacked']))
@@ -1891,7 +1932,7 @@ def unpack_sgi(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough data for SGI header'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     # skip over the magic
     checkfile.seek(offset+2)
     unpackedsize += 2
@@ -1997,11 +2038,7 @@ def unpack_sgi(fileresult, scanenvironment, offset, unpackdir):
             return {'status': False, 'error': unpackingerror}
         if offset == 0 and imagelength == filesize:
             # now load the file into PIL as an extra sanity check
-            try:
-                testimg = PIL.Image.open(checkfile)
-                testimg.load()
-                testimg.close()
-            except OSError:
+            if not verify_image(scanenvironment, checkfile):
                 checkfile.close()
                 unpackingerror = {'offset': offset, 'fatal': False,
                                   'reason': 'invalid SGI according to PIL'}
@@ -2011,7 +2048,8 @@ def unpack_sgi(fileresult, scanenvironment, offset, unpackdir):
             labels.append('sgi')
             labels.append('graphics')
             return {'status': True, 'length': imagelength, 'labels': labels,
-                    'filesandlabels': unpackedfilesandlabels}
+                    'filesandlabels': unpackedfilesandlabels,
+                    'metadata': image_validation_metadata(scanenvironment)}
 
         # Carve the image.
         # first reset the file pointer
@@ -2033,17 +2071,8 @@ def unpack_sgi(fileresult, scanenvironment, offset, unpackdir):
         outfile.close()
         checkfile.close()
 
-        # reopen as read only
-        outfile = open(outfile_full, 'rb')
-
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(outfile)
-            testimg.load()
-            testimg.close()
-            outfile.close()
-        except OSError:
-            outfile.close()
+        if not verify_image(scanenvironment, outfile_full):
             os.unlink(outfile_full)
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'invalid SGI according to PIL'}
@@ -2138,7 +2167,7 @@ def unpack_aiff(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     # skip over the header
     checkfile.seek(offset+4)
     checkbytes = checkfile.read(4)
@@ -2256,7 +2285,7 @@ def unpack_sunraster(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip over the header
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -2363,7 +2392,7 @@ def unpack_apple_icon(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     # skip over the magic
     checkfile.seek(offset+4)
     unpackedsize += 4
@@ -2426,11 +2455,7 @@ def unpack_apple_icon(fileresult, scanenvironment, offset, unpackdir):
 
     if offset == 0 and unpackedsize == filesize:
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(checkfile)
-            testimg.load()
-            testimg.close()
-        except OSError:
+        if not verify_image(scanenvironment, checkfile):
             checkfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'invalid Apple icon according to PIL'}
@@ -2441,7 +2466,8 @@ def unpack_apple_icon(fileresult, scanenvironment, offset, unpackdir):
         labels.append('graphics')
         labels.append('resource')
         return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+                'filesandlabels': unpackedfilesandlabels,
+                'metadata': image_validation_metadata(scanenvironment)}
 
     # Carve the image.
     # first reset the file pointer
@@ -2456,17 +2482,8 @@ def unpack_apple_icon(fileresult, scanenvironment, offset, unpackdir):
     outfile.close()
     checkfile.close()
 
-    # reopen as read only
-    outfile = open(outfile_full, 'rb')
-
     # now load the file into PIL as an extra sanity check
-    try:
-        testimg = PIL.Image.open(outfile)
-        testimg.load()
-        testimg.close()
-        outfile.close()
-    except OSError:
-        outfile.close()
+    if not verify_image(scanenvironment, outfile_full):
         os.unlink(outfile_full)
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid Apple icon according to PIL'}
@@ -2503,7 +2520,7 @@ def unpack_mng(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file skip over the magic header bytes
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize = 8
 
@@ -2650,7 +2667,7 @@ def unpack_swf(fileresult, scanenvironment, offset, unpackdir):
     # * uncompressed
     # * compressed with zlib
     # * compressed with LZMA
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(3)
     if checkbytes == b'FWS':
@@ -3011,7 +3028,7 @@ def unpack_flv(fileresult, scanenvironment, offset, unpackdir):
                           'fatal': False}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     # skip over the magic
     checkfile.seek(offset+3)
     unpackedsize += 3
@@ -3249,7 +3266,7 @@ def unpack_pdf(fileresult, scanenvironment, offset, unpackdir):
     pdfinfo = {}
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+5)
     unpackedsize += 5
 
@@ -3783,7 +3800,7 @@ def unpack_xg3d(fileresult, scanenvironment, offset, unpackdir):
 
     # open the file and skip to offset 29, as that
     # is where the file size can be found.
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+29)
     unpackedsize += 29
 
@@ -3851,7 +3868,7 @@ def unpack_ktx11(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+12)
     unpackedsize += 12
 
@@ -4093,7 +4110,7 @@ def unpack_psd(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 4)
     unpackedsize += 4
 
@@ -4269,11 +4286,7 @@ def unpack_psd(fileresult, scanenvironment, offset, unpackdir):
 
     if offset == 0 and unpackedsize == filesize:
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(checkfile)
-            testimg.load()
-            testimg.close()
-        except OSError:
+        if not verify_image(scanenvironment, checkfile):
             checkfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'invalid PSD data according to PIL'}
@@ -4281,7 +4294,8 @@ def unpack_psd(fileresult, scanenvironment, offset, unpackdir):
         checkfile.close()
         labels += ['psd', 'graphics']
         return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+                'filesandlabels': unpackedfilesandlabels,
+                'metadata': image_validation_metadata(scanenvironment)}
 
     # else carve the file. It is anonymous, so just give it a name
     outfile_rel = os.path.join(unpackdir, "unpacked.psd")
@@ -4293,17 +4307,8 @@ def unpack_psd(fileresult, scanenvironment, offset, unpackdir):
     os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
 
-    # reopen as read only
-    outfile = open(outfile_full, 'rb')
-
     # now load the file into PIL as an extra sanity check
-    try:
-        testimg = PIL.Image.open(outfile)
-        testimg.load()
-        testimg.close()
-        outfile.close()
-    except OSError:
-        outfile.close()
+    if not verify_image(scanenvironment, outfile_full):
         os.unlink(outfile_full)
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid PSD data according to PIL'}
@@ -4332,7 +4337,7 @@ def unpack_pnm(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file and read the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(2)
     if checkbytes == b'P6':
@@ -4545,11 +4550,7 @@ def unpack_pnm(fileresult, scanenvironment, offset, unpackdir):
 
     if offset == 0 and unpackedsize == filesize:
         # now load the file into PIL as an extra sanity check
-        try:
-            testimg = PIL.Image.open(checkfile)
-            testimg.load()
-            testimg.close()
-        except OSError:
+        if not verify_image(scanenvironment, checkfile):
             checkfile.close()
             if pnmtype == 'pgm':
                 unpackingerror = {'offset': offset, 'fatal': False,
@@ -4564,7 +4565,8 @@ def unpack_pnm(fileresult, scanenvironment, offset, unpackdir):
         checkfile.close()
         labels += [pnmtype, 'graphics']
         return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+                'filesandlabels': unpackedfilesandlabels,
+                'metadata': image_validation_metadata(scanenvironment)}
 
     # else carve the file. It is anonymous, so just give it a name
     outfile_rel = os.path.join(unpackdir, "unpacked." + pnmtype)
@@ -4576,17 +4578,8 @@ def unpack_pnm(fileresult, scanenvironment, offset, unpackdir):
     os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
 
-    # reopen as read only
-    outfile = open(outfile_full, 'rb')
-
     # now load the file into PIL as an extra sanity check
-    try:
-        testimg = PIL.Image.open(outfile)
-        testimg.load()
-        testimg.close()
-        outfile.close()
-    except (OSError, ValueError):
-        outfile.close()
+    if not verify_image(scanenvironment, outfile_full):
         os.unlink(outfile_full)
         if pnmtype == 'pgm':
             unpackingerror = {'offset': offset, 'fatal': False,
@@ -4626,7 +4619,7 @@ def unpack_mapsforge(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+20)
 
     # header size
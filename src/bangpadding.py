@@ -0,0 +1,106 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# Helper functions to find padding (runs of NUL or 0xFF bytes) and holes
+# in files, so large runs of padding in (converted) disk images and flash
+# images do not have to be searched for signatures, or even read.
+
+import errno
+import os
+
+# the bytes that are used for padding
+paddingbytes = [b'\x00', b'\xff']
+
+# runs of padding are searched for as blocks of this size
+blocksize = 4096
+
+# runs of padding shorter than this are scanned as any other data
+minimumlength = 65536
+
+# the amount of bytes that is compared at once to find the end of a run
+piecesize = 1024 * 1024
+
+_blocks = dict([(p, p * blocksize) for p in paddingbytes])
+_pieces = {}
+
+def padding_block(paddingbyte):
+    '''Return a block of blocksize padding bytes'''
+    return _blocks[paddingbyte]
+
+def padding_piece(paddingbyte):
+    '''Return piecesize padding bytes, to compare data with or to use
+    instead of data that is not read.'''
+    if paddingbyte not in _pieces:
+        _pieces[paddingbyte] = paddingbyte * piecesize
+    return _pieces[paddingbyte]
+
+def find_holes(filename, offset=0, size=None):
+    '''Return a sorted list of (start, end) tuples of the holes in the
+    size bytes at offset in a sparse file, relative to offset. Holes read
+    as NUL bytes. An empty list is returned if the file system cannot
+    report holes.'''
+    holes = []
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+    except OSError:
+        return holes
+    try:
+        if size is None:
+            size = os.fstat(fd).st_size - offset
+        end = offset + size
+        position = offset
+        while position < end:
+            hole = os.lseek(fd, position, os.SEEK_HOLE)
+            if hole >= end:
+                break
+            try:
+                data = os.lseek(fd, hole, os.SEEK_DATA)
+            except OSError as e:
+                # there is no data after the last hole
+                if e.errno != errno.ENXIO:
+                    raise
+                data = end
+            holes.append((hole - offset, min(data, end) - offset))
+            position = data
+    except (AttributeError, OSError):
+        # SEEK_HOLE and SEEK_DATA are not supported
+        holes = []
+    finally:
+        os.close(fd)
+    return holes
+
+def padding_length(data, paddingbyte):
+    '''Return the amount of padding bytes at the start of data'''
+    if data == padding_piece(paddingbyte)[:len(data)]:
+        return len(data)
+    return len(data) - len(bytes(data).lstrip(paddingbyte))
+
+def merge_ranges(ranges):
+    '''Merge a list of (start, end, paddingbyte) tuples into a sorted list
+    of ranges that do not overlap. Overlapping ranges have to be of the
+    same padding byte.'''
+    merged = []
+    for start, end, paddingbyte in sorted(ranges):
+        if merged != [] and start <= merged[-1][1] and paddingbyte == merged[-1][2]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]), paddingbyte)
+        else:
+            merged.append((start, end, paddingbyte))
+    return merged
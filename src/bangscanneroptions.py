@@ -27,6 +27,10 @@ import stat
 import configparser
 import tempfile
 
+from ScanScheduler import schedulers
+from UnpackBudget import UnpackBudget, budgetlimits
+from ScanEnvironment import imagevalidationlevels
+
 
 class ObjectDict(dict):
     def __setattr__(self, name, value):
@@ -56,6 +60,23 @@ class BangScannerOptions:
             'createjson': True,
             'runfilescans': True,
             'tlshmaximum': sys.maxsize,
+            'usemmap': True,
+            'hashfirst': False,
+            'virtualcarving': True,
+            'entropyprofile': False,
+            'skiphighentropy': False,
+            'skippadding': True,
+            'carvepadding': False,
+            'imagevalidation': 'structural',
+            'decompressionmaximum': 16 * 1024 * 1024 * 1024,
+            'decompressionratio': 20000,
+            'scheduler': 'pipes',
+            'unpackbudget': UnpackBudget(),
+            'parserbudgets': {},
+            'toolconcurrency': max(1, multiprocessing.cpu_count() // 2),
+            'tooltimeout': 0,
+            'toolconcurrencies': {},
+            'tooltimeouts': {},
             'postgresql_enabled': True,
             'postgresql_host': None,
             'postgresql_port': None,
@@ -74,6 +95,7 @@ class BangScannerOptions:
             'writereport': True,
             'uselogging': True,
             'bangthreads': multiprocessing.cpu_count(),
+            'parallelscans': 0,
             'checkpath': None,
         }
         self.options = ObjectDict(dict(self.defaults))
@@ -189,6 +211,8 @@ class BangScannerOptions:
                 section='configuration')
         self._set_integer_option_from_config('bangthreads',
                 section='configuration', option='threads')
+        self._set_integer_option_from_config('parallelscans',
+                section='configuration')
         self._set_boolean_option_from_config('removescandirectory',
                 section='configuration')
         self._set_boolean_option_from_config('createbytecounter',
@@ -199,6 +223,28 @@ class BangScannerOptions:
                 section='configuration', option='runfilescans')
         self._set_integer_option_from_config('tlshmaximum',
                 section='configuration')
+        self._set_boolean_option_from_config('usemmap',
+                section='configuration', option='mmap')
+        self._set_boolean_option_from_config('hashfirst',
+                section='configuration')
+        self._set_boolean_option_from_config('virtualcarving',
+                section='configuration')
+        self._set_boolean_option_from_config('entropyprofile',
+                section='configuration')
+        self._set_boolean_option_from_config('skiphighentropy',
+                section='configuration')
+        self._set_boolean_option_from_config('skippadding',
+                section='configuration')
+        self._set_boolean_option_from_config('carvepadding',
+                section='configuration')
+        self._set_string_option_from_config('imagevalidation',
+                section='configuration')
+        self._set_integer_option_from_config('decompressionmaximum',
+                section='configuration')
+        self._set_integer_option_from_config('decompressionratio',
+                section='configuration')
+        self._set_string_option_from_config('scheduler',
+                section='configuration')
         self._set_boolean_option_from_config('writereport',
                 section='configuration', option='report')
         self._set_boolean_option_from_config('uselogging',
@@ -222,6 +268,74 @@ class BangScannerOptions:
                 section='elasticsearch')
         self._set_string_option_from_config('elastic_host', section='elasticsearch')
         self._set_integer_option_from_config('elastic_port', section='elasticsearchs')
+        self._set_budget_options_from_config(section='budgets')
+        self._set_tool_options_from_config(section='tools')
+
+    def _set_budget_options_from_config(self, section):
+        '''Read the default budget of unpack parsers ("walltime" etc.)
+        and the budgets of single parsers ("gzip.walltime" etc.)'''
+        if not self.config.has_section(section):
+            return
+        limits = {}
+        parserlimits = {}
+        for option in self.config.options(section):
+            # skip the environment variables that are used as defaults
+            if option in self.config.defaults():
+                continue
+            parser, _, limit = option.rpartition('.')
+            if limit not in budgetlimits:
+                self._error("Unknown budget limit %s, exiting" % option)
+            try:
+                if limit == 'writtenbytes':
+                    value = int(self.config.get(section, option))
+                else:
+                    value = float(self.config.get(section, option))
+            except ValueError:
+                self._error("Invalid value for budget limit %s, exiting"
+                        % option)
+            if value < 0:
+                self._error("Budget limit %s cannot be negative, exiting"
+                        % option)
+            if parser == '':
+                limits[limit] = value
+            else:
+                parserlimits.setdefault(parser, {})[limit] = value
+        self.options.unpackbudget = UnpackBudget(**limits)
+        self.options.parserbudgets = {}
+        for parser, limits in parserlimits.items():
+            self.options.parserbudgets[parser] = \
+                    self.options.unpackbudget.updated(**limits)
+
+    def _set_tool_options_from_config(self, section):
+        '''Read the limits of external programs ("concurrency" and
+        "timeout") and the limits of single programs ("7z.timeout" etc.)'''
+        if not self.config.has_section(section):
+            return
+        toollimits = {'concurrency': {}, 'timeout': {}}
+        for option in self.config.options(section):
+            # skip the environment variables that are used as defaults
+            if option in self.config.defaults():
+                continue
+            tool, _, limit = option.rpartition('.')
+            if limit not in toollimits:
+                self._error("Unknown tool limit %s, exiting" % option)
+            try:
+                if limit == 'concurrency':
+                    value = int(self.config.get(section, option))
+                else:
+                    value = float(self.config.get(section, option))
+            except ValueError:
+                self._error("Invalid value for tool limit %s, exiting"
+                        % option)
+            if value < 0:
+                self._error("Tool limit %s cannot be negative, exiting"
+                        % option)
+            if tool == '':
+                self.options['tool' + limit] = value
+            else:
+                toollimits[limit][tool] = value
+        self.options.toolconcurrencies = toollimits['concurrency']
+        self.options.tooltimeouts = toollimits['timeout']
 
     def _set_options_from_arguments(self):
         self.options.checkpath = self.args.checkpath
@@ -234,6 +348,21 @@ class BangScannerOptions:
         # bangthreads >= 1
         if self.options.bangthreads < 1:
             self.options.bangthreads = self.defaults['bangthreads']
+        # parallelscans >= 1, default is one scan per thread
+        if self.options.parallelscans < 1:
+            self.options.parallelscans = self.options.bangthreads
+        # scheduler must be a known backend
+        if self.options.scheduler not in schedulers:
+            self._error("Unknown scheduler %s, exiting" % self.options.scheduler)
+        # image validation must be a known level
+        if self.options.imagevalidation not in imagevalidationlevels:
+            self._error("Unknown image validation level %s, exiting"
+                    % self.options.imagevalidation)
+        # decompression limits cannot be negative, 0 is no limit
+        if self.options.decompressionmaximum < 0:
+            self.options.decompressionmaximum = self.defaults['decompressionmaximum']
+        if self.options.decompressionratio < 0:
+            self.options.decompressionratio = self.defaults['decompressionratio']
         # option usedatabase true if db parameters set
         self.options.usedatabase = self.options.postgresql_enabled and \
             self.options.postgresql_db and \
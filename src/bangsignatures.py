@@ -24,11 +24,16 @@
 
 import math
 
-import bangandroid
-import bangfilesystems
-import bangmedia
-import bangtext
-import bangunpack
+# The legacy unpack functions are in large modules that need a lot of
+# third party modules, so these modules are only imported when one of
+# the tables of legacy unpack functions is used, see __getattr__().
+def _import_legacy_modules():
+    global bangandroid, bangfilesystems, bangmedia, bangtext, bangunpack
+    import bangandroid
+    import bangfilesystems
+    import bangmedia
+    import bangtext
+    import bangunpack
 
 # store a few standard signatures
 signatures = {
@@ -216,128 +221,129 @@ signaturesoffset = {
 
 
 # keep a list of signatures to the (built in) functions
-signaturetofunction = {
-    'webp': bangmedia.unpack_webp,
-    'wav': bangmedia.unpack_wav,
-    'ani': bangmedia.unpack_ani,
-    'mng': bangmedia.unpack_mng,
-    'gzip': bangunpack.unpack_gzip,
-    'bmp': bangmedia.unpack_bmp,
-    'xz': bangunpack.unpack_xz,
-    'lzma_var1': bangunpack.unpack_lzma,
-    'lzma_var2': bangunpack.unpack_lzma,
-    'lzma_var3': bangunpack.unpack_lzma,
-    'timezone': bangunpack.unpack_timezone,
-    'tar_posix': bangunpack.unpack_tar,
-    'tar_gnu': bangunpack.unpack_tar,
-    'ar': bangunpack.unpack_ar,
-    'squashfs_var1': bangfilesystems.unpack_squashfs,
-    'squashfs_var2': bangfilesystems.unpack_squashfs,
-    'squashfs_var3': bangfilesystems.unpack_squashfs,
-    'squashfs_var4': bangfilesystems.unpack_squashfs,
-    'squashfs_var5': bangfilesystems.unpack_squashfs,
-    'squashfs_var6': bangfilesystems.unpack_squashfs,
-    'squashfs_var7': bangfilesystems.unpack_squashfs,
-    'icc': bangunpack.unpack_icc,
-    'zip': bangunpack.unpack_zip,
-    'dahua': bangunpack.unpack_dahua,
-    'bzip2': bangunpack.unpack_bzip2,
-    'xar': bangunpack.unpack_xar,
-    'gif87': bangmedia.unpack_gif,
-    'gif89': bangmedia.unpack_gif,
-    'iso9660': bangfilesystems.unpack_iso9660,
-    'lzip': bangunpack.unpack_lzip,
-    'jpeg': bangmedia.unpack_jpeg,
-    'woff': bangunpack.unpack_woff,
-    'opentype': bangunpack.unpack_opentype_font,
-    'ttc': bangunpack.unpack_opentype_font_collection,
-    'truetype': bangunpack.unpack_truetype_font,
-    'android_backup': bangandroid.unpack_android_backup,
-    'ico': bangmedia.unpack_ico,
-    'cab': bangunpack.unpack_cab,
-    'sgi': bangmedia.unpack_sgi,
-    'aiff': bangmedia.unpack_aiff,
-    'terminfo': bangunpack.unpack_terminfo,
-    'rzip': bangunpack.unpack_rzip,
-    'jffs2_little_endian': bangfilesystems.unpack_jffs2,
-    'jffs2_big_endian': bangfilesystems.unpack_jffs2,
-    'cpio_old': bangunpack.unpack_cpio,
-    'cpio_portable': bangunpack.unpack_cpio,
-    'cpio_newascii': bangunpack.unpack_cpio,
-    'cpio_newcrc': bangunpack.unpack_cpio,
-    '7z': bangunpack.unpack_7z,
-    'chm': bangunpack.unpack_chm,
-    'mswim': bangunpack.unpack_wim,
-    'sunraster': bangmedia.unpack_sunraster,
-    'ext2': bangfilesystems.unpack_ext2,
-    'rpm': bangunpack.unpack_rpm,
-    'zstd_08': bangunpack.unpack_zstd,
-    'apple_icon': bangmedia.unpack_apple_icon,
-    'lz4': bangunpack.unpack_lz4,
-    'lz4_legacy': bangunpack.unpack_lz4legacy,
-    'vmdk': bangfilesystems.unpack_vmdk,
-    'qcow2': bangfilesystems.unpack_qcow2,
-    'vdi': bangfilesystems.unpack_vdi,
-    'javaclass': bangunpack.unpack_java_class,
-    'dex': bangandroid.unpack_dex,
-    'odex': bangandroid.unpack_odex,
-    'snappy_framed': bangunpack.unpack_snappy,
-    'elf': bangunpack.unpack_elf,
-    'swf': bangmedia.unpack_swf,
-    'swf_zlib': bangmedia.unpack_swf,
-    'swf_lzma': bangmedia.unpack_swf,
-    'ubootlegacy': bangunpack.unpack_uboot_legacy,
-    'certificate': bangunpack.unpack_certificate,
-    'git_index': bangunpack.unpack_git_index,
-    'flv': bangmedia.unpack_flv,
-    'lzop': bangunpack.unpack_lzop,
-    'dlinkromfs': bangfilesystems.unpack_dlink_romfs,
-    'pdf': bangmedia.unpack_pdf,
-    'pack200': bangunpack.unpack_pack200,
-    'zim': bangunpack.unpack_zim,
-    'javakeystore': bangunpack.unpack_java_keystore,
-    'xg3d': bangmedia.unpack_xg3d,
-    'acdb': bangunpack.unpack_acdb,
-    'ktx11': bangmedia.unpack_ktx11,
-    'avb': bangandroid.unpack_avb,
-    'sqlite3': bangunpack.unpack_sqlite,
-    'trx': bangunpack.unpack_trx,
-    'psd': bangmedia.unpack_psd,
-    'ppm': bangmedia.unpack_pnm,
-    'pgm': bangmedia.unpack_pnm,
-    'pbm': bangmedia.unpack_pnm,
-    'androidbootmsm': bangandroid.unpack_android_boot_msm,
-    'androidbootimg': bangandroid.unpack_android_boot_img,
-    'fat': bangfilesystems.unpack_fat,
-    'cbfs': bangfilesystems.unpack_cbfs,
-    'minix_1l': bangfilesystems.unpack_minix1l,
-    'compress': bangunpack.unpack_compress,
-    'romfs': bangfilesystems.unpack_romfs,
-    'cramfs_le': bangfilesystems.unpack_cramfs,
-    'cramfs_be': bangfilesystems.unpack_cramfs,
-    'ambarella': bangunpack.unpack_ambarella,
-    'romfs_ambarella': bangunpack.unpack_romfs_ambarella,
-    'bflt': bangunpack.unpack_bflt,
-    'ubi': bangfilesystems.unpack_ubi,
-    'bittorrent': bangunpack.unpack_bittorrent,
-    'pcapng': bangunpack.unpack_pcapng,
-    'pcap_le': bangunpack.unpack_pcap,
-    'pcap_be': bangunpack.unpack_pcap,
-    'pcap_le_nano': bangunpack.unpack_pcap,
-    'pcap_be_nano': bangunpack.unpack_pcap,
-    'android_binary_xml': bangandroid.unpack_android_resource,
-    'serialized_java': bangunpack.unpack_serialized_java,
-    'mapsforge': bangmedia.unpack_mapsforge,
-    'plf': bangfilesystems.unpack_plf,
-    'pfs': bangfilesystems.unpack_pfs,
-    'yaffs_le_1': bangfilesystems.unpack_yaffs2,
-    'yaffs_le_2': bangfilesystems.unpack_yaffs2,
-    'yaffs_be_1': bangfilesystems.unpack_yaffs2,
-    'yaffs_be_2': bangfilesystems.unpack_yaffs2,
-    'qcdt': bangunpack.unpack_qcdt,
-    #'dhtb': bangandroid.unpack_dhtb,
-    'crx': bangunpack.unpack_crx,
-}
+def _signaturetofunction():
+    return {
+        'webp': bangmedia.unpack_webp,
+        'wav': bangmedia.unpack_wav,
+        'ani': bangmedia.unpack_ani,
+        'mng': bangmedia.unpack_mng,
+        'gzip': bangunpack.unpack_gzip,
+        'bmp': bangmedia.unpack_bmp,
+        'xz': bangunpack.unpack_xz,
+        'lzma_var1': bangunpack.unpack_lzma,
+        'lzma_var2': bangunpack.unpack_lzma,
+        'lzma_var3': bangunpack.unpack_lzma,
+        'timezone': bangunpack.unpack_timezone,
+        'tar_posix': bangunpack.unpack_tar,
+        'tar_gnu': bangunpack.unpack_tar,
+        'ar': bangunpack.unpack_ar,
+        'squashfs_var1': bangfilesystems.unpack_squashfs,
+        'squashfs_var2': bangfilesystems.unpack_squashfs,
+        'squashfs_var3': bangfilesystems.unpack_squashfs,
+        'squashfs_var4': bangfilesystems.unpack_squashfs,
+        'squashfs_var5': bangfilesystems.unpack_squashfs,
+        'squashfs_var6': bangfilesystems.unpack_squashfs,
+        'squashfs_var7': bangfilesystems.unpack_squashfs,
+        'icc': bangunpack.unpack_icc,
+        'zip': bangunpack.unpack_zip,
+        'dahua': bangunpack.unpack_dahua,
+        'bzip2': bangunpack.unpack_bzip2,
+        'xar': bangunpack.unpack_xar,
+        'gif87': bangmedia.unpack_gif,
+        'gif89': bangmedia.unpack_gif,
+        'iso9660': bangfilesystems.unpack_iso9660,
+        'lzip': bangunpack.unpack_lzip,
+        'jpeg': bangmedia.unpack_jpeg,
+        'woff': bangunpack.unpack_woff,
+        'opentype': bangunpack.unpack_opentype_font,
+        'ttc': bangunpack.unpack_opentype_font_collection,
+        'truetype': bangunpack.unpack_truetype_font,
+        'android_backup': bangandroid.unpack_android_backup,
+        'ico': bangmedia.unpack_ico,
+        'cab': bangunpack.unpack_cab,
+        'sgi': bangmedia.unpack_sgi,
+        'aiff': bangmedia.unpack_aiff,
+        'terminfo': bangunpack.unpack_terminfo,
+        'rzip': bangunpack.unpack_rzip,
+        'jffs2_little_endian': bangfilesystems.unpack_jffs2,
+        'jffs2_big_endian': bangfilesystems.unpack_jffs2,
+        'cpio_old': bangunpack.unpack_cpio,
+        'cpio_portable': bangunpack.unpack_cpio,
+        'cpio_newascii': bangunpack.unpack_cpio,
+        'cpio_newcrc': bangunpack.unpack_cpio,
+        '7z': bangunpack.unpack_7z,
+        'chm': bangunpack.unpack_chm,
+        'mswim': bangunpack.unpack_wim,
+        'sunraster': bangmedia.unpack_sunraster,
+        'ext2': bangfilesystems.unpack_ext2,
+        'rpm': bangunpack.unpack_rpm,
+        'zstd_08': bangunpack.unpack_zstd,
+        'apple_icon': bangmedia.unpack_apple_icon,
+        'lz4': bangunpack.unpack_lz4,
+        'lz4_legacy': bangunpack.unpack_lz4legacy,
+        'vmdk': bangfilesystems.unpack_vmdk,
+        'qcow2': bangfilesystems.unpack_qcow2,
+        'vdi': bangfilesystems.unpack_vdi,
+        'javaclass': bangunpack.unpack_java_class,
+        'dex': bangandroid.unpack_dex,
+        'odex': bangandroid.unpack_odex,
+        'snappy_framed': bangunpack.unpack_snappy,
+        'elf': bangunpack.unpack_elf,
+        'swf': bangmedia.unpack_swf,
+        'swf_zlib': bangmedia.unpack_swf,
+        'swf_lzma': bangmedia.unpack_swf,
+        'ubootlegacy': bangunpack.unpack_uboot_legacy,
+        'certificate': bangunpack.unpack_certificate,
+        'git_index': bangunpack.unpack_git_index,
+        'flv': bangmedia.unpack_flv,
+        'lzop': bangunpack.unpack_lzop,
+        'dlinkromfs': bangfilesystems.unpack_dlink_romfs,
+        'pdf': bangmedia.unpack_pdf,
+        'pack200': bangunpack.unpack_pack200,
+        'zim': bangunpack.unpack_zim,
+        'javakeystore': bangunpack.unpack_java_keystore,
+        'xg3d': bangmedia.unpack_xg3d,
+        'acdb': bangunpack.unpack_acdb,
+        'ktx11': bangmedia.unpack_ktx11,
+        'avb': bangandroid.unpack_avb,
+        'sqlite3': bangunpack.unpack_sqlite,
+        'trx': bangunpack.unpack_trx,
+        'psd': bangmedia.unpack_psd,
+        'ppm': bangmedia.unpack_pnm,
+        'pgm': bangmedia.unpack_pnm,
+        'pbm': bangmedia.unpack_pnm,
+        'androidbootmsm': bangandroid.unpack_android_boot_msm,
+        'androidbootimg': bangandroid.unpack_android_boot_img,
+        'fat': bangfilesystems.unpack_fat,
+        'cbfs': bangfilesystems.unpack_cbfs,
+        'minix_1l': bangfilesystems.unpack_minix1l,
+        'compress': bangunpack.unpack_compress,
+        'romfs': bangfilesystems.unpack_romfs,
+        'cramfs_le': bangfilesystems.unpack_cramfs,
+        'cramfs_be': bangfilesystems.unpack_cramfs,
+        'ambarella': bangunpack.unpack_ambarella,
+        'romfs_ambarella': bangunpack.unpack_romfs_ambarella,
+        'bflt': bangunpack.unpack_bflt,
+        'ubi': bangfilesystems.unpack_ubi,
+        'bittorrent': bangunpack.unpack_bittorrent,
+        'pcapng': bangunpack.unpack_pcapng,
+        'pcap_le': bangunpack.unpack_pcap,
+        'pcap_be': bangunpack.unpack_pcap,
+        'pcap_le_nano': bangunpack.unpack_pcap,
+        'pcap_be_nano': bangunpack.unpack_pcap,
+        'android_binary_xml': bangandroid.unpack_android_resource,
+        'serialized_java': bangunpack.unpack_serialized_java,
+        'mapsforge': bangmedia.unpack_mapsforge,
+        'plf': bangfilesystems.unpack_plf,
+        'pfs': bangfilesystems.unpack_pfs,
+        'yaffs_le_1': bangfilesystems.unpack_yaffs2,
+        'yaffs_le_2': bangfilesystems.unpack_yaffs2,
+        'yaffs_be_1': bangfilesystems.unpack_yaffs2,
+        'yaffs_be_2': bangfilesystems.unpack_yaffs2,
+        'qcdt': bangunpack.unpack_qcdt,
+        #'dhtb': bangandroid.unpack_dhtb,
+        'crx': bangunpack.unpack_crx,
+    }
 
 # a lookup table to map signatures to a name for
 # pretty printing.
@@ -385,79 +391,52 @@ signatureprettyprint = {
 # reliably recognized any other way.
 # One example is the Android sparse data format.
 # These extensions should be lower case
-extensiontofunction = {
-    '.swp': bangunpack.unpack_vim_swapfile,
-    '.new.dat': bangandroid.unpack_android_sparse_data,
-    '.ihex': bangtext.unpack_ihex,
-    '.hex': bangtext.unpack_ihex,
-    '.srec': bangtext.unpack_srec,
-    '.xml': bangunpack.unpack_xml,
-    '.xsd': bangunpack.unpack_xml,
-    '.ncx': bangunpack.unpack_xml,
-    '.opf': bangunpack.unpack_xml,
-    '.svg': bangunpack.unpack_xml,
-    '.tar': bangunpack.unpack_tar,
-    'resources.arsc': bangandroid.unpack_android_resource,
-    'manifest.mf': bangtext.unpack_java_manifest,
-    '.sf': bangtext.unpack_java_manifest,
-    'dockerfile': bangtext.unpack_dockerfile,
-    '.dockerfile': bangtext.unpack_dockerfile,
-    'pkg-info': bangtext.unpack_python_pkginfo,
-    'known_hosts': bangtext.unpack_ssh_known_hosts,
-    'ssh_known_hosts': bangtext.unpack_ssh_known_hosts,
-    '.rsa': bangunpack.unpack_certificate,
-    '.pem': bangunpack.unpack_certificate,
-    '.lsm': bangtext.unpack_lsm,
-    '.json': bangunpack.unpack_json,
-    'passwd': bangtext.unpack_passwd,
-    'shadow': bangtext.unpack_shadow,
-    'group': bangtext.unpack_group,
-    '.css': bangtext.unpack_css,
-    'tzdata': bangandroid.unpack_android_tzdata,
-    'fstab': bangtext.unpack_fstab,
-    '.pc': bangtext.unpack_pkg_config,
-    '.ics': bangtext.unpack_ics,
-    'trans.tbl': bangtext.unpack_trans_tbl,
-    '.nb0': bangandroid.unpack_nb0,
-    'smbpasswd': bangtext.unpack_smbpasswd,
-    '.ini': bangtext.unpack_ini,
-    'wcprops': bangtext.unpack_subversion_hash,
-}
-
-import os
-import pkgutil
-import importlib
-import inspect
-import parsers
-import pathlib
-from UnpackParser import UnpackParser, WrappedUnpackParser
-
-def _get_unpackers_recursive(unpackers_root, parent_module_path):
-    unpackers = []
-    abs_module_path = unpackers_root / parent_module_path
-    for m in pkgutil.iter_modules([abs_module_path]):
-        full_module_path = parent_module_path / m.name
-        if (unpackers_root / full_module_path).is_dir():
-            try:
-                full_module_name = ".".join(full_module_path.parts)
-                module_name = 'parsers.{}.UnpackParser'.format(full_module_name)
-                module = importlib.import_module(module_name)
-                for name, member in inspect.getmembers(module):
-                    if inspect.isclass(member) and issubclass(member, UnpackParser) \
-                        and member != UnpackParser \
-                        and member != WrappedUnpackParser:
-                        unpackers.append(member)
-            except ModuleNotFoundError as e:
-                pass
-            unpackers.extend(_get_unpackers_recursive(
-                unpackers_root, full_module_path ))
-    return unpackers
-
+def _extensiontofunction():
+    return {
+        '.swp': bangunpack.unpack_vim_swapfile,
+        '.new.dat': bangandroid.unpack_android_sparse_data,
+        '.ihex': bangtext.unpack_ihex,
+        '.hex': bangtext.unpack_ihex,
+        '.srec': bangtext.unpack_srec,
+        '.xml': bangunpack.unpack_xml,
+        '.xsd': bangunpack.unpack_xml,
+        '.ncx': bangunpack.unpack_xml,
+        '.opf': bangunpack.unpack_xml,
+        '.svg': bangunpack.unpack_xml,
+        '.tar': bangunpack.unpack_tar,
+        'resources.arsc': bangandroid.unpack_android_resource,
+        'manifest.mf': bangtext.unpack_java_manifest,
+        '.sf': bangtext.unpack_java_manifest,
+        'dockerfile': bangtext.unpack_dockerfile,
+        '.dockerfile': bangtext.unpack_dockerfile,
+        'pkg-info': bangtext.unpack_python_pkginfo,
+        'known_hosts': bangtext.unpack_ssh_known_hosts,
+        'ssh_known_hosts': bangtext.unpack_ssh_known_hosts,
+        '.rsa': bangunpack.unpack_certificate,
+        '.pem': bangunpack.unpack_certificate,
+        '.lsm': bangtext.unpack_lsm,
+        '.json': bangunpack.unpack_json,
+        'passwd': bangtext.unpack_passwd,
+        'shadow': bangtext.unpack_shadow,
+        'group': bangtext.unpack_group,
+        '.css': bangtext.unpack_css,
+        'tzdata': bangandroid.unpack_android_tzdata,
+        'fstab': bangtext.unpack_fstab,
+        '.pc': bangtext.unpack_pkg_config,
+        '.ics': bangtext.unpack_ics,
+        'trans.tbl': bangtext.unpack_trans_tbl,
+        '.nb0': bangandroid.unpack_nb0,
+        'smbpasswd': bangtext.unpack_smbpasswd,
+        '.ini': bangtext.unpack_ini,
+        'wcprops': bangtext.unpack_subversion_hash,
+    }
+
+import ParserRegistry
 
 def get_unpackers():
-    unpackers = _get_unpackers_recursive(
-            pathlib.Path(os.path.dirname(parsers.__file__)), pathlib.Path('.'))
-    return unpackers
+    # the unpack parsers are described by a manifest and are only
+    # imported when they are used, see ParserRegistry.
+    return list(ParserRegistry.get_unpackers())
 
 def get_unpackers_for_extensions():
     d = {}
@@ -530,15 +509,30 @@ def matches_file_pattern(filename, extension):
     return filename.name.lower().endswith(extension)
 
 # certain unpacking functions if the whole file is text
-textonlyfunctions = {
-    'ihex': bangtext.unpack_ihex,
-    'srec': bangtext.unpack_srec,
-    'kernelconfig': bangtext.unpack_kernel_config,
-    #'dockerfile': bangtext.unpack_dockerfile,
-    'base64': bangtext.unpack_base64,
-    'script': bangtext.unpack_script,
+def _textonlyfunctions():
+    return {
+        'ihex': bangtext.unpack_ihex,
+        'srec': bangtext.unpack_srec,
+        'kernelconfig': bangtext.unpack_kernel_config,
+        #'dockerfile': bangtext.unpack_dockerfile,
+        'base64': bangtext.unpack_base64,
+        'script': bangtext.unpack_script,
+    }
+
+_legacytables = {
+    'signaturetofunction': _signaturetofunction,
+    'extensiontofunction': _extensiontofunction,
+    'textonlyfunctions': _textonlyfunctions,
 }
 
+def __getattr__(name):
+    # build the tables of legacy unpack functions on first use
+    if name not in _legacytables:
+        raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+    _import_legacy_modules()
+    globals()[name] = _legacytables[name]()
+    return globals()[name]
+
 # The result of the scan is a dictionary with the
 # following data, depending on the status of the scan
 # * the status of the scan (successful or not)
@@ -1077,7 +1077,7 @@ def unpack_base64(fileresult, scanenvironment, offset, unpackdir):
     checkfile.close()
 
     # now read the whole file and run it through various decoders
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     base64contents = bytearray(filesize)
     checkfile.readinto(base64contents)
     checkfile.close()
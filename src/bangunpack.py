@@ -44,9 +44,11 @@ import zlib
 import zipfile
 import bz2
 import stat
-import subprocess
 import json
 import xml.dom
+import xml.parsers.expat
+import re
+import codecs
 import hashlib
 import pathlib
 import sqlite3
@@ -54,10 +56,12 @@ import sqlite3
 # some external packages that are needed
 import defusedxml.minidom
 import lz4
+import lz4.block
 import lz4.frame
 import snappy
 
 from FileResult import *
+import bangdecompress
 
 encodingstotranslate = ['utf-8', 'ascii', 'latin-1', 'euc_jp', 'euc_jis_2004',
                         'jisx0213', 'iso2022_jp', 'iso2022_jp_1',
@@ -135,7 +139,7 @@ def unpack_gzip(fileresult, scanenvironment, offset, unpackdir):
 
     filename_full = scanenvironment.unpack_path(fileresult.filename)
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+3)
     unpackedsize += 3
     # RFC 1952 http://www.zlib.org/rfc-gzip.html describes the flags,
@@ -286,7 +290,7 @@ def unpack_gzip(fileresult, scanenvironment, offset, unpackdir):
     # http://www.zlib.net/manual.html#Advanced
     # First create a zlib decompressor that can decompress raw deflate
     # https://docs.python.org/3/library/zlib.html#zlib.compressobj
-    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    decompressor = bangdecompress.ZlibDecompressor(-zlib.MAX_WBITS)
 
     # now start decompressing the data
     # set the name of the file in case it is "anonymous data"
@@ -303,38 +307,27 @@ def unpack_gzip(fileresult, scanenvironment, offset, unpackdir):
 
     outfile_full = scanenvironment.unpack_path(outfile_rel)
 
-    # open a file to write any unpacked data to
-    os.makedirs(outfile_full.parent, exist_ok=True)
-    outfile = open(outfile_full, 'wb')
-
-    # store the CRC of the uncompressed data
-    gzipcrc32 = zlib.crc32(b'')
-
-    # then continue
-    readsize = 10000000
-    checkbuffer = bytearray(readsize)
-    while True:
-        bytesread = checkfile.readinto(checkbuffer)
-        if bytesread == 0:
-            break
-        checkbytes = memoryview(checkbuffer[:bytesread])
-        try:
-            unpackeddata = decompressor.decompress(checkbytes)
-            outfile.write(unpackeddata)
-            gzipcrc32 = zlib.crc32(unpackeddata, gzipcrc32)
-        except Exception as e:
-            # clean up
-            outfile.close()
-            os.unlink(outfile_full)
-            checkfile.close()
-            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                              'reason': 'File not a valid gzip file'}
-            return {'status': False, 'error': unpackingerror}
-
-        unpackedsize += bytesread - len(decompressor.unused_data)
-        if decompressor.unused_data != b'':
-            break
-    outfile.close()
+    # write any unpacked data to the output, while also computing the
+    # CRC of the uncompressed data
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full,
+            computecrc=True)
+    try:
+        unpackedsize += bangdecompress.decompress_stream(decompressor,
+                checkfile, output)
+    except bangdecompress.DecompressionLimitExceeded as e:
+        output.discard()
+        checkfile.close()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': e.args[0]}
+        return {'status': False, 'error': unpackingerror}
+    except Exception as e:
+        # clean up
+        output.discard()
+        checkfile.close()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': 'File not a valid gzip file'}
+        return {'status': False, 'error': unpackingerror}
+    output.close()
 
     # A valid gzip file has CRC32 and ISIZE at the end, so there should
     # always be at least 8 bytes left for a valid file.
@@ -347,12 +340,12 @@ def unpack_gzip(fileresult, scanenvironment, offset, unpackdir):
     # first reset the file pointer until the end of the unpacked zlib data
     checkfile.seek(offset + unpackedsize)
 
-    # now compute the gzip CRC of the uncompressed data and compare to
-    # the CRC stored in the file (RFC 1952, section 2.3.1)
+    # now compare the gzip CRC of the uncompressed data to the CRC
+    # stored in the file (RFC 1952, section 2.3.1)
     checkbytes = checkfile.read(4)
     unpackedsize += 4
 
-    if not gzipcrc32 == int.from_bytes(checkbytes, byteorder='little') and wrongcrcfatal:
+    if not output.crc32 == int.from_bytes(checkbytes, byteorder='little') and wrongcrcfatal:
         checkfile.close()
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'wrong CRC'}
@@ -365,7 +358,7 @@ def unpack_gzip(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize += 4
 
     # this check is modulo 2^32
-    isize = os.stat(outfile_full).st_size % pow(2, 32)
+    isize = output.written % pow(2, 32)
     if int.from_bytes(checkbytes, byteorder='little') != isize:
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'wrong value for ISIZE'}
@@ -428,7 +421,7 @@ def unpack_lzma(fileresult, scanenvironment, offset, unpackdir):
     # The file lzma-file-format.txt in XZ file distributions describe
     # the LZMA format. The first 13 bytes describe the header. The last
     # 8 bytes of the header describe the file size.
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+5)
     checkbytes = checkfile.read(8)
     checkfile.close()
@@ -477,29 +470,12 @@ def unpack_lzma_wrapper(
     unpackedfilesandlabels = []
     labels = []
     unpackingerror = {}
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
-    # Extract one 900k block of data as an extra sanity check.
-    # First create a decompressor
     decompressor = lzma.LZMADecompressor()
-    checkbuffer = bytearray(900000)
-    bytesread = checkfile.readinto(checkbuffer)
-    checkbytes = memoryview(checkbuffer[:bytesread])
-
-    # then try to decompress the data.
-    try:
-        unpackeddata = decompressor.decompress(checkbytes)
-    except Exception as e:
-        # no data could be successfully unpacked
-        checkfile.close()
-        unpackingerror = {'offset': offset+unpackedsize,
-                          'fatal': False,
-                          'reason': 'not valid %s data' % ppfiletype}
-        return {'status': False, 'error': unpackingerror}
 
     # set the name of the file in case it is "anonymous data"
     # otherwise just imitate whatever unxz and lzma do. If the file
@@ -517,49 +493,36 @@ def unpack_lzma_wrapper(
             outfile_rel = os.path.join(unpackdir, filename_full.stem) + ".tar"
     outfile_full = scanenvironment.unpack_path(outfile_rel)
 
-    # data has been unpacked, so open a file and write the data to it.
-    # unpacked, or if all data has been unpacked
-    os.makedirs(unpackdir_full, exist_ok=True)
-    outfile = open(outfile_full, 'wb')
-    outfile.write(unpackeddata)
-    unpackedsize += bytesread - len(decompressor.unused_data)
-
-    # there is still some data left to be unpacked, so
-    # continue unpacking, as described in the Python documentation:
-    # https://docs.python.org/3/library/bz2.html#incremental-de-compression
+    # decompress the data. The output file is only created once data
+    # has been unpacked, which is not the case for most false positives.
     # https://docs.python.org/3/library/lzma.html
-    bytesread = checkfile.readinto(checkbuffer)
-    checkbytes = memoryview(checkbuffer[:bytesread])
-    while bytesread != 0:
-        try:
-            unpackeddata = decompressor.decompress(checkbytes)
-        except EOFError as e:
-            break
-        except Exception as e:
-            # clean up
-            outfile.close()
-            os.unlink(outfile_full)
-            checkfile.close()
-            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                              'reason': 'File not a valid %s file' % ppfiletype}
-            return {'status': False, 'error': unpackingerror}
-        outfile.write(unpackeddata)
-        # there is no more compressed data
-        unpackedsize += bytesread - len(decompressor.unused_data)
-        if decompressor.unused_data != b'':
-            break
-        bytesread = checkfile.readinto(checkbuffer)
-        checkbytes = memoryview(checkbuffer[:bytesread])
-    outfile.close()
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full)
+    try:
+        unpackedsize += bangdecompress.decompress_stream(decompressor,
+                checkfile, output)
+    except bangdecompress.DecompressionLimitExceeded as e:
+        output.discard()
+        checkfile.close()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': e.args[0]}
+        return {'status': False, 'error': unpackingerror}
+    except Exception as e:
+        # no data could be successfully unpacked
+        output.discard()
+        checkfile.close()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': 'not valid %s data' % ppfiletype}
+        return {'status': False, 'error': unpackingerror}
     checkfile.close()
 
-    outfile_size = os.stat(outfile_full).st_size
     # ignore empty files, as it is bogus data
+    outfile_size = output.written
     if outfile_size == 0:
-        os.unlink(outfile_full)
+        output.discard()
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'File not a valid %s file' % ppfiletype}
         return {'status': False, 'error': unpackingerror}
+    output.close()
 
     # check if the length of the unpacked LZMA data is correct, but
     # only if any unpacked length has been defined.
@@ -620,7 +583,7 @@ def unpack_xz(fileresult, scanenvironment, offset, unpackdir):
         # stream flags have to be identical.
         if xzres['status']:
             # open the file again
-            checkfile = open(filename_full, 'rb')
+            checkfile = scanenvironment.open_input_file(filename_full)
 
             # seek to where the streamflags start and read them
             checkfile.seek(offset+6)
@@ -673,7 +636,7 @@ def unpack_timezone(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -1146,7 +1109,7 @@ def unpack_tar(fileresult, scanenvironment, offset, unpackdir):
     # been cut halfway but it might still be possible to extract some
     # data. Use a file object so it is possible to start tar unpacking
     # at arbitrary positions in the file.
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # seek to the offset where the tar is supposed to start. According
     # to the documentation it should be opened at offset 0, but this
@@ -1318,6 +1281,7 @@ unpack_tar.offset = 0x101
 # Unix portable archiver
 # https://en.wikipedia.org/wiki/Ar_%28Unix%29
 # https://sourceware.org/binutils/docs/binutils/ar.html
+# https://www.freebsd.org/cgi/man.cgi?query=ar&sektion=5
 def unpack_ar(fileresult, scanenvironment, offset, unpackdir):
     '''Unpack ar concatenated data.'''
     filesize = fileresult.filesize
@@ -1334,46 +1298,123 @@ def unpack_ar(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'Currently only works on whole files'}
         return {'status': False, 'error': unpackingerror}
 
-    if shutil.which('ar') is None:
-        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                          'reason': 'ar program not found'}
-        return {'status': False, 'error': unpackingerror}
-
-    # first test the file to see if it is a valid file
-    p = subprocess.Popen(['ar', 't', filename_full], stdin=subprocess.PIPE,
-                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (standard_out, standard_error) = p.communicate()
-    if p.returncode != 0:
+    checkfile = scanenvironment.open_input_file(filename_full)
+    checkbytes = checkfile.read(8)
+    if checkbytes != b'!<arch>\n':
+        checkfile.close()
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'Not a valid ar file'}
         return {'status': False, 'error': unpackingerror}
+    unpackedsize = 8
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
+    # first walk all the headers to see if it is a valid file.
+    # Every member has a 60 byte header, followed by the data,
+    # which is padded to an even size. The member names are
+    # stored in three ways:
+    #
+    # * in the header, terminated with '/' (GNU) or padded
+    #   with spaces (BSD)
+    # * GNU: as '/' followed by an offset in the table of long
+    #   names, which is stored in the member '//'
+    # * BSD: as '#1/' followed by the length of the name, which
+    #   is stored at the start of the data
+    #
+    # The GNU symbol tables ('/' and '/SYM64/') are not extracted,
+    # like 'ar x' does. Like 'ar x' data after the last member that
+    # is too small for a header is ignored.
+    longnames = None
+    members = []
+    while filesize - unpackedsize >= 60:
+        checkbytes = checkfile.read(60)
+        if checkbytes[58:60] != b'`\n':
+            checkfile.close()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'Not a valid ar file'}
+            return {'status': False, 'error': unpackingerror}
+        try:
+            membersize = int(checkbytes[48:58].decode().strip())
+        except ValueError:
+            membersize = -1
+        if membersize < 0 or unpackedsize + 60 + membersize > filesize:
+            checkfile.close()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'Not a valid ar file'}
+            return {'status': False, 'error': unpackingerror}
+        dataoffset = unpackedsize + 60
+        datasize = membersize
+
+        membername = checkbytes[:16].rstrip(b' ')
+        if membername == b'//':
+            longnames = checkfile.read(membersize)
+            membername = None
+        elif membername in [b'/', b'/SYM64/']:
+            membername = None
+        elif membername.startswith(b'/'):
+            try:
+                nameoffset = int(membername[1:].decode())
+            except ValueError:
+                nameoffset = -1
+            if longnames is None or not 0 <= nameoffset < len(longnames):
+                checkfile.close()
+                unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                                  'reason': 'Not a valid ar file'}
+                return {'status': False, 'error': unpackingerror}
+            nameend = longnames.find(b'/\n', nameoffset)
+            if nameend == -1:
+                nameend = len(longnames)
+            membername = longnames[nameoffset:nameend]
+        elif membername.startswith(b'#1/'):
+            try:
+                namelength = int(membername[3:].decode())
+            except ValueError:
+                namelength = -1
+            if not 0 <= namelength <= membersize:
+                checkfile.close()
+                unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                                  'reason': 'Not a valid ar file'}
+                return {'status': False, 'error': unpackingerror}
+            membername = checkfile.read(namelength).rstrip(b'\x00')
+            dataoffset += namelength
+            datasize -= namelength
+        else:
+            # the name ends at the first NUL, '/' or space
+            for terminator in [b'\x00', b'/', b' ']:
+                if terminator in checkbytes[:16]:
+                    membername = checkbytes[:checkbytes.index(terminator)]
+                    break
 
-    # then extract the file
-    p = subprocess.Popen(['ar', 'x', filename_full], stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE, cwd=unpackdir_full)
-    (outputmsg, errormsg) = p.communicate()
-    if p.returncode != 0:
-        foundfiles = os.listdir(unpackdir_full)
-        # try to remove any files that were left behind
-        for f in foundfiles:
-            if os.path.isdir(os.path.join(unpackdir_full, f)):
-                shutil.rmtree(os.path.join(unpackdir_full, f))
-            else:
-                os.unlink(os.path.join(unpackdir_full, f))
+        if membername is not None:
+            try:
+                membername = membername.decode()
+            except UnicodeDecodeError:
+                membername = ''
+            # names with a path are not extracted by 'ar x'
+            if membername in ['', '.', '..'] or '/' in membername:
+                checkfile.close()
+                unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                                  'reason': 'Not a valid ar file'}
+                return {'status': False, 'error': unpackingerror}
+            members.append((membername, dataoffset, datasize))
 
-        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                          'reason': 'Not a valid ar file'}
-        return {'status': False, 'error': unpackingerror}
+        unpackedsize += 60 + membersize
+        if unpackedsize % 2 != 0 and unpackedsize < filesize:
+            unpackedsize += 1
+        checkfile.seek(unpackedsize)
+
+    # then extract the members. Members with the same name
+    # overwrite each other, like with 'ar x'.
+    os.makedirs(unpackdir_full, exist_ok=True)
+    for (membername, dataoffset, datasize) in members:
+        outfile_full = os.path.join(unpackdir_full, membername)
+        outfile = open(outfile_full, 'wb')
+        os.sendfile(outfile.fileno(), checkfile.fileno(), dataoffset, datasize)
+        outfile.close()
+    checkfile.close()
 
-    foundfiles = os.listdir(unpackdir_full)
     labels += ['archive', 'ar']
 
-    for f in foundfiles:
+    for f in dict.fromkeys(m[0] for m in members):
         outputfile_rel = os.path.join(unpackdir, f)
-        outputfile_full = os.path.join(unpackdir_full, f)
         unpackedfilesandlabels.append((outputfile_rel, []))
         if f == 'debian-binary':
             if filename_full.suffix.lower() == '.deb' or filename_full.suffix.lower() == '.udeb':
@@ -1412,7 +1453,7 @@ def unpack_icc(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'Not a valid ICC file'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # Then analyze the rest of the file
@@ -1604,6 +1645,11 @@ def unpack_dahua(fileresult, scanenvironment, offset, unpackdir):
     checkfile.write(b'PK')
     checkfile.close()
 
+    # data of the shared file that was read before has to be read again
+    sharedfile = scanenvironment.get_shared_input_file(filename_full)
+    if sharedfile is not None:
+        sharedfile.reopen()
+
     dahuares = unpack_zip(fileresult, scanenvironment, offset, unpackdir)
 
     # reopen for writing
@@ -1615,6 +1661,9 @@ def unpack_dahua(fileresult, scanenvironment, offset, unpackdir):
     checkfile.write(b'DH')
     checkfile.close()
 
+    if sharedfile is not None:
+        sharedfile.reopen()
+
     if dahuares['status']:
         dahuares['labels'].append('dahua')
     return dahuares
@@ -1660,7 +1709,7 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
 
     # skip over the (local) magic
     # and process like section 4.3.7
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     minzipversion = 0
     maxzipversion = 90
@@ -2449,6 +2498,7 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
             # not even necessary.
             checkfile.seek(offset)
 
+        oldcwd = os.getcwd()
         try:
             if not carved:
                 unpackzipfile = zipfile.ZipFile(checkfile)
@@ -2456,7 +2506,6 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
                 unpackzipfile = zipfile.ZipFile(temporaryfile[1])
             zipfiles = unpackzipfile.namelist()
             zipinfolist = unpackzipfile.infolist()
-            oldcwd = os.getcwd()
 
             # create the unpacking directory
             os.makedirs(unpackdir_full, exist_ok=True)
@@ -2501,6 +2550,7 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
                     try:
                         unpackzipfile.extractall()
                     except NotImplementedError:
+                        os.chdir(oldcwd)
                         checkfile.close()
                         if carved:
                             os.unlink(temporaryfile[1])
@@ -2549,6 +2599,7 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
             return {'status': True, 'length': unpackedsize, 'labels': labels,
                     'filesandlabels': unpackedfilesandlabels}
         except zipfile.BadZipFile:
+            os.chdir(oldcwd)
             checkfile.close()
             if carved:
                 os.unlink(temporaryfile[1])
@@ -2598,27 +2649,13 @@ def unpack_bzip2(fileresult, scanenvironment, offset, unpackdir, dryrun=False):
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'File too small (less than 10 bytes'}
         return {'status': False, 'error': unpackingerror}
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
-    # Extract one 900k block of data as an extra sanity check.
     # First create a bzip2 decompressor
     bz2decompressor = bz2.BZ2Decompressor()
-    bz2data = checkfile.read(900000)
-
-    # then try to decompress the data.
-    try:
-        unpackeddata = bz2decompressor.decompress(bz2data)
-    except Exception:
-        # no data could be successfully unpacked,
-        # so close the file and exit.
-        checkfile.close()
-        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                          'reason': 'File not a valid bzip2 file'}
-        return {'status': False, 'error': unpackingerror}
 
     # set the name of the file in case it is "anonymous data"
     # otherwise just imitate whatever bunzip2 does.
@@ -2631,52 +2668,40 @@ def unpack_bzip2(fileresult, scanenvironment, offset, unpackdir, dryrun=False):
         outfile_rel = os.path.join(unpackdir, "unpacked-from-bz2")
 
     outfile_full = scanenvironment.unpack_path(outfile_rel)
-    # data has been unpacked, so open a file and write the data to it.
-    # unpacked, or if all data has been unpacked
-    if not dryrun:
-        # create the unpacking directory
-        os.makedirs(unpackdir_full, exist_ok=True)
-        outfile = open(outfile_full, 'wb')
-        outfile.write(unpackeddata)
-
-    unpackedsize += len(bz2data) - len(bz2decompressor.unused_data)
 
-    # there is still some data left to be unpacked, so
-    # continue unpacking, as described in the Python documentation:
+    # decompress the data, as described in the Python documentation:
     # https://docs.python.org/3/library/bz2.html#incremental-de-compression
-    # read some more data in chunks of 10 MB
-    datareadsize = 10000000
-    bz2data = checkfile.read(datareadsize)
-    while bz2data != b'':
-        try:
-            unpackeddata = bz2decompressor.decompress(bz2data)
-        except EOFError as e:
-            break
-        except Exception as e:
-            # clean up
-            if not dryrun:
-                outfile.close()
-                os.unlink(outfile_full)
-            checkfile.close()
-            unpackingerror = {'offset': offset+unpackedsize,
-                              'fatal': False,
-                              'reason': 'File not a valid bzip2 file, use bzip2recover?'}
-            return {'status': False, 'error': unpackingerror}
-
-        if not dryrun:
-            outfile.write(unpackeddata)
-
-        # there is no more compressed data
-        unpackedsize += len(bz2data) - len(bz2decompressor.unused_data)
-        if bz2decompressor.unused_data != b'':
-            break
-        bz2data = checkfile.read(datareadsize)
+    # The output file is only created once data has been unpacked, and
+    # not at all for a dry run.
+    if dryrun:
+        output = bangdecompress.bounded_output(scanenvironment, None)
+    else:
+        output = bangdecompress.bounded_output(scanenvironment, outfile_full)
+    try:
+        unpackedsize += bangdecompress.decompress_stream(bz2decompressor,
+                checkfile, output)
+    except bangdecompress.DecompressionLimitExceeded as e:
+        output.discard()
+        checkfile.close()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': e.args[0]}
+        return {'status': False, 'error': unpackingerror}
+    except Exception as e:
+        # clean up
+        output.discard()
+        checkfile.close()
+        if output.written == 0:
+            reason = 'File not a valid bzip2 file'
+        else:
+            reason = 'File not a valid bzip2 file, use bzip2recover?'
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': reason}
+        return {'status': False, 'error': unpackingerror}
 
     checkfile.close()
+    output.close()
 
     if not dryrun:
-        outfile.close()
-
         if offset == 0 and unpackedsize == filesize:
             labels += ['bzip2', 'compressed']
         unpackedfilesandlabels.append((outfile_rel, []))
@@ -2720,7 +2745,7 @@ def unpack_xar(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # skip over the file magic
     checkfile.seek(offset+4)
@@ -3141,7 +3166,6 @@ def unpack_lzip(fileresult, scanenvironment, offset, unpackdir):
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     if filesize < 26:
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
@@ -3149,7 +3173,7 @@ def unpack_lzip(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -3186,42 +3210,27 @@ def unpack_lzip(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, filename_full.stem)
     outfile_full = scanenvironment.unpack_path(outfile_rel)
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
-    outfile = open(outfile_full, 'wb')
-
     # while decompressing also compute the CRC of the uncompressed
     # data, as it is stored after the compressed LZMA data in the file
-    crccomputed = binascii.crc32(b'')
-
-    readsize = 1000000
-    lzipbuffer = bytearray(readsize)
-    bytesread = checkfile.readinto(lzipbuffer)
-    checkbytes = lzipbuffer[:bytesread]
-
-    while bytesread != 0:
-        try:
-            unpackeddata = decompressor.decompress(checkbytes)
-        except EOFError as e:
-            break
-        except Exception as e:
-            # clean up
-            outfile.close()
-            os.unlink(outfile_full)
-            checkfile.close()
-            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                              'reason': 'not valid LZMA data'}
-            return {'status': False, 'error': unpackingerror}
-        outfile.write(unpackeddata)
-        crccomputed = binascii.crc32(unpackeddata, crccomputed)
-        # there is no more compressed data
-        unpackedsize += bytesread - len(decompressor.unused_data)
-        if decompressor.unused_data != b'':
-            break
-        bytesread = checkfile.readinto(lzipbuffer)
-        checkbytes = lzipbuffer[:bytesread]
-
-    outfile.close()
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full,
+            computecrc=True)
+    try:
+        unpackedsize += bangdecompress.decompress_stream(decompressor,
+                checkfile, output)
+    except bangdecompress.DecompressionLimitExceeded as e:
+        output.discard()
+        checkfile.close()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': e.args[0]}
+        return {'status': False, 'error': unpackingerror}
+    except Exception as e:
+        # clean up
+        output.discard()
+        checkfile.close()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': 'not valid LZMA data'}
+        return {'status': False, 'error': unpackingerror}
+    output.close()
 
     # first reset to the end of the LZMA compressed data
     checkfile.seek(offset+unpackedsize)
@@ -3236,7 +3245,7 @@ def unpack_lzip(fileresult, scanenvironment, offset, unpackdir):
 
     crcstored = int.from_bytes(checkbytes, byteorder='little')
     # the CRC stored is the CRC of the uncompressed data
-    if crcstored != crccomputed:
+    if crcstored != output.crc32:
         checkfile.close()
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'wrong CRC'}
@@ -3251,7 +3260,7 @@ def unpack_lzip(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough data for original data size'}
         return {'status': False, 'error': unpackingerror}
     originalsize = int.from_bytes(checkbytes, byteorder='little')
-    if originalsize != os.stat(outfile_full).st_size:
+    if originalsize != output.written:
         checkfile.close()
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'wrong original data size'}
@@ -3300,7 +3309,7 @@ def unpack_woff(fileresult, scanenvironment, offset, unpackdir):
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # skip over the header
@@ -3632,7 +3641,7 @@ def unpack_font(fileresult, scanenvironment, offset, unpackdir,
     unpackedsize = 0
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # skip the magic
     checkfile.seek(offset+4)
@@ -4106,7 +4115,7 @@ def unpack_opentype_font_collection(
                           'reason': 'not a valid font file'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize = 4
 
@@ -4196,7 +4205,7 @@ def unpack_vim_swapfile(fileresult, scanenvironment, offset, unpackdir):
     unpackingerror = {}
     unpackedsize = 0
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(6)
     if len(checkbytes) != 6:
@@ -4273,7 +4282,7 @@ def unpack_cab(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic and reserved field
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize += 8
 
@@ -4292,24 +4301,12 @@ def unpack_cab(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'cabextract program not found'}
         return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == cabinetsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, cabinetsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-
     checkfile.close()
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
-    if havetmpfile:
-        p = subprocess.Popen(['cabextract', '-d', unpackdir_full, temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    else:
-        p = subprocess.Popen(['cabextract', '-d', unpackdir_full, filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, cabinetsize) as cabinetfile:
+        p = externaltools.run(['cabextract', '-d', unpackdir_full, cabinetfile])
     if p.returncode != 0:
-        if havetmpfile:
-            os.unlink(temporaryfile[1])
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid cab file'}
         return {'status': False, 'error': unpackingerror}
@@ -4331,14 +4328,10 @@ def unpack_cab(fileresult, scanenvironment, offset, unpackdir):
             unpackedfilesandlabels.append((relfilename, []))
 
     # whole file is cabinet
-    if not havetmpfile:
+    if offset == 0 and filesize == cabinetsize:
         labels.append('cab')
         labels.append('archive')
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-
     return {'status': True, 'length': unpackedsize, 'labels': labels,
             'filesandlabels': unpackedfilesandlabels}
 
@@ -4365,7 +4358,7 @@ def unpack_terminfo(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough data for header'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     # first skip over the magic
     checkfile.seek(offset+2)
     unpackedsize += 2
@@ -4658,7 +4651,7 @@ def unpack_rzip(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     unpackedsize = 0
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # skip over the header
     checkfile.seek(offset+4)
@@ -4738,34 +4731,12 @@ def unpack_rzip(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, filename_full.stem)
     outfile_full = scanenvironment.unpack_path(outfile_rel)
 
-    if offset == 0 and unpackedsize == filesize:
-        checkfile.close()
-        p = subprocess.Popen(['rzip', '-k', '-d', filename_full, '-o', outfile_full], stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
-        (outputmsg, errormsg) = p.communicate()
-        if p.returncode != 0:
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'invalid RZIP file'}
-            return {'status': False, 'error': unpackingerror}
-        if os.stat(outfile_full).st_size != uncompressedsize:
-            os.unlink(outfile_full)
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'unpacked RZIP data does not match declared uncompressed size'}
-            return {'status': False, 'error': unpackingerror}
-        unpackedfilesandlabels.append((outfile_rel, []))
-        labels.append('compressed')
-        labels.append('rzip')
-
-        return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
-
-    temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-    os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-    os.fdopen(temporaryfile[0]).close()
+    # rzip removes the file that it unpacks, unless -k is used
     checkfile.close()
-    p = subprocess.Popen(['rzip', '-d', temporaryfile[1], '-o', outfile_full], stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
-    (outputmsg, errormsg) = p.communicate()
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, unpackedsize) as rzipfile:
+        p = externaltools.run(['rzip', '-k', '-d', rzipfile, '-o', outfile_full])
     if p.returncode != 0:
-        os.unlink(temporaryfile[1])
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid RZIP file'}
         return {'status': False, 'error': unpackingerror}
@@ -4775,6 +4746,9 @@ def unpack_rzip(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'unpacked RZIP data does not match declared uncompressed size'}
         return {'status': False, 'error': unpackingerror}
     unpackedfilesandlabels.append((outfile_rel, []))
+    if offset == 0 and unpackedsize == filesize:
+        labels.append('compressed')
+        labels.append('rzip')
 
     return {'status': True, 'length': unpackedsize, 'labels': labels,
             'filesandlabels': unpackedfilesandlabels}
@@ -4816,7 +4790,7 @@ def unpack_cpio(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough bytes for header'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # create the unpacking directory
@@ -5885,7 +5859,7 @@ def unpack_7z(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 6)
     unpackedsize += 6
 
@@ -5956,20 +5930,10 @@ def unpack_7z(fileresult, scanenvironment, offset, unpackdir):
                           'reason': '7z program not found'}
         return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == unpackedsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    if offset == 0 and filesize == unpackedsize:
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    checkfile.close()
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, unpackedsize) as sevenzipfile:
+        p = externaltools.run(['7z', '-o%s' % unpackdir_full, '-y', 'x', sevenzipfile])
     if p.returncode != 0:
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid 7z file'}
@@ -5987,10 +5951,7 @@ def unpack_7z(fileresult, scanenvironment, offset, unpackdir):
             relfilename = scanenvironment.rel_unpack_path(fullfilename)
             unpackedfilesandlabels.append((relfilename, []))
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-    else:
+    if offset == 0 and filesize == unpackedsize:
         labels.append('7z')
         labels.append('compressed')
         labels.append('archive')
@@ -6023,7 +5984,7 @@ def unpack_chm(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic and the version number
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize += 8
 
@@ -6116,24 +6077,11 @@ def unpack_chm(fileresult, scanenvironment, offset, unpackdir):
 
     unpackedsize = chmsize
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == unpackedsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    if offset == 0 and filesize == unpackedsize:
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    checkfile.close()
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, unpackedsize) as sevenzipfile:
+        p = externaltools.run(['7z', '-o%s' % unpackdir_full, '-y', 'x', sevenzipfile])
     if p.returncode != 0:
-        # cleanup
-        if havetmpfile:
-            os.unlink(temporaryfile[1])
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid CHM file'}
         return {'status': False, 'error': unpackingerror}
@@ -6150,10 +6098,7 @@ def unpack_chm(fileresult, scanenvironment, offset, unpackdir):
             relfilename = scanenvironment.rel_unpack_path(fullfilename)
             unpackedfilesandlabels.append((relfilename, []))
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-    else:
+    if offset == 0 and filesize == unpackedsize:
         labels.append('chm')
         labels.append('compressed')
         labels.append('resource')
@@ -6194,7 +6139,7 @@ def unpack_wim(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 8)
     unpackedsize += 8
 
@@ -6395,20 +6340,10 @@ def unpack_wim(fileresult, scanenvironment, offset, unpackdir):
                           'reason': '7z program not found'}
         return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == unpackedsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    if offset == 0 and filesize == unpackedsize:
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    checkfile.close()
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, unpackedsize) as sevenzipfile:
+        p = externaltools.run(['7z', '-o%s' % unpackdir_full, '-y', 'x', sevenzipfile])
     if p.returncode != 0:
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid WIM file'}
@@ -6426,15 +6361,11 @@ def unpack_wim(fileresult, scanenvironment, offset, unpackdir):
             relfilename = scanenvironment.rel_unpack_path(fullfilename)
             unpackedfilesandlabels.append((relfilename, []))
 
-    if not havetmpfile:
+    if offset == 0 and filesize == unpackedsize:
         labels.append('mswim')
         labels.append('compressed')
         labels.append('archive')
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-
     return {'status': True, 'length': unpackedsize, 'labels': labels,
             'filesandlabels': unpackedfilesandlabels}
 
@@ -6469,7 +6400,7 @@ def unpack_rpm(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -6979,14 +6910,15 @@ def unpack_zstd(fileresult, scanenvironment, offset, unpackdir):
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
-    if shutil.which('zstd') is None:
+    # the frame is decompressed with zstandard, or if it is not
+    # installed, by the zstd program.
+    if bangdecompress.zstandard is None and shutil.which('zstd') is None:
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'zstd program not found'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     # skip the magic
     checkfile.seek(offset+4)
     unpackedsize += 4
@@ -7071,6 +7003,9 @@ def unpack_zstd(fileresult, scanenvironment, offset, unpackdir):
                               'reason': 'not enough data for frame content size'}
             return {'status': False, 'error': unpackingerror}
         uncompressed_size = int.from_bytes(checkbytes, byteorder='little')
+        # a 2 byte frame content size is stored minus 256
+        if fcs_field_size == 2:
+            uncompressed_size += 256
         unpackedsize += fcs_field_size
 
     # then the blocks: each block starts with 3 bytes
@@ -7086,6 +7021,17 @@ def unpack_zstd(fileresult, scanenvironment, offset, unpackdir):
         if checkbytes[0] & 1 == 1:
             lastblock = True
         blocksize = int.from_bytes(checkbytes, byteorder='little') >> 3
+
+        # for RLE blocks the block size is the size of the
+        # decompressed data, which is a single repeated byte.
+        blocktype = (checkbytes[0] >> 1) & 3
+        if blocktype == 3:
+            checkfile.close()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'reserved block type'}
+            return {'status': False, 'error': unpackingerror}
+        if blocktype == 1:
+            blocksize = 1
         if checkfile.tell() + blocksize > filesize:
             checkfile.close()
             unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
@@ -7107,52 +7053,57 @@ def unpack_zstd(fileresult, scanenvironment, offset, unpackdir):
 
     unpackedsize = checkfile.tell() - offset
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
-
     # zstd does not record the name of the file that was
     # compressed, so guess, or just set a name.
     if offset == 0 and unpackedsize == filesize:
-        checkfile.close()
         if filename_full.suffix.lower() == '.zst':
             outfile_rel = os.path.join(unpackdir, filename_full.stem)
         else:
             outfile_rel = os.path.join(unpackdir, "unpacked-by-zstd")
-        outfile_full = scanenvironment.unpack_path(outfile_rel)
-        p = subprocess.Popen(['zstd', '-d', '-o', outfile_full, filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        if p.returncode != 0:
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'invalid zstd'}
-            return {'status': False, 'error': unpackingerror}
-        if fcs_field_size != 0:
-            if uncompressed_size != os.stat(outfile_full).st_size:
-                unpackingerror = {'offset': offset, 'fatal': False,
-                                  'reason': 'invalid checksum'}
-                return {'status': False, 'error': unpackingerror}
         labels.append('zstd')
         labels.append('compressed')
     else:
-        tmpfilename = os.path.join(unpackdir, "unpacked-by-zstd.zst")
-        tmpfile_full = scanenvironment.unpack_path(tmpfilename)
-        tmpfile = open(tmpfile_full, 'wb')
-        os.sendfile(tmpfile.fileno(), checkfile.fileno(), offset, unpackedsize)
-        tmpfile.close()
-        checkfile.close()
-        outfile_rel = tmpfilename[:-4]
-        outfile_full = scanenvironment.unpack_path(outfile_rel)
-        p = subprocess.Popen(['zstd', '-d', '--rm', '-o', outfile_full, tmpfile_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        if p.returncode != 0:
-            os.unlink(tmpfile_full)
+        outfile_rel = os.path.join(unpackdir, "unpacked-by-zstd")
+    outfile_full = scanenvironment.unpack_path(outfile_rel)
+
+    # decompress the frame directly from the file, as its size
+    # is known now.
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full)
+    try:
+        if bangdecompress.zstandard is not None:
+            checkfile.seek(offset)
+            try:
+                bangdecompress.decompress_zstd_frame(checkfile, unpackedsize,
+                                                     output)
+                validzstd = True
+            except bangdecompress.zstandard.ZstdError:
+                validzstd = False
+        else:
+            output.add_input(unpackedsize)
+            with scanenvironment.externaltools.slot('zstd'):
+                returncode = bangdecompress.decompress_with_program(
+                        ['zstd', '-d', '-c'], output, checkfile, offset,
+                        unpackedsize)
+            validzstd = returncode == 0
+    except bangdecompress.DecompressionLimitExceeded as e:
+        checkfile.close()
+        output.discard()
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': e.args[0]}
+        return {'status': False, 'error': unpackingerror}
+    checkfile.close()
+    if not validzstd:
+        output.discard()
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': 'invalid zstd'}
+        return {'status': False, 'error': unpackingerror}
+    if fcs_field_size != 0:
+        if uncompressed_size != output.written:
+            output.discard()
             unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'invalid zstd'}
+                              'reason': 'invalid checksum'}
             return {'status': False, 'error': unpackingerror}
-        if fcs_field_size != 0:
-            if uncompressed_size != os.stat(outfile_full).st_size:
-                unpackingerror = {'offset': offset, 'fatal': False,
-                                  'reason': 'invalid checksum'}
-                return {'status': False, 'error': unpackingerror}
+    output.close()
 
     unpackedfilesandlabels.append((outfile_rel, []))
     return {'status': True, 'length': unpackedsize, 'labels': labels,
@@ -7173,54 +7124,41 @@ def unpack_lz4(fileresult, scanenvironment, offset, unpackdir):
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
-
     outfile_rel = os.path.join(unpackdir, "unpacked-from-lz4")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
-    outfile = open(outfile_full, 'wb')
-
     # first create a decompressor object
-    decompressor = lz4.frame.create_decompression_context()
+    decompressor = bangdecompress.LZ4FrameDecompressor()
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
-    readsize = 1000000
-    checkbytes = checkfile.read(readsize)
-
-    seeneof = False
-    while checkbytes != b'':
-        try:
-            uncompressresults = lz4.frame.decompress_chunk(decompressor, checkbytes)
-            outfile.write(uncompressresults[0])
-            outfile.flush()
-        except:
-            checkfile.close()
-            outfile.close()
-            os.unlink(outfile_full)
-            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                              'reason': 'LZ4 unpacking error'}
-            return {'status': False, 'error': unpackingerror}
-
-        unpackedsize += uncompressresults[1]
 
-        # end of the data/LZ4 frame footer
-        if uncompressresults[2]:
-            outfile.close()
-            seeneof = True
-            break
-        checkbytes = checkfile.read(readsize)
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full)
+    try:
+        unpackedsize += bangdecompress.decompress_stream(decompressor,
+                checkfile, output)
+    except bangdecompress.DecompressionLimitExceeded as e:
+        checkfile.close()
+        output.discard()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': e.args[0]}
+        return {'status': False, 'error': unpackingerror}
+    except Exception:
+        checkfile.close()
+        output.discard()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': 'LZ4 unpacking error'}
+        return {'status': False, 'error': unpackingerror}
 
-    outfile.close()
     checkfile.close()
 
-    if not seeneof:
-        os.unlink(outfile_full)
+    # the end of the data/LZ4 frame footer has to be reached
+    if not decompressor.eof:
+        output.discard()
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'data incomplete'}
         return {'status': False, 'error': unpackingerror}
+    output.close()
 
     # in case the whole file name is the lz4 file and the extension
     # is .lz4 rename the file.
@@ -7240,9 +7178,9 @@ def unpack_lz4(fileresult, scanenvironment, offset, unpackdir):
 unpack_lz4.signatures = {'lz4': b'\x04\x22\x4d\x18'}
 
 
-# LZ4 legacy format, uses external tools as it is not
-# supported in python-lz4:
-# https://github.com/python-lz4/python-lz4/issues/169
+# LZ4 legacy format. It is not supported by lz4.frame in python-lz4
+# (https://github.com/python-lz4/python-lz4/issues/169), so the
+# blocks are parsed here and decompressed with lz4.block.
 # https://github.com/lz4/lz4/blob/master/doc/lz4_Frame_format.md#legacy-frame
 def unpack_lz4legacy(fileresult, scanenvironment, offset, unpackdir):
     '''Unpack LZ4 legacy compressed data.'''
@@ -7252,100 +7190,150 @@ def unpack_lz4legacy(fileresult, scanenvironment, offset, unpackdir):
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file, seek to the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize = 4
 
-    # now process to see how much data should be
-    # processed using the LZ4 utilities
+    # LZ4 legacy does not record the name of the file that was
+    # compressed, so guess, or just set a name.
+    if filename_full.suffix.lower() == '.lz4':
+        outfile_rel = os.path.join(unpackdir, filename_full.stem)
+    else:
+        outfile_rel = os.path.join(unpackdir, "unpacked-from-lz4-legacy")
+    outfile_full = scanenvironment.unpack_path(outfile_rel)
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full)
+
+    # The data consists of independently compressed LZ4 blocks, each
+    # preceded by its compressed size. Every block except the last
+    # one decompresses to exactly 8 MiB. There is no end marker: "if
+    # the frame is followed by a valid Frame Magic Number, it is
+    # considered completed", otherwise the data ends at the end of
+    # the file, at a block that does not decompress or after a block
+    # that decompresses to less than 8 MiB.
     blockunpacked = False
     while True:
         # block compressed size
         checkbytes = checkfile.read(4)
         if len(checkbytes) != 4:
-            checkfile.close()
-            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                              'reason': 'not enough data for block compressed size'}
-            return {'status': False, 'error': unpackingerror}
-        # "if the frame is followed by a valid Frame Magic Number, it is considered completed."
+            break
         if checkbytes == b'\x02\x21\x4c\x18':
             break
         blockcompressedsize = int.from_bytes(checkbytes, byteorder='little')
-        if offset + blockcompressedsize + 8 > filesize:
-            if not blockunpacked:
-                checkfile.close()
-                unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                                  'reason': 'compressed data cannot be outside file'}
-                return {'status': False, 'error': unpackingerror}
+        if blockcompressedsize > lz4legacy_maximum_compressed_size or \
+                checkfile.tell() + blockcompressedsize > filesize:
             break
-        unpackedsize += 4
-
-        # skip over the compressed data
-        checkfile.seek(blockcompressedsize, os.SEEK_CUR)
-        unpackedsize += blockcompressedsize
-
-        # check if the end of file was reached
-        if unpackedsize == filesize:
+        compresseddata = checkfile.read(blockcompressedsize)
+        output.add_input(blockcompressedsize + 4)
+        try:
+            output.check(lz4legacy_block_size)
+            unpackeddata = lz4.block.decompress(compresseddata,
+                    uncompressed_size=lz4legacy_block_size)
+        except lz4.block.LZ4BlockError:
             break
+        except bangdecompress.DecompressionLimitExceeded as e:
+            checkfile.close()
+            output.discard()
+            unpackingerror = {'offset': offset, 'fatal': False,
+                              'reason': e.args[0]}
+            return {'status': False, 'error': unpackingerror}
+        output.write(unpackeddata)
+        unpackedsize += 4 + blockcompressedsize
         blockunpacked = True
+        if len(unpackeddata) != lz4legacy_block_size:
+            break
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
+    checkfile.close()
+
+    if not blockunpacked:
+        output.discard()
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': 'not a LZ4 legacy file'}
+        return {'status': False, 'error': unpackingerror}
 
+    output.close()
     if offset == 0 and unpackedsize == filesize:
-        checkfile.close()
-        if filename_full.suffix.lower() == '.lz4':
-            outfile_rel = os.path.join(unpackdir, filename_full.stem)
-        else:
-            outfile_rel = os.path.join(unpackdir, "unpacked-from-lz4-legacy")
-        outfile_full = scanenvironment.unpack_path(outfile_rel)
-        p = subprocess.Popen(['lz4c', '-d', filename_full, outfile_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        if p.returncode != 0:
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'not a LZ4 legacy file'}
-            return {'status': False, 'error': unpackingerror}
         labels.append('compressed')
         labels.append('lz4')
-        unpackedfilesandlabels.append((outfile_rel, []))
-        return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
-    else:
-        # first write the data to a temporary file
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        checkfile.close()
+    unpackedfilesandlabels.append((outfile_rel, []))
+    return {'status': True, 'length': unpackedsize, 'labels': labels,
+            'filesandlabels': unpackedfilesandlabels}
 
-        if filename_full.suffix.lower() == '.lz4':
-            outfile_rel = os.path.join(unpackdir, filename_full.stem)
-        else:
-            outfile_rel = os.path.join(unpackdir, "unpacked-from-lz4-legacy")
-        outfile_full = scanenvironment.unpack_path(outfile_rel)
-        p = subprocess.Popen(['lz4c', '-d', temporaryfile[1], outfile_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        os.unlink(temporaryfile[1])
+# https://github.com/lz4/lz4/blob/master/doc/lz4_Frame_format.md#legacy-frame
+unpack_lz4legacy.signatures = {'lz4_legacy': b'\x02\x21\x4c\x18'}
 
-        if p.returncode != 0:
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'not a LZ4 legacy file'}
-            return {'status': False, 'error': unpackingerror}
+# the size of the uncompressed blocks of LZ4 legacy data, and the
+# maximum size of a compressed block (LZ4_compressBound())
+lz4legacy_block_size = 8 * 1024 * 1024
+lz4legacy_maximum_compressed_size = lz4legacy_block_size + lz4legacy_block_size // 255 + 16
+
+
+# XML files are checked for well-formedness with expat, which is fed
+# the file in blocks of xmlreadsize bytes and stops at the first error.
+# Like with 'xmllint --noout --nonet' (which was used earlier) no
+# external entities or DTDs are loaded and namespaces are not checked.
+# References to internal entities are only expanded if expat protects
+# against entity expansion attacks ("billion laughs") itself, which it
+# does since version 2.4.0. Older versions do not expand references in
+# content, so markup in entities is not checked there.
+xmlreadsize = 65536
+xml_expand_entities = xml.parsers.expat.version_info >= (2, 4, 0)
+
+# the encoding in the XML declaration (section 4.3.3)
+xml_encoding_declaration = re.compile(rb'(?:\xef\xbb\xbf)?<\?xml[^>]*?\sencoding\s*=\s*["\']([A-Za-z][A-Za-z0-9._-]*)["\']')
+
+
+def parse_xml(checkfile, encoding=None):
+    '''Parse the XML data in checkfile from its current position until
+    the end of the file. If encoding is set, the data is decoded with
+    Python's codec for encoding first, else expat handles the encoding.
+    Raises xml.parsers.expat.ExpatError if the XML is not well-formed.'''
+    if encoding is None:
+        parser = xml.parsers.expat.ParserCreate()
+    else:
+        parser = xml.parsers.expat.ParserCreate('utf-8')
+        decoder = codecs.getincrementaldecoder(encoding)()
 
-        unpackedfilesandlabels.append((outfile_rel, []))
-        return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+    if not xml_expand_entities:
+        def entity_declared(*args):
+            # expat does not expand references to internal entities
+            # when there is a default handler
+            parser.DefaultHandler = lambda data: None
+        parser.EntityDeclHandler = entity_declared
 
-    unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                      'reason': 'invalid LZ4 legacy data'}
-    return {'status': False, 'error': unpackingerror}
+    while True:
+        checkbytes = checkfile.read(xmlreadsize)
+        if checkbytes == b'':
+            break
+        if encoding is not None:
+            checkbytes = decoder.decode(checkbytes).encode('utf-8')
+        parser.Parse(checkbytes, False)
+    if encoding is not None:
+        parser.Parse(decoder.decode(b'', True).encode('utf-8'), True)
+    else:
+        parser.Parse(b'', True)
 
-# https://github.com/lz4/lz4/blob/master/doc/lz4_Frame_format.md#legacy-frame
-unpack_lz4legacy.signatures = {'lz4_legacy': b'\x02\x21\x4c\x18'}
+
+def is_wellformed_xml(checkfile):
+    '''Check if the data in checkfile from its current position until
+    the end of the file is well-formed XML'''
+    startoffset = checkfile.tell()
+    try:
+        try:
+            parse_xml(checkfile)
+        except ValueError:
+            # expat only supports single byte encodings (other than
+            # UTF-8 and UTF-16), so let Python decode the others.
+            checkfile.seek(startoffset)
+            encodingres = xml_encoding_declaration.match(checkfile.read(1024))
+            if encodingres is None:
+                return False
+            checkfile.seek(startoffset)
+            parse_xml(checkfile, encodingres.group(1).decode())
+    except (xml.parsers.expat.ExpatError, LookupError, ValueError):
+        return False
+    return True
 
 
 # There are a few variants of XML. The first one is the "regular"
@@ -7365,7 +7353,7 @@ def unpack_xml(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
 
     # first check if it is and Android XML
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkbytes = checkfile.read(4)
     if len(checkbytes) != 4:
         checkfile.close()
@@ -7379,12 +7367,6 @@ def unpack_xml(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'Android binary XML not supported'}
         return {'status': False, 'error': unpackingerror}
 
-    if shutil.which('xmllint') is None:
-        checkfile.close()
-        unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'xmllint program not found'}
-        return {'status': False, 'error': unpackingerror}
-
     # XML files sometimes start with a Byte Order Mark
     # https://en.wikipedia.org/wiki/Byte_order_mark
     # XML specification, section F.1
@@ -7427,17 +7409,13 @@ def unpack_xml(fileresult, scanenvironment, offset, unpackdir):
                     return {'status': False, 'error': unpackingerror}
             break
 
+    # now check if the whole file is well-formed XML
+    checkfile.seek(offset)
+    wellformed = is_wellformed_xml(checkfile)
     checkfile.close()
-
-    # now run xmllint as a sanity check. By default xmllint tries to
-    # resolve external entities, so this should be prevented by
-    # supplying "--nonet"
-    p = subprocess.Popen(['xmllint', '--noout', "--nonet", filename_full],
-                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (outputmsg, errormsg) = p.communicate()
-    if p.returncode != 0:
+    if not wellformed:
         unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'xmllint cannot parse file'}
+                          'reason': 'XML is not well-formed'}
         return {'status': False, 'error': unpackingerror}
 
     # whole file is XML
@@ -7496,7 +7474,7 @@ def unpack_java_class(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough bytes'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # skip over the magic header
     checkfile.seek(offset+4)
@@ -8128,9 +8106,8 @@ def unpack_snappy(fileresult, scanenvironment, offset, unpackdir):
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # skip the stream identifier stream (section 4.1)
     checkfile.seek(offset+10)
@@ -8183,69 +8160,53 @@ def unpack_snappy(fileresult, scanenvironment, offset, unpackdir):
     outfile_rel = os.path.join(unpackdir, "unpacked-from-snappy")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
-    outfile = open(outfile_full, 'wb')
+    # the whole frame is known, so the expansion ratio can
+    # be checked right from the start
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full)
+    output.add_input(unpackedsize)
 
     # start at the beginning of the frame
     checkfile.seek(offset)
 
     # now carve the file (if necessary)
     if filesize == offset + unpackedsize:
-        try:
-            snappy.stream_decompress(checkfile, outfile)
-        except:
-            outfile.close()
-            os.unlink(outfile_full)
-            checkfile.close()
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'invalid Snappy data'}
-            return {'status': False, 'error': unpackingerror}
-        if offset == 0 and unpackedsize == filesize:
-            labels += ['snappy', 'compressed']
-        outfile.close()
-        checkfile.close()
-        unpackedfilesandlabels.append((outfile_rel, []))
-        return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
+        infile = checkfile
+        tmpfile_full = None
     else:
         tmpfile_rel = os.path.join(unpackdir, "unpacked-from-snappy.sn")
         tmpfile_full = scanenvironment.unpack_path(tmpfile_rel)
+        os.makedirs(tmpfile_full.parent, exist_ok=True)
         tmpfile = open(tmpfile_full, 'wb')
         os.sendfile(tmpfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         checkfile.close()
         tmpfile.close()
 
         # reopen the temporary file as read only
-        tmpfile = open(tmpfile_full, 'rb')
-        tmpfile.seek(0)
-
-        try:
-            snappy.stream_decompress(tmpfile, outfile)
-        except Exception as e:
-            outfile.close()
-            tmpfile.close()
-            os.unlink(outfile_full)
-            os.unlink(tmpfile_full)
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'invalid Snappy data'}
-            return {'status': False, 'error': unpackingerror}
+        infile = open(tmpfile_full, 'rb')
 
-        outfile.close()
-        tmpfile.close()
+    try:
+        snappy.stream_decompress(infile, output)
+    except bangdecompress.DecompressionLimitExceeded as e:
+        reason = e.args[0]
+    except Exception as e:
+        reason = 'invalid Snappy data'
+    else:
+        reason = None
+    infile.close()
+    if tmpfile_full is not None:
         os.unlink(tmpfile_full)
+    if reason is not None:
+        output.discard()
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': reason}
+        return {'status': False, 'error': unpackingerror}
+    output.close()
 
-        unpackedfilesandlabels.append((outfile_rel, []))
-        return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
-
-    outfile.close()
-    os.unlink(outfile_full)
-    checkfile.close()
-
-    unpackingerror = {'offset': offset, 'fatal': False,
-                      'reason': 'invalid Snappy file'}
-    return {'status': False, 'error': unpackingerror}
+    if offset == 0 and unpackedsize == filesize:
+        labels += ['snappy', 'compressed']
+    unpackedfilesandlabels.append((outfile_rel, []))
+    return {'status': True, 'length': unpackedsize, 'labels': labels,
+            'filesandlabels': unpackedfilesandlabels}
 
 # https://github.com/google/snappy/blob/master/framing_format.txt
 unpack_snappy.signatures = {'snappy_framed': b'\xff\x06\x00\x00\x73\x4e\x61\x50\x70\x59'}
@@ -8277,7 +8238,7 @@ def unpack_elf(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough data'}
         return {'status': False, 'error': unpackingerror}
 
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
     is64bit = False
@@ -9369,7 +9330,7 @@ def unpack_uboot_legacy(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and jump to the right offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 4)
     unpackedsize += 4
 
@@ -9555,13 +9516,6 @@ def unpack_certificate(fileresult, scanenvironment, offset, unpackdir):
 
     dataunpacked = False
 
-    # For reasons unknown pyOpenSSL sometimes barfs on certs from
-    # Android, so use an external tool (for now).
-    if shutil.which('openssl') is None:
-        unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'openssl program not found'}
-        return {'status': False, 'error': unpackingerror}
-
     if offset == 0:
         certres = extract_certificate(filename_full, scanenvironment, offset)
         if certres['status']:
@@ -9571,7 +9525,7 @@ def unpack_certificate(fileresult, scanenvironment, offset, unpackdir):
                     'filesandlabels': unpackedfilesandlabels}
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(11)
     if checkbytes != b'-----BEGIN ':
@@ -9665,57 +9619,313 @@ unpack_certificate.extensions = ['.rsa', '.pem']
 unpack_certificate.pretty = 'certificate'
 
 
+# Certificates and keys are checked in the same way as
+# 'openssl asn1parse' does (which was used for it earlier): DER files
+# should be valid BER/DER encoded ASN.1 data, PEM files should contain
+# base64 encoded data that is valid ASN.1 data. Note: the OpenSSL
+# checks (and thus these checks) are quite lenient.
+#
+# https://www.itu.int/rec/T-REC-X.690
+# https://tools.ietf.org/html/rfc7468
+
+# maximum nesting depth of ASN.1 objects (ASN1_PARSE_MAXDEPTH)
+asn1_maximum_depth = 128
+
+
+def asn1_get_object(data, pos, maximum):
+    '''Read the header of the ASN.1 object at pos, of which at most
+    maximum bytes are available. Returns (headerlength, length,
+    constructed, indefinite, tag, tagclass), or None if the header is
+    invalid, or the object is longer than maximum.'''
+    if maximum <= 0:
+        return None
+    start = pos
+    end = pos + maximum
+    constructed = data[pos] & 0x20 != 0
+    tagclass = data[pos] & 0xc0
+    tag = data[pos] & 0x1f
+    pos += 1
+    if pos == end:
+        return None
+    if tag == 0x1f:
+        # high tag number form
+        tag = 0
+        while data[pos] & 0x80:
+            tag = (tag << 7) | (data[pos] & 0x7f)
+            pos += 1
+            if pos == end or tag > 0x7fffffff >> 7:
+                return None
+        tag = (tag << 7) | (data[pos] & 0x7f)
+        pos += 1
+        if pos == end:
+            return None
+
+    # then the length
+    indefinite = False
+    length = 0
+    if data[pos] == 0x80:
+        indefinite = True
+        pos += 1
+    elif data[pos] & 0x80 == 0:
+        length = data[pos]
+        pos += 1
+    else:
+        lengthbytes = data[pos] & 0x7f
+        pos += 1
+        # like OpenSSL, at least one more byte has to follow
+        if end - pos < lengthbytes + 1:
+            return None
+        while lengthbytes > 0 and data[pos] == 0:
+            pos += 1
+            lengthbytes -= 1
+        if lengthbytes > 8:
+            return None
+        length = int.from_bytes(data[pos:pos+lengthbytes], byteorder='big')
+        pos += lengthbytes
+        if length > 0x7fffffffffffffff:
+            return None
+    if indefinite and not constructed:
+        return None
+    if length > end - pos:
+        return None
+    return (pos - start, length, constructed, indefinite, tag, tagclass)
+
+
+def asn1_parse(data, pos, length, depth):
+    '''Parse the ASN.1 objects in length bytes of data at pos, like
+    asn1_parse2() in OpenSSL. Returns (result, pos), where result is 0
+    for invalid data, 1 if all data was parsed and 2 if an end of
+    contents object was found.'''
+    if depth > asn1_maximum_depth:
+        return (0, pos)
+    total = pos + length
+    while length > 0:
+        header = asn1_get_object(data, pos, length)
+        if header is None:
+            return (0, pos)
+        (headerlength, objectlength, constructed, indefinite, tag, tagclass) = header
+        pos += headerlength
+        length -= headerlength
+        if constructed:
+            start = pos
+            end = pos + objectlength
+            if objectlength > length:
+                return (0, pos)
+            if indefinite and objectlength == 0:
+                while True:
+                    (result, pos) = asn1_parse(data, pos, total - pos, depth + 1)
+                    if result == 0:
+                        return (0, pos)
+                    if result == 2 or pos >= total:
+                        objectlength = pos - start
+                        break
+            else:
+                remaining = objectlength
+                while pos < end:
+                    innerstart = pos
+                    (result, pos) = asn1_parse(data, pos, remaining, depth + 1)
+                    if result == 0:
+                        return (0, pos)
+                    remaining -= pos - innerstart
+        else:
+            pos += objectlength
+            if tag == 0 and tagclass == 0:
+                # end of contents
+                return (2, pos)
+        length -= objectlength
+    return (1, pos)
+
+
+def is_valid_der(data):
+    '''Check if data is valid DER (or BER) encoded ASN.1 data, like
+    'openssl asn1parse -inform DER' does'''
+    if len(data) == 0:
+        return False
+    return asn1_parse(data, 0, len(data), 0)[0] != 0
+
+
+# values of characters in base64 data, following the table OpenSSL uses
+# when decoding PEM: whitespace is ignored, '-' ends the data.
+base64_whitespace = 0xe0
+base64_eoln = 0xf0
+base64_eof = 0xf2
+base64_error = 0xff
+
+base64_alphabet = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+base64_values = [base64_alphabet.index(c) if c in base64_alphabet else base64_error
+                 for c in range(256)]
+base64_values[ord('=')] = 0
+base64_values[ord(' ')] = base64_whitespace
+base64_values[ord('\t')] = base64_whitespace
+base64_values[ord('\n')] = base64_eoln
+base64_values[ord('\r')] = base64_eoln
+base64_values[ord('-')] = base64_eof
+
+
+def decode_base64_block(block):
+    '''Decode a block of base64 characters (a multiple of 4),
+    including padding'''
+    result = bytearray()
+    for i in range(0, len(block), 4):
+        value = 0
+        for c in block[i:i+4]:
+            value = (value << 6) | base64_values[c]
+        result += value.to_bytes(3, byteorder='big')
+    return result
+
+
+def decode_base64(data, block):
+    '''Decode base64 data in the way EVP_DecodeUpdate() does. The
+    base64 characters that do not yet form a complete block are kept in
+    block between calls. Returns a tuple (result, decoded data), where
+    result is -1 for invalid data, 0 if the end of the data was reached
+    and 1 if more data could follow'''
+    decoded = bytearray()
+    padding = 0
+    if block and block[-1] == 0x3d:
+        padding += 1
+        if len(block) > 1 and block[-2] == 0x3d:
+            padding += 1
+    if not data:
+        return (0, decoded)
+    end_of_data = False
+    for c in data:
+        value = base64_values[c]
+        if value == base64_error:
+            return (-1, decoded)
+        if c == 0x3d:
+            padding += 1
+        elif padding > 0 and value < 0x40:
+            # data after the padding
+            return (-1, decoded)
+        if padding > 2:
+            return (-1, decoded)
+        if value == base64_eof:
+            end_of_data = True
+            break
+        if value < 0x40:
+            block.append(c)
+        if len(block) == 64:
+            result = decode_base64_block(block)
+            del block[:]
+            if padding > len(result):
+                return (-1, decoded)
+            decoded += result[:len(result) - padding]
+    if block:
+        if len(block) % 4 == 0:
+            result = decode_base64_block(block)
+            del block[:]
+            if padding > len(result):
+                return (-1, decoded)
+            decoded += result[:len(result) - padding]
+        elif end_of_data:
+            return (-1, decoded)
+    if end_of_data or (not block and padding > 0):
+        return (0, decoded)
+    return (1, decoded)
+
+
+# size of the buffer OpenSSL's base64 BIO reads data into
+base64_buffer_size = 1024
+
+
+def decode_pem(data):
+    '''Decode the base64 data in a PEM file like OpenSSL's base64 BIO
+    (as used by 'openssl asn1parse -inform PEM') does: skip lines until
+    a line with base64 data is found, then decode in chunks of at most
+    base64_buffer_size bytes until the end of the base64 data. A chunk with
+    invalid data is discarded.'''
+    decoded = bytearray()
+    block = bytearray()
+    buf = b''
+    pos = 0
+    skip_line = False
+    started = False
+    while True:
+        newdata = data[pos:pos + base64_buffer_size - len(buf)]
+        pos += len(newdata)
+        at_end = newdata == b''
+        if at_end and buf == b'':
+            break
+        buf += newdata
+        if not started:
+            # look for the first line with base64 data
+            linestart = 0
+            newline = buf.find(b'\n')
+            while newline != -1:
+                if skip_line:
+                    skip_line = False
+                else:
+                    (result, linedecoded) = decode_base64(buf[linestart:newline+1], bytearray())
+                    if result > 0 or linedecoded:
+                        started = True
+                        break
+                linestart = newline + 1
+                newline = buf.find(b'\n', linestart)
+            if not started:
+                if at_end:
+                    break
+                if linestart == 0:
+                    # a single long line: skip it
+                    if len(buf) == base64_buffer_size:
+                        skip_line = True
+                        buf = b''
+                elif linestart != len(buf):
+                    buf = buf[linestart:]
+                continue
+            buf = buf[linestart:]
+        elif len(buf) < base64_buffer_size and not at_end:
+            continue
+        (result, chunkdecoded) = decode_base64(buf, block)
+        buf = b''
+        if result < 0:
+            break
+        decoded += chunkdecoded
+        if result == 0 or at_end:
+            break
+    return bytes(decoded)
+
+
 def extract_certificate(filename_full, scanenvironment, offset):
     '''Helper method to extract certificate files.'''
     unpackedfilesandlabels = []
     labels = []
     unpackingerror = {}
 
-    if shutil.which('openssl') is None:
-        checkfile.close()
-        unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'openssl program not found'}
-        return {'status': False, 'error': unpackingerror}
+    checkfile = scanenvironment.open_input_file(filename_full)
+    checkdata = checkfile.read()
+    checkfile.close()
 
     # First see if a file is in DER format
-    p = subprocess.Popen(["openssl", "asn1parse", "-inform", "DER", "-in", filename_full], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (outputmsg, errormsg) = p.communicate()
-    if p.returncode == 0:
+    if is_valid_der(checkdata):
         labels.append("certificate")
         labels.append('resource')
         return {'status': True, 'labels': labels,
                 'filesandlabels': unpackedfilesandlabels}
 
     # then check if it is a PEM
-    p = subprocess.Popen(["openssl", "asn1parse", "-inform", "PEM", "-in", filename_full], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (outputmsg, errormsg) = p.communicate()
-    if p.returncode == 0:
+    if is_valid_der(decode_pem(checkdata)):
         # there could be several certificates or keys
         # inside the file.
         # TODO: split into certificates and private keys
-        # The openssl program does also accept binary crap,
+        # The base64 decoder does also accept binary crap,
         # so add some extra checks.
-        isopened = False
         try:
-            checkfile = open(filename_full, 'r')
-            isopened = True
-            for checkline in checkfile:
-                # then check if this is perhaps a private key
-                if "PRIVATE KEY" in checkline:
-                    labels.append('private key')
-                # or a certificate
-                if "BEGIN CERTIFICATE" in checkline:
-                    labels.append("certificate")
-                # or a trusted certificate
-                if "TRUSTED CERTIFICATE" in checkline:
-                    labels.append("trusted certificate")
-            checkfile.close()
+            checktext = checkdata.decode()
         except UnicodeDecodeError:
-            if isopened:
-                checkfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'not a valid certificate'}
             return {'status': False, 'error': unpackingerror}
+        for checkline in checktext.splitlines():
+            # then check if this is perhaps a private key
+            if "PRIVATE KEY" in checkline:
+                labels.append('private key')
+            # or a certificate
+            if "BEGIN CERTIFICATE" in checkline:
+                labels.append("certificate")
+            # or a trusted certificate
+            if "TRUSTED CERTIFICATE" in checkline:
+                labels.append("trusted certificate")
         labels.append("text")
         labels.append('resource')
         return {'status': True, 'labels': labels,
@@ -9744,7 +9954,7 @@ def unpack_git_index(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip over the header
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -9909,18 +10119,10 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
     '''Unpack a lzop compressed file'''
     filesize = fileresult.filesize
     filename_full = scanenvironment.unpack_path(fileresult.filename)
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
     unpackedfilesandlabels = []
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
-
-    if shutil.which('lzop') is None:
-        checkfile.close()
-        unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'lzop program not found'}
-        return {'status': False, 'error': unpackingerror}
 
     # header is at least 38 bytes, excluding file name
     if offset + 38 > filesize:
@@ -9929,11 +10131,13 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file skip over the magic header bytes
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+9)
     unpackedsize = 9
 
-    # then check the rest of the header
+    # then check the rest of the header. The header checksum is
+    # computed over the header without the magic, so keep the bytes.
+    headerbytes = b''
 
     # version, has to be 0x00, 0x10 or 0x20 according
     # to /usr/share/magic and 0x30 and 0x40 according
@@ -9945,10 +10149,12 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'wrong version'}
         return {'status': False, 'error': unpackingerror}
+    headerbytes += checkbytes
     unpackedsize += 2
 
     # library version, skip
     checkbytes = checkfile.read(2)
+    headerbytes += checkbytes
     unpackedsize += 2
 
     # version needed to extract, should be >= 0x940
@@ -9959,15 +10165,17 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'unsupported version'}
         return {'status': False, 'error': unpackingerror}
+    headerbytes += checkbytes
     unpackedsize += 2
 
-    # method, has to be 1, 2 or 3
+    # method, has to be 1, 2 or 3 (all variants of LZO1X)
     checkbytes = checkfile.read(1)
     if ord(checkbytes) not in [1, 2, 3]:
         checkfile.close()
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'wrong method'}
         return {'status': False, 'error': unpackingerror}
+    headerbytes += checkbytes
     unpackedsize += 1
 
     # level, cannot be > 9
@@ -9977,25 +10185,27 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'wrong data for level'}
         return {'status': False, 'error': unpackingerror}
+    headerbytes += checkbytes
     unpackedsize += 1
 
     # LZOP flags
     checkbytes = checkfile.read(4)
     lzopflags = int.from_bytes(checkbytes, byteorder='big')
+    headerbytes += checkbytes
     unpackedsize += 4
 
-    # optional: if the filter flag is set, then skip 4 bytes
+    # optional: the filter flag. Filtered data cannot be restored
+    # (and lzop itself does not create it anymore).
     if (lzopflags & 0x800) != 0:
-        checkfile.seek(4, os.SEEK_CUR)
-        unpackedsize += 4
-
-    # mode, skip for now
-    checkfile.seek(4, os.SEEK_CUR)
-    unpackedsize += 4
+        checkfile.close()
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': 'filters not supported'}
+        return {'status': False, 'error': unpackingerror}
 
-    # mtime, skip for now
-    checkfile.seek(8, os.SEEK_CUR)
-    unpackedsize += 8
+    # mode and mtime, skip for now
+    checkbytes = checkfile.read(12)
+    headerbytes += checkbytes
+    unpackedsize += 12
 
     # name length
     checkbytes = checkfile.read(1)
@@ -10006,11 +10216,13 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'not enough data for file name'}
         return {'status': False, 'error': unpackingerror}
+    headerbytes += checkbytes
     unpackedsize += 1
 
     # name
     if name_length != 0:
         checkbytes = checkfile.read(name_length)
+        headerbytes += checkbytes
         try:
             lzopname = checkbytes.decode()
         except UnicodeDecodeError:
@@ -10024,29 +10236,78 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
     # some sanity checks, need something nicer
     if '/' in lzopname:
         lzopname = 'unpacked-from-lzo'
-    if lzopname.startswith('..'):
+    if lzopname.startswith('..') or lzopname == '.':
         lzopname = 'unpacked-from-lzo'
     unpackedsize += name_length
 
-    # crc32 or adler32, skip
+    # header checksum: crc32 or adler32
     checkbytes = checkfile.read(4)
     if len(checkbytes) != 4:
         checkfile.close()
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'not enough data for checksum'}
         return {'status': False, 'error': unpackingerror}
+    if lzopflags & 0x1000 != 0:
+        headerchecksum = zlib.crc32(headerbytes)
+    else:
+        headerchecksum = zlib.adler32(headerbytes)
+    if int.from_bytes(checkbytes, byteorder='big') != headerchecksum:
+        checkfile.close()
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': 'wrong header checksum'}
+        return {'status': False, 'error': unpackingerror}
     unpackedsize += 4
 
+    # optional extra field: length, data and checksum
+    if lzopflags & 0x40 != 0:
+        checkbytes = checkfile.read(4)
+        if len(checkbytes) != 4:
+            checkfile.close()
+            unpackingerror = {'offset': offset, 'fatal': False,
+                              'reason': 'not enough data for extra field'}
+            return {'status': False, 'error': unpackingerror}
+        extra_length = int.from_bytes(checkbytes, byteorder='big')
+        if checkfile.tell() + extra_length + 4 > filesize:
+            checkfile.close()
+            unpackingerror = {'offset': offset, 'fatal': False,
+                              'reason': 'not enough data for extra field'}
+            return {'status': False, 'error': unpackingerror}
+        checkfile.seek(extra_length + 4, os.SEEK_CUR)
+        unpackedsize += 4 + extra_length + 4
+
+    # the checksums of the blocks: adler32 or crc32 of the
+    # uncompressed data and of the compressed data
+    if lzopflags & 0x01 != 0:
+        uncompressed_checksum = zlib.adler32
+    elif lzopflags & 0x100 != 0:
+        uncompressed_checksum = zlib.crc32
+    else:
+        uncompressed_checksum = None
+    if lzopflags & 0x02 != 0:
+        compressed_checksum = zlib.adler32
+    elif lzopflags & 0x200 != 0:
+        compressed_checksum = zlib.crc32
+    else:
+        compressed_checksum = None
+
+    outlzop_rel = os.path.join(unpackdir, lzopname)
+    outlzop_full = scanenvironment.unpack_path(outlzop_rel)
+    output = bangdecompress.bounded_output(scanenvironment, outlzop_full)
+
     # then the LZO compressed blocks: first uncompressed length,
-    # followed by compressed length, the data itself, and possibly
-    # checksums
-    haslzodata = False
+    # followed by compressed length, possibly checksums, and the
+    # data itself, which is decompressed and verified one block
+    # at a time. A block with an uncompressed length of 0 ends
+    # the file.
     while True:
-        lastblock = False
         # decompressed length
         checkbytes = checkfile.read(4)
         if len(checkbytes) != 4:
-            break
+            checkfile.close()
+            output.discard()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'not enough data for block'}
+            return {'status': False, 'error': unpackingerror}
         unpackedsize += 4
 
         decompressed_len = int.from_bytes(checkbytes, byteorder='big')
@@ -10054,89 +10315,87 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
             # last block has been reached
             break
 
-        # compressed length
+        # compressed length, never larger than the decompressed
+        # length. lzop uses blocks of at most 64 MiB.
         checkbytes = checkfile.read(4)
         if len(checkbytes) != 4:
-            break
+            checkfile.close()
+            output.discard()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'not enough data for block'}
+            return {'status': False, 'error': unpackingerror}
         compressed_len = int.from_bytes(checkbytes, byteorder='big')
-
-        if checkfile.tell() + compressed_len > filesize:
-            break
+        if decompressed_len > 64 * 1024 * 1024 or compressed_len > decompressed_len:
+            checkfile.close()
+            output.discard()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'invalid block size'}
+            return {'status': False, 'error': unpackingerror}
         unpackedsize += 4
 
-        # skip over the data
-        checkfile.seek(compressed_len, os.SEEK_CUR)
-        unpackedsize += compressed_len
-
-        # adler32 uncompressed or crc32 uncompressed
-        if lzopflags & 0x01 != 0 or lzopflags & 0x100 != 0:
-            checkbytes = checkfile.read(4)
-            if len(checkbytes) != 4:
-                break
-            unpackedsize += 4
-        # adler32 compressed or crc32 compressed
-        if lzopflags & 0x02 != 0 or lzopflags & 0x200 != 0:
-            checkbytes = checkfile.read(4)
-            if len(checkbytes) != 4:
-                break
-            unpackedsize += 4
+        # checksum of the uncompressed data, and of the compressed
+        # data, but only if the data was actually compressed
+        checksums = []
+        if uncompressed_checksum is not None:
+            checksums.append(checkfile.read(4))
+        if compressed_checksum is not None and compressed_len < decompressed_len:
+            checksums.append(checkfile.read(4))
+        if checkfile.tell() + compressed_len > filesize:
+            checkfile.close()
+            output.discard()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'not enough data for block'}
+            return {'status': False, 'error': unpackingerror}
+        unpackedsize += 4 * len(checksums)
 
-        haslzodata = True
+        compresseddata = checkfile.read(compressed_len)
+        if compressed_checksum is not None and compressed_len < decompressed_len:
+            if int.from_bytes(checksums[-1], byteorder='big') != compressed_checksum(compresseddata):
+                checkfile.close()
+                output.discard()
+                unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                                  'reason': 'wrong checksum'}
+                return {'status': False, 'error': unpackingerror}
 
-        # stop if the end of the file has been reached
-        if checkfile.tell() == filesize:
-            break
+        # blocks that do not compress are stored as is
+        output.add_input(compressed_len)
+        try:
+            output.check(decompressed_len)
+            if compressed_len == decompressed_len:
+                unpackeddata = compresseddata
+            else:
+                unpackeddata = bangdecompress.lzo1x_decompress(compresseddata,
+                                                               decompressed_len)
+        except bangdecompress.LZOError:
+            checkfile.close()
+            output.discard()
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': 'invalid LZO data'}
+            return {'status': False, 'error': unpackingerror}
+        except bangdecompress.DecompressionLimitExceeded as e:
+            checkfile.close()
+            output.discard()
+            unpackingerror = {'offset': offset, 'fatal': False,
+                              'reason': e.args[0]}
+            return {'status': False, 'error': unpackingerror}
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
+        if uncompressed_checksum is not None:
+            if int.from_bytes(checksums[0], byteorder='big') != uncompressed_checksum(unpackeddata):
+                checkfile.close()
+                output.discard()
+                unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                                  'reason': 'wrong checksum'}
+                return {'status': False, 'error': unpackingerror}
+        output.write(unpackeddata)
+        unpackedsize += compressed_len
 
-    carved = False
-    # carve the file if necessary
-    if offset != 0 or filesize != unpackedsize:
-        outfile_rel = os.path.join(unpackdir, "unpacked.lzo")
-        outfile_full = scanenvironment.unpack_path(outfile_rel)
-        outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
-        outfile.close()
-        carved = True
-    else:
-        outfile_rel = fileresult.filename
-        outfile_full = filename_full
     checkfile.close()
+    output.close()
 
-    p = subprocess.Popen(['lzop', '-t', outfile_full], stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE)
-    (outputmsg, errormsg) = p.communicate()
-    if p.returncode != 0:
-        if carved:
-            os.unlink(outfile_full)
-        unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'lzop test failed'}
-        return {'status': False, 'error': unpackingerror}
-
-    outlzop_rel = os.path.join(unpackdir, lzopname)
-    outlzop_full = scanenvironment.unpack_path(outlzop_rel)
-
-    p = subprocess.Popen(['lzop', '-d', '-o%s' % outlzop_full, outfile_full], stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE)
-    (outputmsg, errormsg) = p.communicate()
-    if p.returncode != 0:
-        if carved:
-            os.unlink(outfile_full)
-        unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'lzop test failed'}
-        return {'status': False, 'error': unpackingerror}
-
-    if carved:
-        os.unlink(outfile_full)
-    else:
+    if offset == 0 and unpackedsize == filesize:
         labels = ['compressed', 'lzop']
 
-    outfiles = os.listdir(unpackdir_full)
-    for o in outfiles:
-        outfile_rel = os.path.join(unpackdir, o)
-        outlabels = []
-        unpackedfilesandlabels.append((outfile_rel, outlabels))
+    unpackedfilesandlabels.append((outlzop_rel, []))
     return {'status': True, 'length': unpackedsize, 'labels': labels,
             'filesandlabels': unpackedfilesandlabels}
 
@@ -10154,7 +10413,7 @@ def unpack_json(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
 
     # try to read the contents of the file as JSON
     try:
@@ -10215,15 +10474,6 @@ def unpack_pack200(fileresult, scanenvironment, offset, unpackdir):
     # the unpack200 tool only works on whole files. Finding out
     # where the file ends is TODO, but if there is data in front
     # of a valid pack200 file it is not a problem.
-    if offset != 0:
-        # create a temporary file and copy the data into the
-        # temporary file if offset != 0
-        checkfile = open(filename_full, 'rb')
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, filesize - offset)
-        os.fdopen(temporaryfile[0]).close()
-        checkfile.close()
-
     # write unpacked data to a JAR file
     outfile_rel = os.path.join(unpackdir, "unpacked.jar")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
@@ -10231,19 +10481,11 @@ def unpack_pack200(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
 
-    # then extract the file
-    if offset != 0:
-        p = subprocess.Popen(['unpack200', temporaryfile[1], outfile_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=unpackdir_full)
-    else:
-        p = subprocess.Popen(['unpack200', filename_full, outfile_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=unpackdir_full)
-    (outputmsg, errormsg) = p.communicate()
-
-    if offset != 0:
-        os.unlink(temporaryfile[1])
+    # then extract the file, from a copy of the data if offset != 0
+    externaltools = scanenvironment.externaltools
+    with externaltools.file_slice(filename_full, offset, filesize - offset) as pack200file:
+        p = externaltools.run(['unpack200', pack200file, outfile_full],
+                              cwd=unpackdir_full)
 
     if p.returncode != 0:
         # try to remove any files that were possibly left behind
@@ -10288,7 +10530,7 @@ def unpack_zim(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
 
     unpackedsize += 4
@@ -10829,7 +11071,7 @@ def unpack_java_keystore(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -11008,7 +11250,7 @@ def unpack_acdb(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset.
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+8)
     unpackedsize += 8
 
@@ -11100,7 +11342,7 @@ def unpack_sqlite(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the offset
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+16)
     unpackedsize += 16
 
@@ -11397,7 +11639,7 @@ def unpack_trx(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 4)
     unpackedsize += 4
 
@@ -11569,10 +11811,9 @@ def unpack_compress(fileresult, scanenvironment, offset, unpackdir):
     labels = []
     unpackingerror = {}
     unpackedsize = 0
-    unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file, skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+2)
 
     # the next byte contains the "bits per code" field
@@ -11591,34 +11832,7 @@ def unpack_compress(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'invalid bits per code'}
         return {'status': False, 'error': unpackingerror}
 
-    # like deflate compress can work on streams
-    # As a test some data can be uncompressed.
-    # First seek back to the original offset...
-    checkfile.seek(offset)
-
-    # ... read some data...
-    testdata = checkfile.read(1024)
-
-    # ...and run 'uncompress' to see if anything can be compressed at all
-    p = subprocess.Popen(['uncompress'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (standard_out, standard_error) = p.communicate(testdata)
-    if len(standard_out) == 0:
-        checkfile.close()
-        unpackingerror = {'offset': offset, 'fatal': False,
-                          'reason': 'invalid compress\'d data'}
-        return {'status': False, 'error': unpackingerror}
-
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
-
-    havetmpfile = False
-    if offset != 0:
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory, suffix='.Z')
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, filesize - offset)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-
-    checkfile.close()
+    blockmode = ord(checkbytes) & 0x80 != 0
 
     if filename_full.suffix.lower() == '.z':
         outfile_rel = os.path.join(unpackdir, filename_full.stem)
@@ -11626,30 +11840,35 @@ def unpack_compress(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, filename_full.stem) + ".tar"
     else:
         outfile_rel = os.path.join(unpackdir, "unpacked-from-compress")
-
     outfile_full = scanenvironment.unpack_path(outfile_rel)
-    outfile = open(outfile_full, 'wb')
-
-    if havetmpfile:
-        p = subprocess.Popen(['uncompress', '-c', temporaryfile[1]], stdin=subprocess.PIPE, stdout=outfile, stderr=subprocess.PIPE)
-    else:
-        p = subprocess.Popen(['uncompress', '-c', filename_full], stdin=subprocess.PIPE, stdout=outfile, stderr=subprocess.PIPE)
 
-    (standard_out, standard_error) = p.communicate()
-    if p.returncode != 0 and standard_error != b'':
-        outfile.close()
-        os.unlink(outfile_full)
-        if havetmpfile:
-            os.unlink(temporaryfile[1])
+    # like deflate compress can work on streams: there is no end
+    # of stream marker, so all data until the end of the file is
+    # decompressed.
+    output = bangdecompress.bounded_output(scanenvironment, outfile_full)
+    try:
+        bangdecompress.decompress_lzw(checkfile, output, bitspercode,
+                                      blockmode)
+    except bangdecompress.LZWError:
+        checkfile.close()
+        output.discard()
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid compress file'}
         return {'status': False, 'error': unpackingerror}
+    except bangdecompress.DecompressionLimitExceeded as e:
+        checkfile.close()
+        output.discard()
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': e.args[0]}
+        return {'status': False, 'error': unpackingerror}
+    checkfile.close()
 
-    outfile.close()
-
-    # clean up
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
+    if output.written == 0:
+        output.discard()
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': 'invalid compress\'d data'}
+        return {'status': False, 'error': unpackingerror}
+    output.close()
 
     unpackedfilesandlabels.append((outfile_rel, []))
     unpackedsize = filesize - offset
@@ -11679,7 +11898,7 @@ def unpack_ambarella(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # store a mapping of start/end of the sections
@@ -11826,7 +12045,7 @@ def unpack_romfs_ambarella(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # amount of files
@@ -11949,7 +12168,7 @@ def unpack_bflt(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file, skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize = 4
 
@@ -12167,7 +12386,7 @@ def unpack_bittorrent(fileresult, scanenvironment, offset, unpackdir):
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
     # open the file, skip part of the 'magic'
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+1)
     unpackedsize = 1
 
@@ -12451,7 +12670,7 @@ def unpack_pcapng(fileresult, scanenvironment, offset, unpackdir):
     all_blocks = regular_blocks + hone_blocks + sysdig_blocks
 
     # open the file
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
 
     # process the blocks
@@ -12544,7 +12763,7 @@ def unpack_pcap(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file, read the signature to determine byte order
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset)
     checkbytes = checkfile.read(4)
 
@@ -12699,7 +12918,7 @@ def unpack_serialized_java(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file, skip magic and version
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset+4)
     unpackedsize += 4
 
@@ -12785,7 +13004,7 @@ def unpack_qcdt(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 4)
     unpackedsize += 4
 
@@ -12900,7 +13119,7 @@ def unpack_crx(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
 
     # open the file and skip the magic
-    checkfile = open(filename_full, 'rb')
+    checkfile = scanenvironment.open_input_file(filename_full)
     checkfile.seek(offset + 4)
     unpackedsize += 4
 
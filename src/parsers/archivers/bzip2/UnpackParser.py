@@ -9,6 +9,7 @@ class Bzip2UnpackParser(WrappedUnpackParser):
         (0, b'BZh')
     ]
     pretty_name = 'bzip2'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_bzip2(fileresult, scan_environment, offset, unpack_dir)
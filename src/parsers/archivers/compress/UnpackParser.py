@@ -9,6 +9,7 @@ class CompressUnpackParser(WrappedUnpackParser):
         (0, b'\x1f\x9d')
     ]
     pretty_name = 'compress'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_compress(fileresult, scan_environment, offset, unpack_dir)
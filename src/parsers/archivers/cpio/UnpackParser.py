@@ -67,7 +67,6 @@ class CpioBaseUnpackParser(UnpackParser):
 
     def unpack(self):
         unpacked_files = []
-        pos = 0
         for e in self.data.entries:
             out_labels = []
             if e.filename != self.data.trailing_filename:
@@ -79,21 +78,21 @@ class CpioBaseUnpackParser(UnpackParser):
                 if stat.S_ISDIR(mode):
                     self.unpack_directory(outfile_rel)
                 elif stat.S_ISLNK(mode):
-                    self.unpack_link(file_path, e.filedata.decode())
+                    self.unpack_link(file_path, e.filedata.read().decode())
                     out_labels.append('symbolic link')
                 elif stat.S_ISCHR(mode) or stat.S_ISBLK(mode):
                     self.unpack_device(outfile_rel)
                     continue
                 elif stat.S_ISREG(mode):
-                    filedata_start = e.header.hsize + e.header.nsize + e.header.npaddingsize
+                    # the data was not read when parsing, but is
+                    # copied from the file.
                     self.unpack_regular(outfile_rel,
-                            pos + filedata_start, e.header.fsize)
+                            e.filedata.offset, e.filedata.size)
 
                 fr = FileResult(self.fileresult,
                         self.rel_unpack_dir / file_path,
                         set(out_labels))
                 unpacked_files.append( fr )
-            pos += e.header.bsize
         return unpacked_files
     def set_metadata_and_labels(self):
         return
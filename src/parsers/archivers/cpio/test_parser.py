@@ -1,4 +1,4 @@
-import sys, os
+import sys, os, tracemalloc
 from test.util import *
 
 from .UnpackParser import CpioNewAsciiUnpackParser, \
@@ -220,3 +220,37 @@ def test_rewrite_symlink():
 
 # Following archive formats are supported: binary, old ASCII, new ASCII, crc, HPUX binary, HPUX old ASCII, old tar, and POSIX.1 tar.
 
+def _cpio_new_ascii_entry(name, mode, data):
+    name = name.encode() + b'\0'
+    fields = [ 1, mode, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(name), 0 ]
+    entry = b'070701' + b''.join([ b'%08x' % f for f in fields ]) + name
+    entry += b'\0' * (-len(entry) % 4)
+    return entry + data + b'\0' * (-len(data) % 4)
+
+def test_cpio_file_data_is_not_read_into_memory(scan_environment):
+    filesize = 64 * 1024 * 1024
+    rel_testfile = pathlib.Path('large.cpio')
+    abs_testfile = scan_environment.unpackdirectory / rel_testfile
+    with open(abs_testfile, 'wb') as f:
+        f.write(_cpio_new_ascii_entry('large', 0o100644, b'A' * filesize))
+        f.write(_cpio_new_ascii_entry('link', 0o120777, b'large'))
+        f.write(_cpio_new_ascii_entry('TRAILER!!!', 0, b''))
+    fr = fileresult(scan_environment.unpackdirectory, rel_testfile, set())
+    data_unpack_dir = pathlib.Path('unpack-large.cpio-1')
+    p = CpioNewAsciiUnpackParser(fr, scan_environment, data_unpack_dir, 0)
+    tracemalloc.start()
+    try:
+        p.open()
+        r = p.parse_and_unpack()
+        p.close()
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the peak memory use should not depend on the size of the files
+    # in the archive.
+    assert peak < filesize // 16
+    assert r.get_length() <= fr.filesize
+    extracted_fn_abs = scan_environment.unpackdirectory / data_unpack_dir / 'large'
+    assert extracted_fn_abs.stat().st_size == filesize
+    link_abs = scan_environment.unpackdirectory / data_unpack_dir / 'link'
+    assert os.readlink(link_abs) == 'large'
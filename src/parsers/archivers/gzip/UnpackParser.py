@@ -9,6 +9,7 @@ class GzipUnpackParser(WrappedUnpackParser):
         (0, b'\x1f\x8b\x08')
     ]
     pretty_name = 'gzip'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_gzip(fileresult, scan_environment, offset, unpack_dir)
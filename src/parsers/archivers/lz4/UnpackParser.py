@@ -9,6 +9,7 @@ class Lz4UnpackParser(WrappedUnpackParser):
         (0, b'\x04\x22\x4d\x18')
     ]
     pretty_name = 'lz4'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_lz4(fileresult, scan_environment, offset, unpack_dir)
@@ -9,6 +9,7 @@ class Lz4legacyUnpackParser(WrappedUnpackParser):
         (0, b'\x02\x21\x4c\x18')
     ]
     pretty_name = 'lz4_legacy'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_lz4legacy(fileresult, scan_environment, offset, unpack_dir)
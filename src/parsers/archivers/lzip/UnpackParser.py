@@ -9,6 +9,7 @@ class LzipUnpackParser(WrappedUnpackParser):
         (0, b'LZIP')
     ]
     pretty_name = 'lzip'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_lzip(fileresult, scan_environment, offset, unpack_dir)
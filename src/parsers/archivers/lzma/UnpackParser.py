@@ -11,6 +11,7 @@ class LzmaUnpackParser(WrappedUnpackParser):
         (0, b'\x6c\x00\x00')
     ]
     pretty_name = 'lzma'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_lzma(fileresult, scan_environment, offset, unpack_dir)
@@ -50,6 +50,9 @@ class MozillaMar(UnpackParser):
         check_condition(self.data.file_size == self.data.ofs_index + 4 +
                         self.data.index.len_index_entries, "Wrong file size")
         check_condition(self.data.file_size <= file_size, "Not enough data")
+        for entry in self.data.index.index_entries.index_entry:
+            check_condition(entry.ofs_content + entry.len_content <= self.data.file_size,
+                            "Entry outside of file")
 
     def calculate_unpacked_size(self):
         self.unpacked_size = self.data.file_size
@@ -62,11 +65,9 @@ class MozillaMar(UnpackParser):
 
             out_labels = []
             outfile_rel = self.rel_unpack_dir / entry.file_name
-            outfile_full = self.scan_environment.unpack_path(outfile_rel)
-            os.makedirs(outfile_full.parent, exist_ok=True)
-            outfile = open(outfile_full, 'wb')
-            outfile.write(entry.content)
-            outfile.close()
+            # copy the data from the file instead of reading it
+            # into memory with entry.content
+            self.extract_to_file(outfile_rel, entry.ofs_content, entry.len_content)
 
             fr = FileResult(self.fileresult, outfile_rel, set(out_labels))
             unpacked_files.append(fr)
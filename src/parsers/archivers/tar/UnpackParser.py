@@ -14,6 +14,7 @@ class wTarUnpackParser(WrappedUnpackParser):
         (0x101, b'ustar\x20\x20\x00')
     ]
     pretty_name = 'tar'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_tar(fileresult, scan_environment, offset, unpack_dir)
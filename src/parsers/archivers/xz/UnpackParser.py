@@ -9,6 +9,7 @@ class XzUnpackParser(WrappedUnpackParser):
         (0, b'\xfd\x37\x7a\x58\x5a\x00')
     ]
     pretty_name = 'xz'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_xz(fileresult, scan_environment, offset, unpack_dir)
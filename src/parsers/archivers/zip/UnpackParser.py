@@ -9,6 +9,7 @@ class ZipUnpackParser(WrappedUnpackParser):
         (0, b'\x50\x4b\x03\04')
     ]
     pretty_name = 'zip'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_zip(fileresult, scan_environment, offset, unpack_dir)
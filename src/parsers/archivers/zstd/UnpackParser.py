@@ -9,6 +9,7 @@ class ZstdUnpackParser(WrappedUnpackParser):
         (0, b'\x28\xb5\x2f\xfd')
     ]
     pretty_name = 'zstd'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_zstd(fileresult, scan_environment, offset, unpack_dir)
@@ -9,6 +9,7 @@ class ElfUnpackParser(WrappedUnpackParser):
         (0, b'\x7f\x45\x4c\x46')
     ]
     pretty_name = 'elf'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_elf(fileresult, scan_environment, offset, unpack_dir)
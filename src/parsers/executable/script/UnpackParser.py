@@ -9,6 +9,7 @@ class ScriptUnpackParser(WrappedUnpackParser):
     ]
     scan_if_featureless = True
     pretty_name = 'script'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_script(fileresult, scan_environment, offset, unpack_dir)
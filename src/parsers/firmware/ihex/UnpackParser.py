@@ -9,6 +9,7 @@ class IhexUnpackParser(WrappedUnpackParser):
     ]
     scan_if_featureless = True
     pretty_name = 'ihex'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_ihex(fileresult, scan_environment, offset, unpack_dir)
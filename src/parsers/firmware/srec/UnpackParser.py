@@ -9,6 +9,7 @@ class SrecUnpackParser(WrappedUnpackParser):
     ]
     scan_if_featureless = True
     pretty_name = 'srec'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_srec(fileresult, scan_environment, offset, unpack_dir)
@@ -52,7 +52,7 @@ class DoomWadUnpackParser(UnpackParser):
         # than the file itself and there would be hundreds of millions of
         # index entries for which the generated code would first try to create
         # an IndexEntry() object leading to an out of memory issue.
-        filesize = self.fileresult.filename.stat().st_size
+        filesize = self.fileresult.filesize
         check_condition(self.data.index_offset <= filesize, "index offset outside of file")
         check_condition(self.data.num_index_entries > 0, "no lumps defined")
 
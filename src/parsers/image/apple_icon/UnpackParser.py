@@ -9,6 +9,7 @@ class AppleIconUnpackParser(WrappedUnpackParser):
         (0, b'icns')
     ]
     pretty_name = 'apple_icon'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_apple_icon(fileresult, scan_environment, offset, unpack_dir)
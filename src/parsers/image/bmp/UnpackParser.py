@@ -9,6 +9,7 @@ class BmpUnpackParser(WrappedUnpackParser):
         (0, b'BM')
     ]
     pretty_name = 'bmp'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_bmp(fileresult, scan_environment, offset, unpack_dir)
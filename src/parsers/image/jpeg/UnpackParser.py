@@ -9,6 +9,7 @@ class JpegUnpackParser(WrappedUnpackParser):
         (0, b'\xff\xd8')
     ]
     pretty_name = 'jpeg'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_jpeg(fileresult, scan_environment, offset, unpack_dir)
@@ -81,11 +81,15 @@ class PngUnpackParser(UnpackParser):
             # compute CRC32
             computed_crc = binascii.crc32(i.type.encode('utf-8'))
 
+            # the image data is not kept in memory, but read in pieces
+            if i.type == 'IDAT':
+                computed_crc = i.image_data.crc32(computed_crc)
             # hack for text chunks, where 'body' is text and not bytes
-            try:
-                computed_crc = binascii.crc32(i._raw_body, computed_crc)
-            except:
-                computed_crc = binascii.crc32(i.body, computed_crc)
+            else:
+                try:
+                    computed_crc = binascii.crc32(i._raw_body, computed_crc)
+                except:
+                    computed_crc = binascii.crc32(i.body, computed_crc)
             check_condition(computed_crc == int.from_bytes(i.crc, byteorder='big'),
                     "invalid CRC")
             self.chunknames.add(i.type)
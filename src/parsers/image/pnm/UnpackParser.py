@@ -11,6 +11,7 @@ class PnmUnpackParser(WrappedUnpackParser):
         (0, b'P4')
     ]
     pretty_name = 'pnm'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_pnm(fileresult, scan_environment, offset, unpack_dir)
@@ -9,6 +9,7 @@ class PsdUnpackParser(WrappedUnpackParser):
         (0, b'8BPS')
     ]
     pretty_name = 'psd'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_psd(fileresult, scan_environment, offset, unpack_dir)
@@ -9,6 +9,7 @@ class SgiUnpackParser(WrappedUnpackParser):
         (0, b'\x01\xda')
     ]
     pretty_name = 'sgi'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_sgi(fileresult, scan_environment, offset, unpack_dir)
@@ -9,6 +9,7 @@ class Base64UnpackParser(WrappedUnpackParser):
     ]
     scan_if_featureless = True
     pretty_name = 'base64'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_base64(fileresult, scan_environment, offset, unpack_dir)
@@ -9,6 +9,7 @@ class KernelConfigUnpackParser(WrappedUnpackParser):
     ]
     scan_if_featureless = True
     pretty_name = 'kernelconfig'
+    creates_unpack_directory = True
 
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_kernel_config(fileresult, scan_environment, offset, unpack_dir)
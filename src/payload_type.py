@@ -0,0 +1,72 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import binascii
+
+class PayloadType:
+    """Kaitai struct Opaque parser for the payload of an entry in a
+    container format. The payload is skipped without reading it and only
+    its offset and size in the stream are recorded, so it can be extracted
+    with extract_to_file() without keeping it in memory. The size is passed
+    as a parameter and not with size, as that would read the data:
+
+        - id: filedata
+          type: payload_type(header.fsize)
+
+    Add the attribute ks-opaque-types: true to the meta section of the
+    .ksy file. If using opaque types, the kaitai visualizer tools will no
+    longer work."""
+
+    # the amount of bytes that is read at once to process a payload
+    readsize = 1048576
+
+    def __init__(self, size, stream):
+        self._io = stream
+        self.offset = stream.pos()
+        self.size = size
+        if size < 0:
+            raise ValueError("negative payload size %d" % size)
+        if self.offset + size > stream.size():
+            raise EOFError("requested %d bytes, but only %d bytes available" %
+                    (size, stream.size() - self.offset))
+        stream.seek(self.offset + size)
+
+    def read(self):
+        '''Return the payload. Only use this for small payloads, such as
+        the target of a symbolic link.'''
+        pos = self._io.pos()
+        self._io.seek(self.offset)
+        data = self._io.read_bytes(self.size)
+        self._io.seek(pos)
+        return data
+
+    def crc32(self, crc=0):
+        '''Return the CRC32 of the payload, continuing from crc, reading
+        at most readsize bytes at once'''
+        pos = self._io.pos()
+        self._io.seek(self.offset)
+        remaining = self.size
+        while remaining > 0:
+            data = self._io.read_bytes(min(remaining, self.readsize))
+            crc = binascii.crc32(data, crc)
+            remaining -= len(data)
+        self._io.seek(pos)
+        return crc
@@ -0,0 +1,24 @@
+import subprocess
+
+from .util import *
+
+# modules that should only be imported when they are used
+lazymodules = ['bangunpack', 'bangfilesystems', 'bangmedia', 'bangandroid',
+        'bangtext', 'PIL', 'defusedxml', 'psycopg2', 'elasticsearch']
+
+def test_legacy_modules_are_not_imported():
+    p = subprocess.run([sys.executable, '-c',
+        'import sys, bangsignatures; print(" ".join(sys.modules))'],
+        cwd = testdir_base.parent, stdout = subprocess.PIPE, check = True,
+        text = True)
+    imported = p.stdout.split()
+    assert [ m for m in lazymodules if m in imported ] == []
+
+def test_legacy_tables_are_built_on_first_use():
+    gzip = bangsignatures.signaturetofunction['gzip']
+    assert gzip.__name__ == 'unpack_gzip'
+    assert bangsignatures.signaturetofunction is bangsignatures.signaturetofunction
+    assert '.swp' in bangsignatures.extensiontofunction
+    assert 'ihex' in bangsignatures.textonlyfunctions
+    with pytest.raises(AttributeError):
+        bangsignatures.doesnotexist
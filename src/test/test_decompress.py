@@ -0,0 +1,350 @@
+import base64
+import bz2
+import io
+import lzma
+import shutil
+import zlib
+
+import lz4.block
+import lz4.frame
+
+from .util import *
+
+import bangdecompress
+import bangunpack
+
+data = b'BANG! ' * 100000
+
+def _stream_compressors():
+    return [(bangdecompress.ZlibDecompressor, zlib.compress(data)),
+            (bz2.BZ2Decompressor, bz2.compress(data)),
+            (lzma.LZMADecompressor, lzma.compress(data)),
+            (bangdecompress.LZ4FrameDecompressor, lz4.frame.compress(data))]
+
+@pytest.mark.parametrize('decompressorclass,compressed', _stream_compressors())
+def test_stream_is_decompressed_in_chunks(decompressorclass, compressed, monkeypatch):
+    monkeypatch.setattr(bangdecompress, 'chunksize', 4096)
+    writes = []
+    output = bangdecompress.BoundedOutput(None)
+    write = output.write
+    output.write = lambda x: writes.append(len(x)) or write(x)
+    infile = io.BytesIO(compressed + b'trailing data')
+    decompressor = decompressorclass()
+    consumed = bangdecompress.decompress_stream(decompressor, infile, output)
+    assert consumed == len(compressed)
+    assert decompressor.eof
+    assert output.written == len(data)
+    assert max(writes) <= 4096
+
+def test_output_is_computed_and_created_when_closed(tmp_path):
+    output = bangdecompress.BoundedOutput(tmp_path / 'out' / 'unpacked',
+            computecrc=True)
+    assert not (tmp_path / 'out').exists()
+    output.write(data)
+    output.close()
+    assert (tmp_path / 'out' / 'unpacked').read_bytes() == data
+    assert output.crc32 == zlib.crc32(data)
+
+def test_empty_output_is_created_when_closed(tmp_path):
+    output = bangdecompress.BoundedOutput(tmp_path / 'unpacked')
+    output.close()
+    assert (tmp_path / 'unpacked').read_bytes() == b''
+
+def test_output_over_maximum_is_not_written(tmp_path):
+    output = bangdecompress.BoundedOutput(tmp_path / 'unpacked', maximum=1000)
+    output.write(b'x' * 600)
+    with pytest.raises(bangdecompress.DecompressionLimitExceeded):
+        output.write(b'x' * 600)
+    assert output.written == 600
+    output.discard()
+    assert not (tmp_path / 'unpacked').exists()
+
+def test_output_over_ratio_is_not_written(monkeypatch):
+    monkeypatch.setattr(bangdecompress, 'ratiominimum', 1000)
+    output = bangdecompress.BoundedOutput(None, ratio=10)
+    output.add_input(100)
+    # small amounts of data are not checked
+    output.write(b'x' * 1000)
+    with pytest.raises(bangdecompress.DecompressionLimitExceeded):
+        output.write(b'x' * 1)
+
+def _unpack_bytes(scan_environment, compressed, unpackfunction):
+    rel_testfile = pathlib.Path('compressed')
+    (scan_environment.unpackdirectory / rel_testfile).write_bytes(compressed)
+    fr = FileResult(None, rel_testfile, set())
+    fr.set_filesize(len(compressed))
+    return unpackfunction(fr, scan_environment, 0, pathlib.Path('unpacked'))
+
+def _compress(data):
+    # LZW with 9 bit codes in block mode: the table is cleared before
+    # it is full, so the code size never changes. The rest of the group
+    # of 8 codes after a clear code is skipped by the decompressor.
+    codes = []
+    table = {}
+    current = b''
+    for i in range(len(data)):
+        c = data[i:i+1]
+        if current + c in table or len(current + c) == 1:
+            current += c
+            continue
+        codes.append(table.get(current, current[0]))
+        if len(table) < 254:
+            table[current + c] = 257 + len(table)
+        else:
+            codes.append(256)
+            codes += [0] * (-len(codes) % 8)
+            table = {}
+        current = c
+    if current:
+        codes.append(table.get(current, current[0]))
+    bits = sum(code << (9 * i) for i, code in enumerate(codes))
+    return b'\x1f\x9d\x89' + bits.to_bytes((9 * len(codes) + 7) // 8, byteorder='little')
+
+@pytest.mark.parametrize('compress,unpackfunction', [
+    (lambda x: zlib.compress(x, wbits=31), bangunpack.unpack_gzip),
+    (bz2.compress, bangunpack.unpack_bzip2),
+    (lambda x: lzma.compress(x, format=lzma.FORMAT_XZ), bangunpack.unpack_xz),
+    (lz4.frame.compress, bangunpack.unpack_lz4),
+    (_compress, bangunpack.unpack_compress),
+    ])
+def test_unpacking_stops_at_decompression_maximum(scan_environment, compress,
+        unpackfunction):
+    scan_environment.decompressionmaximum = 1024 * 1024
+    compressed = compress(b'\x00' * (4 * 1024 * 1024))
+    testres = _unpack_bytes(scan_environment, compressed, unpackfunction)
+    assert not testres['status']
+    assert testres['error']['reason'] == \
+            'decompressed data larger than 1048576 bytes'
+    assert not (scan_environment.unpackdirectory / 'unpacked').exists() or \
+            list((scan_environment.unpackdirectory / 'unpacked').iterdir()) == []
+
+def test_unpacking_within_limits(scan_environment):
+    scan_environment.decompressionmaximum = 4 * 1024 * 1024
+    scan_environment.decompressionratio = 10
+    compressed = zlib.compress(b'\x00' * (4 * 1024 * 1024), wbits=31)
+    testres = _unpack_bytes(scan_environment, compressed, bangunpack.unpack_gzip)
+    assert testres['status']
+    assert testres['length'] == len(compressed)
+
+def _unpack_testdata(scan_environment, directory, name, offset, unpackfunction):
+    rel_testfile = pathlib.Path('unpackers') / directory / name
+    copy_testfile_to_environment(testdir_base / 'testdata', rel_testfile,
+            scan_environment)
+    fr = FileResult(None, rel_testfile, set())
+    fr.set_filesize((scan_environment.unpackdirectory / rel_testfile).stat().st_size)
+    return unpackfunction(fr, scan_environment, offset, pathlib.Path('unpacked'))
+
+def test_lzo1x_block_is_decompressed_in_python():
+    compressed = b'\x17BANG!  Q\x14\x00\x0clzop and LZO1X\x00 B\x00\x00\x11\x00\x00'
+    unpackeddata = bangdecompress.lzo1x_decompress_python(compressed, 234)
+    assert unpackeddata == b'BANG! ' * 20 + b'lzop and LZO1X' + b'\x00' * 100
+    with pytest.raises(bangdecompress.LZOError):
+        bangdecompress.lzo1x_decompress_python(compressed, 200)
+    with pytest.raises(bangdecompress.LZOError):
+        bangdecompress.lzo1x_decompress_python(compressed[:-3], 234)
+
+@pytest.mark.parametrize('name,offset,length', [
+    ('test.lzo', 0, 588927),
+    ('test-add-random-data.lzo', 0, 588927),
+    ('test-prepend-random-data.lzo', 128, 588927),
+    ('test-cut-data-from-end.lzo', 0, None),
+    ('test-data-replaced-in-middle.lzo', 0, None),
+    ])
+def test_lzop_is_unpacked_in_process(scan_environment, name, offset, length,
+        monkeypatch):
+    monkeypatch.setattr(bangdecompress, 'lzo', None)
+    monkeypatch.setattr(shutil, 'which', lambda x: None)
+    testres = _unpack_testdata(scan_environment, 'lzop', name, offset,
+            bangunpack.unpack_lzop)
+    if length is None:
+        assert not testres['status']
+        assert not (scan_environment.unpackdirectory / 'unpacked' / 'test').exists()
+        return
+    assert testres['status']
+    assert testres['length'] == length
+    assert testres['filesandlabels'] == [('unpacked/test', [])]
+    assert (scan_environment.unpackdirectory / 'unpacked' / 'test').stat().st_size == 592418
+
+def _lz4legacy(data):
+    compressed = b'\x02\x21\x4c\x18'
+    for i in range(0, len(data), bangunpack.lz4legacy_block_size):
+        block = lz4.block.compress(data[i:i+bangunpack.lz4legacy_block_size],
+                store_size=False)
+        compressed += len(block).to_bytes(4, byteorder='little') + block
+    return compressed
+
+def test_lz4legacy_is_unpacked_in_process(scan_environment, monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda x: None)
+    unpackeddata = data * 20
+    compressed = _lz4legacy(unpackeddata)
+    testres = _unpack_bytes(scan_environment, b'x' * 10 + compressed + b'trailing data',
+            lambda fr, se, offset, unpackdir:
+            bangunpack.unpack_lz4legacy(fr, se, 10, unpackdir))
+    assert testres['status']
+    assert testres['length'] == len(compressed)
+    assert (scan_environment.unpackdirectory / 'unpacked' /
+            'unpacked-from-lz4-legacy').read_bytes() == unpackeddata
+
+def test_lz4legacy_stops_at_next_frame(scan_environment):
+    compressed = _lz4legacy(data)
+    testres = _unpack_bytes(scan_environment, compressed + compressed,
+            bangunpack.unpack_lz4legacy)
+    assert testres['status']
+    assert testres['length'] == len(compressed)
+
+def _zstd_frame(blocks, size):
+    # single segment frame with a 2 byte frame content size (size - 256)
+    frame = b'\x28\xb5\x2f\xfd\x60' + (size - 256).to_bytes(2, byteorder='little')
+    for i, (blocktype, blocksize, blockdata) in enumerate(blocks):
+        header = (blocksize << 3) | (blocktype << 1) | (i == len(blocks) - 1)
+        frame += header.to_bytes(3, byteorder='little') + blockdata
+    return frame
+
+@pytest.mark.parametrize('use_zstandard', [True, False])
+def test_zstd_is_unpacked_from_parent_file(scan_environment, use_zstandard,
+        monkeypatch):
+    if use_zstandard and bangdecompress.zstandard is None:
+        pytest.skip('zstandard not installed')
+    if not use_zstandard:
+        if shutil.which('zstd') is None:
+            pytest.skip('zstd program not installed')
+        monkeypatch.setattr(bangdecompress, 'zstandard', None)
+    # a raw block and a RLE block
+    frame = _zstd_frame([(0, 6, b'BANG! '), (1, 300, b'!')], 306)
+    testres = _unpack_bytes(scan_environment, b'x' * 10 + frame + b'trailing data',
+            lambda fr, se, offset, unpackdir:
+            bangunpack.unpack_zstd(fr, se, 10, unpackdir))
+    assert testres['status']
+    assert testres['length'] == len(frame)
+    assert (scan_environment.unpackdirectory / 'unpacked' /
+            'unpacked-by-zstd').read_bytes() == b'BANG! ' + b'!' * 300
+    assert list(scan_environment.temporarydirectory.iterdir()) == []
+
+def test_zstd_frame_content_size_is_verified(scan_environment):
+    if bangdecompress.zstandard is None and shutil.which('zstd') is None:
+        pytest.skip('zstandard and zstd program not installed')
+    frame = _zstd_frame([(0, 6, b'BANG! '), (1, 300, b'!')], 307)
+    testres = _unpack_bytes(scan_environment, frame, bangunpack.unpack_zstd)
+    assert not testres['status']
+    assert not (scan_environment.unpackdirectory / 'unpacked' /
+            'unpacked-by-zstd').exists()
+
+def test_compress_is_unpacked_in_process(scan_environment, monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda x: None)
+    compressed = _compress(data)
+    testres = _unpack_bytes(scan_environment, compressed, bangunpack.unpack_compress)
+    assert testres['status']
+    assert testres['length'] == len(compressed)
+    assert 'compress' in testres['labels']
+    assert (scan_environment.unpackdirectory / 'unpacked' /
+            'unpacked-from-compress').read_bytes() == data
+
+def test_compress_first_code_is_verified(scan_environment):
+    # the first code is the clear code
+    compressed = b'\x1f\x9d\x89' + (256 | ord('B') << 9).to_bytes(3, byteorder='little')
+    testres = _unpack_bytes(scan_environment, compressed, bangunpack.unpack_compress)
+    assert not testres['status']
+    assert not (scan_environment.unpackdirectory / 'unpacked' /
+            'unpacked-from-compress').exists()
+
+def test_ar_is_unpacked_in_process(scan_environment, monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda x: None)
+    testres = _unpack_testdata(scan_environment, 'ar', 'test.ar', 0,
+            bangunpack.unpack_ar)
+    assert testres['status']
+    assert testres['length'] == 592486
+    assert set(testres['labels']) == set(['archive', 'ar'])
+    assert testres['filesandlabels'] == [('unpacked/test.sgi', [])]
+    assert (scan_environment.unpackdirectory / 'unpacked' / 'test.sgi').read_bytes() == \
+            (testdir_base / 'testdata' / 'unpackers' / 'sgi' / 'test.sgi').read_bytes()
+
+def _ar_member(name, contents):
+    header = name.ljust(16) + b'0'.ljust(12) + b'0'.ljust(6) + b'0'.ljust(6) + \
+            b'100644'.ljust(8) + str(len(contents)).encode().ljust(10) + b'`\n'
+    return header + contents + b'\n' * (len(contents) % 2)
+
+def test_ar_long_names(scan_environment):
+    longname = b'a-rather-long-file-name.txt'
+    archive = b'!<arch>\n' + _ar_member(b'/', b'\x00' * 4) + \
+            _ar_member(b'//', longname + b'/\n') + \
+            _ar_member(b'/0', b'GNU long name') + \
+            _ar_member(b'short.txt/', b'short name') + \
+            _ar_member(b'#1/' + str(len(longname) + 4).encode(),
+                    b'bsd-' + longname + b'BSD long name')
+    testres = _unpack_bytes(scan_environment, archive, bangunpack.unpack_ar)
+    assert testres['status']
+    assert testres['length'] == len(archive)
+    assert [f for (f, l) in testres['filesandlabels']] == \
+            ['unpacked/a-rather-long-file-name.txt', 'unpacked/short.txt',
+             'unpacked/bsd-a-rather-long-file-name.txt']
+    unpackdir = scan_environment.unpackdirectory / 'unpacked'
+    assert (unpackdir / longname.decode()).read_bytes() == b'GNU long name'
+    assert (unpackdir / ('bsd-' + longname.decode())).read_bytes() == b'BSD long name'
+
+def test_ar_member_names_are_verified(scan_environment):
+    archive = b'!<arch>\n' + _ar_member(b'../escape/', b'data')
+    testres = _unpack_bytes(scan_environment, archive, bangunpack.unpack_ar)
+    assert not testres['status']
+
+# SEQUENCE { INTEGER 1, OCTET STRING 'BANG!' }
+der = bytes.fromhex('300a020101') + b'\x04\x05BANG!'
+
+def _pem(name, contents):
+    return b'-----BEGIN ' + name + b'-----\n' + base64.encodebytes(contents) + \
+            b'-----END ' + name + b'-----\n'
+
+@pytest.mark.parametrize('contents,valid', [
+    (der, True),
+    (der[:-1], False),
+    (b'', False),
+    # indefinite length, and trailing data after end of contents
+    (b'\x30\x80\x02\x01\x01\x00\x00', True),
+    (b'\x00\x00garbage', True),
+    # like in OpenSSL, a missing end of contents is accepted
+    (b'\x30\x80\x02\x01\x01', True),
+    # a long form length needs a byte of data after it
+    (b'\x04\x81\x00', False),
+    # nested too deep
+    (b'\x30\x80' * 200, False),
+    ])
+def test_der_is_verified(contents, valid):
+    assert bangunpack.is_valid_der(contents) == valid
+
+def test_pem_is_decoded():
+    assert bangunpack.decode_pem(b'text.\n' + _pem(b'CERTIFICATE', der) + b'text') == der
+    # data after padding
+    assert bangunpack.decode_pem(b'QUI=\nQUJD\n') == b''
+    # incomplete lines are not decoded
+    assert bangunpack.decode_pem(b'QUJD') == b''
+
+@pytest.mark.parametrize('contents,labels', [
+    (der, ['certificate', 'resource']),
+    (_pem(b'CERTIFICATE', der), ['certificate', 'text', 'resource']),
+    (_pem(b'TRUSTED CERTIFICATE', der), ['trusted certificate', 'text', 'resource']),
+    (_pem(b'PRIVATE KEY', der), ['private key', 'text', 'resource']),
+    ])
+def test_certificate_is_verified_in_process(scan_environment, contents, labels,
+        monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda x: None)
+    testres = _unpack_bytes(scan_environment, contents, bangunpack.unpack_certificate)
+    assert testres['status']
+    assert testres['length'] == len(contents)
+    assert set(testres['labels']) == set(labels)
+
+def test_certificate_is_carved(scan_environment):
+    pem = _pem(b'CERTIFICATE', der)
+    testres = _unpack_bytes(scan_environment, b'\x00' * 10 + pem + b'\x00' * 10,
+            lambda fr, se, offset, unpackdir:
+            bangunpack.unpack_certificate(fr, se, 10, unpackdir))
+    assert testres['status']
+    assert testres['length'] == len(pem) - 1
+    assert (scan_environment.unpackdirectory / 'unpacked' /
+            'unpacked.crt').read_bytes() == pem[:-1]
+
+def test_invalid_certificate_is_not_unpacked(scan_environment):
+    pem = _pem(b'CERTIFICATE', der[:-1])
+    testres = _unpack_bytes(scan_environment, b'\x00' * 10 + pem,
+            lambda fr, se, offset, unpackdir:
+            bangunpack.unpack_certificate(fr, se, 10, unpackdir))
+    assert not testres['status']
+    assert not (scan_environment.unpackdirectory / 'unpacked' / 'unpacked.crt').exists()
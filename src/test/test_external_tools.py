@@ -0,0 +1,116 @@
+import multiprocessing
+import time
+
+from .util import *
+
+from ExternalTools import ExternalTools
+from ScanStatistics import ScanStatistics
+from UnpackBudget import UnpackBudget, UnpackBudgetExceeded
+
+python = os.path.basename(sys.executable)
+
+def _external_tools(tmp_path, **kwargs):
+    tools = ExternalTools(tmp_path, **kwargs)
+    tools.set_statistics(ScanStatistics())
+    return tools
+
+def test_program_is_run(tmp_path):
+    tools = _external_tools(tmp_path)
+    p = tools.run([sys.executable, '-c',
+        'import os, sys; print(os.getcwd()); sys.exit(3)'], cwd=tmp_path)
+    assert p.returncode == 3
+    assert p.stdout.strip() == os.fsencode(tmp_path)
+    runs = tools.statistics.get()['tools'][python]
+    assert runs['runs'] == 1
+    assert runs['timeouts'] == 0
+    assert runs['wall time'] > 0
+
+def test_program_over_its_timeout_is_killed(tmp_path):
+    tools = _external_tools(tmp_path, tooltimeouts={python: 0.2})
+    start = time.perf_counter()
+    p = tools.run([sys.executable, '-c', 'import time; time.sleep(30)'])
+    assert time.perf_counter() - start < 10
+    assert p.returncode < 0
+    assert tools.statistics.get()['tools'][python]['timeouts'] == 1
+
+def test_program_is_killed_when_attempt_is_aborted(tmp_path):
+    tools = _external_tools(tmp_path)
+    start = time.perf_counter()
+    with pytest.raises(UnpackBudgetExceeded):
+        with UnpackBudget(walltime=0.2).enforce(tmp_path):
+            tools.run([sys.executable, '-c', 'import time; time.sleep(30)'])
+    assert time.perf_counter() - start < 10
+
+def _try_slot(tools, tool, result):
+    result.value = tools.semaphores[tool].acquire(timeout=0.1)
+
+def test_concurrency_is_limited_across_processes(tmp_path):
+    tools = _external_tools(tmp_path, concurrency=1)
+    assert 'unsquashfs' in tools.semaphores
+    result = multiprocessing.Value('b', -1)
+    with tools.slot('unsquashfs'):
+        process = multiprocessing.Process(target=_try_slot,
+                args=(tools, 'unsquashfs', result))
+        process.start()
+        process.join()
+        assert result.value == 0
+    process = multiprocessing.Process(target=_try_slot,
+            args=(tools, 'unsquashfs', result))
+    process.start()
+    process.join()
+    assert result.value == 1
+
+def test_waiting_for_slot_is_aborted_over_budget(tmp_path):
+    tools = _external_tools(tmp_path, concurrency=1)
+    start = time.perf_counter()
+    with tools.slot('unsquashfs'):
+        with pytest.raises(UnpackBudgetExceeded):
+            with UnpackBudget(walltime=0.2).enforce(tmp_path):
+                with tools.slot('unsquashfs'):
+                    pass
+    assert time.perf_counter() - start < 10
+    # the slot that was waited for was not taken, the other one is released
+    assert tools.semaphores['unsquashfs'].acquire(timeout=0)
+    tools.semaphores['unsquashfs'].release()
+    assert 'unsquashfs' in tools.statistics.get()['tools']
+
+def test_programs_without_limit_are_not_limited(tmp_path):
+    tools = ExternalTools(tmp_path, concurrency=2,
+            toolconcurrency={'7z': 0, 'other': 1})
+    assert '7z' not in tools.semaphores
+    assert 'other' in tools.semaphores
+    assert 'unsquashfs' in tools.semaphores
+    assert ExternalTools(tmp_path).semaphores == {}
+
+def test_file_slice_is_shared(tmp_path):
+    tools = ExternalTools(tmp_path)
+    datafile = tmp_path / 'data'
+    datafile.write_bytes(b'0123456789')
+    with tools.file_slice(datafile, 2, 5) as slicename:
+        assert pathlib.Path(slicename).read_bytes() == b'23456'
+        # a retry gets the same copy
+        with tools.file_slice(datafile, 2, 5) as retryname:
+            assert retryname == slicename
+        # a copy that is in use is not removed
+        tools.remove_file_slices()
+        assert os.path.exists(slicename)
+    # the copy is kept for later use, until other data is copied
+    with tools.file_slice(datafile, 2, 5) as laterslicename:
+        assert laterslicename == slicename
+    with tools.file_slice(datafile, 3, 5) as otherslicename:
+        assert pathlib.Path(otherslicename).read_bytes() == b'34567'
+        assert not os.path.exists(slicename)
+    tools.remove_file_slices()
+    assert not os.path.exists(otherslicename)
+    assert tools.slices == {}
+
+def test_whole_file_is_not_copied(tmp_path):
+    tools = ExternalTools(tmp_path)
+    datafile = tmp_path / 'data'
+    datafile.write_bytes(b'0123456789')
+    with tools.file_slice(datafile, 0, 10) as slicename:
+        assert slicename == str(datafile)
+    with tools.file_slice(datafile, 0, 5, trailingdata=True) as slicename:
+        assert slicename == str(datafile)
+    with tools.file_slice(datafile, 0, 5) as slicename:
+        assert pathlib.Path(slicename).read_bytes() == b'01234'
@@ -0,0 +1,64 @@
+import collections
+import string
+
+from .util import *
+
+import FileContentsComputer as contentscomputer
+from FileContentsComputer import *
+
+def _read(tmp_path, data, computer, read_size=7):
+    path = tmp_path / 'data'
+    path.write_bytes(data)
+    fc = FileContentsComputer(read_size)
+    fc.subscribe(computer)
+    fc.read(path)
+    return computer.get()
+
+@pytest.fixture(params = ['numpy', 'counter'])
+def numpy_backend(request, monkeypatch):
+    if request.param == 'numpy':
+        if contentscomputer.numpy is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(contentscomputer, 'numpy', None)
+    return request.param
+
+@pytest.mark.parametrize('data', [
+    b'', b'hello world\n', string.printable.encode() * 3,
+    b'hello\x00world', b'hello world\x7f', b'\xe2\x82\xac uro',
+    bytes(range(256)),
+])
+def test_is_text_computer_matches_printable_characters(tmp_path, data):
+    expected = all(chr(x) in string.printable for x in data)
+    assert _read(tmp_path, data, IsTextComputer()) == expected
+
+def test_byte_counter_counts_all_bytes(tmp_path, numpy_backend):
+    data = bytes(range(256)) * 3 + b'abc' * 10
+    counter = _read(tmp_path, data, ByteCounter())
+    expected = collections.Counter(dict([(i, 0) for i in range(0, 256)]))
+    expected.update(data)
+    assert counter == expected
+    assert list(counter.items()) == list(expected.items())
+
+@pytest.mark.parametrize('read_size', [7, 100, 1000])
+def test_entropy_computer_computes_entropy_per_block(tmp_path, numpy_backend, read_size):
+    data = b'\0' * 256 + bytes(range(256)) + b'ab' * 64
+    profile = _read(tmp_path, data, EntropyComputer(blocksize = 256), read_size)
+    assert profile == [0.0, 8.0, 1.0]
+
+def test_byte_counter_of_empty_file(tmp_path, numpy_backend):
+    counter = _read(tmp_path, b'', ByteCounter())
+    assert len(counter) == 256
+    assert sum(counter.values()) == 0
+
+def test_padding_ranges_are_not_read(tmp_path):
+    data = b'abc' * 100 + b'\0' * 5000 + b'def' + b'\xff' * 3000
+    expected = _read(tmp_path, data, Hasher(['sha256']))
+    # the padding is replaced by other data, which should not be read
+    path = tmp_path / 'data'
+    path.write_bytes(data[:300] + b'x' * 5000 + b'def' + b'x' * 3000)
+    hasher = Hasher(['sha256'])
+    fc = FileContentsComputer(1000)
+    fc.subscribe(hasher)
+    fc.read(path, paddingranges = [ (300, 5300, b'\0'), (5303, 8303, b'\xff') ])
+    assert hasher.get() == expected
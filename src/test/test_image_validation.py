@@ -0,0 +1,47 @@
+from .util import *
+
+import bangmedia
+
+def _unpack_image(scan_environment, rel_testfile, unpackfunction, offset=0):
+    copy_testfile_to_environment(testdir_base / 'testdata', rel_testfile,
+            scan_environment)
+    fr = fileresult(testdir_base / 'testdata', rel_testfile, set())
+    return unpackfunction(fr, scan_environment, offset, pathlib.Path('unpacked'))
+
+@pytest.mark.parametrize('level', ['structural', 'full'])
+def test_validation_level_is_recorded(scan_environment, level):
+    scan_environment.imagevalidation = level
+    rel_testfile = pathlib.Path('unpackers') / 'bmp' / 'test.bmp'
+    testres = _unpack_image(scan_environment, rel_testfile, bangmedia.unpack_bmp)
+    assert testres['status']
+    assert testres['metadata'] == {'image validation': level}
+
+def test_structural_validation_does_not_decode(scan_environment, monkeypatch):
+    def fail(*args):
+        raise AssertionError("image was decoded")
+    monkeypatch.setattr(bangmedia.PIL.Image, 'open', fail)
+    scan_environment.imagevalidation = 'structural'
+    rel_testfile = pathlib.Path('unpackers') / 'ico' / 'test.ico'
+    testres = _unpack_image(scan_environment, rel_testfile, bangmedia.unpack_ico)
+    assert testres['status']
+
+def test_structural_validation_rejects_missing_pixels(scan_environment, tmp_path):
+    scan_environment.imagevalidation = 'structural'
+    data = (testdir_base / 'testdata' / 'unpackers' / 'bmp' / 'test.bmp').read_bytes()
+    # keep the size in the header, but drop pixel data and pad the file
+    data = data[:-1000] + b'\x00' * 100
+    data = data[:2] + len(data).to_bytes(4, byteorder='little') + data[6:]
+    rel_testfile = pathlib.Path('truncated.bmp')
+    (scan_environment.unpackdirectory / rel_testfile).write_bytes(data)
+    fr = FileResult(None, rel_testfile, set())
+    fr.set_filesize(len(data))
+    testres = bangmedia.unpack_bmp(fr, scan_environment, 0, pathlib.Path('unpacked'))
+    assert not testres['status']
+
+@pytest.mark.parametrize('rel_testfile', ['test-png-data-replaced-in-middle.ico',
+    'test-png-data-added-to-middle.ico'])
+def test_structural_validation_checks_png_crcs(scan_environment, rel_testfile):
+    scan_environment.imagevalidation = 'structural'
+    rel_testfile = pathlib.Path('unpackers') / 'ico' / rel_testfile
+    testres = _unpack_image(scan_environment, rel_testfile, bangmedia.unpack_ico)
+    assert not testres['status']
@@ -0,0 +1,61 @@
+import pickle
+
+from .util import *
+
+import ParserRegistry
+from ParserRegistry import LazyUnpackParser
+from UnpackParser import UnpackParser
+
+@pytest.fixture
+def manifestfile(tmp_path, monkeypatch):
+    path = tmp_path / 'manifest.json'
+    monkeypatch.setattr(ParserRegistry, 'manifestfile', path)
+    return path
+
+def test_manifest_describes_all_unpackers(manifestfile):
+    unpackers, missing = ParserRegistry.import_unpackers()
+    manifest = ParserRegistry.build_manifest()
+    ParserRegistry.write_manifest(manifest)
+    manifest = ParserRegistry.read_manifest()
+    assert manifest is not None
+    lazyunpackers = [ ParserRegistry._lazy_unpacker(d) for d in manifest['unpackers'] ]
+    assert [ u.__name__ for u in lazyunpackers ] == [ u.__name__ for u in unpackers ]
+    for lazy, unpacker in zip(lazyunpackers, unpackers):
+        assert lazy.pretty_name == unpacker.pretty_name
+        assert lazy.signatures == unpacker.signatures
+        assert lazy.extensions == unpacker.extensions
+        assert lazy.scan_if_featureless == unpacker.scan_if_featureless
+        assert lazy.get_class() is unpacker
+
+def test_manifest_is_invalid_after_parsers_change(manifestfile, monkeypatch):
+    ParserRegistry.write_manifest(ParserRegistry.build_manifest())
+    assert ParserRegistry.read_manifest() is not None
+    monkeypatch.setattr(ParserRegistry, 'compute_fingerprint', lambda: 'changed')
+    assert ParserRegistry.read_manifest() is None
+
+def test_manifest_is_invalid_after_missing_module_is_installed(manifestfile):
+    manifest = ParserRegistry.build_manifest()
+    manifest['missing'] = { 'parsers.a.UnpackParser': 'hashlib' }
+    ParserRegistry.write_manifest(manifest)
+    assert ParserRegistry.read_manifest() is None
+
+def _copy_lazy_unpacker(u):
+    return LazyUnpackParser(u.module, u.__name__, u.pretty_name,
+            u.signatures, u.extensions, u.scan_if_featureless)
+
+def test_lazy_unpacker_imports_class_when_used():
+    u = _copy_lazy_unpacker(ParserRegistry.get_unpackers()[0])
+    assert u.unpackparser is None
+    assert u.pretty_name is not None
+    assert issubclass(u.get_class(), UnpackParser)
+    assert u.unpackparser is not None
+    for extension in u.extensions:
+        assert u.is_valid_extension(extension)
+
+def test_lazy_unpacker_can_be_pickled():
+    u = _copy_lazy_unpacker(ParserRegistry.get_unpackers()[0])
+    u.get_class()
+    v = pickle.loads(pickle.dumps(u))
+    assert v.unpackparser is None
+    assert v.__name__ == u.__name__
+    assert v.get_class() is u.get_class()
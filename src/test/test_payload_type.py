@@ -0,0 +1,40 @@
+import binascii
+import io
+
+from kaitaistruct import KaitaiStream
+
+from .util import *
+from payload_type import PayloadType
+
+def _stream(data):
+    return KaitaiStream(io.BytesIO(data))
+
+def test_payload_is_skipped():
+    stream = _stream(b'ab' + b'0123456789' + b'cd')
+    stream.read_bytes(2)
+    payload = PayloadType(10, stream)
+    assert payload.offset == 2
+    assert payload.size == 10
+    assert stream.pos() == 12
+    assert stream.read_bytes(2) == b'cd'
+
+def test_payload_is_read_on_request():
+    stream = _stream(b'ab' + b'0123456789' + b'cd')
+    stream.read_bytes(2)
+    payload = PayloadType(10, stream)
+    assert payload.read() == b'0123456789'
+    assert payload.crc32() == binascii.crc32(b'0123456789')
+    assert payload.crc32(5) == binascii.crc32(b'0123456789', 5)
+    # the position in the stream is not changed
+    assert stream.pos() == 12
+
+def test_payload_crc_is_computed_in_pieces(monkeypatch):
+    monkeypatch.setattr(PayloadType, 'readsize', 3)
+    payload = PayloadType(10, _stream(b'0123456789'))
+    assert payload.crc32() == binascii.crc32(b'0123456789')
+
+def test_truncated_payload_raises_error():
+    with pytest.raises(EOFError):
+        PayloadType(11, _stream(b'0123456789'))
+    with pytest.raises(ValueError):
+        PayloadType(-1, _stream(b'0123456789'))
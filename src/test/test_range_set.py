@@ -0,0 +1,40 @@
+from .util import *
+
+from RangeSet import RangeSet
+
+def test_ranges_are_sorted_and_merged():
+    ranges = RangeSet([(20, 30), (0, 5)])
+    ranges.add(10, 15)
+    ranges.add(5, 8)
+    ranges.add(25, 40)
+    ranges.add(50, 50)
+    assert ranges.ranges() == [ (0, 8), (10, 15), (20, 40) ]
+    ranges.add(8, 20)
+    assert ranges.ranges() == [ (0, 40) ]
+    assert len(ranges) == 1
+
+def test_containment():
+    ranges = RangeSet([(10, 20), (30, 40)])
+    assert 9 not in ranges
+    assert 10 in ranges
+    assert 19 in ranges
+    assert 20 not in ranges
+    assert ranges.find(35) == (30, 40)
+    assert ranges.find(25) is None
+    assert ranges.next_gap(15) == 20
+    assert ranges.next_gap(25) == 25
+
+def test_overlaps():
+    ranges = RangeSet([(10, 20)])
+    assert not ranges.overlaps(0, 10)
+    assert ranges.overlaps(0, 11)
+    assert ranges.overlaps(19, 30)
+    assert not ranges.overlaps(20, 30)
+    assert not ranges.overlaps(15, 15)
+
+def test_gaps():
+    ranges = RangeSet([(10, 20), (30, 40)])
+    assert ranges.gaps(0, 50) == [ (0, 10), (20, 30), (40, 50) ]
+    assert ranges.gaps(15, 35) == [ (20, 30) ]
+    assert ranges.gaps(10, 20) == []
+    assert RangeSet().gaps(0, 5) == [ (0, 5) ]
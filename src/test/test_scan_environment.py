@@ -7,6 +7,7 @@ import pathlib
 from ScanEnvironment import ScanEnvironment
 from UnpackParser import UnpackParser
 from FileResult import FileResult
+from ScanScheduler import ScanContext
 
 
 # test get_unpack_path from fileresult
@@ -81,6 +82,16 @@ def test_get_unpackparsers_from_scan_environment(scan_environment):
         }
     assert scan_environment.get_unpackparsers_for_featureless_files() == [ unpackparsers[3] ]
 
+def test_scan_environment_for_scan_uses_scan_directories(scan_environment, tmp_path):
+    scan = ScanContext('scan', tmp_path / 'unpack', tmp_path / 'results')
+    se = scan_environment.for_scan(scan)
+    assert se.unpackdirectory == tmp_path / 'unpack'
+    assert se.resultsdirectory == tmp_path / 'results'
+    assert se.scanfilequeue is scan_environment.scanfilequeue
+    assert se.get_signature_matcher() is scan_environment.get_signature_matcher()
+    assert scan_environment.for_scan(scan) is se
+    assert scan_environment.for_scan(None) is scan_environment
+
 
 
 class TestScanEnvironment(unittest.TestCase):
@@ -102,3 +113,43 @@ class TestScanEnvironment(unittest.TestCase):
 
 if __name__ == "__main__":
     unittest.main()
+
+def _virtual_fileresult(scan_environment, name):
+    backing = scan_environment.unpackdirectory / (name + '-backing')
+    backing.write_bytes(b'AAAAAsome data')
+    parent = FileResult(None, backing, set())
+    fr = FileResult(parent, pathlib.Path(name), set())
+    fr.set_slice(backing, 5, 9)
+    return fr
+
+def test_virtual_file_is_materialized_once(scan_environment):
+    fr = _virtual_fileresult(scan_environment, 'once')
+    path = scan_environment.materialize(fr, keep=False)
+    assert path.read_bytes() == b'some data'
+    assert fr.is_virtual()
+    path.write_bytes(b'changed')
+    assert scan_environment.materialize(fr, keep=False) == path
+    assert path.read_bytes() == b'changed'
+    scan_environment.unmaterialize(fr)
+    assert not path.exists()
+    assert fr.is_virtual()
+
+def test_materialized_file_is_kept(scan_environment):
+    fr = _virtual_fileresult(scan_environment, 'kept')
+    scan_environment.materialize(fr, keep=False)
+    path = scan_environment.materialize(fr)
+    assert not fr.is_virtual()
+    scan_environment.unmaterialize(fr)
+    assert path.read_bytes() == b'some data'
+
+def test_partial_materialized_file_is_removed(scan_environment, monkeypatch):
+    fr = _virtual_fileresult(scan_environment, 'partial')
+    def interrupted_sendfile(out, infile, offset, count):
+        os.write(out, b'some')
+        raise KeyboardInterrupt
+    monkeypatch.setattr(os, 'sendfile', interrupted_sendfile)
+    with pytest.raises(KeyboardInterrupt):
+        scan_environment.materialize(fr, keep=False)
+    assert not scan_environment.get_unpack_path_for_fileresult(fr).exists()
+    monkeypatch.undo()
+    assert scan_environment.materialize(fr).read_bytes() == b'some data'
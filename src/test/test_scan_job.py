@@ -1,3 +1,4 @@
+import hashlib
 import sys
 import os
 import shutil
@@ -9,6 +10,7 @@ from .util import *
 
 from FileResult import *
 from ScanJob import *
+from ScanScheduler import ScanContext
 # from ScanEnvironment import *
 
 # import bangfilescans
@@ -78,6 +80,7 @@ parser_pass_BB_0_5 = create_unpackparser('ParserPassBB_0_5',
 # TODO: test unpacking for extension that has multiple unpackparsers
 
 def test_carved_padding_file_has_correct_labels(scan_environment):
+    scan_environment.carvepadding = True
     padding_file = _create_padding_file_in_unpack_directory(scan_environment)
     fileresult = FileResult(None, scan_environment.unpackdirectory / padding_file, set())
     fileresult.set_filesize(
@@ -93,6 +96,30 @@ def test_carved_padding_file_has_correct_labels(scan_environment):
     j = scan_environment.scanfilequeue.get()
     assert j.fileresult.labels == set(['padding', 'synthesized'])
 
+def test_padding_is_reported_instead_of_carved(scan_environment):
+    padding_file = _create_padding_file_in_unpack_directory(scan_environment)
+    fileresult = FileResult(None, scan_environment.unpackdirectory / padding_file, set())
+    fileresult.set_filesize(
+            (scan_environment.unpackdirectory / padding_file).stat().st_size)
+    scanjob, unpacker = initialize_scanjob_and_unpacker(scan_environment, fileresult)
+    scanjob.check_unscannable_file()
+    unpacker.append_unpacked_range(0, 5) # bytes [0:5) are unpacked
+    scanjob.carve_file_data(unpacker)
+    assert len(scan_environment.scanfilequeue.queue) == 0
+    assert fileresult.unpackedfiles == [ {'offset': 5, 'type': 'padding',
+        'size': 15, 'files': []} ]
+
+@pytest.mark.parametrize('content,expected', [
+    (b'', False), (b'\0', True), (b'\xff' * 3000000, True),
+    (b'\0' * 3000000 + b'\xff', False), (b'\0' * 100 + b'a' + b'\0', False),
+    (b'a' * 100, False),
+])
+def test_is_padding(scan_environment, content, expected):
+    fn_abs = scan_environment.temporarydirectory / 'data'
+    fileresult = create_tmp_fileresult(fn_abs, b'x' + content + b'x')
+    scanjob, unpacker = initialize_scanjob_and_unpacker(scan_environment, fileresult)
+    assert scanjob.is_padding(fn_abs, 1, len(content)) == expected
+
 def test_process_paddingfile_has_correct_labels(scan_environment):
     padding_file = _create_padding_file_in_unpack_directory(scan_environment)
     fileresult = FileResult(None, scan_environment.unpackdirectory / padding_file, set(['padding']))
@@ -235,6 +262,66 @@ def test_report_has_correct_path(scan_environment):
     assert unpack_report['unpackdirectory'] == fn_expected.parent
     assert unpack_report['files'] == [ fn_expected ]
 
+def test_duplicate_file_is_not_unpacked_if_hashes_are_computed_first(scan_environment):
+    fn = pathlib.Path("a") / "hello.gz"
+    fn_abs = testdata_dir / fn
+    fn_copy = scan_environment.temporarydirectory / "hello-copy.gz"
+    shutil.copy(fn_abs, fn_copy)
+    scan_environment.hashfirst = True
+    for f in [fn_abs, fn_copy]:
+        # TODO: FileResult asks for relative path
+        fileresult = FileResult(None, f, set())
+        fileresult.set_filesize(f.stat().st_size)
+        scan_environment.scanfilequeue.put(ScanJob(fileresult))
+    try:
+        processfile(MockDBConn(), MockDBCursor(), scan_environment)
+    except QueueEmptyError:
+        pass
+    except ScanJobError as e:
+        if e.e.__class__ != QueueEmptyError:
+            raise e
+    result1 = scan_environment.resultqueue.get()
+    result2 = scan_environment.resultqueue.get()
+    result3 = scan_environment.resultqueue.get()
+    assert len(scan_environment.resultqueue.queue) == 0
+    assert result1.filename == fn_abs
+    assert not result1.is_duplicate()
+    assert len(result1.unpackedfiles) == 1
+    assert result2.filename == fn_copy
+    assert result2.is_duplicate()
+    assert result2.unpackedfiles == []
+    assert result2.get()['duplicate of'] == str(fn_abs)
+    assert result3.filename.name == 'hello'
+
+def test_files_of_a_scan_are_unpacked_in_the_scan_directory(scan_environment, tmp_path):
+    fn = pathlib.Path("a") / "hello.gz"
+    fn_abs = testdata_dir / fn
+    (tmp_path / 'unpack').mkdir()
+    (tmp_path / 'results').mkdir()
+    scan = ScanContext('scan', tmp_path / 'unpack', tmp_path / 'results')
+    # TODO: FileResult asks for relative path
+    fileresult = FileResult(None, fn_abs, set())
+    fileresult.set_filesize(fn_abs.stat().st_size)
+    scan_environment.scanfilequeue.put(ScanJob(fileresult, scan))
+    try:
+        processfile(MockDBConn(), MockDBCursor(), scan_environment)
+    except QueueEmptyError:
+        pass
+    except ScanJobError as e:
+        if e.e.__class__ != QueueEmptyError:
+            raise e
+    scanid1, jobid1, parentid1, result1, queuedjobs1, statistics1 = scan_environment.resultqueue.get()
+    scanid2, jobid2, parentid2, result2, queuedjobs2, statistics2 = scan_environment.resultqueue.get()
+    assert len(scan_environment.resultqueue.queue) == 0
+    assert (scanid1, parentid1, queuedjobs1) == ('scan', None, 1)
+    assert (scanid2, parentid2, queuedjobs2) == ('scan', jobid1, 0)
+    assert statistics1.get()['parsers']['gzip']['successes'] == 1
+    assert 'signatures' in statistics1.get()['phases']
+    assert 'stat' in statistics2.get()['phases']
+    assert result2.filename.name == 'hello'
+    assert (tmp_path / 'unpack' / result2.filename).exists()
+    assert not (scan_environment.unpackdirectory / result2.filename).exists()
+
 def test_file_is_unpacked_by_extension(scan_environment):
     fn = pathlib.Path("unpackers") / "gif" / "test.gif"
     fn_abs = testdata_dir / fn
@@ -400,6 +487,44 @@ def test_file_unpack_signature_fail(scan_environment):
 
 
 
+def test_entropy_profile_is_recorded_in_metadata(scan_environment):
+    scan_environment.entropyprofile = True
+    scan_environment.skiphighentropy = True
+    fn_abs = scan_environment.temporarydirectory / 'random'
+    fileresult = create_tmp_fileresult(fn_abs, b'\0' * 65536 + os.urandom(65536))
+    scan_environment.scanfilequeue.put(ScanJob(fileresult))
+    try:
+        processfile(MockDBConn(), MockDBCursor(), scan_environment)
+    except QueueEmptyError:
+        pass
+    except ScanJobError as e:
+        if e.e.__class__ != QueueEmptyError:
+            raise e
+    result = scan_environment.resultqueue.get()
+    entropy = result.metadata['entropy']
+    assert entropy['block size'] == 65536
+    assert entropy['blocks'][0] == 0.0
+    assert entropy['blocks'][1] > 7.9
+
+def test_padding_is_reported_and_not_carved(scan_environment):
+    scan_environment.skippadding = True
+    fn_abs = scan_environment.temporarydirectory / 'image'
+    content = b'some text\n' * 10 + b'\xff' * 200000 + b'more text\n' * 10
+    fileresult = create_tmp_fileresult(fn_abs, content)
+    scan_environment.scanfilequeue.put(ScanJob(fileresult))
+    try:
+        processfile(MockDBConn(), MockDBCursor(), scan_environment)
+    except QueueEmptyError:
+        pass
+    except ScanJobError as e:
+        if e.e.__class__ != QueueEmptyError:
+            raise e
+    result = scan_environment.resultqueue.get()
+    assert result.get_hash() == hashlib.sha256(content).hexdigest()
+    padding = [ r for r in result.unpackedfiles if r['type'] == 'padding' ]
+    assert padding == [ {'offset': 100, 'type': 'padding', 'size': 200000,
+        'files': []} ]
+
 def test_carved_data_is_extracted_from_file(scan_environment):
     fn = pathlib.Path("unpackers") / "gif" / "test-prepend-random-data.gif"
     fn_abs = testdata_dir / fn
@@ -423,6 +548,48 @@ def test_carved_data_is_extracted_from_file(scan_environment):
     assert j.fileresult.filename == synthesized_name
     assertUnpackedPathExists(scan_environment, j.fileresult.filename)
 
+def test_virtual_carving_does_not_write_carved_data(scan_environment):
+    scan_environment.virtualcarving = True
+    scan_environment.carvepadding = True
+    fn_abs = scan_environment.temporarydirectory / 'prepend-padding'
+    fileresult = create_tmp_fileresult(fn_abs, b'A' * 5 + b'\0' * 20)
+    scanjob, unpacker = initialize_scanjob_and_unpacker(scan_environment,
+            fileresult)
+    scanjob.check_unscannable_file()
+    unpacker.append_unpacked_range(0, 5) # bytes [0:5) are unpacked
+    scanjob.carve_file_data(unpacker)
+    j = scan_environment.scanfilequeue.get()
+    assert j.fileresult.labels == set(['padding', 'synthesized'])
+    assert j.fileresult.filename.name == 'PADDING-0x5-0x18'
+    assert j.fileresult.get_slice() == (fn_abs, 5, 20)
+    assert not scan_environment.unpack_path(j.fileresult.filename).exists()
+
+def test_virtual_file_is_scanned_in_place(scan_environment):
+    scan_environment.virtualcarving = True
+    fn_abs = scan_environment.temporarydirectory / 'prepend-text'
+    create_tmp_fileresult(fn_abs, b'A' * 5 + b'some text\n' * 3)
+    parent = FileResult(None, fn_abs, set())
+    fileresult = FileResult(parent, pathlib.Path('a') / 'unpacked-0x5-0x22',
+            set(['synthesized']))
+    fileresult.set_slice(fn_abs, 5, 30)
+    scan_environment.scanfilequeue.put(ScanJob(fileresult))
+    try:
+        processfile(MockDBConn(), MockDBCursor(), scan_environment)
+    except QueueEmptyError:
+        pass
+    except ScanJobError as e:
+        if e.e.__class__ != QueueEmptyError:
+            raise e
+    result = scan_environment.resultqueue.get()
+    assert result.filesize == 30
+    assert result.get_hash() == hashlib.sha256(b'some text\n' * 3).hexdigest()
+    assert 'text' in result.labels
+    assert not scan_environment.unpack_path(result.filename).exists()
+
+    path = scan_environment.materialize(result)
+    assert not result.is_virtual()
+    assert path.read_bytes() == b'some text\n' * 3
+
 def test_featureless_file_is_unpacked(scan_environment):
     fn = pathlib.Path("unpackers") / "ihex" / "example.txt"
     fn_abs = testdata_dir / fn
@@ -787,3 +954,28 @@ def test_file_without_features_is_carved(scan_environment):
 
 if __name__ == "__main__":
     unittest.main()
+
+class UnpackParserBorrowsFile(UnpackParser):
+    pretty_name = 'borrows'
+    signatures = [(0, b'AA')]
+    borrowed = []
+    def parse(self):
+        UnpackParserBorrowsFile.borrowed.append(type(self.infile.infile))
+        self.infile.read(2)
+
+def test_parsers_borrow_the_shared_file(scan_environment):
+    from SharedInputFile import BorrowedFile
+    s = b'AAxxAAxxxxAA'
+    fn = pathlib.Path('test_shared.data')
+    fileresult = create_tmp_fileresult(scan_environment.temporarydirectory / fn, s)
+    scan_environment.set_unpackparsers([UnpackParserBorrowsFile])
+    scanjob, unpacker = initialize_scanjob_and_unpacker(scan_environment, fileresult)
+    scanjob.share_input_file()
+    sharedfile = scanjob.sharedfile
+    scanjob.check_for_signatures(unpacker)
+    scanjob.carve_file_data(unpacker)
+    scanjob.close_shared_input_file()
+    assert UnpackParserBorrowsFile.borrowed == [BorrowedFile] * 3
+    assert sorted([ u['offset'] for u in fileresult.unpackedfiles ]) == [0, 2, 4, 6, 10]
+    assert sharedfile.infile.closed
+    assert scan_environment.sharedinputfiles == {}
@@ -0,0 +1,234 @@
+import hashlib
+import multiprocessing
+import pathlib
+import pickle
+
+from .util import *
+
+from FileResult import FileResult
+from ScanJob import ScanJob
+from ScanScheduler import *
+from ScanStatistics import ScanStatistics
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _double_and_report(scanfilequeue, resultqueue, processlock, checksumdict):
+    while True:
+        scanjob = scanfilequeue.get()
+        item = int(str(scanjob.fileresult.filename))
+        queuedjobs = 0
+        if item < 100:
+            for child in [item * 2, item * 2 + 1]:
+                childresult = FileResult(None, pathlib.Path(str(child)), set())
+                scanfilequeue.put(ScanJob(childresult, scanjob.scan, scanjob.jobid))
+                queuedjobs += 1
+        fileresult = scanjob.fileresult
+        fileresult.set_hashresult('sha256', sha256(b'%d' % (item % 10)))
+        checksumkey = scanjob.scan.checksum_key(fileresult.get_hash())
+        processlock.acquire()
+        if checksumkey in checksumdict:
+            fileresult.set_duplicate(True)
+            fileresult.set_duplicate_of(checksumdict[checksumkey])
+        else:
+            checksumdict[checksumkey] = fileresult.filename
+        processlock.release()
+        resultqueue.put((scanjob.scan.scanid, scanjob.jobid, scanjob.parentid,
+            fileresult, queuedjobs, None))
+        scanfilequeue.task_done()
+
+def _create_scanjob(scanid, item):
+    scan = ScanContext(scanid, pathlib.Path('unpack'), pathlib.Path('results'))
+    return ScanJob(FileResult(None, pathlib.Path(str(item)), set()), scan)
+
+def test_batching_queue_hands_out_single_items():
+    q = BatchingJoinableQueue(batchsize = 2)
+    q.put('a')
+    q.put('b')
+    q.put('c')
+    q.flush()
+    items = [q.get(timeout = 1) for i in range(3)]
+    assert sorted(items) == ['a', 'b', 'c']
+    for i in range(3):
+        q.task_done()
+    q.join()
+
+def _get_item(q, result, started = None):
+    if started is not None:
+        started.wait(5)
+    result.value = q.get(timeout = 5).encode()
+    q.task_done()
+
+def test_batching_queue_shares_batches_with_idle_processes():
+    q = BatchingJoinableQueue(batchsize = 2)
+    result = multiprocessing.Array('c', 1)
+    started = multiprocessing.Event()
+    p = multiprocessing.Process(target = _get_item, args = (q, result, started))
+    p.start()
+    for item in ['a', 'b', 'c', 'd']:
+        q.put(item)
+    assert q.get(timeout = 1) == 'a'
+    # the other batch is taken by another process
+    started.set()
+    p.join()
+    assert result.value == b'c'
+    q.task_done()
+    assert q.get(timeout = 1) == 'b'
+    q.task_done()
+    q.join()
+
+class CountingQueue:
+    def __init__(self, queue):
+        self.queue = queue
+        self.sent = 0
+        self.received = 0
+
+    def put(self, batch):
+        self.sent += len(batch)
+        self.queue.put(batch)
+
+    def get(self, timeout = None):
+        batch = self.queue.get(timeout = timeout)
+        self.received += len(batch)
+        return batch
+
+    def task_done(self):
+        self.queue.task_done()
+
+    def join(self):
+        self.queue.join()
+
+def test_batching_queue_sends_items_once():
+    q = BatchingJoinableQueue(batchsize = 4)
+    q.queue = CountingQueue(q.queue)
+    q.put(1)
+    q.flush()
+    # every item adds two new items, until there are 99 items
+    jobs = 99
+    for i in range(jobs):
+        item = q.get(timeout = 1)
+        if item < 50:
+            q.put(item * 2)
+            q.put(item * 2 + 1)
+        q.task_done()
+    q.join()
+    assert q.queue.sent == jobs
+    assert q.queue.received == jobs
+
+def test_batching_queue_does_not_pickle_buffers():
+    q = BatchingJoinableQueue(batchsize = 4)
+    q.put('a')
+    state = q.__getstate__()
+    assert 'pending' not in state
+    q.flush()
+
+@pytest.mark.parametrize('name', schedulers)
+def test_scheduler_runs_scans_until_done(name):
+    scheduler = create_scheduler(name)
+    processes = [ multiprocessing.Process(target = _double_and_report,
+        args = (scheduler.scanfilequeue, scheduler.resultqueue,
+            scheduler.processlock, scheduler.checksumdict))
+        for i in range(3) ]
+    for p in processes:
+        p.start()
+    scheduler.submit(_create_scanjob('first', 1))
+    scheduler.submit(_create_scanjob('second', 51))
+    assert scheduler.get_active_scans() == 2
+    finished = {}
+    for i in range(2):
+        scan, results, statistics = scheduler.wait_for_scan()
+        finished[scan.scanid] = results
+    assert scheduler.get_active_scans() == 0
+    assert len(scheduler.checksumdict) == 0
+    for p in processes:
+        p.terminate()
+        p.join()
+    scheduler.shutdown()
+
+    first = finished['first']
+    assert sorted(int(str(r.filename)) for r in first) == list(range(1, 200))
+    assert len([ r for r in first if not r.is_duplicate() ]) == 10
+    for r in first:
+        if r.is_duplicate():
+            assert int(str(r.duplicateof)) % 10 == int(str(r.filename)) % 10
+
+    # duplicates are only searched for in the same scan
+    second = finished['second']
+    assert sorted(int(str(r.filename)) for r in second) == [51, 102, 103]
+    assert not any(r.is_duplicate() for r in second)
+
+def test_scan_progress_waits_for_parents():
+    progress = ScanProgress(None)
+    # the result of a file that was unpacked arrives first
+    assert not progress.add_result('child', 'root', None, 0)
+    assert not progress.add_result('root', None, None, 2)
+    assert progress.add_result('otherchild', 'root', None, 0)
+
+def test_scan_progress_merges_statistics():
+    progress = ScanProgress(None)
+    for success in [True, False]:
+        statistics = ScanStatistics()
+        statistics.add_attempt('gzip', statistics.start(), success)
+        progress.add_result(success, None, None, 0, statistics)
+    assert progress.statistics.get()['parsers']['gzip']['attempts'] == 2
+
+def test_checksum_table_records_hashes():
+    table = SharedChecksumTable(capacity = 8)
+    try:
+        assert sha256(b'a') not in table
+        table[sha256(b'a')] = 'a'
+        assert sha256(b'a') in table
+        assert table[sha256(b'a')] is None
+        assert sha256(b'b') not in table
+        assert len(table) == 1
+    finally:
+        table.unlink()
+
+def test_checksum_table_grows():
+    table = SharedChecksumTable(capacity = 4)
+    try:
+        for i in range(100):
+            table[sha256(b'%d' % i)] = i
+        assert len(table) == 100
+        assert table.capacity >= 128
+        for i in range(100):
+            assert sha256(b'%d' % i) in table
+        assert sha256(b'100') not in table
+    finally:
+        table.unlink()
+
+def test_checksum_table_is_shared_after_growing():
+    table = SharedChecksumTable(capacity = 4)
+    try:
+        other = pickle.loads(pickle.dumps(table))
+        for i in range(10):
+            other[sha256(b'%d' % i)] = i
+        for i in range(10):
+            assert sha256(b'%d' % i) in table
+        other.close()
+    finally:
+        table.unlink()
+
+def test_checksum_table_removes_hashes():
+    table = SharedChecksumTable(capacity = 8)
+    try:
+        for i in range(5):
+            table[sha256(b'%d' % i)] = i
+        del table[sha256(b'1')]
+        assert sha256(b'1') not in table
+        for i in [0, 2, 3, 4]:
+            assert sha256(b'%d' % i) in table
+        assert len(table) == 4
+        with pytest.raises(KeyError):
+            del table[sha256(b'1')]
+        # removed slots are reused and cleaned up when the table
+        # is rebuilt, so it does not keep growing
+        for i in range(100):
+            table[sha256(b'x')] = 'x'
+            del table[sha256(b'x')]
+            table[(i, sha256(b'y'))] = 'y'
+            del table[(i, sha256(b'y'))]
+        assert len(table) == 4
+        assert table.capacity <= 16
+    finally:
+        table.unlink()
@@ -0,0 +1,57 @@
+from .util import *
+
+from ScanStatistics import ScanStatistics
+
+def test_attempts_are_counted_per_parser():
+    statistics = ScanStatistics()
+    statistics.add_attempt('gzip', statistics.start(), True)
+    statistics.add_attempt('gzip', statistics.start(), False)
+    statistics.add_attempt('zip', statistics.start(), False)
+    parsers = statistics.get()['parsers']
+    assert parsers['gzip']['attempts'] == 2
+    assert parsers['gzip']['successes'] == 1
+    assert parsers['gzip']['failures'] == 1
+    assert parsers['zip']['failures'] == 1
+    assert parsers['gzip']['failed wall time'] <= parsers['gzip']['wall time']
+
+def test_phases_are_timed():
+    statistics = ScanStatistics()
+    with statistics.phase('signatures'):
+        sum(range(100000))
+    with pytest.raises(ValueError):
+        with statistics.phase('signatures'):
+            raise ValueError
+    phases = statistics.get()['phases']
+    assert phases['signatures']['count'] == 2
+    assert phases['signatures']['wall time'] > 0
+    assert phases['signatures']['cpu time'] >= 0
+
+def test_statistics_are_merged():
+    first = ScanStatistics()
+    first.add_attempt('gzip', first.start(), True)
+    with first.phase('stat'):
+        pass
+    second = ScanStatistics()
+    second.add_attempt('gzip', second.start(), False)
+    second.add_attempt('zip', second.start(), True)
+    with second.phase('stat'):
+        pass
+    first.merge(second)
+    result = first.get()
+    assert result['phases']['stat']['count'] == 2
+    assert result['parsers']['gzip']['attempts'] == 2
+    assert result['parsers']['gzip']['failures'] == 1
+    assert result['parsers']['zip']['successes'] == 1
+
+def test_external_programs_are_recorded_and_merged():
+    first = ScanStatistics()
+    first.add_tool_run('unsquashfs', 0.5, 2.0)
+    second = ScanStatistics()
+    second.add_tool_run('unsquashfs', 0.0, 1.0)
+    second.add_tool_timeout('unsquashfs')
+    second.add_tool_run('7z', 0.0, 0.5)
+    first.merge(second)
+    tools = first.get()['tools']
+    assert list(tools) == ['unsquashfs', '7z']
+    assert tools['unsquashfs'] == {'runs': 2, 'timeouts': 1,
+                                   'wait time': 0.5, 'wall time': 3.0}
@@ -0,0 +1,72 @@
+from .util import *
+
+from SharedInputFile import SharedInputFile, BorrowedFile
+
+@pytest.fixture
+def sharedfile(tmp_path):
+    path = tmp_path / 'data'
+    path.write_bytes(b'0123456789abcdef')
+    sharedfile = SharedInputFile(path)
+    yield sharedfile
+    sharedfile.close()
+
+def test_borrowed_files_have_their_own_position(sharedfile):
+    f = sharedfile.borrow()
+    g = sharedfile.borrow()
+    assert f.read(4) == b'0123'
+    assert g.read(2) == b'01'
+    assert f.read(4) == b'4567'
+    g.seek(10)
+    assert f.tell() == 8
+    assert g.read() == b'abcdef'
+    assert f.read(2) == b'89'
+
+def test_closing_borrowed_file_keeps_shared_file_open(sharedfile):
+    with sharedfile.borrow() as f:
+        assert f.read(2) == b'01'
+    assert f.closed
+    with pytest.raises(ValueError):
+        f.read()
+    assert not sharedfile.infile.closed
+    assert sharedfile.borrow().read(2) == b'01'
+
+def test_borrowed_range_is_bounded(sharedfile):
+    f = sharedfile.borrow(4, 6)
+    assert f.read() == b'456789'
+    f.seek(0, os.SEEK_END)
+    assert f.tell() == 6
+    assert f.fileno() == sharedfile.infile.fileno()
+
+def test_map_is_shared(sharedfile):
+    m = sharedfile.get_mmap()
+    assert m[:4] == b'0123'
+    assert sharedfile.get_mmap() is m
+
+def test_reopen_reads_changed_data(sharedfile):
+    f = sharedfile.borrow()
+    assert f.read(2) == b'01'
+    with open(sharedfile.filename, 'r+b') as g:
+        g.write(b'ab')
+    sharedfile.reopen()
+    assert f.tell() == 2
+    f.seek(0)
+    assert f.read(2) == b'ab'
+
+def test_scan_environment_lends_shared_file(scan_environment, tmp_path):
+    path = tmp_path / 'data'
+    path.write_bytes(b'0123456789')
+    fileresult = FileResult(None, path, set())
+    f = scan_environment.open_fileresult(fileresult)
+    assert not isinstance(f.infile, BorrowedFile)
+    f.close()
+    sharedfile = scan_environment.share_input_file(path)
+    f = scan_environment.open_fileresult(fileresult)
+    assert isinstance(f.infile, BorrowedFile)
+    assert f.read() == b'0123456789'
+    f.close()
+    g = scan_environment.open_input_file(path)
+    assert isinstance(g, BorrowedFile)
+    g.close()
+    scan_environment.close_shared_input_file(sharedfile)
+    assert scan_environment.get_shared_input_file(path) is None
+    assert sharedfile.infile.closed
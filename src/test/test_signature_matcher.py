@@ -0,0 +1,52 @@
+from .util import *
+
+from SignatureMatcher import SignatureMatcher
+
+def create_signature_parsers():
+    return [
+            create_unpackparser('FirstUnpacker',
+                signatures = [ (0,b'ABCD'), (5,b'DCBA') ],
+                pretty_name = 'first'),
+            create_unpackparser('SecondUnpacker',
+                signatures = [ (2,b'ABCD') ],
+                pretty_name = 'second'),
+            create_unpackparser('ThirdUnpacker',
+                signatures = [ (0,b'CDE') ],
+                pretty_name = 'third'),
+        ]
+
+@pytest.fixture(params = [True, False])
+def signature_matcher(request, scan_environment):
+    scan_environment.set_unpackparsers(create_signature_parsers())
+    return SignatureMatcher(scan_environment.get_unpackparsers_for_signatures(),
+            use_automaton = request.param)
+
+def test_signature_matcher_finds_overlapping_signatures(signature_matcher):
+    candidates = signature_matcher.find_offsets(b'xxABCDE', 7, 0, 7)
+    assert [ (o, u.pretty_name) for o, u in candidates ] == [
+            (0, 'second'), (2, 'first'), (4, 'third') ]
+
+def test_signature_matcher_skips_signatures_before_start_of_file(signature_matcher):
+    candidates = signature_matcher.find_offsets(b'xDCBAxx', 7, 0, 7)
+    assert candidates == []
+
+def test_signature_matcher_uses_offset_in_file(signature_matcher):
+    candidates = signature_matcher.find_offsets(b'xxDCBAxx', 8, 100, 108)
+    assert [ (o, u.pretty_name) for o, u in candidates ] == [ (97, 'first') ]
+
+def test_signature_matcher_only_searches_bytes_read(signature_matcher):
+    candidates = signature_matcher.find_offsets(b'xxxxABCD', 6, 0, 8)
+    assert candidates == []
+
+def test_signature_matcher_is_cached_in_scan_environment(scan_environment):
+    scan_environment.set_unpackparsers(create_signature_parsers())
+    matcher = scan_environment.get_signature_matcher()
+    assert scan_environment.get_signature_matcher() is matcher
+    scan_environment.add_unpackparser(create_unpackparser('FourthUnpacker',
+        signatures = [ (0,b'XYZ') ]))
+    assert scan_environment.get_signature_matcher() is not matcher
+
+def test_signature_matcher_finds_signatures_ending_in_available_bytes(signature_matcher):
+    candidates = signature_matcher.find_offsets(b'xxxxABCD', 6, 0, 8, 8)
+    assert [ (o, u.pretty_name) for o, u in candidates ] == [
+            (2, 'second'), (4, 'first') ]
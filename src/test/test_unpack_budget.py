@@ -0,0 +1,116 @@
+import signal
+import time
+
+from .util import *
+
+from FileResult import FileResult
+from ScanJob import ScanJob
+from UnpackBudget import UnpackBudget, UnpackBudgetExceeded
+from UnpackManager import UnpackManager
+
+def _busy_loop():
+    while True:
+        pass
+
+def test_unlimited_budget_does_not_use_a_timer(tmp_path):
+    handler = signal.getsignal(signal.SIGALRM)
+    with UnpackBudget().enforce(tmp_path):
+        assert signal.getsignal(signal.SIGALRM) is handler
+        assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+@pytest.mark.parametrize('limit', ['walltime', 'cputime'])
+def test_attempt_over_time_budget_is_aborted(tmp_path, limit):
+    handler = signal.getsignal(signal.SIGALRM)
+    with pytest.raises(UnpackBudgetExceeded) as e:
+        with UnpackBudget(**{limit: 0.2}).enforce(tmp_path):
+            _busy_loop()
+    assert e.value.limit == limit
+    assert signal.getsignal(signal.SIGALRM) is handler
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+def test_caught_budget_exception_is_raised_again(tmp_path):
+    with pytest.raises(UnpackBudgetExceeded):
+        with UnpackBudget(walltime=0.1).enforce(tmp_path):
+            try:
+                _busy_loop()
+            except Exception:
+                pass
+            raise ValueError("unpack parser fails in another way")
+
+def test_cleanup_after_budget_exception_is_not_interrupted(tmp_path):
+    cleanedup = False
+    with pytest.raises(UnpackBudgetExceeded):
+        with UnpackBudget(walltime=0.1).enforce(tmp_path):
+            try:
+                _busy_loop()
+            finally:
+                # several check intervals
+                end = time.perf_counter() + 0.3
+                while time.perf_counter() < end:
+                    pass
+                cleanedup = True
+    assert cleanedup
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+def test_attempt_writing_over_budget_is_aborted_while_running(tmp_path):
+    with pytest.raises(UnpackBudgetExceeded) as e:
+        with UnpackBudget(writtenbytes=1000).enforce(tmp_path):
+            (tmp_path / 'unpacked').write_bytes(b'x' * 1001)
+            _busy_loop()
+    assert e.value.limit == 'writtenbytes'
+
+def test_attempt_over_written_bytes_budget_is_aborted(tmp_path):
+    with pytest.raises(UnpackBudgetExceeded) as e:
+        with UnpackBudget(writtenbytes=1000).enforce(tmp_path):
+            (tmp_path / 'sub').mkdir()
+            (tmp_path / 'sub' / 'unpacked').write_bytes(b'x' * 1001)
+    assert e.value.limit == 'writtenbytes'
+
+def test_attempt_within_budget_is_not_aborted(tmp_path):
+    with UnpackBudget(walltime=10, cputime=10, writtenbytes=1000).enforce(tmp_path):
+        (tmp_path / 'unpacked').write_bytes(b'x' * 1000)
+
+class ParserSlowAA(UnpackParser):
+    pretty_name = 'slow-AA'
+    signatures = [(1, b'AA')]
+    def parse_and_unpack(self):
+        self.make_unpack_directory()
+        outfile = self.scan_environment.unpack_path(self.rel_unpack_dir / 'partial')
+        outfile.write_bytes(b'partial output')
+        _busy_loop()
+
+parser_slow_AA = ParserSlowAA
+parser_pass_BB_1_5 = create_unpackparser('ParserPassBB_1_5',
+        signatures = [(1,b'BB')],
+        length = 5,
+        pretty_name = 'pass-BB-1-5')
+
+def test_parser_budget_overrides_default_budget(scan_environment):
+    scan_environment.unpackbudget = UnpackBudget(walltime=60, writtenbytes=100)
+    scan_environment.parserbudgets = {
+            'slow-AA': scan_environment.unpackbudget.updated(walltime=600)}
+    assert scan_environment.get_unpack_budget(parser_slow_AA) == \
+            UnpackBudget(walltime=600, writtenbytes=100)
+    assert scan_environment.get_unpack_budget(parser_pass_BB_1_5) == \
+            UnpackBudget(walltime=60, writtenbytes=100)
+
+def test_scan_continues_after_attempt_over_budget(scan_environment):
+    scan_environment.parserbudgets = {'slow-AA': UnpackBudget(walltime=0.2)}
+    scan_environment.set_unpackparsers([parser_slow_AA, parser_pass_BB_1_5])
+    path_abs = scan_environment.temporarydirectory / 'test_budget.data'
+    path_abs.write_bytes(b'xAAxxxxxxxxxxxxyBBxxxxxxxxxxx')
+    fileresult = FileResult(None, path_abs, set())
+    fileresult.set_filesize(path_abs.stat().st_size)
+    scanjob = ScanJob(fileresult)
+    scanjob.set_scanenvironment(scan_environment)
+    scanjob.initialize()
+    unpacker = UnpackManager(scan_environment.unpackdirectory)
+    scanjob.prepare_for_unpacking()
+
+    scanjob.check_for_signatures(unpacker)
+    assert [x['offset'] for x in fileresult.unpackedfiles] == [15]
+    assert list(scan_environment.unpackdirectory.rglob('partial')) == []
+    parsers = scanjob.statistics.get()['parsers']
+    assert parsers['slow-AA']['timeouts'] == 1
+    assert parsers['slow-AA']['failures'] == 1
+    assert parsers['pass-BB-1-5']['timeouts'] == 0
@@ -69,11 +69,149 @@ def test_try_unpack_for_extension_fail(scan_environment):
     with pytest.raises(UnpackParserException):
         unpack_result = unpack_manager.try_unpack_file_for_extension(fileresult, scan_environment, '.ex1', unpack_parser)
 
-    # TODO: currently scanjob takes care of removing the unpack directory, but unpackmanager should perhaps do this
-    # assert not (scan_environment.unpackdirectory / unpack_manager.dataunpackdirectory).exists()
-    assert os.listdir(scan_environment.unpackdirectory / unpack_manager.dataunpackdirectory) == []
+    # the unpack directory is only created when something is unpacked
+    assert not (scan_environment.unpackdirectory / unpack_manager.dataunpackdirectory).exists()
 
+class UnpackParserChdirFail(UnpackParser):
+    pretty_name = "chdir_fail"
+    extensions = ['.ex1']
+    def parse(self):
+        os.chdir(self.scan_environment.temporarydirectory)
+        raise UnpackParserException("fails after changing directory")
 
+def test_try_unpack_fail_restores_working_directory(scan_environment):
+    fn = pathlib.Path("test.ex1")
+    fileresult = create_tmp_fileresult(scan_environment.temporarydirectory / fn, b"A"*70)
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    cwd = os.getcwd()
+    with pytest.raises(UnpackParserException):
+        unpack_manager.try_unpack_file_for_extension(fileresult, scan_environment, '.ex1', UnpackParserChdirFail)
+    assert os.getcwd() == cwd
+    with pytest.raises(UnpackParserException):
+        unpack_manager.try_unpack_file_for_signatures(fileresult, scan_environment, UnpackParserChdirFail, 0)
+    assert os.getcwd() == cwd
+
+
+
+def test_unpack_directory_is_created_when_used(scan_environment):
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    relpath = pathlib.Path('test.bin')
+    # a file with the name of the directory is not overwritten
+    (scan_environment.unpackdirectory / 'test.bin-0x00000000-ex1-1').write_bytes(b'')
+    assert unpack_manager.make_data_unpack_directory(relpath, 'ex1', 0) == 2
+    unpackdir = scan_environment.unpackdirectory / unpack_manager.get_data_unpack_directory()
+    assert not unpackdir.exists()
+    unpack_manager.remove_data_unpack_directory_tree()
+    # data that was left behind is removed
+    unpackdir.mkdir()
+    (unpackdir / 'data').write_bytes(b'x')
+    assert unpack_manager.make_data_unpack_directory(relpath, 'ex1', 0, 2) == 2
+    unpack_manager.remove_data_unpack_directory_tree()
+    assert not unpackdir.exists()
+
+def _collect_candidates(unpack_manager, signature_matcher, filesize):
+    candidates = []
+    unpack_manager.seek_to_last_unpacked_offset()
+    unpack_manager.read_chunk_from_scanfile()
+    while True:
+        candidates.extend(unpack_manager.find_offsets_for_signatures(
+            signature_matcher, filesize))
+        if unpack_manager.get_current_offset_in_file() >= filesize:
+            break
+        unpack_manager.seek_to_find_next_signature()
+        unpack_manager.read_chunk_from_scanfile()
+    unpack_manager.close_scanfile()
+    return candidates
+
+def test_mmap_windows_find_signatures_across_window_boundaries(scan_environment):
+    scan_environment.set_unpackparsers([
+        create_unpackparser('ParserAB', signatures = [(0, b'ABCD')],
+            pretty_name = 'ab') ])
+    fn = scan_environment.temporarydirectory / "test.bin"
+    # the second signature crosses the boundary of the first window
+    content = b'ABCD' + b'x' * 10 + b'ABCD' + b'x' * 20
+    fileresult = create_tmp_fileresult(fn, content)
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    assert unpack_manager.open_scanfile_with_mmap(fn, windowsize = 16)
+    candidates = _collect_candidates(unpack_manager,
+            scan_environment.get_signature_matcher(), len(content))
+    assert [ offset for offset, u in candidates ] == [ 0, 14 ]
+
+def test_mmap_and_chunked_reading_find_same_signatures(scan_environment):
+    scan_environment.set_unpackparsers([
+        create_unpackparser('ParserAB', signatures = [(0, b'ABCD')],
+            pretty_name = 'ab') ])
+    fn = scan_environment.temporarydirectory / "test.bin"
+    content = (b'x' * 1000 + b'ABCD') * 500
+    fileresult = create_tmp_fileresult(fn, content)
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    assert unpack_manager.open_scanfile_with_mmap(fn, windowsize = 4096)
+    mmap_candidates = _collect_candidates(unpack_manager,
+            scan_environment.get_signature_matcher(), len(content))
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    unpack_manager.open_scanfile_with_memoryview(fn, 4 * maxsignaturesoffset)
+    read_candidates = _collect_candidates(unpack_manager,
+            scan_environment.get_signature_matcher(), len(content))
+    assert sorted(set(read_candidates)) == mmap_candidates
+
+def test_weak_signatures_are_skipped_in_high_entropy_blocks(scan_environment):
+    scan_environment.set_unpackparsers([
+        create_unpackparser('ParserAB', signatures = [(0, b'AB')],
+            pretty_name = 'ab'),
+        create_unpackparser('ParserCD', signatures = [(0, b'CDEF')],
+            pretty_name = 'cd') ])
+    fn = scan_environment.temporarydirectory / "test.bin"
+    content = (b'x' * 10 + b'AB' + b'x' * 10 + b'CDEF').ljust(64, b'x') * 3
+    fileresult = create_tmp_fileresult(fn, content)
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    # the first two blocks look encrypted, the second one is unpacked
+    unpack_manager.set_entropy_profile(64, [7.99, 7.99, 4.0])
+    unpack_manager.append_unpacked_range(120, 130)
+    unpack_manager.open_scanfile_with_memoryview(fn, 4 * maxsignaturesoffset)
+    candidates = _collect_candidates(unpack_manager,
+            scan_environment.get_signature_matcher(), len(content))
+    assert [ offset for offset, u in candidates ] == [ 22, 74, 86, 138, 150 ]
+    assert unpack_manager.skippedsignatures == 1
+
+def test_data_before_last_unpacked_offset_is_searched(scan_environment):
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    unpack_manager.append_unpacked_range(10, 20)
+    unpack_manager.append_unpacked_range(30, 40)
+    unpack_manager.set_last_unpacked_offset(40)
+    assert unpack_manager.offset_overlaps_with_unpacked_data(15)
+    assert not unpack_manager.offset_overlaps_with_unpacked_data(25)
+    assert unpack_manager.unpacked_gaps(0, 50) == [ (0, 10), (20, 30), (40, 50) ]
+
+@pytest.mark.parametrize('usemmap', [True, False])
+def test_long_runs_of_padding_are_skipped(scan_environment, usemmap):
+    scan_environment.set_unpackparsers([
+        create_unpackparser('ParserAB', signatures = [(0, b'ABCD')],
+            pretty_name = 'ab') ])
+    fn = scan_environment.temporarydirectory / "test.bin"
+    content = b'x' * 100 + b'\x00' * 131072 + b'ABCD' + b'\xff' * 131072 + \
+            b'ABCD' + b'\x00' * 1000 + b'ABCD'
+    fileresult = create_tmp_fileresult(fn, content)
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    unpack_manager.set_skip_padding(True)
+    if usemmap:
+        assert unpack_manager.open_scanfile_with_mmap(fn, windowsize = 65536)
+    else:
+        unpack_manager.open_scanfile_with_memoryview(fn, 4 * maxsignaturesoffset)
+    candidates = _collect_candidates(unpack_manager,
+            scan_environment.get_signature_matcher(), len(content))
+    assert [ offset for offset, u in candidates ] == [ 131172, 262248, 263252 ]
+    # short runs of padding are scanned as any other data
+    assert unpack_manager.padding_ranges() == [ (100, 131172, b'\x00'),
+            (131176, 262248, b'\xff') ]
+    unpack_manager.append_unpacked_range(131172, 131180)
+    assert unpack_manager.add_padding_ranges() == [ (100, 131172, b'\x00'),
+            (131180, 262248, b'\xff') ]
+
+def test_mmap_falls_back_for_files_that_cannot_be_mapped(scan_environment):
+    fn = scan_environment.temporarydirectory / "empty"
+    fileresult = create_tmp_fileresult(fn, b'')
+    unpack_manager = UnpackManager(scan_environment.unpackdirectory)
+    assert not unpack_manager.open_scanfile_with_mmap(fn)
 
 def test_file_reading(scan_environment):
     unpack_manager = UnpackManager(scan_environment.unpackdirectory)
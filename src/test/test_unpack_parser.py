@@ -1,8 +1,10 @@
+import io
 import pytest
+import struct
 
 from .util import *
 from UnpackParserException import UnpackParserException
-from UnpackParser import UnpackParser
+from UnpackParser import UnpackParser, OffsetInputFile
 from bangsignatures import get_unpackers
 from parsers.database.sqlite.UnpackParser import SqliteUnpackParser
 from parsers.image.gif.UnpackParser import GifUnpackParser
@@ -36,6 +38,76 @@ def test_unpackparsers_are_found():
     assert 'GifUnpackParser' in unpacker_names
     assert 'VfatUnpackParser' in unpacker_names
 
+def test_offset_input_file_is_bounded(tmp_path):
+    path = tmp_path / 'data'
+    path.write_bytes(b'0123456789')
+    f = OffsetInputFile(path.open('rb'), 2, 5)
+    f.seek(0)
+    assert f.read() == b'23456'
+    assert f.read(1) == b''
+    assert f.seek(-2, os.SEEK_END) == 3
+    b = bytearray(4)
+    assert f.readinto(b) == 2
+    assert b[:2] == b'56'
+    f.seek(0)
+    assert f.read(3) == b'234'
+    assert f.tell() == 3
+    f.close()
+
+def test_offset_input_file_reads_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(OffsetInputFile, 'buffersize', 4)
+    path = tmp_path / 'data'
+    path.write_bytes(b'0123456789abcdef')
+    infile = path.open('rb')
+    f = OffsetInputFile(infile, 2, 10)
+    assert f.size == 10
+    assert f.read(1) == b'2'
+    assert f.read(2) == b'34'
+    assert f.read(3) == b'567'
+    # large reads are not buffered
+    assert f.read(5) == b'89ab'
+    assert f.read(1) == b''
+    # the position of the wrapped file is not used
+    assert infile.tell() == 0
+    f.seek(1)
+    b = bytearray(8)
+    assert f.readinto(b) == 8
+    assert bytes(b) == b'3456789a'
+    f.seek(6)
+    v = f.read_view(10)
+    assert bytes(v) == b'89ab'
+    assert f.tell() == 10
+    f.close()
+
+def test_offset_input_file_without_size_ends_with_file(tmp_path):
+    path = tmp_path / 'data'
+    path.write_bytes(b'0123456789')
+    f = OffsetInputFile(path.open('rb'), 4)
+    assert f.size == 6
+    assert f.read() == b'456789'
+    f.close()
+    f = OffsetInputFile(io.BytesIO(b'0123456789'), 4)
+    assert f.size == 6
+    assert f.read(2) == b'45'
+    assert f.readinto(bytearray(10)) == 4
+
+def test_offset_input_file_unpacks_structs(tmp_path):
+    path = tmp_path / 'data'
+    path.write_bytes(b'xx\x01\x00\x02\x00\x00\x00yy')
+    f = OffsetInputFile(path.open('rb'), 2, 6)
+    assert f.read_struct('<H') == (1,)
+    assert f.read_struct(struct.Struct('<I')) == (2,)
+    assert f.tell() == 6
+    assert f.unpack_from('<HI', 0) == (1, 2)
+    assert f.tell() == 6
+    f.seek(4)
+    with pytest.raises(EOFError):
+        f.read_struct('<I')
+    assert f.tell() == 4
+    with pytest.raises(ValueError):
+        f.seek(-1)
+    f.close()
+
 def test_wrapped_unpackparser_raises_exception(scan_environment):
     rel_testfile = pathlib.Path('unpackers') / 'fat' / 'test-fat12-multidirfile.fat'
     copy_testfile_to_environment(testdir_base / 'testdata', rel_testfile, scan_environment)
@@ -0,0 +1,64 @@
+import shutil
+
+from .util import *
+
+import bangunpack
+
+def _unpack_xml(scan_environment, data, name='test.xml'):
+    rel_testfile = pathlib.Path(name)
+    (scan_environment.unpackdirectory / rel_testfile).write_bytes(data)
+    fr = FileResult(None, rel_testfile, set())
+    fr.set_filesize(len(data))
+    return bangunpack.unpack_xml(fr, scan_environment, 0, pathlib.Path('unpacked'))
+
+def _billion_laughs(reference):
+    data = b'<!DOCTYPE lolz [<!ENTITY lol0 "lol">'
+    for i in range(1, 10):
+        data += b'<!ENTITY lol%d "%s">' % (i, b'&lol%d;' % (i - 1) * 10)
+    return data + b']>\n' + reference
+
+@pytest.mark.parametrize('data', [
+    b'<?xml version="1.0"?>\n<a b="c">text<d/><!-- comment --></a>\n',
+    b'\xef\xbb\xbf<a/>',
+    # namespaces are not checked
+    b'<a><x:b/></a>',
+    b'<!DOCTYPE a [<!ENTITY e "x">]><a b="&e;">&e;</a>',
+    # undefined entities are allowed if there is an external DTD
+    b'<!DOCTYPE a SYSTEM "http://example.com/a.dtd"><a>&nbsp;</a>',
+    b'<?xml version="1.0" encoding="windows-1252"?>\n<a>\x80</a>',
+    b'<?xml version="1.0" encoding="Shift_JIS"?>\n<a>\x82\xa0</a>',
+    ])
+def test_wellformed_xml_is_unpacked(scan_environment, data, monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda x: None)
+    testres = _unpack_xml(scan_environment, data)
+    assert testres['status']
+    assert testres['length'] == len(data)
+    assert testres['labels'] == ['xml']
+
+@pytest.mark.parametrize('data', [
+    b'<a><b></a>',
+    b'<a/>junk',
+    b'<a>&nbsp;</a>',
+    b'<a b="1" b="2"/>',
+    b'<a>\xff</a>',
+    b'<a>&#0;</a>',
+    b'<!DOCTYPE a [<!ENTITY e "<b>">]><a>&e;</a>',
+    b'<?xml version="1.0" encoding="bogus"?>\n<a/>',
+    b'<?xml version="1.0" encoding="Shift_JIS"?>\n<a>\x82\xa0\x82</a>',
+    _billion_laughs(b'<lolz>&lol9;</lolz>'),
+    _billion_laughs(b'<lolz a="&lol9;"/>'),
+    ])
+def test_xml_that_is_not_wellformed_is_not_unpacked(scan_environment, data):
+    if b'lolz' in data and not bangunpack.xml_expand_entities:
+        pytest.skip('expat does not protect against entity expansion')
+    testres = _unpack_xml(scan_environment, data)
+    assert not testres['status']
+
+def test_xml_is_parsed_in_blocks(scan_environment, monkeypatch):
+    monkeypatch.setattr(bangunpack, 'xmlreadsize', 10)
+    data = b'<?xml version="1.0" encoding="Shift_JIS"?>\n<a>' + \
+            b'\x82\xa0' * 100 + b'</a>'
+    testres = _unpack_xml(scan_environment, data)
+    assert testres['status']
+    testres = _unpack_xml(scan_environment, data[:-1])
+    assert not testres['status']